@@ -29,19 +29,55 @@ class Config:
     OWNER_ID = int(os.getenv("OWNER_ID", "0"))
     GROUP_ID = int(os.getenv("GROUP_ID", "0"))
 
+    # 更新接收：配置了 BOT_WEBHOOK_URL 时使用 Webhook（本地端口由反向代理转发），否则长轮询
+    BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")  # Telegram 回调的公网 HTTPS 地址（含路径）
+    BOT_WEBHOOK_LISTEN = os.getenv("BOT_WEBHOOK_LISTEN", "127.0.0.1")
+    BOT_WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", 8443))
+    BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "telegram")
+    BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")  # setWebhook 的 secret_token，校验请求确实来自 Telegram
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 16))  # 同时处理的更新数（同一用户的更新仍按到达顺序处理）
+    BOT_POOL_SIZE = int(os.getenv("BOT_POOL_SIZE", 64))  # Bot API 连接池大小（长连接复用）
+    BOT_POOL_TIMEOUT = float(os.getenv("BOT_POOL_TIMEOUT", 5))  # 连接池占满时等待空闲连接的秒数
+
     # 消息自毁配置（秒），设为 0 则不删除
     MESSAGE_DELETE_DELAY = int(os.getenv("MESSAGE_DELETE_DELAY", 30))
 
+    # 出站消息队列（/say 广播、成就炫耀等统一限速）
+    SEND_RATE_PER_SECOND = float(os.getenv("SEND_RATE_PER_SECOND", 30))  # 全局每秒最多发送条数（Telegram 约 30 条/秒）
+    SEND_QUEUE_CONCURRENCY = int(os.getenv("SEND_QUEUE_CONCURRENCY", 8))  # 并发发送协程数
+    MESSAGE_EDIT_INTERVAL = float(os.getenv("MESSAGE_EDIT_INTERVAL", 3))  # 同一条消息最短编辑间隔（秒），期间的更新合并为一次
+
     # Emby
     EMBY_URL = os.getenv("EMBY_URL", "")
     EMBY_API_KEY = os.getenv("EMBY_API_KEY", "")
     EMBY_LIBRARY_WHITELIST = os.getenv("EMBY_LIBRARY_WHITELIST", "")
+    EMBY_PLAYED_COUNT_TTL = int(os.getenv("EMBY_PLAYED_COUNT_TTL", 1800))  # 用户已看电影 / 剧集数缓存时间（秒）
+    EMBY_POOL_SIZE = int(os.getenv("EMBY_POOL_SIZE", 20))  # Emby 连接池上限（共享长连接）
+    EMBY_TIMEOUT = int(os.getenv("EMBY_TIMEOUT", 10))  # Emby 请求默认超时（秒）
+    EMBY_LIBRARY_SYNC_INTERVAL = int(os.getenv("EMBY_LIBRARY_SYNC_INTERVAL", 300))  # Emby 媒体库本地索引增量同步间隔（秒）
+    EMBY_FEED_INTERVAL = int(os.getenv("EMBY_FEED_INTERVAL", 300))  # 新片变更流轮询间隔（秒），REMUX 推送与新片公告共用
+    EMBY_USERS_TTL = int(os.getenv("EMBY_USERS_TTL", 600))  # Emby 用户目录后台刷新间隔（秒）
+    EMBY_WATCH_CONCURRENCY = int(os.getenv("EMBY_WATCH_CONCURRENCY", 10))  # 观影奖励采集的 Emby 并发请求数
+    EMBY_WEBHOOK_PORT = int(os.getenv("EMBY_WEBHOOK_PORT", 0))  # Emby Webhook 接收端口，0 为不启用（只靠轮询）
+    EMBY_WEBHOOK_HOST = os.getenv("EMBY_WEBHOOK_HOST", "0.0.0.0")
+    EMBY_WEBHOOK_PATH = os.getenv("EMBY_WEBHOOK_PATH", "/emby/webhook")
+    EMBY_WEBHOOK_SECRET = os.getenv("EMBY_WEBHOOK_SECRET", "")  # Webhook 共享密钥（URL 的 ?token= 或 X-Webhook-Secret 头）
+    POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", "data/posters")  # 推送海报的磁盘缓存目录
+    POSTER_CACHE_MB = int(os.getenv("POSTER_CACHE_MB", 200))  # 海报磁盘缓存上限（MB），超出按 LRU 淘汰
+    EMBY_VERIFY_SSL = os.getenv("EMBY_VERIFY_SSL", "false").lower() == "true"  # 是否校验 Emby 的 HTTPS 证书（自签证书需关闭）
 
     # Database
     DB_TYPE = os.getenv("DB_TYPE", "sqlite")  # sqlite / postgresql / mysql
     DB_PATH = os.getenv("DB_PATH", "data/magic.db")
     DB_URL = os.getenv("DB_URL", f"sqlite:///{DB_PATH}")
     DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"  # SQL日志开关
+    DB_DURABILITY = os.getenv("DB_DURABILITY", "strict")  # SQLite 持久化档位: strict / balanced / fast
+    DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"  # 启动时数据库版本落后是否自动执行迁移
+    DB_CHECKPOINT_INTERVAL = int(os.getenv("DB_CHECKPOINT_INTERVAL", 60))  # 后台 checkpoint 间隔（秒）
+    DB_CHECKPOINT_WAL_MB = int(os.getenv("DB_CHECKPOINT_WAL_MB", 16))  # WAL 超过该大小时执行 RESTART checkpoint
+    COUNTER_FLUSH_INTERVAL = int(os.getenv("COUNTER_FLUSH_INTERVAL", 10))  # 活跃度/聊天任务计数写回间隔（秒）
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))  # 用户快照缓存容量（人）
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))  # 用户快照缓存过期时间（秒）
 
     @classmethod
     def validate(cls):
@@ -9,10 +9,23 @@
     # 方式2: 分层导入
     from database.models import UserBinding
     from database.repository import get_user, get_or_create_user
+
+    # 异步回调中使用异步接口
+    from database import get_async_session, get_user_async
+
+    # 余额变动走账本（SQL 端原子加减）
+    from database import credit, debit_if_sufficient, transfer
+
+    # 成就 / 外观 / 武器收藏 / 领取记录走集合表
+    from database import user_set_contains, add_to_user_set
 """
 
 # === 模型类 ===
-from database.models import Base, UserBinding, VIPApplication, RedPacket, Guild
+from database.models import (
+    Base, UserBinding, VIPApplication, RedPacket, RedPacketClaim, Guild,
+    UserAchievement, UserCosmetic, UserWeapon, UserClaim, EmbyItem, EmbySeenItem, BroadcastJob,
+    PendingDeletion
+)
 
 # === 数据库会话 ===
 from database.repository import (
@@ -51,6 +64,65 @@ from database.repository import (
     cancel_user_pending_applications
 )
 
+# === 异步接口（供 async 回调使用，不阻塞事件循环） ===
+from database.async_repository import (
+    get_async_session,
+    AsyncSessionLocal,
+    async_engine,
+    get_user_async,
+    create_user_async,
+    get_or_create_user_async,
+    update_user_async,
+    get_top_users_by_attack_async,
+    get_top_users_by_bank_async,
+    get_user_count_async,
+    get_vip_count_async
+)
+
+# === MP 账本（余额变动统一入口） ===
+from database.ledger import (
+    get_balance,
+    credit,
+    credit_many,
+    debit_if_sufficient,
+    transfer,
+    bank_deposit,
+    bank_withdraw,
+    get_balance_async,
+    credit_async,
+    debit_if_sufficient_async,
+    transfer_async
+)
+
+# === 用户集合表（成就 / 外观 / 武器收藏 / 领取记录） ===
+from database.user_sets import (
+    get_user_set,
+    user_set_contains,
+    user_set_members,
+    add_to_user_set,
+    count_set_holders,
+    add_weapon,
+    get_weapon_counts,
+    get_user_set_async,
+    user_set_contains_async,
+    add_to_user_set_async
+)
+
+# === 用户快照缓存（绑定状态 / VIP 等热路径检查，写入时自动失效） ===
+from database.user_cache import (
+    UserSnapshot,
+    user_cache,
+    get_user_snapshot,
+    get_user_snapshot_async,
+    invalidate_user
+)
+
+# === 内存排行榜（战力 / 金库 / 观影 / 活跃 / 签到 / 爬塔，写入时增量更新） ===
+from database.leaderboard import (
+    leaderboards,
+    load_top_users
+)
+
 # === 兼容旧版 ===
 from database.repository import create_or_update_user
 
@@ -61,7 +133,16 @@ __all__ = [
     'UserBinding',
     'VIPApplication',
     'RedPacket',
+    'RedPacketClaim',
     'Guild',
+    'UserAchievement',
+    'UserCosmetic',
+    'UserWeapon',
+    'UserClaim',
+    'EmbyItem',
+    'EmbySeenItem',
+    'BroadcastJob',
+    'PendingDeletion',
 
     # 会话
     'get_session',
@@ -92,6 +173,55 @@ __all__ = [
     'approve_vip_application',
     'cancel_user_pending_applications',
 
+    # 异步接口
+    'get_async_session',
+    'AsyncSessionLocal',
+    'async_engine',
+    'get_user_async',
+    'create_user_async',
+    'get_or_create_user_async',
+    'update_user_async',
+    'get_top_users_by_attack_async',
+    'get_top_users_by_bank_async',
+    'get_user_count_async',
+    'get_vip_count_async',
+
+    # MP 账本
+    'get_balance',
+    'credit',
+    'credit_many',
+    'debit_if_sufficient',
+    'transfer',
+    'bank_deposit',
+    'bank_withdraw',
+    'get_balance_async',
+    'credit_async',
+    'debit_if_sufficient_async',
+    'transfer_async',
+
+    # 用户集合表
+    'get_user_set',
+    'user_set_contains',
+    'user_set_members',
+    'add_to_user_set',
+    'count_set_holders',
+    'add_weapon',
+    'get_weapon_counts',
+    'get_user_set_async',
+    'user_set_contains_async',
+    'add_to_user_set_async',
+
+    # 用户快照缓存
+    'UserSnapshot',
+    'user_cache',
+    'get_user_snapshot',
+    'get_user_snapshot_async',
+    'invalidate_user',
+
+    # 内存排行榜
+    'leaderboards',
+    'load_top_users',
+
     # 兼容旧版
     'create_or_update_user',
 ]
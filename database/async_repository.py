@@ -0,0 +1,185 @@
+"""
+异步数据访问层 (Async Repository)
+与 repository.py 平行的一套异步接口，供 async 回调直接 await 使用
+
+为什么需要：
+- 同步 get_session() 在 async 回调中执行时会阻塞整个事件循环
+- SQLite fsync / PostgreSQL 往返期间，其它 Update 全部排队等待
+
+驱动：
+- SQLite      -> aiosqlite
+- PostgreSQL  -> asyncpg
+"""
+from contextlib import asynccontextmanager
+from typing import Optional, List, Iterable
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import StaticPool
+from config import Config
+from database.models import UserBinding, user_lookup_statement
+
+
+# === 异步引擎 ===
+
+def to_async_url(url: str) -> str:
+    """把同步数据库 URL 转换为对应的异步驱动 URL"""
+    if url.startswith("sqlite+aiosqlite://") or "+asyncpg" in url:
+        return url
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+if Config.DB_TYPE == "sqlite":
+    # 文件库使用连接池：并发协程各自持有连接，写锁等待发生在 aiosqlite 线程中
+    # 内存库只能共享同一连接，否则每个连接都是一个独立的空库
+    async_engine = create_async_engine(
+        to_async_url(Config.DB_URL),
+        echo=Config.DB_ECHO,
+        connect_args={"timeout": 30},
+        **({"poolclass": StaticPool} if ":memory:" in Config.DB_URL else {}),
+    )
+
+    # 复用同步引擎的 PRAGMA 设置，保证两条连接行为一致
+    from database.repository import set_sqlite_pragma
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragma)
+
+else:
+    async_engine = create_async_engine(
+        to_async_url(Config.DB_URL),
+        echo=Config.DB_ECHO,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+    )
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False  # 与同步会话一致，提交后仍可读取属性
+)
+
+
+@asynccontextmanager
+async def get_async_session():
+    """
+    获取异步数据库会话的上下文管理器
+    用法:
+        async with get_async_session() as session:
+            user = await get_user_async(123, session)
+    """
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def use_async_session(session: Optional[AsyncSession] = None):
+    """复用调用方会话（先 flush，不提交）或新开会话（结束时提交），与 use_session 对应"""
+    if session is not None:
+        await session.flush()
+        yield session
+    else:
+        async with get_async_session() as own:
+            yield own
+
+
+# === 用户数据操作 ===
+
+async def get_user_async(tg_id: int, session: Optional[AsyncSession] = None,
+                         groups: Optional[Iterable[str]] = None) -> Optional[UserBinding]:
+    """
+    获取用户
+    groups: 只加载指定列分组（见 models.USER_COLUMN_GROUPS）
+    注意：异步会话不能按需加载未读取的列，访问分组外的列会报错，需要的分组必须写全；
+    collections 组默认不加载，需要时显式传入
+    """
+    stmt = user_lookup_statement(groups)
+    if session:
+        return (await session.execute(stmt, {"tg_id": tg_id})).scalars().first()
+    async with get_async_session() as session:
+        return (await session.execute(stmt, {"tg_id": tg_id})).scalars().first()
+
+
+async def create_user_async(tg_id: int, emby_account: Optional[str] = None,
+                            session: Optional[AsyncSession] = None) -> UserBinding:
+    """创建新用户"""
+    user = UserBinding(tg_id=tg_id, emby_account=emby_account)
+    if session:
+        session.add(user)
+        await session.flush()
+    else:
+        async with get_async_session() as session:
+            session.add(user)
+            await session.flush()
+    return user
+
+
+async def get_or_create_user_async(tg_id: int, emby_account: Optional[str] = None,
+                                   session: Optional[AsyncSession] = None) -> UserBinding:
+    """获取或创建用户（如果不存在）"""
+    user = await get_user_async(tg_id, session)
+    if not user:
+        user = await create_user_async(tg_id, emby_account, session)
+    return user
+
+
+async def update_user_async(tg_id: int, **kwargs) -> bool:
+    """更新用户字段"""
+    async with get_async_session() as session:
+        user = await get_user_async(tg_id, session)
+        if not user:
+            return False
+        for key, value in kwargs.items():
+            if hasattr(user, key):
+                setattr(user, key, value)
+        return True
+
+
+async def get_top_users_by_attack_async(limit: int = 10) -> List[UserBinding]:
+    """获取战力排行榜"""
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(UserBinding)
+            .filter(UserBinding.attack > 0)
+            .order_by(UserBinding.attack.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+async def get_top_users_by_bank_async(limit: int = 10) -> List[UserBinding]:
+    """获取银行财富排行榜"""
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(UserBinding)
+            .order_by(UserBinding.bank_points.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+async def get_user_count_async() -> int:
+    """获取用户总数"""
+    async with get_async_session() as session:
+        return (await session.execute(select(func.count()).select_from(UserBinding))).scalar_one()
+
+
+async def get_vip_count_async() -> int:
+    """获取VIP用户数"""
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(UserBinding).filter_by(is_vip=True)
+        )
+        return result.scalar_one()
@@ -0,0 +1,329 @@
+"""
+整库数据搬迁 (SQLite -> PostgreSQL)
+旧版迁移脚本把整张表读成 ORM 对象、逐个重建再每 10 行提交一次，开始前还会清空目标表，
+大库上耗时很长且失败后只能从头再来。现在改为：
+
+- 按主键顺序流式读取源表（yield_per，内存中只保留一个分块），不经过 ORM
+- 分块批量写入：PostgreSQL (psycopg2) 走 COPY FROM STDIN，其他目标走 executemany
+- 每个分块与断点（已写到的最后一个主键）在同一个目标库事务中提交，中断后重跑即从断点续传
+- 互不依赖的表并行搬迁（各表之间没有外键，按外键层级分批）
+- 结束后逐表校验行数与内容校验和（与行顺序无关，不受两边排序规则差异影响）
+
+断点记录在目标库的 transfer_checkpoint 表中；restart=True 时清空断点与目标表重新开始。
+
+使用方式:
+    from database.bulk_copy import copy_database, verify_tables
+
+    stats = copy_database(source_engine, target_engine)
+    checks = verify_tables(source_engine, target_engine)
+"""
+import hashlib
+import io
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, Text,
+    column, delete, insert, select, text, tuple_, update,
+)
+from sqlalchemy.engine import Engine
+from database.models import Base
+from database.migrate import current_version, head_version, upgrade
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_WORKERS = 4
+
+# 断点表只存在于目标库，单独的 MetaData，不参与 create_all / drop_all
+transfer_checkpoint = Table(
+    "transfer_checkpoint", MetaData(),
+    Column("table_name", String, primary_key=True),
+    Column("last_key", Text),                 # 已写入的最后一个主键（JSON 数组）
+    Column("rows", Integer, default=0),
+    Column("done", Boolean, default=False),
+    Column("updated_at", DateTime, default=datetime.now),
+)
+
+
+class TableStats(NamedTuple):
+    """单表搬迁结果（rows 为本次运行写入的行数，不含断点前已写入的部分）"""
+    name: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class TableCheck(NamedTuple):
+    """单表校验结果"""
+    name: str
+    source_rows: int
+    target_rows: int
+    source_checksum: str
+    target_checksum: str
+
+    @property
+    def ok(self) -> bool:
+        return self.source_rows == self.target_rows and self.source_checksum == self.target_checksum
+
+
+class TransferError(RuntimeError):
+    """源库 / 目标库状态不满足搬迁条件"""
+
+
+# ==========================================
+# 读取
+# ==========================================
+
+def transfer_tables() -> List[Table]:
+    return list(Base.metadata.sorted_tables)
+
+
+def table_levels(tables: Iterable[Table]) -> List[List[Table]]:
+    """按外键依赖分层：同一层内的表互不依赖，可以并行搬迁"""
+    remaining = list(tables)
+    levels, placed = [], set()
+    while remaining:
+        level = [
+            t for t in remaining
+            if all(fk.column.table.name in placed or fk.column.table is t for fk in t.foreign_keys)
+        ]
+        if not level:
+            raise TransferError(f"外键存在循环依赖: {[t.name for t in remaining]}")
+        levels.append(level)
+        placed.update(t.name for t in level)
+        remaining = [t for t in remaining if t.name not in placed]
+    return levels
+
+
+def _key_columns(table: Table) -> list:
+    return list(table.primary_key.columns)
+
+
+def _key_positions(table: Table) -> List[int]:
+    names = [c.name for c in table.columns]
+    return [names.index(c.name) for c in _key_columns(table)]
+
+
+def stream_chunks(engine: Engine, table: Table, after: Optional[list] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    按主键顺序流式读取 after 之后的行，每次产出一个分块（按 table.columns 顺序的元组列表）
+    读取的是驱动返回的原始值，不做类型转换：搬迁只是原样转写，省掉逐行逐列的类型处理
+    """
+    keys = _key_columns(table)
+    raw_columns = [column(c.name) for c in table.columns]
+    stmt = select(*raw_columns).select_from(table).order_by(*keys)
+    if after is not None:
+        if len(keys) == 1:
+            stmt = stmt.where(keys[0] > after[0])
+        else:
+            stmt = stmt.where(tuple_(*keys) > tuple_(*after))
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+        for rows in result.partitions():
+            yield [tuple(row) for row in rows]
+
+
+# ==========================================
+# 写入
+# ==========================================
+
+def _csv_field(value) -> str:
+    """COPY (FORMAT csv) 的字段编码：未加引号的空字段是 NULL，字符串一律加引号"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(conn, table: Table, rows):
+    """PostgreSQL COPY FROM STDIN，与当前事务共用同一个连接"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(map(_csv_field, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    quote = conn.dialect.identifier_preparer.quote
+    names = ", ".join(quote(c.name) for c in table.columns)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {quote(table.name)} ({names}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_sql(conn, table: Table) -> str:
+    """按驱动参数风格拼出位置参数的 INSERT（配合 executemany 直接传元组）"""
+    quote = conn.dialect.identifier_preparer.quote
+    count = len(table.columns)
+    style = conn.dialect.paramstyle
+    if style == "qmark":
+        params = ["?"] * count
+    elif style == "numeric":
+        params = [f":{i}" for i in range(1, count + 1)]
+    else:
+        params = ["%s"] * count
+    names = ", ".join(quote(c.name) for c in table.columns)
+    return f"INSERT INTO {quote(table.name)} ({names}) VALUES ({', '.join(params)})"
+
+
+def write_rows(conn, table: Table, rows):
+    """批量写入一个分块：PostgreSQL (psycopg2) 走 COPY，其他目标走 executemany"""
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        _copy_rows(conn, table, rows)
+    else:
+        conn.exec_driver_sql(_insert_sql(conn, table), rows)
+
+
+def _reset_sequence(conn, table: Table):
+    """PostgreSQL 自增主键：把序列推进到当前最大值之后"""
+    keys = _key_columns(table)
+    if conn.dialect.name != "postgresql" or len(keys) != 1 or not isinstance(keys[0].type, Integer):
+        return
+    if keys[0].autoincrement is False:
+        return
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence(:table, :column), "
+        f"COALESCE((SELECT MAX({keys[0].name}) FROM {table.name}), 0) + 1, false)"
+    ), {"table": table.name, "column": keys[0].name})
+
+
+# ==========================================
+# 断点
+# ==========================================
+
+def _load_checkpoints(engine: Engine) -> Dict[str, dict]:
+    with engine.connect() as conn:
+        return {
+            row.table_name: {"last_key": json.loads(row.last_key) if row.last_key else None,
+                             "rows": row.rows or 0, "done": bool(row.done)}
+            for row in conn.execute(select(transfer_checkpoint))
+        }
+
+
+def _save_checkpoint(conn, name: str, last_key: Optional[list], rows: int, done: bool = False):
+    conn.execute(
+        update(transfer_checkpoint)
+        .where(transfer_checkpoint.c.table_name == name)
+        .values(last_key=json.dumps(last_key) if last_key is not None else None,
+                rows=rows, done=done, updated_at=datetime.now())
+    )
+
+
+def copy_table(source: Engine, target: Engine, table: Table, checkpoint: Optional[dict] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               progress: Optional[Callable[[str, int], None]] = None) -> TableStats:
+    """
+    搬迁单表（可续传）
+    没有断点时先清空目标表并建立断点；每个分块与断点在同一事务中提交
+    """
+    start = time.perf_counter()
+    if checkpoint is None:
+        with target.begin() as conn:
+            conn.execute(delete(table))
+            conn.execute(delete(transfer_checkpoint).where(transfer_checkpoint.c.table_name == table.name))
+            conn.execute(insert(transfer_checkpoint).values(table_name=table.name, rows=0, done=False))
+        checkpoint = {"last_key": None, "rows": 0, "done": False}
+    if checkpoint["done"]:
+        return TableStats(table.name, 0, 0.0)
+
+    positions = _key_positions(table)
+    total, copied = checkpoint["rows"], 0
+    last_key = checkpoint["last_key"]
+    for rows in stream_chunks(source, table, last_key, chunk_size):
+        last_key = [rows[-1][i] for i in positions]
+        with target.begin() as conn:
+            write_rows(conn, table, rows)
+            _save_checkpoint(conn, table.name, last_key, total + copied + len(rows))
+        copied += len(rows)
+        if progress:
+            progress(table.name, total + copied)
+
+    with target.begin() as conn:
+        _reset_sequence(conn, table)
+        _save_checkpoint(conn, table.name, last_key, total + copied, done=True)
+    return TableStats(table.name, copied, time.perf_counter() - start)
+
+
+def prepare_target(source: Engine, target: Engine, restart: bool = False):
+    """检查源库版本，目标库建表（标记为最新版本）并准备断点表"""
+    head = head_version()
+    version = current_version(source)
+    if version != head:
+        raise TransferError(
+            f"源库版本 {version or 0} 与代码版本 {head} 不一致，请先对源库执行: python -m database.migrate"
+        )
+    upgrade(target)
+    transfer_checkpoint.create(target, checkfirst=True)
+    if restart:
+        with target.begin() as conn:
+            conn.execute(delete(transfer_checkpoint))
+
+
+def copy_database(source: Engine, target: Engine, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  workers: int = DEFAULT_WORKERS, restart: bool = False,
+                  progress: Optional[Callable[[str, int], None]] = None) -> List[TableStats]:
+    """
+    搬迁全部业务表（可续传），返回各表本次写入的行数与耗时
+    SQLite 目标只有一个写者，此时不并行
+    """
+    prepare_target(source, target, restart)
+    checkpoints = _load_checkpoints(target)
+    if target.dialect.name == "sqlite":
+        workers = 1
+
+    stats = []
+    for level in table_levels(transfer_tables()):
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(level)))) as pool:
+            futures = [
+                pool.submit(copy_table, source, target, table, checkpoints.get(table.name), chunk_size, progress)
+                for table in level
+            ]
+            stats.extend(f.result() for f in futures)
+    return stats
+
+
+# ==========================================
+# 校验
+# ==========================================
+
+def table_checksum(engine: Engine, table: Table, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    返回 (行数, 校验和)
+    按模型列类型读取（两边驱动的原始值不同：SQLite 的布尔是 0/1、时间是字符串），
+    逐行取 repr 摘要后求和（mod 2^64），与行顺序无关
+    """
+    count, total = 0, 0
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(select(table))
+        for rows in result.partitions():
+            for row in rows:
+                digest = hashlib.blake2b(repr(tuple(row)).encode(), digest_size=8).digest()
+                total += int.from_bytes(digest, "big")
+            count += len(rows)
+    return count, f"{total & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def verify_tables(source: Engine, target: Engine, workers: int = DEFAULT_WORKERS) -> List[TableCheck]:
+    """逐表比对源库与目标库的行数和校验和"""
+    tables = transfer_tables()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        source_sums = [pool.submit(table_checksum, source, t) for t in tables]
+        target_sums = [pool.submit(table_checksum, target, t) for t in tables]
+        checks = []
+        for table, s, d in zip(tables, source_sums, target_sums):
+            (source_rows, source_sum), (target_rows, target_sum) = s.result(), d.result()
+            checks.append(TableCheck(table.name, source_rows, target_rows, source_sum, target_sum))
+        return checks
@@ -0,0 +1,116 @@
+"""
+SQLite WAL 后台 checkpoint 管理器
+
+以前每次 commit 后都会新开一条 sqlite3 连接执行 wal_checkpoint(TRUNCATE)，
+每条群消息都要多出几次 fsync。现在改为：
+- 定时执行 PASSIVE checkpoint（不等待读者，不阻塞写入）
+- WAL 文件超过阈值时执行 RESTART checkpoint（让 WAL 从头复用，限制文件增长）
+- 仅在关闭时执行一次 TRUNCATE checkpoint（清空 WAL 文件）
+
+使用方式（由 main.py 在应用生命周期中启动/关闭）:
+    manager = CheckpointManager()
+    manager.start()
+    ...
+    await manager.stop()
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointManager:
+    """定时 / 按 WAL 大小触发 checkpoint 的后台任务"""
+
+    def __init__(self, db_path: Optional[str] = None, interval: Optional[int] = None,
+                 wal_threshold_mb: Optional[int] = None):
+        self.db_path = db_path or Config.DB_PATH
+        self.interval = interval if interval is not None else Config.DB_CHECKPOINT_INTERVAL
+        threshold_mb = wal_threshold_mb if wal_threshold_mb is not None else Config.DB_CHECKPOINT_WAL_MB
+        self.wal_threshold = threshold_mb * 1024 * 1024
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"passive": 0, "restart": 0, "truncate": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """仅对 SQLite 文件库生效（内存库和 PostgreSQL 不需要）"""
+        return Config.DB_TYPE == "sqlite" and self.db_path != ":memory:"
+
+    @property
+    def wal_path(self) -> str:
+        return f"{self.db_path}-wal"
+
+    def wal_size(self) -> int:
+        """当前 WAL 文件大小（字节）"""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # 专用连接：不与 ORM 的 StaticPool 连接共享，可以安全地在线程中使用
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        return self._conn
+
+    def checkpoint(self, mode: str = "PASSIVE") -> tuple:
+        """
+        同步执行一次 checkpoint
+        返回 (busy, wal_pages, checkpointed_pages)
+        """
+        result = self._connection().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        self.stats[mode.lower()] += 1
+        return tuple(result) if result else (0, 0, 0)
+
+    def run_once(self) -> str:
+        """根据 WAL 大小选择 checkpoint 模式并执行，返回使用的模式"""
+        mode = "RESTART" if self.wal_size() >= self.wal_threshold else "PASSIVE"
+        self.checkpoint(mode)
+        return mode
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"[Checkpoint] 执行失败: {e}")
+
+    def start(self):
+        """启动后台 checkpoint 任务（需在事件循环中调用）"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        logger.info(f"[Checkpoint] 已启动: 间隔 {self.interval}s, RESTART 阈值 {self.wal_threshold // 1024 // 1024}MB")
+
+    async def stop(self):
+        """停止后台任务，并执行一次 TRUNCATE checkpoint 清空 WAL"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self.checkpoint, "TRUNCATE")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[Checkpoint] 关闭时 TRUNCATE 失败: {e}")
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 进程级单例
+checkpoint_manager = CheckpointManager()
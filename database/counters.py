@@ -0,0 +1,406 @@
+"""
+高频计数器写回缓冲 (Write-Behind Counter Store)
+
+群里每条文本消息都会更新活跃度（daily/total_presence_points、last_active_time）
+和聊天任务进度（task_progress）。以前每条消息都要加载整行 UserBinding 并提交一次，
+现在改为：
+- 每个用户首次发言时加载一次"基线"（只查需要的几列）
+- 之后的增量全部累积在内存中，阈值判断（活跃等级 / 聊天任务）直接基于内存状态
+- 后台任务每隔 COUNTER_FLUSH_INTERVAL 秒用一次批量 UPDATE 写回，关闭时再写回一次
+
+写回使用 SQL 端增量（points = points + :d 之类），不会覆盖其它插件同时写入的数据；
+task_progress 增量会带上任务ID和日期，任务被刷新/跨天后旧增量自动作废；
+逗号串无法 SQL 端相加，用条件 UPDATE 合并（apply_task_progress_async），其它插件的任务进度也走这里。
+
+使用方式:
+    entry = await counter_store.get(tg_id)
+    if entry:
+        daily = entry.add_presence(gain, now, window_seconds)
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, date
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import select, update, case, bindparam, func, Boolean, Integer, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import Config
+from database.models import UserBinding
+from database.async_repository import get_async_session
+from database.user_sets import get_user_set_async, add_to_user_set_async
+from database.leaderboard import stage_scores
+
+logger = logging.getLogger(__name__)
+
+# 基线最长缓存时间，超时后重新从数据库加载（兜底外部脚本修改）
+BASELINE_TTL = 300
+# 未绑定用户的否定缓存时间，避免路人每条消息都查库
+NEGATIVE_TTL = 60
+# task_progress 条件写入被别人抢先时重新读取的次数上限
+TASK_MERGE_ATTEMPTS = 10
+
+_bindings = UserBinding.__table__
+
+
+class UserCounters:
+    """单个用户的内存计数状态 = 数据库基线 + 未写回增量"""
+
+    def __init__(self, tg_id: int):
+        self.tg_id = tg_id
+        self.loaded_at = 0.0
+        # --- 数据库基线 ---
+        self.is_vip = False
+        self.db_daily_presence = 0
+        self.db_last_active: Optional[datetime] = None
+        self.claimed_levels: Set[int] = set()
+        self.task_ids: List[str] = []
+        self.db_task_progress: List[int] = []
+        self.task_date: Optional[date] = None
+        # --- 未写回增量 ---
+        self.pending_presence = 0
+        self.pending_reset = False           # 超出活跃窗口，写回时今日活跃从 0 开始
+        self.last_active: Optional[datetime] = None
+        self.new_levels: Set[int] = set()
+        self.pending_tasks: Dict[Tuple[int, str], List[int]] = {}  # (下标, 任务ID) -> [增量, 上限]
+        self.pending_task_date: Optional[date] = None
+
+    def load(self, row, claimed_levels: Set[str]):
+        """从数据库行加载基线（保留尚未写回的增量）"""
+        self.is_vip = bool(row.is_vip)
+        self.db_daily_presence = row.daily_presence_points or 0
+        self.db_last_active = row.last_active_time
+        self.claimed_levels = {int(x) for x in claimed_levels if x.isdigit()}
+        self.claimed_levels |= self.new_levels
+        self.task_ids = (row.daily_tasks or "").split(",") if row.daily_tasks else []
+        self.db_task_progress = [int(x) if x.isdigit() else 0 for x in (row.task_progress or "0,0,0").split(",")]
+        self.task_date = row.task_date.date() if isinstance(row.task_date, datetime) else row.task_date
+        self.loaded_at = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending_presence or self.pending_reset or self.new_levels or self.pending_tasks)
+
+    # === 活跃度 ===
+
+    @property
+    def daily_presence(self) -> int:
+        """当前今日活跃点数（含未写回部分）"""
+        return (0 if self.pending_reset else self.db_daily_presence) + self.pending_presence
+
+    def add_presence(self, gain: int, now: datetime, window_seconds: int) -> int:
+        """
+        累加活跃度，超过活跃窗口未发言则今日累积清零
+        返回累加后的今日活跃点数
+        """
+        last = self.last_active or self.db_last_active
+        if last and (now - last).total_seconds() > window_seconds:
+            self.pending_reset = True
+            self.pending_presence = 0
+        self.pending_presence += gain
+        self.last_active = now
+        return self.daily_presence
+
+    def claim_presence_level(self, level: int):
+        """标记活跃等级已领取（随下次写回持久化）"""
+        self.claimed_levels.add(level)
+        self.new_levels.add(level)
+
+    # === 每日任务进度 ===
+
+    def task_progress(self, index: int) -> int:
+        """指定任务的当前进度（含未写回部分）"""
+        base = self.db_task_progress[index] if index < len(self.db_task_progress) else 0
+        tid = self.task_ids[index] if index < len(self.task_ids) else ""
+        pending = self.pending_tasks.get((index, tid))
+        if not pending:
+            return base
+        return min(base + pending[0], pending[1])
+
+    def add_task_progress(self, index: int, delta: int, target: int) -> Tuple[int, int]:
+        """累加任务进度（封顶 target），返回 (累加前, 累加后)"""
+        before = self.task_progress(index)
+        key = (index, self.task_ids[index])
+        pending = self.pending_tasks.setdefault(key, [0, target])
+        pending[0] += delta
+        self.pending_task_date = self.task_date
+        return before, self.task_progress(index)
+
+
+class CounterStore:
+    """进程内写回缓冲，按 tg_id 聚合高频计数"""
+
+    def __init__(self, flush_interval: Optional[int] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else Config.COUNTER_FLUSH_INTERVAL
+        self._entries: Dict[int, UserCounters] = {}
+        self._missing: Dict[int, float] = {}  # 未绑定用户 -> 记录时间
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"loads": 0, "flushes": 0, "rows_flushed": 0, "errors": 0}
+
+    # === 读取 ===
+
+    async def get(self, tg_id: int, max_age: Optional[float] = None) -> Optional[UserCounters]:
+        """
+        获取用户计数状态，必要时从数据库加载基线；用户不存在返回 None
+        max_age: 基线最长可接受的缓存时间（秒），默认 BASELINE_TTL
+        """
+        now = time.monotonic()
+        missing_at = self._missing.get(tg_id)
+        if missing_at is not None and now - missing_at < NEGATIVE_TTL:
+            return None
+
+        entry = self._entries.get(tg_id)
+        if entry is not None and now - entry.loaded_at < (BASELINE_TTL if max_age is None else max_age):
+            return entry
+
+        async with get_async_session() as session:
+            row = (await session.execute(
+                select(
+                    _bindings.c.is_vip,
+                    _bindings.c.daily_presence_points,
+                    _bindings.c.last_active_time,
+                    _bindings.c.daily_tasks,
+                    _bindings.c.task_progress,
+                    _bindings.c.task_date,
+                ).where(_bindings.c.tg_id == tg_id)
+            )).first()
+            claimed_levels = await get_user_set_async(tg_id, "presence_level", session) if row else set()
+        self.stats["loads"] += 1
+
+        if row is None:
+            self._missing[tg_id] = now
+            self._entries.pop(tg_id, None)
+            return None
+
+        self._missing.pop(tg_id, None)
+        # 加载期间可能有其它协程已经创建了条目
+        entry = self._entries.get(tg_id) or UserCounters(tg_id)
+        entry.load(row, claimed_levels)
+        self._entries[tg_id] = entry
+        return entry
+
+    def invalidate(self, tg_id: Optional[int] = None):
+        """
+        让基线失效，下次访问时重新加载（未写回的增量保留）
+        tg_id 为 None 时使全部失效
+        """
+        targets = self._entries.values() if tg_id is None else filter(None, [self._entries.get(tg_id)])
+        for entry in targets:
+            entry.loaded_at = 0.0
+        if tg_id is None:
+            self._missing.clear()
+        else:
+            self._missing.pop(tg_id, None)
+
+    def reset_daily(self):
+        """
+        日切后同步内存基线：今日活跃与已领取等级归零，每日任务置空（等待重新生成）
+        需在 flush 之后、数据库归零之后调用；之后新累积的增量照常保留
+        """
+        for entry in self._entries.values():
+            entry.db_daily_presence = 0
+            entry.claimed_levels = set(entry.new_levels)
+            entry.task_ids = []
+            entry.db_task_progress = []
+            entry.task_date = None
+            entry.pending_tasks = {}
+            entry.pending_task_date = None
+
+    # === 写回 ===
+
+    async def flush(self) -> int:
+        """把所有未写回增量批量写入数据库，返回写回的用户数"""
+        async with self._lock:
+            dirty = [e for e in self._entries.values() if e.dirty]
+            if not dirty:
+                return 0
+
+            # 先把增量从条目中摘出来，写回期间的新消息继续累积到条目上
+            snapshots = [self._take_snapshot(e) for e in dirty]
+            try:
+                await self._write(snapshots)
+            except Exception as e:
+                for entry, snap in zip(dirty, snapshots):
+                    self._restore_snapshot(entry, snap)
+                self.stats["errors"] += 1
+                logger.warning(f"[Counters] 写回失败，增量已保留: {e}")
+                raise
+
+            self.stats["flushes"] += 1
+            self.stats["rows_flushed"] += len(snapshots)
+            return len(snapshots)
+
+    @staticmethod
+    def _take_snapshot(entry: UserCounters) -> dict:
+        snap = {
+            "tg_id": entry.tg_id,
+            "presence": entry.pending_presence,
+            "reset": entry.pending_reset,
+            "daily": entry.daily_presence,
+            "last_active": entry.last_active,
+            "new_levels": set(entry.new_levels),
+            "tasks": entry.pending_tasks,
+            "task_date": entry.pending_task_date,
+            "prev_daily": entry.db_daily_presence,
+            "prev_last_active": entry.db_last_active,
+        }
+        # 乐观地把增量并入基线
+        entry.db_daily_presence = entry.daily_presence
+        if entry.last_active:
+            entry.db_last_active = entry.last_active
+        for (index, _), (delta, cap) in entry.pending_tasks.items():
+            while len(entry.db_task_progress) <= index:
+                entry.db_task_progress.append(0)
+            entry.db_task_progress[index] = min(entry.db_task_progress[index] + delta, cap)
+        entry.pending_presence = 0
+        entry.pending_reset = False
+        entry.new_levels = set()
+        entry.pending_tasks = {}
+        return snap
+
+    @staticmethod
+    def _restore_snapshot(entry: UserCounters, snap: dict):
+        if not entry.pending_reset:
+            # 写回期间没有发生新的窗口重置，旧增量仍然有效
+            entry.pending_presence += snap["presence"]
+            entry.pending_reset = snap["reset"]
+        entry.db_daily_presence = snap["prev_daily"]
+        entry.db_last_active = snap["prev_last_active"]
+        entry.new_levels |= snap["new_levels"]
+        for key, (delta, cap) in snap["tasks"].items():
+            pending = entry.pending_tasks.setdefault(key, [0, cap])
+            pending[0] += delta
+            index = key[0]
+            if index < len(entry.db_task_progress):
+                entry.db_task_progress[index] = max(0, entry.db_task_progress[index] - delta)
+        entry.pending_task_date = entry.pending_task_date or snap["task_date"]
+
+    async def _write(self, snapshots: List[dict]):
+        presence_rows = [s for s in snapshots if s["presence"] or s["reset"]]
+        level_rows = [s for s in snapshots if s["new_levels"]]
+        task_rows = [s for s in snapshots if s["tasks"]]
+
+        async with get_async_session() as session:
+            if presence_rows:
+                # 一条 UPDATE 语句，executemany 批量执行；全部是 SQL 端增量
+                stmt = (
+                    update(_bindings)
+                    .where(_bindings.c.tg_id == bindparam("b_tg_id"))
+                    .values(
+                        daily_presence_points=case(
+                            (bindparam("b_reset", type_=Boolean), bindparam("b_presence", type_=Integer)),
+                            else_=func.coalesce(_bindings.c.daily_presence_points, 0) + bindparam("b_presence", type_=Integer),
+                        ),
+                        total_presence_points=func.coalesce(_bindings.c.total_presence_points, 0)
+                        + bindparam("b_presence", type_=Integer),
+                        last_active_time=func.coalesce(
+                            bindparam("b_last_active", type_=DateTime), _bindings.c.last_active_time),
+                    )
+                )
+                await session.execute(stmt, [
+                    {
+                        "b_tg_id": s["tg_id"],
+                        "b_reset": s["reset"],
+                        "b_presence": s["presence"],
+                        "b_last_active": s["last_active"],
+                    }
+                    for s in presence_rows
+                ])
+                for s in presence_rows:
+                    stage_scores(session, s["tg_id"], daily_presence_points=s["daily"])
+
+            for s in level_rows:
+                await add_to_user_set_async(s["tg_id"], "presence_level", s["new_levels"], session)
+
+            for s in task_rows:
+                # task_progress 是逗号串，与 track_and_check_task 一样用条件 UPDATE 合并，互不覆盖
+                await apply_task_progress_async(s["tg_id"], s["tasks"], s["task_date"], session)
+
+    # === 生命周期 ===
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass  # flush 内部已记录日志并保留增量，下个周期重试
+
+    def start(self):
+        """启动后台写回任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        """停止后台任务并写回剩余增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def merge_task_progress(row, pending: dict, task_date: Optional[date]) -> Optional[str]:
+    """
+    把未写回的任务增量合并进数据库中的 task_progress
+    任务已被刷新（任务ID不一致）或已跨天的增量直接丢弃；无变化返回 None
+    """
+    row_date = row.task_date.date() if isinstance(row.task_date, datetime) else row.task_date
+    if row_date is None or row_date != task_date:
+        return None
+
+    task_ids = (row.daily_tasks or "").split(",")
+    progress = [int(x) if x.isdigit() else 0 for x in (row.task_progress or "0,0,0").split(",")]
+    changed = False
+    for (index, tid), (delta, cap) in pending.items():
+        if index >= len(task_ids) or task_ids[index] != tid:
+            continue
+        while len(progress) <= index:
+            progress.append(0)
+        new_val = min(progress[index] + delta, cap)
+        if new_val != progress[index]:
+            progress[index] = new_val
+            changed = True
+    return ",".join(str(x) for x in progress) if changed else None
+
+
+async def apply_task_progress_async(tg_id: int, pending: dict, task_date: Optional[date],
+                                    session: AsyncSession) -> Optional[Tuple[str, str]]:
+    """
+    把任务增量合并进数据库中的 task_progress，由调用方提交
+    条件 UPDATE：WHERE 任务与进度仍是本次读到的值，被别人改过则重新读取后再合并
+    返回 (合并前, 合并后)；任务已刷新 / 已跨天 / 无变化返回 None
+    """
+    for _ in range(TASK_MERGE_ATTEMPTS):
+        row = (await session.execute(
+            select(_bindings.c.tg_id, _bindings.c.daily_tasks,
+                   _bindings.c.task_progress, _bindings.c.task_date)
+            .where(_bindings.c.tg_id == tg_id)
+        )).first()
+        if row is None:
+            return None
+        merged = merge_task_progress(row, pending, task_date)
+        if merged is None:
+            return None
+        written = (await session.execute(
+            update(_bindings)
+            .where(
+                _bindings.c.tg_id == tg_id,
+                _bindings.c.daily_tasks.is_not_distinct_from(row.daily_tasks),
+                _bindings.c.task_progress.is_not_distinct_from(row.task_progress),
+            )
+            .values(task_progress=merged)
+            .returning(_bindings.c.tg_id)
+        )).first()
+        if written is not None:
+            return row.task_progress or "0,0,0", merged
+
+    logger.warning(f"[Counters] {tg_id} 任务进度争用，合并 {TASK_MERGE_ATTEMPTS} 次未成功")
+    return None
+
+
+# 进程级单例
+counter_store = CounterStore()
@@ -0,0 +1,108 @@
+"""
+日切 (Daily Rollover)
+以前每日计数各自在请求里比较日期、按行懒重置（转盘、宝箱限购、决斗、每日任务……），
+有的计数（塔罗、观影、活跃等级）甚至从未重置。现在统一由每天零点的日切任务完成：
+
+- 一条 UPDATE 把所有每日计数归零，并清空每日任务（下次打开任务面板时重新生成）
+- 一条 DELETE 清空活跃等级领取记录（user_claims 中 kind = presence_level）
+- 在 bot_state 中记录日切日期；同一天重复执行直接跳过，启动时补跑错过的日切
+- 进程内状态随之重置：计数写回缓冲的今日基线、今日活跃排行榜
+
+热路径因此不再需要逐行比较日期：计数 > 0 即代表"今天已经做过"。
+
+使用方式:
+    from database.daily_reset import run_daily_rollover
+
+    await run_daily_rollover()      # 今天已日切返回 None，否则返回被重置的用户数
+"""
+import logging
+from datetime import date
+from typing import Optional
+from sqlalchemy import update, delete, func, or_
+from database.models import UserBinding, UserClaim, BotState
+from database.async_repository import get_async_session, use_async_session
+from database.counters import counter_store
+from database.leaderboard import leaderboards
+
+logger = logging.getLogger(__name__)
+
+ROLLOVER_STATE_KEY = "daily_rollover_date"
+
+# 日切时归零的计数列
+DAILY_COUNTER_COLUMNS = (
+    "daily_chat_count",
+    "daily_duel_count",
+    "daily_forge_count",
+    "daily_tarot_count",
+    "daily_box_count",
+    "daily_gift_count",
+    "daily_presence_points",
+    "daily_watch_minutes",
+    "daily_box_buy_count",
+    "wheel_spins_today",
+)
+
+# 日切时清空的每日任务列（task_date 为空即视为今日任务未生成）
+DAILY_TASK_VALUES = {"daily_tasks": "", "task_progress": "0,0,0", "task_date": None}
+
+
+def _reset_statement():
+    """一条集合式 UPDATE：只改写确实有当日数据的行"""
+    counters = [getattr(UserBinding, c) for c in DAILY_COUNTER_COLUMNS]
+    return (
+        update(UserBinding)
+        .where(or_(
+            *(func.coalesce(c, 0) != 0 for c in counters),
+            UserBinding.task_date.isnot(None),
+        ))
+        .values(**{c: 0 for c in DAILY_COUNTER_COLUMNS}, **DAILY_TASK_VALUES)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_last_rollover(session=None) -> Optional[date]:
+    """最近一次日切的日期；从未执行过返回 None"""
+    async with use_async_session(session) as s:
+        state = await s.get(BotState, ROLLOVER_STATE_KEY)
+    return date.fromisoformat(state.value) if state and state.value else None
+
+
+async def reset_daily_counters(session=None) -> int:
+    """归零全部每日计数 / 清空每日任务与活跃等级领取记录，返回被重置的用户数"""
+    async with use_async_session(session) as s:
+        reset = (await s.execute(_reset_statement())).rowcount
+        await s.execute(
+            delete(UserClaim)
+            .where(UserClaim.kind == "presence_level")
+            .execution_options(synchronize_session=False)
+        )
+    return reset
+
+
+async def run_daily_rollover(today: Optional[date] = None, force: bool = False) -> Optional[int]:
+    """
+    执行日切（幂等）：今天已执行过且未指定 force 时返回 None
+    返回被重置的用户数
+    """
+    today = today or date.today()
+
+    # 先把内存中尚未写回的活跃度 / 任务进度落库，归零后不会被旧增量覆盖
+    await counter_store.flush()
+
+    async with get_async_session() as session:
+        last = await get_last_rollover(session)
+        if not force and last is not None and last >= today:
+            return None
+
+        reset = await reset_daily_counters(session)
+
+        state = await session.get(BotState, ROLLOVER_STATE_KEY)
+        if state is None:
+            session.add(BotState(key=ROLLOVER_STATE_KEY, value=today.isoformat()))
+        else:
+            state.value = today.isoformat()
+
+    counter_store.reset_daily()
+    leaderboards.reset_field("daily_presence_points")
+    logger.info(f"[Rollover] {today} 日切完成，重置 {reset} 位用户的每日数据")
+    return reset
@@ -0,0 +1,136 @@
+"""
+公会成员与战力 (Guild Membership & Power)
+成员关系只看 bindings.guild_id（已建索引 idx_guild_id），不再维护 Guild.members 逗号串。
+Guild.total_power 在成员战力变化、加入、退出时增量维护，排行榜直接按该列排序，无需重算。
+
+使用方式:
+    from database.guilds import set_attack, join_guild, leave_guild
+
+    # 锻造 / 突破 / 爬塔等所有修改战力的地方
+    set_attack(user, (user.attack or 0) + bonus, session)
+
+    join_guild(user, guild, session)
+    leave_guild(user, guild, session)
+
+需要全量校对时，calculate_guild_powers() 用一条 SUM(attack) GROUP BY guild_id 统计。
+"""
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, func, update, text
+from sqlalchemy.orm import Session
+from database.models import Guild, UserBinding
+from database.repository import use_session
+
+
+def _power_update(guild_id: int, power_delta: int, member_delta: int = 0):
+    """SQL 端增量更新公会战力 / 成员数"""
+    values = {"total_power": func.coalesce(Guild.total_power, 0) + power_delta}
+    if member_delta:
+        values["member_count"] = func.coalesce(Guild.member_count, 0) + member_delta
+    return (
+        update(Guild)
+        .where(Guild.id == guild_id)
+        .values(**values)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def set_attack(user: UserBinding, attack: int, session: Session) -> int:
+    """
+    修改用户战力，并把差值同步到所在公会的 total_power
+    返回战力变化量
+    """
+    delta = (attack or 0) - (user.attack or 0)
+    user.attack = attack
+    if delta and user.guild_id:
+        session.execute(_power_update(user.guild_id, delta))
+    return delta
+
+
+def join_guild(user: UserBinding, guild: Guild, session: Session) -> None:
+    """加入公会：设置 guild_id，成员数 +1，公会战力 + 用户战力"""
+    user.guild_id = guild.id
+    session.execute(_power_update(guild.id, user.attack or 0, member_delta=1))
+
+
+def leave_guild(user: UserBinding, guild: Guild, session: Session) -> None:
+    """退出公会：清空 guild_id，成员数 -1，公会战力 - 用户战力"""
+    user.guild_id = None
+    session.execute(_power_update(guild.id, -(user.attack or 0), member_delta=-1))
+
+
+def get_guild_members(guild_id: int, limit: Optional[int] = None,
+                      session: Optional[Session] = None) -> List[UserBinding]:
+    """公会成员（走 idx_guild_id），按战力从高到低"""
+    with use_session(session) as s:
+        q = (
+            s.query(UserBinding)
+            .filter(UserBinding.guild_id == guild_id)
+            .order_by(UserBinding.attack.desc())
+        )
+        if limit:
+            q = q.limit(limit)
+        return q.all()
+
+
+def calculate_guild_powers(guild_ids: Optional[Iterable[int]] = None,
+                           session: Optional[Session] = None) -> Dict[int, Dict[str, int]]:
+    """
+    一条 SUM(attack) / COUNT(*) GROUP BY guild_id 统计公会战力与成员数
+    返回 {guild_id: {"power": int, "members": int}}
+    """
+    stmt = (
+        select(UserBinding.guild_id,
+               func.coalesce(func.sum(UserBinding.attack), 0),
+               func.count())
+        .where(UserBinding.guild_id.isnot(None))
+        .group_by(UserBinding.guild_id)
+    )
+    if guild_ids is not None:
+        stmt = stmt.where(UserBinding.guild_id.in_(list(guild_ids)))
+    with use_session(session) as s:
+        return {gid: {"power": power, "members": members} for gid, power, members in s.execute(stmt)}
+
+
+def calculate_guild_power(guild_id: int, session: Optional[Session] = None) -> int:
+    """单个公会的实际总战力"""
+    return calculate_guild_powers([guild_id], session).get(guild_id, {"power": 0})["power"]
+
+
+def reconcile_guild_stats(session: Optional[Session] = None) -> int:
+    """按成员实际数据校对所有公会的 total_power / member_count，返回修正的公会数"""
+    with use_session(session) as s:
+        stats = calculate_guild_powers(session=s)
+        fixed = 0
+        for guild in s.query(Guild).all():
+            actual = stats.get(guild.id, {"power": 0, "members": 0})
+            if (guild.total_power or 0) != actual["power"] or (guild.member_count or 0) != actual["members"]:
+                guild.total_power = actual["power"]
+                guild.member_count = actual["members"]
+                fixed += 1
+        return fixed
+
+
+# ==========================================
+# 旧数据迁移
+# ==========================================
+
+def migrate_legacy_guild_members(conn) -> int:
+    """
+    把 Guild.members 逗号串中的成员写回 bindings.guild_id，然后清空该列
+    （会长创建公会时 guild_id 曾未写入，也一并修复）；可重复执行
+    返回写入 guild_id 的用户数
+    """
+    rows = conn.execute(
+        text("SELECT id, leader_id, members FROM guilds WHERE members IS NOT NULL AND members != ''")
+    ).all()
+    moved = 0
+    for guild_id, leader_id, members in rows:
+        member_ids = {int(uid) for uid in members.split(",") if uid.strip().isdigit()}
+        member_ids.add(leader_id)
+        for tg_id in member_ids:
+            moved += conn.execute(
+                text("UPDATE bindings SET guild_id = :gid WHERE tg_id = :tg_id AND guild_id IS NULL"),
+                {"gid": guild_id, "tg_id": tg_id},
+            ).rowcount
+        conn.execute(text("UPDATE guilds SET members = '' WHERE id = :gid"), {"gid": guild_id})
+    return moved
@@ -0,0 +1,433 @@
+"""
+内存排行榜 (In-Memory Leaderboards)
+以前每次查看排行榜都要把全部用户读出来再在 Python 中排序 / 线性查找自己的名次。
+现在进程内为每个排行字段维护一份有序结构，写入时增量更新：
+
+    rank_of(field, tg_id)      # 名次（1 开始），未上榜返回 None
+    top(field, k)              # 前 k 名 [(tg_id, 分数), ...]
+    around(field, tg_id, k)    # 自己前后各 k 名 [(名次, tg_id, 分数), ...]
+
+以上均为 O(log n)（around / top 另加输出长度）。
+
+上榜条件：已绑定 Emby 且分数 > 0；同分按 tg_id 升序。
+daily_presence_points 是"今日"榜，零点日切（database.daily_reset）归零数据库后随之清空。
+
+数据来源：
+- 启动时一次扫描（走 idx_emby_account）预热；首次查询时若尚未预热也会自动预热
+- ORM 写入：Session after_flush 记录变化，提交后生效，回滚则丢弃（同步 / 异步会话均覆盖）
+- SQL 端写入（账本金库划转、活跃度计数写回）：调用 stage_scores() 登记新值，同样随提交生效
+
+使用方式:
+    from database.leaderboard import leaderboards
+
+    rank = leaderboards.rank_of("attack", tg_id)
+    for tg_id, attack in leaderboards.top("attack", 10):
+        ...
+
+    # 需要展示名字时，只按 tg_id 加载上榜的几个人
+    rows = load_top_users("attack", 10)     # row.tg_id / row.emby_account / row.is_vip / row.attack
+"""
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from database.models import UserBinding
+from database.repository import use_session
+from database.async_repository import use_async_session
+
+# 支持的排行字段
+LEADERBOARD_FIELDS = (
+    "attack",
+    "bank_points",
+    "total_watch_minutes",
+    "daily_presence_points",
+    "consecutive_checkin",
+    "tower_max_floor",
+)
+
+_TRACKED = ("emby_account",) + LEADERBOARD_FIELDS
+
+
+class SortedKeys:
+    """
+    分块有序列表：若干个长度不超过 2 * LOAD 的有序小块 + 各块最大值 + 块长度树状数组
+    定位块与计算名次都是 O(log n)，插入 / 删除只移动一个小块内的元素
+    """
+
+    LOAD = 512
+
+    def __init__(self, keys: Iterable = ()):
+        self._lists: List[list] = []
+        self._maxes: list = []
+        self._tree: Optional[List[int]] = None  # 块长度的树状数组，块结构变化时置空重建
+        self._len = 0
+        self.reset(keys)
+
+    def reset(self, keys: Iterable = ()):
+        values = sorted(keys)
+        self._lists = [values[i:i + self.LOAD] for i in range(0, len(values), self.LOAD)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._tree = None
+        self._len = len(values)
+
+    def __len__(self):
+        return self._len
+
+    # === 树状数组 ===
+
+    def _build_tree(self) -> List[int]:
+        tree = [0] + [len(sub) for sub in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+        return tree
+
+    def _tree_add(self, pos: int, delta: int):
+        tree = self._tree
+        if tree is None:
+            return
+        i = pos + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, pos: int) -> int:
+        """前 pos 个块的元素总数"""
+        tree = self._tree or self._build_tree()
+        total = 0
+        while pos > 0:
+            total += tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """全局下标 -> (块号, 块内下标)"""
+        tree = self._tree or self._build_tree()
+        pos = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                index -= tree[nxt]
+                pos = nxt
+            step >>= 1
+        return pos, index
+
+    # === 增删查 ===
+
+    def add(self, key):
+        if not self._maxes:
+            self._lists = [[key]]
+            self._maxes = [key]
+            self._tree = None
+            self._len = 1
+            return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._lists[pos], key)
+        self._len += 1
+        sub = self._lists[pos]
+        if len(sub) > 2 * self.LOAD:
+            self._lists[pos:pos + 1] = [sub[:self.LOAD], sub[self.LOAD:]]
+            self._maxes[pos:pos + 1] = [sub[self.LOAD - 1], sub[-1]]
+            self._tree = None
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, key):
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            raise KeyError(key)
+        sub = self._lists[pos]
+        i = bisect_left(sub, key)
+        if i == len(sub) or sub[i] != key:
+            raise KeyError(key)
+        del sub[i]
+        self._len -= 1
+        if sub:
+            self._maxes[pos] = sub[-1]
+            self._tree_add(pos, -1)
+        else:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._tree = None
+
+    def index(self, key) -> int:
+        """key 的全局下标（key 必须存在）"""
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            raise KeyError(key)
+        i = bisect_left(self._lists[pos], key)
+        if self._lists[pos][i] != key:
+            raise KeyError(key)
+        return self._prefix(pos) + i
+
+    def slice(self, start: int, stop: int) -> list:
+        """下标 [start, stop) 的元素"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        pos, i = self._locate(start)
+        result = []
+        need = stop - start
+        while need > 0:
+            chunk = self._lists[pos][i:i + need]
+            result.extend(chunk)
+            need -= len(chunk)
+            pos, i = pos + 1, 0
+        return result
+
+
+class Leaderboard:
+    """单个字段的排行榜：tg_id -> 分数 + 按 (-分数, tg_id) 排序的键"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._scores: Dict[int, int] = {}
+        self._keys = SortedKeys()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, tg_id: int):
+        return tg_id in self._scores
+
+    def load(self, scores: Dict[int, int]):
+        self._scores = {tg_id: score for tg_id, score in scores.items() if score and score > 0}
+        self._keys.reset(zip([-score for score in self._scores.values()], self._scores))
+
+    def clear(self):
+        self.load({})
+
+    def update(self, tg_id: int, score: Optional[int]):
+        """设置分数；分数 <= 0 时下榜"""
+        old = self._scores.get(tg_id)
+        if old == score:
+            return
+        if old is not None:
+            self._keys.remove((-old, tg_id))
+            del self._scores[tg_id]
+        if score and score > 0:
+            self._scores[tg_id] = score
+            self._keys.add((-score, tg_id))
+
+    def remove(self, tg_id: int):
+        self.update(tg_id, None)
+
+    def score_of(self, tg_id: int) -> Optional[int]:
+        return self._scores.get(tg_id)
+
+    def rank_of(self, tg_id: int) -> Optional[int]:
+        score = self._scores.get(tg_id)
+        if score is None:
+            return None
+        return self._keys.index((-score, tg_id)) + 1
+
+    def top(self, k: int, offset: int = 0) -> List[Tuple[int, int]]:
+        return [(tg_id, -neg) for neg, tg_id in self._keys.slice(offset, offset + k)]
+
+    def around(self, tg_id: int, k: int) -> List[Tuple[int, int, int]]:
+        rank = self.rank_of(tg_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - k, 0)
+        return [(start + i + 1, uid, -neg)
+                for i, (neg, uid) in enumerate(self._keys.slice(start, rank + k))]
+
+
+class LeaderboardService:
+    """全部排行字段的排行榜 + 已绑定用户集合；读写都加锁（同步会话可能在线程池中提交）"""
+
+    def __init__(self, fields: Tuple[str, ...] = LEADERBOARD_FIELDS):
+        self.boards: Dict[str, Leaderboard] = {f: Leaderboard(f) for f in fields}
+        self._bound: set = set()
+        self._warmed = False
+        self._lock = threading.RLock()
+
+    # === 预热 ===
+
+    def _warm_statement(self):
+        columns = [UserBinding.tg_id] + [getattr(UserBinding, f) for f in self.boards]
+        return select(*columns).where(UserBinding.emby_account.isnot(None), UserBinding.emby_account != "")
+
+    def warm(self, session: Optional[Session] = None) -> int:
+        """一次扫描全部已绑定用户，重建所有排行榜；返回已绑定用户数"""
+        with use_session(session) as s:
+            rows = s.execute(self._warm_statement()).all()
+        return self._load(rows)
+
+    async def warm_async(self, session=None) -> int:
+        async with use_async_session(session) as s:
+            rows = (await s.execute(self._warm_statement())).all()
+        return self._load(rows)
+
+    def _load(self, rows) -> int:
+        # 按列转置后整列构建，避免逐行逐字段 getattr
+        columns = list(zip(*rows)) or [()] * (len(self.boards) + 1)
+        ids = columns[0]
+        scores = {f: dict(zip(ids, values)) for f, values in zip(self.boards, columns[1:])}
+        bound = set(ids)
+
+        with self._lock:
+            self._bound = bound
+            for f, board in self.boards.items():
+                board.load(scores[f])
+            self._warmed = True
+        return len(bound)
+
+    def reset(self):
+        """丢弃全部数据，下次查询时重新预热（测试 / 外部脚本批量修改后使用）"""
+        with self._lock:
+            self._bound = set()
+            for board in self.boards.values():
+                board.clear()
+            self._warmed = False
+
+    def reset_field(self, field: str):
+        """清空某个榜（每日字段被日切批量归零后调用）"""
+        with self._lock:
+            self.boards[field].clear()
+
+    def _ready(self) -> None:
+        if not self._warmed:
+            self.warm()
+
+    # === 写入 ===
+
+    def apply(self, changes: Dict[int, dict]):
+        """
+        应用一批已提交的变化 {tg_id: {字段: 新值}}
+        emby_account 为空或 _deleted 时从所有榜中移除；未加载（不在 dict 中）的字段保持不变
+        """
+        with self._lock:
+            if not self._warmed:
+                # 尚未预热时不用维护，预热会读到已提交的最新数据
+                return
+            self._ready()
+            for tg_id, values in changes.items():
+                if values.get("_deleted") or ("emby_account" in values and not values["emby_account"]):
+                    self._bound.discard(tg_id)
+                    for board in self.boards.values():
+                        board.remove(tg_id)
+                    continue
+                if values.get("emby_account"):
+                    self._bound.add(tg_id)
+                if tg_id not in self._bound:
+                    continue
+                for f, board in self.boards.items():
+                    if f in values:
+                        board.update(tg_id, values[f])
+
+    # === 查询 ===
+
+    def rank_of(self, field: str, tg_id: int) -> Optional[int]:
+        with self._lock:
+            self._ready()
+            return self.boards[field].rank_of(tg_id)
+
+    def score_of(self, field: str, tg_id: int) -> Optional[int]:
+        with self._lock:
+            self._ready()
+            return self.boards[field].score_of(tg_id)
+
+    def top(self, field: str, k: int, offset: int = 0) -> List[Tuple[int, int]]:
+        with self._lock:
+            self._ready()
+            return self.boards[field].top(k, offset)
+
+    def around(self, field: str, tg_id: int, k: int) -> List[Tuple[int, int, int]]:
+        with self._lock:
+            self._ready()
+            return self.boards[field].around(tg_id, k)
+
+    def size(self, field: str) -> int:
+        with self._lock:
+            self._ready()
+            return len(self.boards[field])
+
+
+leaderboards = LeaderboardService()
+
+
+def load_ranked_users(field: str, tg_ids: List[int], session: Optional[Session] = None) -> list:
+    """
+    按给定顺序加载上榜用户的展示字段：tg_id, emby_account, is_vip 以及排行字段本身
+    只按主键查这几个人，不扫全表
+    """
+    if not tg_ids:
+        return []
+    stmt = (
+        select(UserBinding.tg_id, UserBinding.emby_account, UserBinding.is_vip, getattr(UserBinding, field))
+        .where(UserBinding.tg_id.in_(tg_ids))
+    )
+    with use_session(session) as s:
+        by_id = {row.tg_id: row for row in s.execute(stmt)}
+    return [by_id[tg_id] for tg_id in tg_ids if tg_id in by_id]
+
+
+def load_top_users(field: str, k: int, session: Optional[Session] = None) -> list:
+    """排行榜前 k 名的展示数据（按名次排序）"""
+    return load_ranked_users(field, [tg_id for tg_id, _ in leaderboards.top(field, k)], session)
+
+
+def stage_scores(session, tg_id: int, **values):
+    """
+    登记绕过 ORM 的写入（SQL 端增量）产生的新分数，随会话提交生效
+    session 可以是同步或异步会话
+    """
+    pending = session.info.setdefault("leaderboard_pending", {})
+    pending.setdefault(tg_id, {}).update(values)
+
+
+# ==========================================
+# ORM 写入自动同步
+# ==========================================
+
+def _loaded_values(obj: UserBinding, changed_only: bool) -> dict:
+    """取出已加载的排行相关字段（未加载的延迟列不触发查询）"""
+    state = inspect(obj)
+    values = {}
+    for f in _TRACKED:
+        if f not in state.dict:
+            continue
+        if changed_only and not state.attrs[f].history.has_changes():
+            continue
+        values[f] = state.dict[f]
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _stage_on_flush(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, UserBinding):
+            stage_scores(session, obj.tg_id, **_loaded_values(obj, changed_only=False))
+    for obj in session.dirty:
+        if isinstance(obj, UserBinding):
+            values = _loaded_values(obj, changed_only=True)
+            if values.get("emby_account"):
+                # 新绑定：已有的分数也要上榜
+                values = _loaded_values(obj, changed_only=False)
+            if values:
+                stage_scores(session, obj.tg_id, **values)
+    for obj in session.deleted:
+        if isinstance(obj, UserBinding):
+            stage_scores(session, obj.tg_id, _deleted=True)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    pending = session.info.pop("leaderboard_pending", None)
+    if pending:
+        leaderboards.apply(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("leaderboard_pending", None)
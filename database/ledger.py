@@ -0,0 +1,260 @@
+"""
+MP 账本 (Ledger)
+所有余额变动统一走这里，每次变动都是一条 SQL 端原子更新：
+
+    UPDATE bindings SET points = points + :d WHERE tg_id = :id [AND points >= :n] RETURNING points
+
+不再"加载整行 → user.points += x → 提交"，既省掉整行 SELECT，也不会在并发下丢失更新。
+
+使用方式:
+    from database.ledger import credit, debit_if_sufficient, transfer
+
+    balance = credit(tg_id, 100, "签到奖励")              # 返回新余额，用户不存在返回 None
+    credited = credit_many({tg_id: 6, other_id: 9}, "观影奖励")  # 批量发放，一条 executemany
+    balance = debit_if_sufficient(tg_id, 50, "商店购买")   # 余额不足返回 None
+    result = transfer(from_id, to_id, 100, fee=5)         # 返回 (转出方余额, 接收方余额)
+
+    # 与其它修改放在同一事务中：传入当前 session（不会提交）
+    with get_session() as session:
+        user = session.query(UserBinding).filter_by(tg_id=tg_id).first()
+        user.daily_watch_minutes += 30
+        credit(tg_id, 6, "观影奖励", session=session)
+        session.commit()
+
+传入 session 时，会话里已加载的 UserBinding 对象会同步到新余额，之后读取 user.points 是准确的。
+"""
+import logging
+from typing import Dict, Optional, Tuple
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import UserBinding
+from database.repository import use_session
+from database.async_repository import use_async_session
+from database.leaderboard import stage_scores
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# 语句构造
+# ==========================================
+
+def _points_update(tg_id: int, delta: int, minimum: Optional[int] = None):
+    """points = points + delta；minimum 不为空时要求当前余额 >= minimum"""
+    conditions = [UserBinding.tg_id == tg_id]
+    if minimum is not None:
+        conditions.append(UserBinding.points >= minimum)
+    return (
+        update(UserBinding)
+        .where(*conditions)
+        .values(points=UserBinding.points + delta)
+        .returning(UserBinding.points)
+        # 用 RETURNING 的主键同步会话中已加载的对象，避免后续 ORM 提交用旧余额覆盖
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def _points_batch_update():
+    """按 tg_id 批量加余额（executemany 参数：b_tg_id, b_amount）"""
+    table = UserBinding.__table__
+    return (
+        update(table)
+        .where(table.c.tg_id == bindparam("b_tg_id"))
+        .values(points=table.c.points + bindparam("b_amount"))
+    )
+
+
+def _bank_update(tg_id: int, to_bank: int, to_wallet: int, minimum_points: int = 0, minimum_bank: int = 0):
+    """钱包与金库之间划转：points += to_wallet, bank_points += to_bank，要求两边余额足够"""
+    return (
+        update(UserBinding)
+        .where(
+            UserBinding.tg_id == tg_id,
+            UserBinding.points >= minimum_points,
+            UserBinding.bank_points >= minimum_bank,
+        )
+        .values(points=UserBinding.points + to_wallet, bank_points=UserBinding.bank_points + to_bank)
+        .returning(UserBinding.points, UserBinding.bank_points)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def _check_amount(amount: int):
+    if amount < 0:
+        raise ValueError(f"金额不能为负数: {amount}")
+
+
+def _log(tg_id: int, delta: int, reason: str, balance: Optional[int]):
+    if balance is None:
+        logger.debug(f"[Ledger] {tg_id} {delta:+d} 未执行 ({reason})")
+    else:
+        logger.debug(f"[Ledger] {tg_id} {delta:+d} -> {balance} ({reason})")
+
+
+def _transfer_steps(from_id: int, to_id: int, amount: int, fee: int):
+    """
+    转账的两步更新，按 tg_id 从小到大加行锁，避免 A→B 与 B→A 同时发生时死锁
+    返回 [(标识, 语句, 回滚语句), ...]
+    """
+    debit = ("from", _points_update(from_id, -amount, minimum=amount), _points_update(from_id, amount))
+    credit_ = ("to", _points_update(to_id, amount - fee), _points_update(to_id, fee - amount))
+    return [debit, credit_] if from_id < to_id else [credit_, debit]
+
+
+def _check_transfer(from_id: int, to_id: int, amount: int, fee: int):
+    _check_amount(amount)
+    if not 0 <= fee <= amount:
+        raise ValueError(f"手续费必须在 0 与转账金额之间: {fee}")
+    if from_id == to_id:
+        raise ValueError("不能转账给自己")
+
+
+# ==========================================
+# 同步接口
+# ==========================================
+
+def get_balance(tg_id: int, session: Optional[Session] = None) -> Optional[int]:
+    """只查询余额一列；用户不存在返回 None"""
+    with use_session(session) as s:
+        return s.execute(select(UserBinding.points).where(UserBinding.tg_id == tg_id)).scalar()
+
+
+def credit(tg_id: int, amount: int, reason: str = "", session: Optional[Session] = None) -> Optional[int]:
+    """增加余额，返回新余额；用户不存在返回 None"""
+    _check_amount(amount)
+    with use_session(session) as s:
+        balance = s.execute(_points_update(tg_id, amount)).scalar()
+    _log(tg_id, amount, reason, balance)
+    return balance
+
+
+def credit_many(amounts: Dict[int, int], reason: str = "", session: Optional[Session] = None) -> int:
+    """
+    批量增加余额（定时结算等一次给大量用户发放），返回实际到账的用户数
+    与逐个 credit 相同的 SQL 端增量，但只 flush 一次、一条 executemany 写完；不返回各自余额，
+    会话中已加载对象的 points 会被标记过期，下次访问时重新读取
+    """
+    amounts = {tg_id: amount for tg_id, amount in amounts.items() if amount}
+    for amount in amounts.values():
+        _check_amount(amount)
+    if not amounts:
+        return 0
+    with use_session(session) as s:
+        result = s.connection().execute(
+            _points_batch_update(),
+            [{"b_tg_id": tg_id, "b_amount": amount} for tg_id, amount in amounts.items()],
+        )
+        for obj in list(s.identity_map.values()):
+            if isinstance(obj, UserBinding) and obj.tg_id in amounts:
+                s.expire(obj, ["points"])
+    credited = result.rowcount if result.rowcount >= 0 else len(amounts)
+    logger.debug(f"[Ledger] 批量 +{sum(amounts.values())} -> {credited} 人 ({reason})")
+    return credited
+
+
+def debit_if_sufficient(tg_id: int, amount: int, reason: str = "",
+                        session: Optional[Session] = None) -> Optional[int]:
+    """余额足够时扣除，返回新余额；余额不足或用户不存在返回 None（不做任何修改）"""
+    _check_amount(amount)
+    with use_session(session) as s:
+        balance = s.execute(_points_update(tg_id, -amount, minimum=amount)).scalar()
+    _log(tg_id, -amount, reason, balance)
+    return balance
+
+
+def transfer(from_id: int, to_id: int, amount: int, fee: int = 0, reason: str = "",
+             session: Optional[Session] = None) -> Optional[Tuple[int, int]]:
+    """
+    转账：转出方扣 amount，接收方到账 amount - fee
+    返回 (转出方余额, 接收方余额)；余额不足或任一方不存在返回 None（不做任何修改）
+    """
+    _check_transfer(from_id, to_id, amount, fee)
+    with use_session(session) as s:
+        balances = {}
+        done = []
+        for side, stmt, undo in _transfer_steps(from_id, to_id, amount, fee):
+            balance = s.execute(stmt).scalar()
+            if balance is None:
+                # 同一事务内补偿已执行的步骤
+                for undo_stmt in done:
+                    s.execute(undo_stmt)
+                _log(from_id, -amount, f"转账给 {to_id} 失败 {reason}", None)
+                return None
+            balances[side] = balance
+            done.append(undo)
+    _log(from_id, -amount, f"转账给 {to_id} {reason}", balances["from"])
+    return balances["from"], balances["to"]
+
+
+def bank_deposit(tg_id: int, amount: int, session: Optional[Session] = None) -> Optional[Tuple[int, int]]:
+    """钱包存入金库，返回 (钱包余额, 金库余额)；钱包余额不足返回 None"""
+    _check_amount(amount)
+    with use_session(session) as s:
+        row = s.execute(_bank_update(tg_id, to_bank=amount, to_wallet=-amount, minimum_points=amount)).first()
+        if row:
+            stage_scores(s, tg_id, bank_points=row[1])
+    _log(tg_id, -amount, "存入金库", row[0] if row else None)
+    return tuple(row) if row else None
+
+
+def bank_withdraw(tg_id: int, amount: int, fee: int = 0, bonus: int = 0,
+                  session: Optional[Session] = None) -> Optional[Tuple[int, int]]:
+    """
+    从金库取出 amount，钱包到账 amount - fee + bonus（bonus 为结算的利息）
+    返回 (钱包余额, 金库余额)；金库余额不足返回 None
+    """
+    _check_amount(amount)
+    with use_session(session) as s:
+        row = s.execute(_bank_update(tg_id, to_bank=-amount, to_wallet=amount - fee + bonus,
+                                     minimum_bank=amount)).first()
+        if row:
+            stage_scores(s, tg_id, bank_points=row[1])
+    _log(tg_id, amount - fee + bonus, "金库取出", row[0] if row else None)
+    return tuple(row) if row else None
+
+
+# ==========================================
+# 异步接口（供 async 回调使用）
+# ==========================================
+
+async def get_balance_async(tg_id: int, session: Optional[AsyncSession] = None) -> Optional[int]:
+    async with use_async_session(session) as s:
+        return (await s.execute(select(UserBinding.points).where(UserBinding.tg_id == tg_id))).scalar()
+
+
+async def credit_async(tg_id: int, amount: int, reason: str = "",
+                       session: Optional[AsyncSession] = None) -> Optional[int]:
+    _check_amount(amount)
+    async with use_async_session(session) as s:
+        balance = (await s.execute(_points_update(tg_id, amount))).scalar()
+    _log(tg_id, amount, reason, balance)
+    return balance
+
+
+async def debit_if_sufficient_async(tg_id: int, amount: int, reason: str = "",
+                                    session: Optional[AsyncSession] = None) -> Optional[int]:
+    _check_amount(amount)
+    async with use_async_session(session) as s:
+        balance = (await s.execute(_points_update(tg_id, -amount, minimum=amount))).scalar()
+    _log(tg_id, -amount, reason, balance)
+    return balance
+
+
+async def transfer_async(from_id: int, to_id: int, amount: int, fee: int = 0, reason: str = "",
+                         session: Optional[AsyncSession] = None) -> Optional[Tuple[int, int]]:
+    _check_transfer(from_id, to_id, amount, fee)
+    async with use_async_session(session) as s:
+        balances = {}
+        done = []
+        for side, stmt, undo in _transfer_steps(from_id, to_id, amount, fee):
+            balance = (await s.execute(stmt)).scalar()
+            if balance is None:
+                for undo_stmt in done:
+                    await s.execute(undo_stmt)
+                _log(from_id, -amount, f"转账给 {to_id} 失败 {reason}", None)
+                return None
+            balances[side] = balance
+            done.append(undo)
+    _log(from_id, -amount, f"转账给 {to_id} {reason}", balances["from"])
+    return balances["from"], balances["to"]
@@ -0,0 +1,254 @@
+"""
+数据库版本化迁移 (Schema Migrations)
+以前每次 import database 都会 inspect 整个库、逐表检查缺失字段并 create_all，
+脚本和测试也要付出这笔开销；新增字段还得另写一次性脚本。现在改为：
+
+- schema_version 表记录已执行的迁移（每个迁移一行）
+- database/migrations/ 下按编号排序的迁移文件：NNNN_说明.py，提供 upgrade(conn)
+- 启动检查只读一行：SELECT MAX(version) FROM schema_version
+- 显式执行迁移：python -m database.migrate [status|upgrade|stamp]
+
+全新的空库直接按当前模型建表并标记为最新版本；没有 schema_version 表的旧库从 0 开始逐个执行，
+因此迁移必须可重复执行（加字段 / 建索引前先检查是否存在，见下方辅助函数）。
+
+在线迁移约定（bindings 有近百列、数据量大）：
+- 加字段只用 add_missing_columns()：允许为空 + 常量默认值，SQLite / PostgreSQL 都只改元数据，不重写整表
+- 回填数据按主键分批执行，避免长事务锁表
+- PostgreSQL 上建索引使用 CONCURRENTLY，迁移模块需声明 TRANSACTIONAL = False
+
+使用方式:
+    python -m database.migrate            # 执行全部待执行迁移
+    python -m database.migrate status     # 查看当前版本与待执行迁移
+
+    # Bot 启动时
+    from database.migrate import ensure_schema
+    ensure_schema()
+"""
+import importlib
+import logging
+import pkgutil
+import sys
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, inspect, select, func, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from config import Config
+from database.models import Base
+from database.repository import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_PACKAGE = "database.migrations"
+
+# 版本表不属于业务模型，单独的 MetaData，不参与 create_all / drop_all
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.now),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    module: object
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+
+class SchemaOutdatedError(RuntimeError):
+    """数据库版本落后于代码，且未开启自动迁移"""
+
+
+def discover_migrations() -> List[Migration]:
+    """按编号排序的全部迁移"""
+    package = importlib.import_module(MIGRATIONS_PACKAGE)
+    migrations = []
+    for info in pkgutil.iter_modules(package.__path__):
+        prefix, _, _ = info.name.partition("_")
+        if not prefix.isdigit():
+            continue
+        module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{info.name}")
+        migrations.append(Migration(int(prefix), info.name, module))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"迁移编号重复: {versions}")
+    return migrations
+
+
+def head_version() -> int:
+    migrations = discover_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(engine: Engine) -> Optional[int]:
+    """
+    当前数据库版本：只读 schema_version 的一行
+    没有 schema_version 表时返回 None（全新库或迁移系统之前的旧库）
+    """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+
+# ==========================================
+# 迁移辅助函数（供 migrations/*.py 使用）
+# ==========================================
+
+def add_missing_columns(conn, table: Table) -> List[str]:
+    """
+    按迁移声明的表结构补齐表中缺失的列，返回新增的列名
+    新列一律允许为空，Python 端标量默认值转为常量 DEFAULT（只改元数据，不重写整表）
+    """
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+        default = column.default.arg if column.default is not None and column.default.is_scalar else None
+        if isinstance(default, bool):
+            ddl += f" DEFAULT {'TRUE' if default else 'FALSE'}"
+        elif isinstance(default, (int, float)):
+            ddl += f" DEFAULT {default}"
+        elif isinstance(default, str):
+            ddl += " DEFAULT '{}'".format(default.replace("'", "''"))
+        conn.execute(text(ddl))
+        added.append(column.name)
+    return added
+
+
+def create_missing_indexes(conn, table: Table) -> List[str]:
+    """创建表结构中声明但库里缺失的索引；PostgreSQL 上使用 CONCURRENTLY（需非事务迁移）"""
+    existing = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+    created = []
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        autocommit = conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+        if conn.dialect.name == "postgresql" and autocommit:
+            index.dialect_options["postgresql"]["concurrently"] = True
+        index.create(conn)
+        created.append(index.name)
+    return created
+
+
+def table_exists(conn, name: str) -> bool:
+    return inspect(conn).has_table(name)
+
+
+# ==========================================
+# 执行迁移
+# ==========================================
+
+def _record(conn, migration: Migration):
+    conn.execute(insert(schema_version).values(
+        version=migration.version, name=migration.name, applied_at=datetime.now()
+    ))
+
+
+def stamp(engine: Engine, version: Optional[int] = None) -> int:
+    """不执行迁移，直接把数据库标记为指定版本（默认最新）"""
+    migrations = discover_migrations()
+    version = version if version is not None else (migrations[-1].version if migrations else 0)
+    schema_version.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        done = set(conn.execute(select(schema_version.c.version)).scalars())
+        for migration in migrations:
+            if migration.version <= version and migration.version not in done:
+                _record(conn, migration)
+    return version
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[str]:
+    """
+    执行全部待执行迁移（或到 target 版本为止），返回已执行的迁移名
+    每个迁移在独立事务中执行并记录版本，中途失败时已完成的迁移不会回滚
+    """
+    migrations = discover_migrations()
+    version = current_version(engine)
+
+    if version is None:
+        with engine.connect() as conn:
+            fresh = not table_exists(conn, "bindings")
+        if fresh:
+            # 全新空库：按当前模型建表，直接标记为最新版本
+            Base.metadata.create_all(engine)
+            stamp(engine, target)
+            logger.info("[Migration] 新建数据库并标记为最新版本")
+            return []
+        # 迁移系统之前的旧库：从头执行（迁移均可重复执行）
+        schema_version.create(engine, checkfirst=True)
+        version = 0
+
+    applied = []
+    for migration in migrations:
+        if migration.version <= version or (target is not None and migration.version > target):
+            continue
+        start = time.perf_counter()
+        if migration.transactional:
+            with engine.begin() as conn:
+                migration.module.upgrade(conn)
+                _record(conn, migration)
+        else:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                migration.module.upgrade(conn)
+                _record(conn, migration)
+        applied.append(migration.name)
+        logger.info(f"[Migration] {migration.name} 完成（{time.perf_counter() - start:.2f}s）")
+    return applied
+
+
+def ensure_schema(engine: Optional[Engine] = None, auto_migrate: Optional[bool] = None) -> int:
+    """
+    启动检查：版本一致时只读一行就返回
+    版本落后时按 DB_AUTO_MIGRATE 自动升级，或抛出 SchemaOutdatedError
+    """
+    engine = engine or default_engine
+    auto_migrate = Config.DB_AUTO_MIGRATE if auto_migrate is None else auto_migrate
+    head = head_version()
+    version = current_version(engine)
+    if version is not None and version >= head:
+        return version
+    if not auto_migrate:
+        raise SchemaOutdatedError(
+            f"数据库版本 {version or 0} 落后于代码版本 {head}，请先执行: python -m database.migrate"
+        )
+    for name in upgrade(engine):
+        print(f"[Migration] 已执行: {name}")
+    return head
+
+
+def main(argv: List[str]) -> int:
+    engine = default_engine
+    command = argv[0] if argv else "upgrade"
+    if command == "status":
+        version = current_version(engine)
+        print(f"当前版本: {'未初始化' if version is None else version}")
+        for migration in discover_migrations():
+            mark = "✅" if version is not None and migration.version <= version else "⏳"
+            print(f"  {mark} {migration.name}")
+    elif command == "upgrade":
+        target = int(argv[1]) if len(argv) > 1 else None
+        applied = upgrade(engine, target)
+        print(f"已执行 {len(applied)} 个迁移，当前版本: {current_version(engine)}")
+    elif command == "stamp":
+        version = stamp(engine, int(argv[1]) if len(argv) > 1 else None)
+        print(f"已标记为版本 {version}")
+    else:
+        print("用法: python -m database.migrate [status|upgrade [版本]|stamp [版本]]")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(main(sys.argv[1:]))
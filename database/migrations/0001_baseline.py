@@ -0,0 +1,220 @@
+"""
+基线：补齐迁移系统之前的旧库
+- 创建缺失的表（红包、集合表、bot_state 等）
+- 补齐 bindings 等表缺失的列（取代 last_chest_open 内置检查与 scripts/add_emby_fields.py）
+- 补建声明的索引
+
+下面是引入迁移系统时的表结构快照，不引用 database.models：模型以后增删列不改变本迁移的结果
+"""
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, Text
+)
+from database.migrate import add_missing_columns, create_missing_indexes
+
+metadata = MetaData()
+
+bindings = Table(
+    'bindings', metadata,
+    Column('tg_id', BigInteger, primary_key=True),
+    Column('emby_account', String),
+    Column('is_vip', Boolean, default=False),
+    Column('win', Integer, default=0),
+    Column('lost', Integer, default=0),
+    Column('points', Integer, default=0),
+    Column('bank_points', Integer, default=0),
+    Column('last_interest_claimed', DateTime),
+    Column('accumulated_interest', Integer, default=0),
+    Column('weapon', String),
+    Column('attack', Integer, default=0),
+    Column('intimacy', Integer, default=0),
+    Column('resonance_count', Integer, default=0),
+    Column('last_checkin', DateTime),
+    Column('last_tarot', DateTime),
+    Column('last_duel_date', DateTime),
+    Column('daily_chat_count', Integer, default=0),
+    Column('daily_duel_count', Integer, default=0),
+    Column('daily_forge_count', Integer, default=0),
+    Column('daily_tarot_count', Integer, default=0),
+    Column('daily_box_count', Integer, default=0),
+    Column('daily_gift_count', Integer, default=0),
+    Column('last_chat_time', DateTime),
+    Column('chat_combo', Integer, default=0),
+    Column('items', Text, default=''),
+    Column('lucky_boost', Boolean, default=False),
+    Column('shield_active', Boolean, default=False),
+    Column('extra_tarot', Integer, default=0),
+    Column('extra_gacha', Integer, default=0),
+    Column('free_forges', Integer, default=0),
+    Column('free_forges_big', Integer, default=0),
+    Column('gacha_pity_counter', Integer, default=0),
+    Column('gacha_total_count', Integer, default=0),
+    Column('last_sr_gacha_count', Integer, default=0),
+    Column('lose_streak', Integer, default=0),
+    Column('achievements', Text, default=''),
+    Column('total_checkin_days', Integer, default=0),
+    Column('consecutive_checkin', Integer, default=0),
+    Column('last_checkin_date', DateTime),
+    Column('total_earned', Integer, default=0),
+    Column('total_spent', Integer, default=0),
+    Column('win_streak', Integer, default=0),
+    Column('last_win_streak_date', DateTime),
+    Column('last_box_buy_date', DateTime),
+    Column('daily_box_buy_count', Integer, default=0),
+    Column('task_date', DateTime),
+    Column('daily_tasks', Text, default=''),
+    Column('task_progress', Text, default='0,0,0'),
+    Column('last_wheel_date', DateTime),
+    Column('wheel_spins_today', Integer, default=0),
+    Column('daily_presence_points', Integer, default=0),
+    Column('total_presence_points', Integer, default=0),
+    Column('last_active_time', DateTime),
+    Column('presence_levels_claimed', Text, default=''),
+    Column('tower_current_floor', Integer, default=0),
+    Column('tower_max_floor', Integer, default=0),
+    Column('tower_total_wins', Integer, default=0),
+    Column('last_chest_open', DateTime),
+    Column('daily_watch_minutes', Integer, default=0),
+    Column('total_watch_minutes', Integer, default=0),
+    Column('last_watch_claimed', DateTime),
+    Column('early_bird_wins', Integer, default=0),
+    Column('claimed_early_bird_items', Text, default=''),
+    Column('weekly_challenge_target', Integer, default=0),
+    Column('weekly_challenge_progress', Integer, default=0),
+    Column('weekly_challenge_reward_claimed', Boolean, default=False),
+    Column('weekly_challenge_completed', Integer, default=0),
+    Column('watch_achievements', Text, default=''),
+    Column('newbie_package_claimed', Boolean, default=False),
+    Column('forge_pity_counter', Integer, default=0),
+    Column('registered_date', DateTime),
+    Column('weapon_collection', Text, default=''),
+    Column('breakthrough_level', Integer, default=0),
+    Column('breakthrough_exp', Integer, default=0),
+    Column('total_mp_spent_breakthrough', Integer, default=0),
+    Column('guild_id', Integer),
+    Column('guild_join_date', DateTime),
+    Column('guild_contribution', Integer, default=0),
+    Column('owned_frames', Text, default=''),
+    Column('equipped_frame', String),
+    Column('owned_titles', Text, default=''),
+    Column('equipped_title', String),
+    Column('owned_themes', Text, default=''),
+    Column('equipped_theme', String, default='default'),
+    Index('idx_attack', 'attack'),
+    Index('idx_bank_points', 'bank_points'),
+    Index('idx_breakthrough', 'breakthrough_level', 'breakthrough_exp'),
+    Index('idx_checkin_consecutive', 'consecutive_checkin'),
+    Index('idx_checkin_date', 'last_checkin_date'),
+    Index('idx_emby_account', 'emby_account'),
+    Index('idx_guild_id', 'guild_id'),
+    Index('idx_is_vip', 'is_vip'),
+    Index('idx_total_earned', 'total_earned'),
+    Index('idx_win', 'win'),
+)
+
+bot_state = Table(
+    'bot_state', metadata,
+    Column('key', String, primary_key=True),
+    Column('value', String),
+    Column('updated_at', DateTime),
+)
+
+guilds = Table(
+    'guilds', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('name', String, nullable=False, unique=True),
+    Column('leader_id', BigInteger, nullable=False),
+    Column('leader_name', String),
+    Column('description', Text, default=''),
+    Column('level', Integer, default=1),
+    Column('exp', Integer, default=0),
+    Column('members', Text, default=''),
+    Column('member_count', Integer, default=1),
+    Column('max_members', Integer, default=20),
+    Column('created_at', DateTime),
+    Column('total_power', Integer, default=0),
+    Column('treasury', Integer, default=0),
+    Column('announcement', Text, default=''),
+    Index('idx_guild_leader', 'leader_id'),
+    Index('idx_guild_level_power', 'level', 'total_power'),
+)
+
+red_packets = Table(
+    'red_packets', metadata,
+    Column('id', String, primary_key=True),
+    Column('sender_id', BigInteger),
+    Column('chat_id', BigInteger),
+    Column('message_id', Integer),
+    Column('total_amount', Integer),
+    Column('total_count', Integer),
+    Column('remaining_amount', Integer),
+    Column('remaining_count', Integer),
+    Column('packet_type', String, default='random'),
+    Column('greeting', String, default='恭喜发财，大吉大利'),
+    Column('created_at', DateTime),
+    Column('claimed_by', Text, default=''),
+    Index('idx_packet_chat', 'chat_id'),
+    Index('idx_packet_created', 'created_at'),
+    Index('idx_packet_sender', 'sender_id'),
+)
+
+user_achievements = Table(
+    'user_achievements', metadata,
+    Column('tg_id', BigInteger),
+    Column('kind', String, default='general'),
+    Column('achievement_id', String),
+    Column('unlocked_at', DateTime),
+    PrimaryKeyConstraint('tg_id', 'kind', 'achievement_id'),
+    Index('idx_user_ach_item', 'kind', 'achievement_id'),
+)
+
+user_claims = Table(
+    'user_claims', metadata,
+    Column('tg_id', BigInteger),
+    Column('kind', String),
+    Column('claim_key', String),
+    Column('claimed_at', DateTime),
+    PrimaryKeyConstraint('tg_id', 'kind', 'claim_key'),
+    Index('idx_user_claim_item', 'kind', 'claim_key'),
+)
+
+user_cosmetics = Table(
+    'user_cosmetics', metadata,
+    Column('tg_id', BigInteger),
+    Column('kind', String),
+    Column('item_id', String),
+    Column('acquired_at', DateTime),
+    PrimaryKeyConstraint('tg_id', 'kind', 'item_id'),
+    Index('idx_user_cos_item', 'kind', 'item_id'),
+)
+
+user_weapons = Table(
+    'user_weapons', metadata,
+    Column('tg_id', BigInteger),
+    Column('weapon_name', String),
+    Column('count', Integer, default=1),
+    Column('first_obtained_at', DateTime),
+    PrimaryKeyConstraint('tg_id', 'weapon_name'),
+    Index('idx_user_weapon_name', 'weapon_name'),
+)
+
+vip_applications = Table(
+    'vip_applications', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('tg_id', BigInteger),
+    Column('username', String),
+    Column('emby_account', String),
+    Column('status', String, default='pending'),
+    Column('message_id', Integer),
+    Column('admin_note', Text),
+    Column('created_at', DateTime),
+    Column('reviewed_at', DateTime),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    for table in metadata.sorted_tables:
+        added = add_missing_columns(conn, table)
+        if added:
+            print(f"[Migration] {table.name} 添加字段: {', '.join(added)}")
+        create_missing_indexes(conn, table)
@@ -0,0 +1,14 @@
+"""
+旧版逗号串列 -> user_achievements / user_cosmetics / user_weapons / user_claims
+集合表已有数据时说明已迁移过，直接跳过（避免把已日切清空的领取记录再写回去）
+"""
+from sqlalchemy import select, exists, table
+from database.user_sets import migrate_legacy_set_columns
+
+
+def upgrade(conn):
+    for name in ("user_achievements", "user_cosmetics", "user_weapons", "user_claims"):
+        if conn.execute(select(exists().select_from(table(name)))).scalar():
+            return
+    counts = migrate_legacy_set_columns(conn)
+    print(f"[Migration] 集合列迁移完成: {counts}")
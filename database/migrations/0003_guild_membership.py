@@ -0,0 +1,15 @@
+"""
+旧版 Guild.members 逗号串 -> bindings.guild_id，并按成员实际数据校对公会战力 / 成员数
+"""
+from sqlalchemy.orm import Session
+from database.guilds import migrate_legacy_guild_members, reconcile_guild_stats
+
+
+def upgrade(conn):
+    moved = migrate_legacy_guild_members(conn)
+    # 会话加入迁移所在的事务，commit 只 flush，不会提前提交外层事务
+    with Session(bind=conn) as session:
+        fixed = reconcile_guild_stats(session)
+        session.commit()
+    if moved or fixed:
+        print(f"[Migration] 公会成员迁移 {moved} 人，校对公会 {fixed} 个")
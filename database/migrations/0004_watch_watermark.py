@@ -0,0 +1,16 @@
+"""
+bindings 新增 watch_ingested_at：观影奖励增量采集的水位（已结算到的播放时间）
+"""
+from sqlalchemy import Column, DateTime, MetaData, Table
+from database.migrate import add_missing_columns
+
+bindings = Table(
+    'bindings', MetaData(),
+    Column('watch_ingested_at', DateTime),
+)
+
+
+def upgrade(conn):
+    added = add_missing_columns(conn, bindings)
+    if added:
+        print(f"[Migration] bindings 添加字段: {', '.join(added)}")
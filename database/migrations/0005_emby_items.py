@@ -0,0 +1,35 @@
+"""
+新增 emby_items：Emby 媒体库本地索引（首次启动后由 emby.library 全量同步填充）
+"""
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text
+from database.migrate import create_missing_indexes
+
+emby_items = Table(
+    'emby_items', MetaData(),
+    Column('id', String, primary_key=True),
+    Column('type', String, nullable=False),
+    Column('name', String),
+    Column('series_name', String),
+    Column('year', Integer),
+    Column('genres', Text, default=''),
+    Column('overview', Text),
+    Column('community_rating', Float),
+    Column('rating_band', Integer, default=0),
+    Column('date_created', DateTime),
+    Column('date_modified', DateTime),
+    Column('primary_image_tag', String),
+    Column('backdrop_image_tag', String),
+    Column('path', Text),
+    Column('media_summary', Text),
+    Column('sample_key', Float, nullable=False),
+    Column('synced_at', DateTime),
+    Index('idx_emby_item_sample', 'type', 'sample_key'),
+    Index('idx_emby_item_band', 'type', 'rating_band', 'sample_key'),
+    Index('idx_emby_item_created', 'date_created'),
+    Index('idx_emby_item_modified', 'date_modified'),
+)
+
+
+def upgrade(conn):
+    emby_items.create(conn, checkfirst=True)
+    create_missing_indexes(conn, emby_items)
@@ -0,0 +1,33 @@
+"""
+新增 emby_seen_items：Emby 变更流的已处理条目；导入旧的 data/pushed_emby_items.txt 推送记录
+"""
+import os
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, insert, select
+from database.migrate import create_missing_indexes
+
+LEGACY_PUSHED_FILE = "data/pushed_emby_items.txt"
+
+emby_seen_items = Table(
+    'emby_seen_items', MetaData(),
+    Column('kind', String, primary_key=True),
+    Column('item_id', String, primary_key=True),
+    Column('seen_at', DateTime, nullable=False),
+    Index('idx_emby_seen_at', 'seen_at'),
+)
+
+
+def upgrade(conn):
+    emby_seen_items.create(conn, checkfirst=True)
+    create_missing_indexes(conn, emby_seen_items)
+
+    if not os.path.exists(LEGACY_PUSHED_FILE):
+        return
+    with open(LEGACY_PUSHED_FILE) as f:
+        ids = {line.strip() for line in f if line.strip()}
+    table = emby_seen_items
+    ids -= set(conn.execute(select(table.c.item_id).where(table.c.kind == "push")).scalars())
+    if ids:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        conn.execute(insert(table), [{"kind": "push", "item_id": i, "seen_at": now} for i in sorted(ids)])
+        print(f"[Migration] 导入 {len(ids)} 条旧推送记录")
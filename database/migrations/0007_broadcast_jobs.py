@@ -0,0 +1,39 @@
+"""
+新增 broadcast_jobs（可续传的全员广播任务）；bindings 新增 bot_blocked_at（屏蔽了 Bot 的用户，广播跳过）
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text
+from database.migrate import add_missing_columns, create_missing_indexes
+
+metadata = MetaData()
+
+bindings = Table(
+    'bindings', metadata,
+    Column('bot_blocked_at', DateTime),
+)
+
+broadcast_jobs = Table(
+    'broadcast_jobs', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('admin_id', BigInteger, nullable=False),
+    Column('chat_id', BigInteger, nullable=False),
+    Column('message_id', Integer),
+    Column('text', Text, nullable=False),
+    Column('status', String, nullable=False, default='running'),
+    Column('cursor', BigInteger),
+    Column('total', Integer, default=0),
+    Column('sent', Integer, default=0),
+    Column('failed', Integer, default=0),
+    Column('blocked', Integer, default=0),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    Column('finished_at', DateTime),
+    Index('idx_broadcast_status', 'status'),
+)
+
+
+def upgrade(conn):
+    added = add_missing_columns(conn, bindings)
+    if added:
+        print(f"[Migration] bindings 添加字段: {', '.join(added)}")
+    broadcast_jobs.create(conn, checkfirst=True)
+    create_missing_indexes(conn, broadcast_jobs)
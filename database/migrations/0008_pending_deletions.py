@@ -0,0 +1,19 @@
+"""
+新增 pending_deletions：消息自毁调度的持久化队列
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, PrimaryKeyConstraint, Table
+from database.migrate import create_missing_indexes
+
+pending_deletions = Table(
+    'pending_deletions', MetaData(),
+    Column('chat_id', BigInteger, nullable=False),
+    Column('message_id', Integer, nullable=False),
+    Column('due_at', DateTime, nullable=False),
+    PrimaryKeyConstraint('chat_id', 'message_id'),
+    Index('idx_pending_deletion_due', 'due_at'),
+)
+
+
+def upgrade(conn):
+    pending_deletions.create(conn, checkfirst=True)
+    create_missing_indexes(conn, pending_deletions)
@@ -0,0 +1,51 @@
+"""
+新增 red_packet_claims：红包领取记录（取代 red_packets.claimed_by JSON 串），并导入旧记录
+"""
+import json
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, PrimaryKeyConstraint, String, Table, Text
+from sqlalchemy import insert, select
+
+metadata = MetaData()
+
+red_packets = Table(
+    'red_packets', metadata,
+    Column('id', String, primary_key=True),
+    Column('created_at', DateTime),
+    Column('claimed_by', Text),
+)
+
+red_packet_claims = Table(
+    'red_packet_claims', metadata,
+    Column('packet_id', String, nullable=False),
+    Column('tg_id', BigInteger, nullable=False),
+    Column('amount', Integer, nullable=False),
+    Column('claimed_at', DateTime),
+    PrimaryKeyConstraint('packet_id', 'tg_id'),
+)
+
+
+def upgrade(conn):
+    red_packet_claims.create(conn, checkfirst=True)
+
+    imported = 0
+    packets = conn.execute(
+        select(red_packets.c.id, red_packets.c.created_at, red_packets.c.claimed_by)
+        .where(red_packets.c.claimed_by.isnot(None), red_packets.c.claimed_by != '')
+    ).all()
+    for packet_id, created_at, claimed_by in packets:
+        try:
+            claims = json.loads(claimed_by)
+        except ValueError:
+            continue
+        existing = set(conn.execute(
+            select(red_packet_claims.c.tg_id).where(red_packet_claims.c.packet_id == packet_id)
+        ).scalars())
+        rows = [
+            {"packet_id": packet_id, "tg_id": int(tg_id), "amount": int(amount), "claimed_at": created_at}
+            for tg_id, amount in claims.items() if int(tg_id) not in existing
+        ]
+        if rows:
+            conn.execute(insert(red_packet_claims), rows)
+            imported += len(rows)
+    if imported:
+        print(f"[Migration] 导入 {imported} 条旧红包领取记录")
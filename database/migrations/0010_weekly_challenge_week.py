@@ -0,0 +1,39 @@
+"""
+bindings 新增 weekly_challenge_week：周挑战状态所属的周（周一0点）
+以前借用每日任务的 task_date 判断跨周，日切清空 task_date 后周挑战再也不会重置。
+旧数据按 task_date 回填（仍有值的行才能判断上次访问的周）
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import Column, BigInteger, DateTime, MetaData, Table
+from sqlalchemy import select, update
+from database.migrate import add_missing_columns
+
+bindings = Table(
+    'bindings', MetaData(),
+    Column('tg_id', BigInteger, primary_key=True),
+    Column('task_date', DateTime),
+    Column('weekly_challenge_week', DateTime),
+)
+
+
+def week_start(moment: datetime) -> datetime:
+    """所在周的周一0点"""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return day - timedelta(days=day.weekday())
+
+
+def upgrade(conn):
+    added = add_missing_columns(conn, bindings)
+    if added:
+        print(f"[Migration] bindings 添加字段: {', '.join(added)}")
+
+    rows = conn.execute(
+        select(bindings.c.tg_id, bindings.c.task_date)
+        .where(bindings.c.weekly_challenge_week.is_(None), bindings.c.task_date.isnot(None))
+    ).all()
+    for tg_id, task_date in rows:
+        conn.execute(
+            update(bindings)
+            .where(bindings.c.tg_id == tg_id)
+            .values(weekly_challenge_week=week_start(task_date))
+        )
@@ -0,0 +1,9 @@
+"""
+数据库迁移文件（由 database.migrate 按编号顺序执行）
+
+命名：NNNN_说明.py，编号只增不改；每个文件提供 upgrade(conn)，
+conn 为已开启事务的连接（声明 TRANSACTIONAL = False 时为自动提交连接）。
+迁移必须可重复执行：旧库会从 0001 开始执行全部迁移。
+迁移里的表结构写成独立 MetaData 上的显式 Table 快照，不引用 database.models：
+模型之后再改，已有编号迁移建出的结构也不变（全新空库仍直接按当前模型建表）。
+"""
@@ -5,8 +5,11 @@
 性能优化：为常用查询字段添加索引
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, BigInteger, DateTime, Text, Index
+from functools import lru_cache
+from typing import Iterable, Optional
+from sqlalchemy import select, bindparam, Column, Integer, String, Boolean, BigInteger, DateTime, Float, Text, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred, load_only
 
 Base = declarative_base()
 
@@ -28,11 +31,11 @@ class Guild(Base):
     description = Column(Text, default="")                  # 公会简介
     level = Column(Integer, default=1)                      # 公会等级 (1-10)
     exp = Column(Integer, default=0)                        # 公会经验
-    members = Column(Text, default="")                      # 成员列表 (逗号分隔user_id)
-    member_count = Column(Integer, default=1)               # 成员数量
+    members = Column(Text, default="")                      # [已废弃] 成员以 bindings.guild_id 为准
+    member_count = Column(Integer, default=1)               # 成员数量（加入/退出时增量维护）
     max_members = Column(Integer, default=20)               # 最大成员数
     created_at = Column(DateTime, default=datetime.now)     # 创建时间
-    total_power = Column(Integer, default=0)                # 总战力
+    total_power = Column(Integer, default=0)                # 总战力（成员战力变化时增量维护）
     treasury = Column(Integer, default=0)                   # 公会金库（MP）
     announcement = Column(Text, default="")                 # 公会公告
 
@@ -92,7 +95,7 @@ class UserBinding(Base):
     chat_combo = Column(Integer, default=0)            # 连续聊天连击数
 
     # === 背包系统 ===
-    items = Column(Text, default="")                  # 道具背包 (逗号分隔存储)
+    items = deferred(Column(Text, default=""), group="collections")  # 道具背包 (逗号分隔存储)
 
     # === 商店道具效果 ===
     lucky_boost = Column(Boolean, default=False)      # 幸运草：下次签到暴击率UP
@@ -109,7 +112,7 @@ class UserBinding(Base):
     lose_streak = Column(Integer, default=0)          # 连败计数（用于安慰机制）
 
     # === 成就系统 ===
-    achievements = Column(Text, default="")          # 已完成成就列表（逗号分隔）
+    achievements = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_achievements] 旧版成就列表（逗号分隔）
     total_checkin_days = Column(Integer, default=0)  # 累计签到天数
     consecutive_checkin = Column(Integer, default=0) # 连续签到天数
     last_checkin_date = Column(DateTime)             # 上次签到日期（用于连续签到计算）
@@ -135,7 +138,7 @@ class UserBinding(Base):
     daily_presence_points = Column(Integer, default=0)   # 今日活跃点数
     total_presence_points = Column(Integer, default=0)   # 累计活跃点数
     last_active_time = Column(DateTime)              # 上次活跃时间
-    presence_levels_claimed = Column(Text, default="")  # 已领取的活跃等级
+    presence_levels_claimed = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_claims] 旧版已领取活跃等级
 
     # === 通天塔系统 ===
     tower_current_floor = Column(Integer, default=0)   # 当前挑战层数
@@ -149,21 +152,26 @@ class UserBinding(Base):
     daily_watch_minutes = Column(Integer, default=0)   # 今日已计算奖励的观影分钟数
     total_watch_minutes = Column(Integer, default=0)  # 累计观影总分钟数
     last_watch_claimed = Column(DateTime)              # 上次领取观影奖励时间
+    watch_ingested_at = Column(DateTime)               # 观影奖励已结算到的播放时间（UTC），增量采集水位
     early_bird_wins = Column(Integer, default=0)        # 首播奖励获得次数
-    claimed_early_bird_items = Column(Text, default="")  # 已领取首播奖励的媒体ID列表
+    claimed_early_bird_items = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_claims] 旧版已领取首播奖励列表
 
     # === 每周观影挑战 ===
     weekly_challenge_target = Column(Integer, default=0)     # 本周目标(分钟)
     weekly_challenge_progress = Column(Integer, default=0)   # 本周进度(分钟)
     weekly_challenge_reward_claimed = Column(Boolean, default=False)  # 本周奖励是否已领取
     weekly_challenge_completed = Column(Integer, default=0)  # 累计完成周挑战次数
+    weekly_challenge_week = Column(DateTime)                 # 周挑战状态所属的周（周一0点）
 
     # === 观影成就 ===
-    watch_achievements = Column(Text, default="")  # 已完成观影成就列表
+    watch_achievements = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_achievements] 旧版观影成就列表
 
     # === 新手系统 ===
     newbie_package_claimed = Column(Boolean, default=False)  # 是否已领取新手礼包
 
+    # === 消息推送 ===
+    bot_blocked_at = Column(DateTime)  # 广播时发现用户屏蔽了 Bot 的时间（之后的广播跳过，用户再次 /start 时清除）
+
     # === 保底系统 ===
     forge_pity_counter = Column(Integer, default=0)  # 锻造保底计数（连续低品质次数）
 
@@ -171,7 +179,7 @@ class UserBinding(Base):
     registered_date = Column(DateTime)  # 注册日期（用于计算新手期）
 
     # === 武器收藏系统 ===
-    weapon_collection = Column(Text, default="")  # 收藏的武器列表（逗号分隔）
+    weapon_collection = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_weapons] 旧版武器收藏（逗号分隔）
 
     # === 战力突破系统 ===
     breakthrough_level = Column(Integer, default=0)       # 突破等级 (0-10)
@@ -184,14 +192,148 @@ class UserBinding(Base):
     guild_contribution = Column(Integer, default=0)      # 公会贡献度
 
     # === 外观系统 ===
-    owned_frames = Column(Text, default="")              # 拥有的头像框 (逗号分隔)
+    owned_frames = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_cosmetics] 旧版头像框列表
     equipped_frame = Column(String, default=None)        # 当前装备的头像框
-    owned_titles = Column(Text, default="")              # 拥有的称号 (逗号分隔)
+    owned_titles = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_cosmetics] 旧版称号列表
     equipped_title = Column(String, default=None)        # 当前装备的称号
-    owned_themes = Column(Text, default="")              # 拥有的主题 (逗号分隔)
+    owned_themes = deferred(Column(Text, default=""), group="collections")  # [已迁移至 user_cosmetics] 旧版主题列表
     equipped_theme = Column(String, default="default")   # 当前主题
 
 
+# === UserBinding 列分组 ===
+# bindings 有近百列，热路径只需其中几组：get_user(tg_id, groups=("identity", "wallet")) 只读这些列，
+# 其余列在首次访问时按需加载（同步会话）。collections 组是大文本列，默认即延迟加载。
+USER_COLUMN_GROUPS = {
+    "identity": (
+        "tg_id", "emby_account", "is_vip", "registered_date", "newbie_package_claimed",
+        "guild_id", "guild_join_date", "guild_contribution",
+        "equipped_frame", "equipped_title", "equipped_theme", "bot_blocked_at",
+    ),
+    "wallet": (
+        "points", "bank_points", "last_interest_claimed", "accumulated_interest",
+        "total_earned", "total_spent",
+    ),
+    "combat": (
+        "weapon", "attack", "intimacy", "resonance_count", "win", "lost",
+        "win_streak", "last_win_streak_date", "lose_streak", "last_duel_date", "shield_active",
+        "free_forges", "free_forges_big", "forge_pity_counter",
+        "breakthrough_level", "breakthrough_exp", "total_mp_spent_breakthrough",
+        "tower_current_floor", "tower_max_floor", "tower_total_wins",
+    ),
+    "daily_counters": (
+        "last_checkin", "last_checkin_date", "total_checkin_days", "consecutive_checkin", "lucky_boost",
+        "last_tarot", "extra_tarot", "extra_gacha",
+        "daily_chat_count", "daily_duel_count", "daily_forge_count", "daily_tarot_count",
+        "daily_box_count", "daily_gift_count", "last_chat_time", "chat_combo",
+        "gacha_pity_counter", "gacha_total_count", "last_sr_gacha_count",
+        "last_box_buy_date", "daily_box_buy_count", "last_wheel_date", "wheel_spins_today",
+        "task_date", "daily_tasks", "task_progress",
+        "daily_presence_points", "total_presence_points", "last_active_time", "last_chest_open",
+    ),
+    "collections": (
+        "items", "achievements", "presence_levels_claimed", "claimed_early_bird_items",
+        "watch_achievements", "weapon_collection", "owned_frames", "owned_titles", "owned_themes",
+    ),
+    "emby_watch": (
+        "daily_watch_minutes", "total_watch_minutes", "last_watch_claimed", "watch_ingested_at", "early_bird_wins",
+        "weekly_challenge_target", "weekly_challenge_progress",
+        "weekly_challenge_reward_claimed", "weekly_challenge_completed", "weekly_challenge_week",
+    ),
+}
+
+
+def user_load_options(groups: Optional[Iterable[str]] = None) -> list:
+    """
+    按列分组生成加载选项（见 USER_COLUMN_GROUPS）
+    groups 为空时返回 []，即默认加载（除 collections 组外的全部列）
+    """
+    if not groups:
+        return []
+    columns = {"tg_id"}
+    for group in groups:
+        if group not in USER_COLUMN_GROUPS:
+            raise ValueError(f"未知的列分组: {group}")
+        columns.update(USER_COLUMN_GROUPS[group])
+    return [load_only(*(getattr(UserBinding, c) for c in sorted(columns)))]
+
+
+@lru_cache(maxsize=None)
+def _user_lookup(groups: tuple):
+    return (
+        select(UserBinding)
+        .options(*user_load_options(groups))
+        .where(UserBinding.tg_id == bindparam("tg_id"))
+    )
+
+
+def user_lookup_statement(groups: Optional[Iterable[str]] = None):
+    """
+    按 tg_id 查询用户的预构建语句（参数 tg_id），同一组合只构建一次，
+    省去每次查询重新生成语句与缓存键的开销
+    """
+    return _user_lookup(tuple(sorted(set(groups or ()))))
+
+
+class UserAchievement(Base):
+    """用户成就（一行一个成就）"""
+    __tablename__ = 'user_achievements'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('tg_id', 'kind', 'achievement_id'),
+        Index('idx_user_ach_item', 'kind', 'achievement_id'),   # "多少人解锁了某成就"
+    )
+
+    tg_id = Column(BigInteger, nullable=False)
+    kind = Column(String, nullable=False, default="general")   # general: 普通成就 / watch: 观影成就
+    achievement_id = Column(String, nullable=False)
+    unlocked_at = Column(DateTime, default=datetime.now)
+
+
+class UserCosmetic(Base):
+    """用户拥有的外观（头像框 / 称号 / 主题）"""
+    __tablename__ = 'user_cosmetics'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('tg_id', 'kind', 'item_id'),
+        Index('idx_user_cos_item', 'kind', 'item_id'),          # "谁拥有某外观"
+    )
+
+    tg_id = Column(BigInteger, nullable=False)
+    kind = Column(String, nullable=False)                       # frame / title / theme
+    item_id = Column(String, nullable=False)
+    acquired_at = Column(DateTime, default=datetime.now)
+
+
+class UserWeapon(Base):
+    """武器收藏（同名武器累计数量）"""
+    __tablename__ = 'user_weapons'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('tg_id', 'weapon_name'),
+        Index('idx_user_weapon_name', 'weapon_name'),
+    )
+
+    tg_id = Column(BigInteger, nullable=False)
+    weapon_name = Column(String, nullable=False)
+    count = Column(Integer, default=1)
+    first_obtained_at = Column(DateTime, default=datetime.now)
+
+
+class UserClaim(Base):
+    """一次性领取记录（活跃等级奖励、首播奖励等）"""
+    __tablename__ = 'user_claims'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('tg_id', 'kind', 'claim_key'),
+        Index('idx_user_claim_item', 'kind', 'claim_key'),
+    )
+
+    tg_id = Column(BigInteger, nullable=False)
+    kind = Column(String, nullable=False)                       # presence_level / early_bird
+    claim_key = Column(String, nullable=False)
+    claimed_at = Column(DateTime, default=datetime.now)
+
+
 class RedPacket(Base):
     """红包模型"""
     __tablename__ = 'red_packets'
@@ -214,7 +356,21 @@ class RedPacket(Base):
     packet_type = Column(String, default='random')    # 红包类型: random(随机)/average(平均)
     greeting = Column(String, default='恭喜发财，大吉大利')  # 祝福语
     created_at = Column(DateTime, default=datetime.now)
-    claimed_by = Column(Text, default="")              # 已抢用户 JSON 格式: {user_id: amount}
+    claimed_by = Column(Text, default="")              # 旧版已抢用户 JSON: {user_id: amount}（已迁移到 red_packet_claims）
+
+
+class RedPacketClaim(Base):
+    """红包领取记录（主键保证每人每个红包只能领取一次）"""
+    __tablename__ = 'red_packet_claims'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('packet_id', 'tg_id'),
+    )
+
+    packet_id = Column(String, nullable=False)         # RedPacket.id
+    tg_id = Column(BigInteger, nullable=False)
+    amount = Column(Integer, nullable=False)           # 领到的金额(MP)
+    claimed_at = Column(DateTime, default=datetime.now)
 
 
 class VIPApplication(Base):
@@ -230,3 +386,93 @@ class VIPApplication(Base):
     admin_note = Column(Text)            # 管理员备注
     created_at = Column(DateTime, default=datetime.now)
     reviewed_at = Column(DateTime)       # 审核时间
+
+
+class EmbyItem(Base):
+    """Emby 媒体库本地索引（emby.library 同步，抽卡 / 推荐 / 新片查询直接读本表）"""
+    __tablename__ = 'emby_items'
+
+    __table_args__ = (
+        Index('idx_emby_item_sample', 'type', 'sample_key'),                    # 按类型随机抽样
+        Index('idx_emby_item_band', 'type', 'rating_band', 'sample_key'),       # 按评分档随机抽样
+        Index('idx_emby_item_created', 'date_created'),                         # 最新入库 / 增量水位
+        Index('idx_emby_item_modified', 'date_modified'),
+    )
+
+    id = Column(String, primary_key=True)              # Emby Item ID
+    type = Column(String, nullable=False)              # Movie / Episode
+    name = Column(String)
+    series_name = Column(String)                       # 剧集所属剧名
+    year = Column(Integer)                             # ProductionYear
+    genres = Column(Text, default="")                  # JSON 数组
+    overview = Column(Text)
+    community_rating = Column(Float)
+    rating_band = Column(Integer, default=0)           # 评分向下取整（无评分为 0）
+    date_created = Column(DateTime)                    # UTC
+    date_modified = Column(DateTime)                   # UTC
+    primary_image_tag = Column(String)
+    backdrop_image_tag = Column(String)
+    path = Column(Text)                                # 文件路径（REMUX 检测）
+    media_summary = Column(Text)                       # 首条视频流摘要 JSON（分辨率 / 编码 / HDR / 色深）
+    sample_key = Column(Float, nullable=False)         # [0, 1) 随机数，随机抽样用
+    synced_at = Column(DateTime)                       # 最近一次同步写入时间（UTC）
+
+
+class EmbySeenItem(Base):
+    """Emby 变更流已处理的条目（emby.feed 去重用，按 seen_at 定期清理）"""
+    __tablename__ = 'emby_seen_items'
+
+    __table_args__ = (
+        Index('idx_emby_seen_at', 'seen_at'),
+    )
+
+    kind = Column(String, primary_key=True)            # feed：已分发给订阅者；push：已推送到群组
+    item_id = Column(String, primary_key=True)         # Emby Item ID
+    seen_at = Column(DateTime, nullable=False)         # UTC
+
+
+class BotState(Base):
+    """进程外持久化的运行状态（如最近一次日切日期），键值对"""
+    __tablename__ = 'bot_state'
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class BroadcastJob(Base):
+    """全员广播任务（游标与计数持久化，重启后从游标继续，不重发已送达的用户）"""
+    __tablename__ = 'broadcast_jobs'
+
+    __table_args__ = (
+        Index('idx_broadcast_status', 'status'),           # 启动时恢复进行中的任务
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    admin_id = Column(BigInteger, nullable=False)      # 发起的管理员
+    chat_id = Column(BigInteger, nullable=False)       # 进度消息所在聊天
+    message_id = Column(Integer)                       # 进度消息ID（实时更新进度、暂停 / 继续 / 取消按钮）
+    text = Column(Text, nullable=False)                # 广播内容（HTML）
+    status = Column(String, nullable=False, default="running")  # running / paused / cancelled / done
+    cursor = Column(BigInteger)                        # 已处理到的 tg_id（按 tg_id 升序的 keyset 游标，空为未开始）
+    total = Column(Integer, default=0)                 # 创建时的收件人数
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)               # 本次发现屏蔽了 Bot 的用户数
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime)
+
+
+class PendingDeletion(Base):
+    """待自毁的群消息（messaging.deletions 调度，重启后继续删除）"""
+    __tablename__ = 'pending_deletions'
+
+    __table_args__ = (
+        PrimaryKeyConstraint('chat_id', 'message_id'),
+        Index('idx_pending_deletion_due', 'due_at'),
+    )
+
+    chat_id = Column(BigInteger, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    due_at = Column(DateTime, nullable=False)          # 到期删除时间
@@ -0,0 +1,120 @@
+"""
+红包领取 (Red Packet Claims)
+抢红包是一群人同时点同一个按钮。以前读出 remaining_amount / remaining_count / claimed_by，
+await 发钱之后再整行写回：并发时同一份金额被重复发放，claimed_by 互相覆盖。现在：
+
+- 剩余个数 / 金额用一条条件 UPDATE 扣减：WHERE 剩余值仍是本次读到的值，否则重新读取后再分
+- 领取记录写入 red_packet_claims（主键 packet_id + tg_id），每人每个红包只能写入一次
+- 扣减、领取记录与调用方的入账在同一事务中提交
+
+使用方式:
+    from database.redpackets import claim_red_packet_async
+
+    async with get_async_session() as session:
+        result = await claim_red_packet_async(packet_id, user_id, session)
+        if result.status == "ok":
+            await credit_async(user_id, result.amount, "抢红包", session=session)
+        await session.commit()
+"""
+import logging
+import random
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import RedPacket, RedPacketClaim
+from database.user_sets import _dialect, _insert_ignore
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 20          # 条件扣减被别人抢先时重新读取的次数上限
+
+
+class ClaimResult(NamedTuple):
+    status: str                        # ok / claimed（已领过）/ empty（已抢完）/ missing（红包不存在）
+    amount: int = 0                    # 本次（或之前）领到的金额
+    packet: Optional[RedPacket] = None
+
+
+def pick_amount(remaining_amount: int, remaining_count: int) -> int:
+    """随机分配金额：最后一个拿走剩余全部，其余每个至少 1 MP"""
+    if remaining_count <= 1:
+        return remaining_amount
+    max_get = remaining_amount - remaining_count + 1
+    return 1 if max_get <= 1 else random.randint(1, max_get)
+
+
+def _claim_update(packet: RedPacket, amount: int):
+    """剩余值未被别人改过时扣减一个红包"""
+    return (
+        update(RedPacket)
+        .where(
+            RedPacket.id == packet.id,
+            RedPacket.remaining_count == packet.remaining_count,
+            RedPacket.remaining_amount == packet.remaining_amount,
+        )
+        .values(remaining_count=RedPacket.remaining_count - 1,
+                remaining_amount=RedPacket.remaining_amount - amount)
+        .returning(RedPacket.remaining_count)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+async def get_red_packet_async(packet_id: str, session: AsyncSession) -> Optional[RedPacket]:
+    """读取红包最新状态（覆盖会话中已加载的旧值）"""
+    stmt = select(RedPacket).where(RedPacket.id == packet_id).execution_options(populate_existing=True)
+    return (await session.execute(stmt)).scalars().first()
+
+
+async def get_claim_amount_async(packet_id: str, tg_id: int, session: AsyncSession) -> Optional[int]:
+    """用户领到的金额；没领过返回 None"""
+    stmt = select(RedPacketClaim.amount).where(RedPacketClaim.packet_id == packet_id,
+                                               RedPacketClaim.tg_id == tg_id)
+    return (await session.execute(stmt)).scalar()
+
+
+async def list_claims_async(packet_id: str, session: AsyncSession) -> List[Tuple[int, int]]:
+    """按领取先后返回 [(tg_id, amount), ...]"""
+    stmt = (
+        select(RedPacketClaim.tg_id, RedPacketClaim.amount)
+        .where(RedPacketClaim.packet_id == packet_id)
+        .order_by(RedPacketClaim.claimed_at)
+    )
+    return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+
+async def claim_red_packet_async(packet_id: str, tg_id: int, session: AsyncSession) -> ClaimResult:
+    """
+    领取一个红包，返回 ClaimResult；status 为 ok 时已扣减红包并写入领取记录（由调用方提交）
+    不负责给用户入账，调用方在同一会话中 credit_async
+    """
+    for _ in range(MAX_ATTEMPTS):
+        packet = await get_red_packet_async(packet_id, session)
+        if packet is None:
+            return ClaimResult("missing")
+        claimed = await get_claim_amount_async(packet_id, tg_id, session)
+        if claimed is not None:
+            return ClaimResult("claimed", claimed, packet)
+        if (packet.remaining_count or 0) <= 0:
+            return ClaimResult("empty", 0, packet)
+
+        amount = pick_amount(packet.remaining_amount, packet.remaining_count)
+        if (await session.execute(_claim_update(packet, amount))).first() is None:
+            continue        # 别人抢先领了一个，重新读取剩余值后再分
+
+        row = {"packet_id": packet_id, "tg_id": tg_id, "amount": amount, "claimed_at": datetime.now()}
+        inserted = await session.execute(_insert_ignore(_dialect(session), RedPacketClaim).values(**row))
+        if inserted.rowcount == 0:
+            # 同一用户的另一次点击先写入了领取记录：退回本次扣减
+            await session.execute(
+                update(RedPacket)
+                .where(RedPacket.id == packet_id)
+                .values(remaining_count=RedPacket.remaining_count + 1,
+                        remaining_amount=RedPacket.remaining_amount + amount)
+                .execution_options(synchronize_session="fetch")
+            )
+            return ClaimResult("claimed", await get_claim_amount_async(packet_id, tg_id, session), packet)
+        return ClaimResult("ok", amount, packet)
+
+    logger.warning(f"[红包] {packet_id} 争抢激烈，{tg_id} 领取 {MAX_ATTEMPTS} 次未成功")
+    return ClaimResult("empty", 0, await get_red_packet_async(packet_id, session))
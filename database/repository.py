@@ -4,20 +4,55 @@
 
 性能优化：
 - SQLite 连接池配置
+- SQLite 持久化档位（DB_DURABILITY）
 - 自动重连机制
 - 会话缓存优化
 """
 from contextlib import contextmanager
-from typing import Optional, List
-from sqlalchemy import create_engine, event, text, inspect
+from typing import Optional, List, Iterable
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool, QueuePool
 from config import Config
-from database.models import Base, UserBinding, VIPApplication, RedPacket
+from database.models import UserBinding, VIPApplication, user_lookup_statement
 
 
 # === 数据库连接管理（性能优化） ===
 
+# SQLite 持久化档位（DB_DURABILITY=strict|balanced|fast）
+# - strict:   synchronous=FULL，每次提交 fsync WAL，断电也不丢已提交事务
+# - balanced: synchronous=NORMAL，进程崩溃不丢数据，断电可能丢失最后几个事务
+# - fast:     synchronous=OFF，不 fsync，仅适合测试或可重建的数据
+# checkpoint 不再在提交路径上执行，由 database.checkpoint.CheckpointManager 在后台完成
+DURABILITY_PROFILES = {
+    "strict": {"synchronous": "FULL", "wal_autocheckpoint": 1000},
+    "balanced": {"synchronous": "NORMAL", "wal_autocheckpoint": 1000},
+    "fast": {"synchronous": "OFF", "wal_autocheckpoint": 10000},
+}
+
+
+def get_durability_profile(name: Optional[str] = None) -> dict:
+    """获取持久化档位对应的 PRAGMA 配置，未知档位回退到 strict"""
+    return DURABILITY_PROFILES.get((name or Config.DB_DURABILITY).lower(), DURABILITY_PROFILES["strict"])
+
+
+def apply_sqlite_pragmas(dbapi_conn, profile: Optional[str] = None):
+    """在原始 SQLite 连接上应用性能参数和持久化档位"""
+    pragmas = get_durability_profile(profile)
+    cursor = dbapi_conn.cursor()
+    # WAL 模式 - 允许读写并发
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # 同步模式 - 由持久化档位决定
+    cursor.execute(f"PRAGMA synchronous={pragmas['synchronous']}")
+    # 缓存大小 - 增加到 64MB
+    cursor.execute("PRAGMA cache_size=-64000")
+    # 临时存储在内存中
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    # 自动 checkpoint 仅作兜底，常规 checkpoint 由后台管理器执行
+    cursor.execute(f"PRAGMA wal_autocheckpoint={pragmas['wal_autocheckpoint']}")
+    cursor.close()
+
+
 if Config.DB_TYPE == "sqlite":
     # SQLite 优化配置
     engine = create_engine(
@@ -34,18 +69,7 @@ if Config.DB_TYPE == "sqlite":
     @event.listens_for(engine, "connect")
     def set_sqlite_pragma(dbapi_conn, connection_record):
         """设置 SQLite 性能优化参数"""
-        cursor = dbapi_conn.cursor()
-        # WAL 模式 - 允许读写并发
-        cursor.execute("PRAGMA journal_mode=WAL")
-        # 同步模式 - FULL 确保数据持久化（Docker环境需要）
-        cursor.execute("PRAGMA synchronous=FULL")
-        # 缓存大小 - 增加到 64MB
-        cursor.execute("PRAGMA cache_size=-64000")
-        # 临时存储在内存中
-        cursor.execute("PRAGMA temp_store=MEMORY")
-        # 每次 commit 后立即写入磁盘
-        cursor.execute("PRAGMA wal_autocheckpoint=100")
-        cursor.close()
+        apply_sqlite_pragmas(dbapi_conn)
 
 else:
     # PostgreSQL/MySQL 配置
@@ -60,44 +84,7 @@ else:
         pool_pre_ping=True,     # 连接健康检查
     )
 
-# === 数据库迁移系统 ===
-def run_migrations():
-    """运行数据库迁移，自动添加缺失的字段"""
-    with engine.connect() as conn:
-        inspector = inspect(engine)
-
-        # 检查 bindings 表
-        if 'bindings' in inspector.get_table_names():
-            columns = [c['name'] for c in inspector.get_columns('bindings')]
-
-            # 需要添加的字段
-            migrations = [
-                ('last_chest_open', 'DATETIME'),
-            ]
-
-            for col_name, col_type in migrations:
-                if col_name not in columns:
-                    try:
-                        conn.execute(text(f"ALTER TABLE bindings ADD COLUMN {col_name} {col_type}"))
-                        conn.commit()
-                        print(f"[Migration] 添加字段: bindings.{col_name}")
-                    except Exception:
-                        pass
-
-        # 检查 red_packets 表是否存在
-        if 'red_packets' not in inspector.get_table_names():
-            try:
-                RedPacket.__table__.create(engine, checkfirst=True)
-                print(f"[Migration] 创建表: red_packets")
-            except Exception:
-                pass
-
-
-# 运行迁移
-run_migrations()
-
-# 创建所有表
-Base.metadata.create_all(engine)
+# 表结构由版本化迁移维护（python -m database.migrate），导入时不再检查 / 建表
 
 # 会话工厂优化
 SessionLocal = sessionmaker(
@@ -120,16 +107,6 @@ def get_session():
     try:
         yield session
         session.commit()
-        # SQLite WAL 模式下，执行 checkpoint 确保数据持久化
-        if Config.DB_TYPE == "sqlite":
-            import sqlite3
-            try:
-                # 直接连接数据库执行 checkpoint
-                conn = sqlite3.connect(Config.DB_PATH, timeout=30)
-                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
-                conn.close()
-            except Exception:
-                pass
     except Exception:
         session.rollback()
         raise
@@ -137,6 +114,21 @@ def get_session():
         session.close()
 
 
+@contextmanager
+def use_session(session: Optional[Session] = None):
+    """
+    复用调用方会话或新开会话
+    - 传入 session：在其事务内执行（先 flush 待写入修改），不提交
+    - 未传入：新开会话，结束时提交
+    """
+    if session is not None:
+        session.flush()
+        yield session
+    else:
+        with get_session() as own:
+            yield own
+
+
 def get_session_raw() -> Session:
     """
     获取原始数据库会话（需手动管理）
@@ -147,12 +139,17 @@ def get_session_raw() -> Session:
 
 # === 用户数据操作 ===
 
-def get_user(tg_id: int, session: Optional[Session] = None) -> Optional[UserBinding]:
-    """获取用户"""
+def get_user(tg_id: int, session: Optional[Session] = None,
+             groups: Optional[Iterable[str]] = None) -> Optional[UserBinding]:
+    """
+    获取用户
+    groups: 只加载指定列分组，如 ("identity", "wallet")；未加载的列在首次访问时按需查询
+    """
+    stmt = user_lookup_statement(groups)
     if session:
-        return session.query(UserBinding).filter_by(tg_id=tg_id).first()
+        return session.execute(stmt, {"tg_id": tg_id}).scalars().first()
     with get_session() as session:
-        return session.query(UserBinding).filter_by(tg_id=tg_id).first()
+        return session.execute(stmt, {"tg_id": tg_id}).scalars().first()
 
 
 def create_user(tg_id: int, emby_account: Optional[str] = None, session: Optional[Session] = None) -> UserBinding:
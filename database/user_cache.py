@@ -0,0 +1,188 @@
+"""
+用户快照缓存 (User Snapshot Cache)
+同一个 tg_id 在一次 Update 中往往被查询多次（"是否绑定 / 是否 VIP"），
+这里在 repository 前面加一层进程内 LRU + TTL 缓存，缓存的是不可变快照：
+
+    UserSnapshot(tg_id, emby_account, is_vip, guild_id, equipped_frame, equipped_title, equipped_theme)
+
+失效：
+- 任何会话（同步 / 异步）flush 了 UserBinding 的快照字段，或新建 / 删除了用户，
+  flush 与提交时都会让对应 tg_id 失效（ORM 事件监听，插件直接改 user.is_vip 也能覆盖）
+- 账本只改 points，不在快照中，无需失效
+- 绕过 ORM 的批量 UPDATE 修改快照字段时，需手动调用 invalidate_user()
+- TTL 兜底：最多 USER_CACHE_TTL 秒后重新读取
+
+使用方式:
+    from database.user_cache import get_user_snapshot
+
+    snap = get_user_snapshot(tg_id)       # 未注册返回 None
+    if not snap or not snap.is_bound:
+        ...
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import Session
+from config import Config
+from database.models import UserBinding
+from database.repository import use_session
+from database.async_repository import use_async_session
+
+SNAPSHOT_FIELDS = (
+    "tg_id", "emby_account", "is_vip", "guild_id",
+    "equipped_frame", "equipped_title", "equipped_theme",
+)
+
+
+class UserSnapshot(NamedTuple):
+    """用户常用身份信息的只读快照"""
+    tg_id: int
+    emby_account: Optional[str]
+    is_vip: bool
+    guild_id: Optional[int]
+    equipped_frame: Optional[str]
+    equipped_title: Optional[str]
+    equipped_theme: Optional[str]
+
+    @property
+    def is_bound(self) -> bool:
+        return bool(self.emby_account)
+
+    @classmethod
+    def from_row(cls, row) -> "UserSnapshot":
+        return cls(
+            tg_id=row.tg_id,
+            emby_account=row.emby_account,
+            is_vip=bool(row.is_vip),
+            guild_id=row.guild_id,
+            equipped_frame=row.equipped_frame,
+            equipped_title=row.equipped_title,
+            equipped_theme=row.equipped_theme,
+        )
+
+
+_SNAPSHOT_QUERY = select(*(getattr(UserBinding, f) for f in SNAPSHOT_FIELDS))
+
+_MISSING = object()
+
+
+class UserSnapshotCache:
+    """LRU + TTL 快照缓存；未注册用户也会缓存（值为 None），避免反复查库"""
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        self.maxsize = maxsize if maxsize is not None else Config.USER_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.USER_CACHE_TTL
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()  # tg_id -> (快照或 None, 写入时间)
+        # 同步会话可能在线程池中执行，失效与读写都要加锁
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, tg_id: int):
+        """命中返回快照或 None（已知未注册）；未命中返回 _MISSING"""
+        with self._lock:
+            item = self._data.get(tg_id)
+            if item is not None and time.monotonic() - item[1] < self.ttl:
+                self._data.move_to_end(tg_id)
+                self.stats["hits"] += 1
+                return item[0]
+            self.stats["misses"] += 1
+            return _MISSING
+
+    def store(self, tg_id: int, snapshot: Optional[UserSnapshot]):
+        with self._lock:
+            self._data[tg_id] = (snapshot, time.monotonic())
+            self._data.move_to_end(tg_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, tg_id: Optional[int] = None):
+        """使某个用户（tg_id 为 None 时全部）失效"""
+        with self._lock:
+            if tg_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(tg_id, None)
+            self.stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, tg_id: int, session: Optional[Session] = None) -> Optional[UserSnapshot]:
+        cached = self.lookup(tg_id)
+        if cached is not _MISSING:
+            return cached
+        with use_session(session) as s:
+            row = s.execute(_SNAPSHOT_QUERY.where(UserBinding.tg_id == tg_id)).first()
+        snapshot = UserSnapshot.from_row(row) if row else None
+        self.store(tg_id, snapshot)
+        return snapshot
+
+    async def get_async(self, tg_id: int, session=None) -> Optional[UserSnapshot]:
+        cached = self.lookup(tg_id)
+        if cached is not _MISSING:
+            return cached
+        async with use_async_session(session) as s:
+            row = (await s.execute(_SNAPSHOT_QUERY.where(UserBinding.tg_id == tg_id))).first()
+        snapshot = UserSnapshot.from_row(row) if row else None
+        self.store(tg_id, snapshot)
+        return snapshot
+
+
+user_cache = UserSnapshotCache()
+
+
+def get_user_snapshot(tg_id: int, session: Optional[Session] = None) -> Optional[UserSnapshot]:
+    """获取用户快照（未注册返回 None）"""
+    return user_cache.get(tg_id, session)
+
+
+async def get_user_snapshot_async(tg_id: int, session=None) -> Optional[UserSnapshot]:
+    return await user_cache.get_async(tg_id, session)
+
+
+def invalidate_user(tg_id: Optional[int] = None):
+    """手动失效（绕过 ORM 修改快照字段时使用）"""
+    user_cache.invalidate(tg_id)
+
+
+# ==========================================
+# ORM 写入自动失效
+# ==========================================
+
+def _changed_users(session) -> set:
+    changed = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, UserBinding) and obj.tg_id is not None:
+            changed.add(obj.tg_id)
+    for obj in session.dirty:
+        if not isinstance(obj, UserBinding):
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[f].history.has_changes() for f in SNAPSHOT_FIELDS):
+            changed.add(obj.tg_id)
+    return changed
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    changed = _changed_users(session)
+    if not changed:
+        return
+    # flush 时立即失效；提交时再失效一次，防止提交前被其它读者用旧值重新填充
+    session.info.setdefault("user_cache_dirty", set()).update(changed)
+    for tg_id in changed:
+        user_cache.invalidate(tg_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for tg_id in session.info.pop("user_cache_dirty", ()):
+        user_cache.invalidate(tg_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("user_cache_dirty", None)
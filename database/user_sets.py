@@ -0,0 +1,255 @@
+"""
+用户集合表 (User Sets)
+成就、外观、武器收藏、一次性领取记录以前都是 bindings 上的逗号分隔 Text 列，
+每次判断都要整串 split；claimed_early_bird_items 还会无限增长。
+现在改为四张复合主键表，成员判断、"谁拥有 X"、"多少人解锁了 Y" 都是索引查询：
+
+    集合名称                         表
+    achievement / watch_achievement  user_achievements
+    frame / title / theme            user_cosmetics
+    presence_level / early_bird      user_claims
+    （武器收藏带数量）               user_weapons -> add_weapon / get_weapon_counts
+
+使用方式:
+    from database.user_sets import user_set_contains, add_to_user_set
+
+    if not user_set_contains(tg_id, "achievement", "duel_1", session):
+        add_to_user_set(tg_id, "achievement", ["duel_1"], session)
+"""
+from collections import Counter
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+from sqlalchemy import select, func, insert, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import UserAchievement, UserCosmetic, UserWeapon, UserClaim
+from database.repository import use_session
+from database.async_repository import use_async_session
+
+
+class _SetSpec(NamedTuple):
+    model: type
+    value_column: str
+    kind: str
+
+
+USER_SETS = {
+    "achievement": _SetSpec(UserAchievement, "achievement_id", "general"),
+    "watch_achievement": _SetSpec(UserAchievement, "achievement_id", "watch"),
+    "frame": _SetSpec(UserCosmetic, "item_id", "frame"),
+    "title": _SetSpec(UserCosmetic, "item_id", "title"),
+    "theme": _SetSpec(UserCosmetic, "item_id", "theme"),
+    "presence_level": _SetSpec(UserClaim, "claim_key", "presence_level"),
+    "early_bird": _SetSpec(UserClaim, "claim_key", "early_bird"),
+}
+
+# 旧版逗号串列 -> 集合名称
+LEGACY_SET_COLUMNS = {
+    "achievements": "achievement",
+    "watch_achievements": "watch_achievement",
+    "owned_frames": "frame",
+    "owned_titles": "title",
+    "owned_themes": "theme",
+    "presence_levels_claimed": "presence_level",
+    "claimed_early_bird_items": "early_bird",
+}
+
+
+def _spec(name: str) -> _SetSpec:
+    try:
+        return USER_SETS[name]
+    except KeyError:
+        raise ValueError(f"未知的集合: {name}")
+
+
+def _member_query(spec: _SetSpec, tg_id: int):
+    column = getattr(spec.model, spec.value_column)
+    return select(column).where(spec.model.tg_id == tg_id, spec.model.kind == spec.kind)
+
+
+def _clean(values: Iterable) -> Set[str]:
+    return {str(v) for v in values if v is not None and str(v) != ""}
+
+
+def _rows(spec: _SetSpec, tg_id: int, values: Iterable[str]) -> list:
+    return [{"tg_id": tg_id, "kind": spec.kind, spec.value_column: v} for v in values]
+
+
+def _insert_ignore(dialect: str, model):
+    """重复主键直接跳过的批量插入语句"""
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(model)
+    return dialect_insert(model).on_conflict_do_nothing()
+
+
+def _dialect(session) -> str:
+    sync_session = getattr(session, "sync_session", session)
+    return sync_session.get_bind().dialect.name
+
+
+# ==========================================
+# 同步接口
+# ==========================================
+
+def get_user_set(tg_id: int, name: str, session: Optional[Session] = None) -> Set[str]:
+    """获取用户某个集合的全部成员"""
+    spec = _spec(name)
+    with use_session(session) as s:
+        return set(s.execute(_member_query(spec, tg_id)).scalars())
+
+
+def user_set_contains(tg_id: int, name: str, value, session: Optional[Session] = None) -> bool:
+    """主键查询：用户是否拥有某成员"""
+    spec = _spec(name)
+    column = getattr(spec.model, spec.value_column)
+    with use_session(session) as s:
+        return s.execute(_member_query(spec, tg_id).where(column == str(value)).limit(1)).first() is not None
+
+
+def user_set_members(tg_id: int, name: str, values: Iterable, session: Optional[Session] = None) -> Set[str]:
+    """只查询给定候选中用户已拥有的成员（集合很大时不必整表读出）"""
+    spec = _spec(name)
+    values = _clean(values)
+    if not values:
+        return set()
+    column = getattr(spec.model, spec.value_column)
+    with use_session(session) as s:
+        return set(s.execute(_member_query(spec, tg_id).where(column.in_(values))).scalars())
+
+
+def add_to_user_set(tg_id: int, name: str, values: Iterable, session: Optional[Session] = None) -> Set[str]:
+    """批量加入集合，已存在的跳过；返回本次新加入的成员"""
+    spec = _spec(name)
+    values = _clean(values)
+    if not values:
+        return set()
+    column = getattr(spec.model, spec.value_column)
+    with use_session(session) as s:
+        existing = set(s.execute(_member_query(spec, tg_id).where(column.in_(values))).scalars())
+        new = values - existing
+        if new:
+            s.execute(_insert_ignore(_dialect(s), spec.model), _rows(spec, tg_id, new))
+    return new
+
+
+def count_set_holders(name: str, value, session: Optional[Session] = None) -> int:
+    """多少用户拥有某成员（走 kind + 成员 索引）"""
+    spec = _spec(name)
+    column = getattr(spec.model, spec.value_column)
+    with use_session(session) as s:
+        return s.execute(
+            select(func.count()).select_from(spec.model)
+            .where(spec.model.kind == spec.kind, column == str(value))
+        ).scalar() or 0
+
+
+def add_weapon(tg_id: int, weapon_name: str, session: Optional[Session] = None) -> int:
+    """收藏一把武器（同名累加数量），返回该武器当前数量"""
+    with use_session(session) as s:
+        current = s.execute(
+            select(UserWeapon.count).where(UserWeapon.tg_id == tg_id, UserWeapon.weapon_name == weapon_name)
+        ).scalar()
+        if current is None:
+            s.execute(insert(UserWeapon).values(tg_id=tg_id, weapon_name=weapon_name, count=1))
+            return 1
+        s.execute(
+            UserWeapon.__table__.update()
+            .where(UserWeapon.tg_id == tg_id, UserWeapon.weapon_name == weapon_name)
+            .values(count=UserWeapon.count + 1)
+        )
+        return current + 1
+
+
+def get_weapon_counts(tg_id: int, session: Optional[Session] = None) -> Dict[str, int]:
+    """武器收藏 {武器名: 数量}，按首次获得时间排序"""
+    with use_session(session) as s:
+        rows = s.execute(
+            select(UserWeapon.weapon_name, UserWeapon.count)
+            .where(UserWeapon.tg_id == tg_id)
+            .order_by(UserWeapon.first_obtained_at)
+        ).all()
+    return {name: count or 0 for name, count in rows}
+
+
+# ==========================================
+# 异步接口
+# ==========================================
+
+async def get_user_set_async(tg_id: int, name: str, session: Optional[AsyncSession] = None) -> Set[str]:
+    spec = _spec(name)
+    async with use_async_session(session) as s:
+        return set((await s.execute(_member_query(spec, tg_id))).scalars())
+
+
+async def user_set_contains_async(tg_id: int, name: str, value, session: Optional[AsyncSession] = None) -> bool:
+    spec = _spec(name)
+    column = getattr(spec.model, spec.value_column)
+    async with use_async_session(session) as s:
+        result = await s.execute(_member_query(spec, tg_id).where(column == str(value)).limit(1))
+        return result.first() is not None
+
+
+async def add_to_user_set_async(tg_id: int, name: str, values: Iterable,
+                                session: Optional[AsyncSession] = None) -> Set[str]:
+    spec = _spec(name)
+    values = _clean(values)
+    if not values:
+        return set()
+    column = getattr(spec.model, spec.value_column)
+    async with use_async_session(session) as s:
+        existing = set((await s.execute(_member_query(spec, tg_id).where(column.in_(values)))).scalars())
+        new = values - existing
+        if new:
+            await s.execute(_insert_ignore(_dialect(s), spec.model), _rows(spec, tg_id, new))
+    return new
+
+
+# ==========================================
+# 旧数据迁移
+# ==========================================
+
+def migrate_legacy_set_columns(conn, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    一次性把 bindings 上的逗号串列复制到集合表（可重复执行，已存在的行跳过）
+    conn 为 Engine.begin() 得到的连接；返回 {集合名称: 迁移行数}
+    """
+    dialect = conn.dialect.name
+    counts: Dict[str, int] = {name: 0 for name in LEGACY_SET_COLUMNS.values()}
+    counts["weapon"] = 0
+
+    columns = ", ".join(["tg_id", "weapon_collection", *LEGACY_SET_COLUMNS])
+    last_id = None
+    while True:
+        # 按主键分批读取，避免一次把整张表读进内存
+        where = "" if last_id is None else "WHERE tg_id > :last_id"
+        rows = conn.execute(
+            text(f"SELECT {columns} FROM bindings {where} ORDER BY tg_id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size},
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["tg_id"]
+
+        pending: Dict[type, list] = {}
+        for row in rows:
+            for column, name in LEGACY_SET_COLUMNS.items():
+                values = _clean((row[column] or "").split(","))
+                if values:
+                    spec = USER_SETS[name]
+                    pending.setdefault(spec.model, []).extend(_rows(spec, row["tg_id"], values))
+                    counts[name] += len(values)
+
+            weapons = Counter(w for w in (row["weapon_collection"] or "").split(",") if w)
+            for weapon_name, count in weapons.items():
+                pending.setdefault(UserWeapon, []).append(
+                    {"tg_id": row["tg_id"], "weapon_name": weapon_name, "count": count}
+                )
+                counts["weapon"] += 1
+
+        for model, model_rows in pending.items():
+            conn.execute(_insert_ignore(dialect, model), model_rows)
+
+    return counts
@@ -0,0 +1,15 @@
+"""
+Emby 服务访问层
+"""
+from emby.client import EmbyClient, EmbyError, emby_client, parse_emby_date
+from emby.directory import EmbyUserDirectory, emby_directory
+from emby.feed import EmbyChangeFeed, emby_feed
+from emby.library import EmbyLibrary, emby_library
+from emby.played import PlayedCountCache, played_counts
+from emby.posters import PosterCache, poster_cache
+from emby.webhook import EmbyWebhookServer, emby_webhook
+
+__all__ = ["EmbyClient", "EmbyError", "emby_client", "parse_emby_date", "EmbyUserDirectory", "emby_directory",
+           "EmbyChangeFeed", "emby_feed",
+           "EmbyLibrary", "emby_library", "PlayedCountCache", "played_counts",
+           "PosterCache", "poster_cache", "EmbyWebhookServer", "emby_webhook"]
@@ -0,0 +1,201 @@
+"""
+共享 Emby HTTP 客户端
+以前每次调用 Emby API 都新建一个 aiohttp.ClientSession：每个请求都要重新握手 TCP/TLS、重建请求头，
+同一时刻多人打开同一个面板时还会向 Emby 发出完全相同的请求。现在改为：
+
+- 整个应用共用一个 ClientSession（post_init 中创建，post_shutdown 时关闭），连接池有上限并保持长连接
+- 请求头只构建一次
+- 按接口分类设置超时（用户列表 / 媒体查询 / 图片下载）
+- 单飞合并：同一时刻相同的 GET（路径 + 参数相同）只发一次请求，所有等待者共享结果
+
+注意：合并后的结果对象由多个调用方共享，调用方不应原地修改返回的 dict / list。
+
+使用方式:
+    from emby import emby_client, EmbyError
+
+    users = await emby_client.get_json("/Users")
+    data = await emby_client.get_json(f"/Users/{user_id}/Items", {"Filters": "IsPlayed", "Limit": 1})
+    image = await emby_client.get_bytes(f"/Items/{item_id}/Images/Primary")
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+import aiohttp
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 各类接口的超时（秒），未列出的使用 Config.EMBY_TIMEOUT
+ENDPOINT_TIMEOUTS = {
+    "users": 5,       # /Users 用户列表（绑定校验等交互路径，宁可快速失败）
+    "image": 30,      # /Items/{id}/Images/... 海报下载
+}
+
+_EMBY_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:?\d{2})?$")
+
+
+class EmbyError(Exception):
+    """Emby 未配置、返回非 200 或请求失败"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def endpoint_of(path: str) -> str:
+    """按路径归类接口，用于选择超时"""
+    if "/Images/" in path:
+        return "image"
+    if path.rstrip("/") == "/Users":
+        return "users"
+    return "items"
+
+
+def _query(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """查询参数规范化：布尔值转为 Emby 使用的 true / false（aiohttp 不接受 bool）"""
+    return {k: ("true" if v else "false") if isinstance(v, bool) else v for k, v in (params or {}).items()}
+
+
+def parse_emby_date(value: Optional[str]) -> Optional[datetime]:
+    """Emby 时间（如 2024-05-01T12:34:56.1234567Z）→ 不带时区的 UTC 时间；无法解析返回 None"""
+    match = _EMBY_DATE.match(value or "")
+    if not match:
+        return None
+    seconds, fraction, offset = match.groups()
+    # Emby 给 7 位小数，Python 3.10 的 fromisoformat 只认 6 位
+    fraction = (fraction or "")[1:].ljust(6, "0")[:6]
+    offset = "+00:00" if offset in (None, "Z") else offset
+    if ":" not in offset:
+        offset = f"{offset[:3]}:{offset[3:]}"
+    parsed = datetime.fromisoformat(f"{seconds}.{fraction}{offset}")
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _freeze(params: Dict[str, Any]) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class EmbyClient:
+    """带连接池、长连接和单飞合并的 Emby API 客户端"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 verify_ssl: Optional[bool] = None):
+        self.base_url = (base_url if base_url is not None else Config.EMBY_URL).rstrip("/")
+        self.api_key = api_key if api_key is not None else Config.EMBY_API_KEY
+        self.pool_size = pool_size or Config.EMBY_POOL_SIZE
+        self.timeout = timeout or Config.EMBY_TIMEOUT
+        self.verify_ssl = Config.EMBY_VERIFY_SSL if verify_ssl is None else verify_ssl
+        self.headers = {
+            "X-Emby-Token": self.api_key,
+            "Accept": "application/json",
+            "User-Agent": "curl/7.68.0",
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.stats = {"requests": 0, "coalesced": 0, "errors": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.base_url and self.api_key)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    # ==========================================
+    # 生命周期
+    # ==========================================
+
+    def start(self):
+        """创建共享会话（需在事件循环中调用，由 main.py 的 post_init 调用）"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is loop:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+            ssl=None if self.verify_ssl else False,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        self._loop = loop
+        self._inflight.clear()
+        logger.info(f"[Emby] 客户端已启动: 连接池 {self.pool_size}, 默认超时 {self.timeout}s")
+
+    async def close(self):
+        """关闭共享会话和连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+        self._inflight.clear()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 未经 post_init 启动（脚本、测试）或事件循环已更换时按需创建
+        if self._session is None or self._session.closed or self._loop is not asyncio.get_running_loop():
+            self.start()
+        return self._session
+
+    # ==========================================
+    # 请求
+    # ==========================================
+
+    def _timeout(self, path: str, timeout: Optional[float]) -> aiohttp.ClientTimeout:
+        seconds = timeout or ENDPOINT_TIMEOUTS.get(endpoint_of(path), self.timeout)
+        return aiohttp.ClientTimeout(total=seconds)
+
+    async def _fetch(self, path: str, params: Optional[dict], timeout: Optional[float], as_json: bool):
+        if not self.configured:
+            raise EmbyError("Emby 未配置")
+        self.stats["requests"] += 1
+        try:
+            async with self._get_session().get(
+                self.url(path), params=params, timeout=self._timeout(path, timeout)
+            ) as resp:
+                if resp.status != 200:
+                    body = await resp.text()
+                    raise EmbyError(f"Emby 返回 HTTP {resp.status}: {body[:200]}", resp.status)
+                return await resp.json(content_type=None) if as_json else await resp.read()
+        except EmbyError:
+            self.stats["errors"] += 1
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats["errors"] += 1
+            raise EmbyError(f"请求 Emby 失败: {e!r}") from e
+
+    async def _coalesced(self, key: tuple, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+
+            def _done(t, key=key):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                if not t.cancelled():
+                    t.exception()   # 所有等待者都已取消时避免 "exception was never retrieved"
+
+            task.add_done_callback(_done)
+        else:
+            self.stats["coalesced"] += 1
+        # shield：某个等待者被取消不影响其他共享同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def get_json(self, path: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> Any:
+        """GET 并解析 JSON；相同的并发请求合并为一次"""
+        params = _query(params)
+        key = ("json", path, _freeze(params))
+        return await self._coalesced(key, lambda: self._fetch(path, params, timeout, as_json=True))
+
+    async def get_bytes(self, path: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> bytes:
+        """GET 原始字节（图片等）；相同的并发请求合并为一次"""
+        params = _query(params)
+        key = ("bytes", path, _freeze(params))
+        return await self._coalesced(key, lambda: self._fetch(path, params, timeout, as_json=False))
+
+
+emby_client = EmbyClient()
@@ -0,0 +1,162 @@
+"""
+Emby 用户目录缓存
+以前 /watch_stats、/weekly_challenge、/watch_achievements 和每小时的观影奖励任务每次都要下载完整的
+/Users 列表再按用户名查 ID，绑定校验和"谁看过这部片"也各自再拉一遍。现在改为进程内共享一份目录：
+
+- 用户名 → ID、ID → 用户名，用户名查找不区分大小写（精确匹配优先）
+- 后台按 TTL 定时刷新（post_init 启动）；过期时先返回旧数据并在后台刷新
+- 查不到时立即刷新一次（刚在 Emby 新建的账号），但两次之间至少间隔 MISS_REFRESH_INTERVAL 秒
+- 绑定后调用 invalidate()，下次查找前重新拉取
+- 管理员控制台可查看目录人数与更新时间
+
+使用方式:
+    from emby import emby_directory
+
+    emby_user_id = await emby_directory.resolve_id(user.emby_account)
+    name = await emby_directory.canonical_name("Alice")    # 返回 Emby 中的实际大小写
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from emby.client import EmbyClient, emby_client
+
+logger = logging.getLogger(__name__)
+
+# 查不到用户名时触发刷新的最小间隔（秒），避免拼错的用户名反复拉取整个列表
+MISS_REFRESH_INTERVAL = 60
+
+
+class EmbyUserDirectory:
+    """进程内 Emby 用户目录（用户名 ↔ ID）"""
+
+    def __init__(self, client: Optional[EmbyClient] = None, ttl: Optional[int] = None):
+        self.client = client or emby_client
+        self.ttl = ttl if ttl is not None else Config.EMBY_USERS_TTL
+        self._by_name: Dict[str, str] = {}
+        self._by_lower: Dict[str, str] = {}
+        self._by_id: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @property
+    def age(self) -> Optional[float]:
+        """距上次成功刷新的秒数；从未加载返回 None"""
+        return time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+
+    # ==========================================
+    # 刷新
+    # ==========================================
+
+    def load(self, users: List[dict]):
+        """用 /Users 的返回结果整体替换目录"""
+        by_name = {u.get("Name", ""): u.get("Id", "") for u in users if u.get("Name") and u.get("Id")}
+        by_lower = {}
+        for name in by_name:
+            by_lower.setdefault(name.lower(), name)
+        self._by_name, self._by_lower = by_name, by_lower
+        self._by_id = {user_id: name for name, user_id in by_name.items()}
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    async def refresh(self) -> int:
+        """立即从 Emby 拉取用户列表，返回用户数；失败时保留旧数据"""
+        try:
+            users = await self.client.get_json("/Users")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[EmbyDirectory] 刷新用户列表失败: {e}")
+            return len(self)
+        self.load(users)
+        self.stats["refreshes"] += 1
+        return len(self)
+
+    def _refresh_in_background(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.get_running_loop().create_task(self.refresh())
+
+    async def _ensure(self):
+        if self._loaded_at is None or self._stale:
+            await self.refresh()
+        elif self.age > self.ttl:
+            self._refresh_in_background()
+
+    def invalidate(self):
+        """标记目录需要重新拉取（绑定 / 改名后调用）"""
+        self._stale = True
+
+    # ==========================================
+    # 查找
+    # ==========================================
+
+    def _lookup(self, name: str) -> Optional[str]:
+        """返回 Emby 中的实际用户名（精确匹配优先，其次忽略大小写）"""
+        if not name:
+            return None
+        if name in self._by_name:
+            return name
+        return self._by_lower.get(name.lower())
+
+    async def canonical_name(self, name: str) -> Optional[str]:
+        """用户名在 Emby 中的实际写法；不存在返回 None"""
+        if not name or not self.client.configured:
+            return None
+        await self._ensure()
+        found = self._lookup(name)
+        if found is None and (self.age is None or self.age > MISS_REFRESH_INTERVAL):
+            await self.refresh()
+            found = self._lookup(name)
+        self.stats["hits" if found else "misses"] += 1
+        return found
+
+    async def resolve_id(self, name: str) -> Optional[str]:
+        """用户名 → Emby 用户 ID；不存在返回 None"""
+        found = await self.canonical_name(name)
+        return self._by_name.get(found) if found else None
+
+    def name_of(self, user_id: str) -> Optional[str]:
+        """Emby 用户 ID → 用户名（只读内存）"""
+        return self._by_id.get(user_id)
+
+    async def all_users(self) -> List[Tuple[str, str]]:
+        """全部用户 [(user_id, name)]"""
+        if self.client.configured:
+            await self._ensure()
+        return list(self._by_id.items())
+
+    # ==========================================
+    # 后台刷新
+    # ==========================================
+
+    async def _loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        """启动后台定时刷新（需在事件循环中调用）"""
+        if self._task is not None or not self.client.configured:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        logger.info(f"[EmbyDirectory] 已启动: 每 {self.ttl}s 刷新用户目录")
+
+    async def stop(self):
+        for task in (self._task, self._refreshing):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._refreshing = None
+
+
+emby_directory = EmbyUserDirectory()
@@ -0,0 +1,217 @@
+"""
+Emby 新片变更流
+以前有两个各自轮询的新片任务：emby_watch 的新片公告（已公告记录在内存 set 里，重启就丢）和 emby_monitor 的
+REMUX 自动推送（记录在只追加的 data/pushed_emby_items.txt，导入时整个读进内存），后者还要逐条串行拉详情。
+现在合并为一个变更流：
+
+- 每 EMBY_FEED_INTERVAL 秒只发一个 /Items 列表请求：MinDateCreated = 持久化水位（bot_state）减去重叠窗口，
+  Fields 一次带上订阅者需要的全部字段（路径 / 媒体流 / 类型 / 简介），不再逐条拉详情
+- 已处理的条目记在 emby_seen_items（kind + item_id 主键，seen_at 索引），超过 SEEN_RETENTION 的定期清理
+- 新条目依次分发给订阅者（REMUX 推送、新片公告、首播冲刺），单个订阅者出错不影响其他订阅者
+- 手动推送也写入同一张表（kind="push"），自动推送据此去重
+- 配置了 Emby Webhook 时，library.new 事件会提前唤醒轮询（trigger），定时轮询保留作对账
+
+使用方式:
+    from emby import emby_feed
+
+    async def on_new_items(bot, items):    # items 为 Emby /Items 结构的 dict 列表，按入库时间升序
+        ...
+
+    emby_feed.subscribe("remux_push", on_new_items)
+    emby_feed.start(application.bot)
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import delete, select
+from config import Config
+from database import get_session
+from database.models import BotState, EmbySeenItem
+from emby.client import EmbyClient, EmbyError, emby_client, parse_emby_date
+
+logger = logging.getLogger(__name__)
+
+FEED_TYPES = ("Movie", "Episode")
+FEED_FIELDS = "Path,Genres,Overview,OfficialRating,CommunityRating,MediaSources,ProductionYear,DateCreated"
+PAGE_LIMIT = 200
+WATERMARK_STATE_KEY = "emby_feed_watermark"
+BOOTSTRAP_LOOKBACK = timedelta(days=1)     # 首次运行时回看多久
+OVERLAP = timedelta(hours=1)               # 水位重叠窗口：晚于水位才出现在 Emby 的条目也不会漏
+SEEN_RETENTION = timedelta(days=30)
+TRIGGER_DEBOUNCE = 10                      # 收到入库事件后等待多久再轮询（合并连续事件，等 Emby 刮削完元数据）
+
+Subscriber = Callable[..., Awaitable[None]]
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _emby_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class EmbyChangeFeed:
+    """单次轮询、持久化水位、多订阅者分发的 Emby 新片变更流"""
+
+    def __init__(self, client: Optional[EmbyClient] = None, interval: Optional[int] = None):
+        self.client = client or emby_client
+        self.interval = interval or Config.EMBY_FEED_INTERVAL
+        self._subscribers: Dict[str, Subscriber] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self.stats = {"polls": 0, "requests": 0, "delivered": 0, "errors": 0, "triggered": 0}
+
+    def subscribe(self, name: str, callback: Subscriber):
+        """注册订阅者 callback(bot, items)；同名重复注册会覆盖"""
+        self._subscribers[name] = callback
+
+    # ==================== 已处理记录 ====================
+
+    def seen_ids(self, item_ids: Iterable[str], kind: str = "feed") -> Set[str]:
+        """item_ids 中已记录过的 ID"""
+        ids = [i for i in item_ids if i]
+        if not ids:
+            return set()
+        with get_session() as session:
+            return set(session.scalars(
+                select(EmbySeenItem.item_id).where(EmbySeenItem.kind == kind, EmbySeenItem.item_id.in_(ids))
+            ))
+
+    def is_seen(self, item_id: str, kind: str = "feed") -> bool:
+        return bool(self.seen_ids([item_id], kind))
+
+    def mark_seen(self, item_ids: Iterable[str], kind: str = "feed"):
+        ids = set(i for i in item_ids if i)
+        ids -= self.seen_ids(ids, kind)
+        if not ids:
+            return
+        now = _utc_now()
+        with get_session() as session:
+            session.add_all(EmbySeenItem(kind=kind, item_id=i, seen_at=now) for i in sorted(ids))
+            session.commit()
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """清理超过保留期的记录（水位早已越过这些条目）"""
+        cutoff = (now or _utc_now()) - SEEN_RETENTION
+        with get_session() as session:
+            removed = session.execute(delete(EmbySeenItem).where(EmbySeenItem.seen_at < cutoff)).rowcount
+            session.commit()
+        return removed or 0
+
+    # ==================== 水位 ====================
+
+    def watermark(self) -> Optional[datetime]:
+        with get_session() as session:
+            state = session.get(BotState, WATERMARK_STATE_KEY)
+            return datetime.fromisoformat(state.value) if state and state.value else None
+
+    def _save_watermark(self, value: datetime):
+        with get_session() as session:
+            state = session.get(BotState, WATERMARK_STATE_KEY)
+            if state is None:
+                session.add(BotState(key=WATERMARK_STATE_KEY, value=value.isoformat()))
+            else:
+                state.value = value.isoformat()
+            session.commit()
+
+    # ==================== 轮询 ====================
+
+    async def _fetch(self, since: datetime) -> List[Dict]:
+        """MinDateCreated 之后入库的条目（按入库时间升序）；通常一个请求，超过 PAGE_LIMIT 才翻页"""
+        items: List[Dict] = []
+        while True:
+            data = await self.client.get_json("/Items", {
+                "Recursive": True,
+                "IncludeItemTypes": ",".join(FEED_TYPES),
+                "Fields": FEED_FIELDS,
+                "MinDateCreated": _emby_time(since),
+                "SortBy": "DateCreated",
+                "SortOrder": "Ascending",
+                "StartIndex": len(items),
+                "Limit": PAGE_LIMIT,
+            })
+            self.stats["requests"] += 1
+            page = data.get("Items") or []
+            items.extend(page)
+            if len(page) < PAGE_LIMIT:
+                return items
+
+    async def poll(self) -> List[Dict]:
+        """拉取并记录新条目（不分发）；Emby 不可用时抛出 EmbyError，水位不动"""
+        now = _utc_now()
+        watermark = self.watermark()
+        since = (watermark - OVERLAP) if watermark else now - BOOTSTRAP_LOOKBACK
+        items = await self._fetch(since)
+        self.stats["polls"] += 1
+
+        seen = self.seen_ids(item.get("Id") for item in items)
+        fresh = [item for item in items if item.get("Id") and item["Id"] not in seen]
+        created = [parse_emby_date(item.get("DateCreated")) for item in items]
+        latest = max((c for c in created if c is not None), default=None)
+
+        self.mark_seen(item["Id"] for item in fresh)
+        # 水位不超过当前时间（Emby 时钟偏快时也不会跳过之后的条目）
+        self._save_watermark(min(max(latest, watermark or latest), now) if latest else (watermark or since))
+        return fresh
+
+    async def run_once(self, bot) -> int:
+        """轮询一次并分发给所有订阅者，返回新条目数"""
+        async with self._lock:
+            try:
+                items = await self.poll()
+            except EmbyError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"[EmbyFeed] 轮询失败: {e}")
+                return 0
+
+            if items:
+                for name, callback in list(self._subscribers.items()):
+                    try:
+                        await callback(bot, items)
+                    except Exception as e:
+                        logger.error(f"[EmbyFeed] 订阅者 {name} 处理失败: {e}")
+                self.stats["delivered"] += len(items)
+                logger.info(f"[EmbyFeed] {len(items)} 个新条目已分发给 {len(self._subscribers)} 个订阅者")
+
+            self.prune()
+            return len(items)
+
+    def trigger(self):
+        """提前唤醒后台轮询（Webhook 收到 library.new 时调用），TRIGGER_DEBOUNCE 秒内的多次触发只轮询一次"""
+        self.stats["triggered"] += 1
+        self._wake.set()
+
+    async def _loop(self, bot):
+        while True:
+            try:
+                await self.run_once(bot)
+            except Exception as e:
+                logger.error(f"[EmbyFeed] 处理出错: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+                await asyncio.sleep(TRIGGER_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self, bot):
+        """在事件循环中启动后台轮询（Emby 未配置或没有订阅者时不启动）"""
+        if self._task is not None or not self.client.configured or not self._subscribers:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop(bot))
+        logger.info(f"[EmbyFeed] 已启动: 每 {self.interval}s 轮询，订阅者 {', '.join(self._subscribers)}")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+emby_feed = EmbyChangeFeed()
@@ -0,0 +1,376 @@
+"""
+Emby 媒体库本地索引
+以前抽卡每抽都向 Emby 随机拉 50 部电影，/recommend 先查总数再按随机偏移取一条，/new 与两个新片轮询任务
+每次都实时查询最新入库并逐条拉详情；Emby 一慢这些功能全部跟着慢，Emby 一挂就全部报错。
+现在把媒体库元数据同步到本地 emby_items 表：
+
+- 首次（之后每 FULL_SYNC_INTERVAL）全量分页同步，并删除 Emby 中已不存在的条目
+- 平时按本地 DateCreated / DateModified 最大值作水位增量同步（MinDateCreated / MinDateLastSaved）
+- 随机抽样走 (type, sample_key) / (type, rating_band, sample_key) 索引，不做 ORDER BY RANDOM() 全表排序
+- 读取接口返回与 Emby /Items 相同结构的 dict，调用方的字段访问不用改；索引为空时回退实时查询 Emby
+- Emby 不可用时继续使用已同步的数据
+
+使用方式:
+    from emby import emby_library
+
+    items = await emby_library.random_items(["Movie"])                    # 随机 1 部电影
+    items = await emby_library.random_items(["Movie"], min_rating=7.5)    # 指定评分档
+    latest = await emby_library.latest_items(["Movie", "Episode"], limit=20)
+    details = emby_library.get(item_id)                                   # 只查本地，没有返回 None
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.orm import Session
+from config import Config
+from database import get_session
+from database.models import EmbyItem, BotState
+from emby.client import EmbyClient, EmbyError, emby_client, parse_emby_date
+
+logger = logging.getLogger(__name__)
+
+INDEXED_TYPES = ("Movie", "Episode")
+PAGE_SIZE = 500
+FULL_SYNC_INTERVAL = 86400                 # 全量同步间隔（秒），用于清理已删除的条目
+FULL_SYNC_STATE_KEY = "emby_library_full_sync"
+SYNC_TIMEOUT = 60
+
+# ImageTags / BackdropImageTags / SeriesName 默认就会返回
+SYNC_FIELDS = "Genres,CommunityRating,ProductionYear,DateCreated,DateModified,Overview,Path,MediaStreams"
+VIDEO_SUMMARY_KEYS = ("Width", "Height", "Codec", "VideoRange", "HdrFormat", "BitDepth")
+
+# 同步时覆盖的列（sample_key 保持不变，抽样分布不随同步抖动）
+_UPDATE_COLUMNS = (
+    "type", "name", "series_name", "year", "genres", "overview", "community_rating", "rating_band",
+    "date_created", "date_modified", "primary_image_tag", "backdrop_image_tag", "path", "media_summary",
+    "synced_at",
+)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _emby_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+# ==========================================
+# Emby dict ↔ 索引行
+# ==========================================
+
+def _video_summary(item: dict) -> Optional[dict]:
+    """首条视频流的规格摘要"""
+    streams = item.get("MediaStreams")
+    if not streams and item.get("MediaSources"):
+        streams = item["MediaSources"][0].get("MediaStreams")
+    video = next((s for s in streams or [] if s.get("Type") == "Video"), None)
+    if not video:
+        return None
+    return {k: video[k] for k in VIDEO_SUMMARY_KEYS if video.get(k)}
+
+
+def item_row(item: dict, synced_at: datetime) -> dict:
+    """Emby /Items 条目 → emby_items 行"""
+    rating = item.get("CommunityRating")
+    backdrops = item.get("BackdropImageTags") or []
+    summary = _video_summary(item)
+    return {
+        "id": item["Id"],
+        "type": item.get("Type") or "",
+        "name": item.get("Name"),
+        "series_name": item.get("SeriesName"),
+        "year": item.get("ProductionYear"),
+        "genres": json.dumps(item.get("Genres") or [], ensure_ascii=False),
+        "overview": item.get("Overview"),
+        "community_rating": rating,
+        "rating_band": int(rating) if rating else 0,
+        "date_created": parse_emby_date(item.get("DateCreated")),
+        "date_modified": parse_emby_date(item.get("DateModified")),
+        "primary_image_tag": (item.get("ImageTags") or {}).get("Primary"),
+        "backdrop_image_tag": backdrops[0] if backdrops else None,
+        "path": item.get("Path"),
+        "media_summary": json.dumps(summary) if summary else None,
+        "sample_key": random.random(),
+        "synced_at": synced_at,
+    }
+
+
+def item_dict(row: EmbyItem) -> dict:
+    """emby_items 行 → 与 Emby /Items 条目相同结构的 dict"""
+    item = {
+        "Id": row.id,
+        "Name": row.name,
+        "Type": row.type,
+        "ProductionYear": row.year,
+        "Genres": json.loads(row.genres) if row.genres else [],
+        "CommunityRating": row.community_rating,
+        "Overview": row.overview,
+        "DateCreated": _emby_time(row.date_created) if row.date_created else None,
+        "ImageTags": {"Primary": row.primary_image_tag} if row.primary_image_tag else {},
+        "BackdropImageTags": [row.backdrop_image_tag] if row.backdrop_image_tag else [],
+    }
+    if row.series_name:
+        item["SeriesName"] = row.series_name
+    if row.path:
+        item["Path"] = row.path
+    if row.media_summary:
+        item["MediaSources"] = [{"MediaStreams": [{"Type": "Video", **json.loads(row.media_summary)}]}]
+    return item
+
+
+def _upsert(session: Session, rows: List[dict]):
+    """按主键插入或覆盖"""
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(EmbyItem.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"], set_={c: stmt.excluded[c] for c in _UPDATE_COLUMNS}
+        )
+        session.connection().execute(stmt, rows)
+    else:
+        session.execute(delete(EmbyItem).where(EmbyItem.id.in_([r["id"] for r in rows])))
+        session.connection().execute(EmbyItem.__table__.insert(), rows)
+
+
+class EmbyLibrary:
+    """emby_items 的同步与查询"""
+
+    def __init__(self, client: Optional[EmbyClient] = None, interval: Optional[int] = None,
+                 page_size: int = PAGE_SIZE):
+        self.client = client or emby_client
+        self.interval = interval if interval is not None else Config.EMBY_LIBRARY_SYNC_INTERVAL
+        self.page_size = page_size
+        self._lock = asyncio.Lock()
+        self._ready = False
+        self._task: Optional[asyncio.Task] = None
+        self.size = 0
+        self.last_sync: Optional[float] = None
+        self.stats = {"full": 0, "incremental": 0, "written": 0, "removed": 0, "errors": 0,
+                      "local": 0, "fallback": 0}
+
+    @property
+    def age(self) -> Optional[float]:
+        """距上次成功同步的秒数；本进程尚未同步返回 None"""
+        return time.monotonic() - self.last_sync if self.last_sync is not None else None
+
+    def ready(self) -> bool:
+        """本地索引是否有数据（上次运行同步过的数据重启后也可直接使用）"""
+        if not self._ready:
+            with get_session() as session:
+                self._ready = session.execute(select(EmbyItem.id).limit(1)).first() is not None
+        return self._ready
+
+    # ==========================================
+    # 同步
+    # ==========================================
+
+    async def _pages(self, params: Dict[str, str]) -> AsyncIterator[List[dict]]:
+        start = 0
+        while True:
+            data = await self.client.get_json("/Items", {
+                "Recursive": True,
+                "IncludeItemTypes": ",".join(INDEXED_TYPES),
+                "Fields": SYNC_FIELDS,
+                "SortBy": "DateCreated,SortName",
+                "SortOrder": "Ascending",
+                "StartIndex": start,
+                "Limit": self.page_size,
+                **params,
+            }, timeout=SYNC_TIMEOUT)
+            items = data.get("Items") or []
+            page = [item for item in items if item.get("Id")]
+            if page:
+                yield page
+            start += len(items)
+            if len(items) < self.page_size:
+                return
+
+    def _write(self, items: List[dict], synced_at: datetime) -> int:
+        """每页一个短事务"""
+        rows = list({item["Id"]: item_row(item, synced_at) for item in items}.values())
+        with get_session() as session:
+            _upsert(session, rows)
+            session.commit()
+        self._ready = True
+        return len(rows)
+
+    async def _full_sync(self) -> int:
+        started = _utc_now()
+        written = 0
+        async for page in self._pages({}):
+            written += self._write(page, started)
+
+        with get_session() as session:
+            removed = 0
+            if written:
+                # 本轮没有写到的条目已在 Emby 中删除（空结果不清表，防止 Emby 异常时清空索引）
+                removed = session.execute(delete(EmbyItem).where(
+                    or_(EmbyItem.synced_at < started, EmbyItem.synced_at.is_(None))
+                )).rowcount
+            state = session.get(BotState, FULL_SYNC_STATE_KEY)
+            if state is None:
+                session.add(BotState(key=FULL_SYNC_STATE_KEY, value=started.isoformat()))
+            else:
+                state.value = started.isoformat()
+            session.commit()
+        self.stats["full"] += 1
+        self.stats["removed"] += removed
+        logger.info(f"[EmbyLibrary] 全量同步完成: 写入 {written} 条，删除 {removed} 条")
+        return written
+
+    async def _incremental_sync(self, created: datetime, modified: Optional[datetime]) -> int:
+        synced_at = _utc_now()
+        passes = [{"MinDateCreated": _emby_time(created)}]
+        if modified is not None:
+            passes.append({"MinDateLastSaved": _emby_time(modified)})
+        written = 0
+        for params in passes:
+            async for page in self._pages(params):
+                written += self._write(page, synced_at)
+        self.stats["incremental"] += 1
+        if written:
+            logger.debug(f"[EmbyLibrary] 增量同步写入 {written} 条")
+        return written
+
+    def _sync_plan(self):
+        """返回 (是否全量, DateCreated 水位, DateModified 水位)"""
+        with get_session() as session:
+            created, modified = session.execute(
+                select(func.max(EmbyItem.date_created), func.max(EmbyItem.date_modified))
+            ).one()
+            state = session.get(BotState, FULL_SYNC_STATE_KEY)
+        last_full = datetime.fromisoformat(state.value) if state and state.value else None
+        full = created is None or last_full is None or \
+            (_utc_now() - last_full).total_seconds() > FULL_SYNC_INTERVAL
+        return full, created, modified
+
+    async def sync(self, full: Optional[bool] = None) -> int:
+        """
+        同步一次，返回写入条数；默认按需选择全量 / 增量
+        Emby 不可用时记录错误并保留已有数据
+        """
+        if not self.client.configured:
+            return 0
+        async with self._lock:
+            due, created, modified = self._sync_plan()
+            try:
+                if full or (full is None and due) or created is None:
+                    written = await self._full_sync()
+                else:
+                    written = await self._incremental_sync(created, modified)
+            except EmbyError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"[EmbyLibrary] 同步失败，继续使用本地索引: {e}")
+                return 0
+            with get_session() as session:
+                self.size = session.execute(select(func.count()).select_from(EmbyItem)).scalar()
+        self.stats["written"] += written
+        self.last_sync = time.monotonic()
+        return written
+
+    # ==========================================
+    # 查询
+    # ==========================================
+
+    def sample(self, types: Sequence[str], limit: int = 1, min_rating: Optional[float] = None) -> List[dict]:
+        """本地随机抽样：从随机点沿 sample_key 索引顺序取 limit 条，不够再从头补"""
+        conditions = [EmbyItem.type.in_(list(types))]
+        if min_rating is not None:
+            conditions += [EmbyItem.rating_band >= int(min_rating), EmbyItem.community_rating >= min_rating]
+        key = random.random()
+        with get_session() as session:
+            query = select(EmbyItem).where(*conditions).order_by(EmbyItem.sample_key)
+            rows = list(session.scalars(query.where(EmbyItem.sample_key >= key).limit(limit)))
+            if len(rows) < limit:
+                rows += session.scalars(query.where(EmbyItem.sample_key < key).limit(limit - len(rows)))
+            return [item_dict(row) for row in rows]
+
+    async def random_items(self, types: Sequence[str], limit: int = 1,
+                           min_rating: Optional[float] = None) -> List[dict]:
+        """随机条目；本地索引为空时实时查询 Emby"""
+        if self.ready():
+            items = self.sample(types, limit, min_rating)
+            if items:
+                self.stats["local"] += 1
+                return items
+        if not self.client.configured:
+            return []
+        self.stats["fallback"] += 1
+        params = {"Recursive": True, "IncludeItemTypes": ",".join(types), "SortBy": "Random",
+                  "Limit": limit, "Fields": SYNC_FIELDS}
+        if min_rating is not None:
+            params["MinCommunityRating"] = min_rating
+        data = await self.client.get_json("/Items", params, timeout=30)
+        return data.get("Items") or []
+
+    async def latest_items(self, types: Sequence[str], limit: int = 20,
+                           since: Optional[datetime] = None) -> List[dict]:
+        """最新入库（since 为 UTC）；本地索引为空时实时查询 Emby"""
+        if self.ready():
+            self.stats["local"] += 1
+            conditions = [EmbyItem.type.in_(list(types))]
+            if since is not None:
+                conditions.append(EmbyItem.date_created >= since)
+            with get_session() as session:
+                rows = session.scalars(
+                    select(EmbyItem).where(*conditions).order_by(EmbyItem.date_created.desc()).limit(limit)
+                )
+                return [item_dict(row) for row in rows]
+        if not self.client.configured:
+            return []
+        self.stats["fallback"] += 1
+        params = {"Recursive": True, "IncludeItemTypes": ",".join(types), "SortBy": "DateCreated",
+                  "SortOrder": "Descending", "Limit": limit, "Fields": SYNC_FIELDS}
+        if since is not None:
+            params["MinDateCreated"] = _emby_time(since)
+        data = await self.client.get_json("/Items", params)
+        return data.get("Items") or []
+
+    def get(self, item_id: str) -> Optional[dict]:
+        """按 ID 查本地索引"""
+        with get_session() as session:
+            row = session.get(EmbyItem, item_id)
+            return item_dict(row) if row else None
+
+    # ==========================================
+    # 后台同步
+    # ==========================================
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                # 数据库错误、异常的返回数据等：记录后下一轮继续，不让后台同步就此停止
+                self.stats["errors"] += 1
+                logger.error(f"[EmbyLibrary] 同步出错: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """启动后台定时同步（需在事件循环中调用）"""
+        if self._task is not None or not self.client.configured:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        logger.info(f"[EmbyLibrary] 已启动: 每 {self.interval}s 增量同步媒体库")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+emby_library = EmbyLibrary()
@@ -0,0 +1,81 @@
+"""
+Emby 已看数量统计
+/watch_stats、/watch_achievements 与观影成就检查以前请求 Filters=IsPlayed&Limit=10000，再在本地数 Items
+数组得到电影 / 剧集数，重度用户每条命令要下载几 MB JSON。现在改为：
+
+- 每种类型一个 Limit=0 请求，只读 TotalRecordCount（两种类型并发请求）
+- 按 Emby 用户缓存，EMBY_PLAYED_COUNT_TTL 秒后过期；观影奖励采集发现新播放时主动失效
+- 刷新失败时返回过期的旧值（没有旧值才抛出 EmbyError）
+
+使用方式:
+    from emby import played_counts
+
+    counts = await played_counts.get(emby_user_id)     # {"Movie": 12, "Episode": 340}
+    played_counts.invalidate(emby_user_id)              # 有新播放时
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+from config import Config
+from emby.client import EmbyClient, EmbyError, emby_client
+
+logger = logging.getLogger(__name__)
+
+COUNTED_TYPES = ("Movie", "Episode")
+
+
+class PlayedCountCache:
+    """按 Emby 用户缓存的已看电影 / 剧集数量"""
+
+    def __init__(self, client: Optional[EmbyClient] = None, ttl: Optional[int] = None):
+        self.client = client or emby_client
+        self.ttl = ttl if ttl is not None else Config.EMBY_PLAYED_COUNT_TTL
+        self._entries: Dict[str, Tuple[Dict[str, int], float]] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _count(self, emby_user_id: str, item_type: str) -> int:
+        data = await self.client.get_json(f"/Users/{emby_user_id}/Items", {
+            "Filters": "IsPlayed",
+            "Recursive": True,
+            "IncludeItemTypes": item_type,
+            "Limit": 0,
+        })
+        return int(data.get("TotalRecordCount") or 0)
+
+    async def fetch(self, emby_user_id: str) -> Dict[str, int]:
+        """不经缓存直接查询"""
+        totals = await asyncio.gather(*(self._count(emby_user_id, t) for t in COUNTED_TYPES))
+        return dict(zip(COUNTED_TYPES, totals))
+
+    async def get(self, emby_user_id: str) -> Dict[str, int]:
+        """已看数量 {"Movie": n, "Episode": m}"""
+        entry = self._entries.get(emby_user_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.stats["hits"] += 1
+            return entry[0]
+
+        self.stats["misses"] += 1
+        try:
+            counts = await self.fetch(emby_user_id)
+        except EmbyError as e:
+            if entry is None:
+                raise
+            self.stats["stale"] += 1
+            logger.warning(f"[PlayedCounts] 刷新 {emby_user_id} 失败，使用旧值: {e}")
+            return entry[0]
+        self._entries[emby_user_id] = (counts, time.monotonic())
+        return counts
+
+    def invalidate(self, emby_user_id: Optional[str] = None):
+        """失效某个用户（不传则全部）的缓存"""
+        if emby_user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(emby_user_id, None)
+
+
+played_counts = PlayedCountCache()
@@ -0,0 +1,193 @@
+"""
+Emby 海报缓存
+新片推送（/push、推送按钮、自动检查）以前每次都从 Emby 下载完整海报，写进临时文件再用阻塞的 open() 读回来
+上传，发完删掉；同一部片常被自动和手动各推一次，海报就要下载、上传两遍。现在：
+
+- 海报按 (条目 ID, 图片 tag) 存在 POSTER_CACHE_DIR，文件名是键的哈希；tag 变了就是新海报
+- 磁盘缓存按 POSTER_CACHE_MB 做 LRU 淘汰，文件读写放到线程里，不阻塞事件循环
+- 首次上传后记下 Telegram 返回的 file_id（存 bot_state），之后推送直接发 file_id，不再传任何字节
+- 上传直接用内存中的 bytes，不经过临时文件
+
+使用方式:
+    from emby import poster_cache
+
+    msg = await poster_cache.send_photo(bot, chat_id, item_id, tag, caption=..., parse_mode='HTML')
+    if msg is None:     # 拿不到海报
+        msg = await bot.send_message(...)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+from telegram.error import BadRequest
+from config import Config
+from database import get_session
+from database.models import BotState
+from emby.client import EmbyClient, EmbyError, emby_client
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_KEY_PREFIX = "poster_file_id:"
+
+
+def poster_key(item_id: str, tag: Optional[str]) -> str:
+    return f"{item_id}:{tag or ''}"
+
+
+class PosterCache:
+    """海报字节的磁盘 LRU + Telegram file_id 复用"""
+
+    def __init__(self, client: Optional[EmbyClient] = None, directory: Optional[str] = None,
+                 max_bytes: Optional[int] = None):
+        self.client = client or emby_client
+        self.directory = directory or Config.POSTER_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.POSTER_CACHE_MB * 1024 * 1024
+        self._files: Optional["OrderedDict[str, int]"] = None    # 文件名 -> 字节数，按最近使用排序
+        self._file_ids: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self.stats = {"file_id": 0, "disk": 0, "download": 0, "uploaded_bytes": 0, "evicted": 0}
+
+    @property
+    def size(self) -> int:
+        return sum(self._files.values()) if self._files else 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".jpg")
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        """启动后第一次使用时按修改时间恢复 LRU 顺序"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        return OrderedDict((name, size) for _, name, size in entries)
+
+    async def _index(self) -> "OrderedDict[str, int]":
+        if self._files is None:
+            self._files = await asyncio.to_thread(self._scan)
+        return self._files
+
+    # ==================== 字节缓存 ====================
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write(self, path: str, data: bytes, evict: list):
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        for name in evict:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    async def get_bytes(self, item_id: str, tag: Optional[str] = None) -> Optional[bytes]:
+        """海报字节：先查磁盘缓存，没有再从 Emby 下载并写入缓存；下载失败返回 None"""
+        path = self._path(poster_key(item_id, tag))
+        name = os.path.basename(path)
+        files = await self._index()
+
+        if name in files:
+            data = await asyncio.to_thread(self._read, path)
+            if data is not None:
+                files.move_to_end(name)
+                self.stats["disk"] += 1
+                return data
+            files.pop(name, None)
+
+        params = {"tag": tag} if tag else None
+        try:
+            data = await self.client.get_bytes(f"/Items/{item_id}/Images/Primary", params)
+        except EmbyError as e:
+            logger.warning(f"[Posters] 下载海报失败 {item_id}: {e}")
+            return None
+        self.stats["download"] += 1
+
+        async with self._lock:
+            files[name] = len(data)
+            files.move_to_end(name)
+            evict = []
+            total = sum(files.values())
+            while total > self.max_bytes and len(files) > 1:
+                old, old_size = files.popitem(last=False)
+                evict.append(old)
+                total -= old_size
+            self.stats["evicted"] += len(evict)
+            try:
+                await asyncio.to_thread(self._write, path, data, evict)
+            except OSError as e:
+                files.pop(name, None)
+                logger.warning(f"[Posters] 写入海报缓存失败: {e}")
+        return data
+
+    # ==================== Telegram file_id ====================
+
+    def file_id(self, item_id: str, tag: Optional[str] = None) -> Optional[str]:
+        key = poster_key(item_id, tag)
+        if key not in self._file_ids:
+            with get_session() as session:
+                state = session.get(BotState, FILE_ID_KEY_PREFIX + key)
+                if state is None:
+                    return None
+                self._file_ids[key] = state.value
+        return self._file_ids[key]
+
+    def remember_file_id(self, item_id: str, tag: Optional[str], file_id: Optional[str]):
+        """记录（file_id 为 None 时删除）某张海报在 Telegram 上的 file_id"""
+        key = poster_key(item_id, tag)
+        with get_session() as session:
+            state = session.get(BotState, FILE_ID_KEY_PREFIX + key)
+            if file_id is None:
+                self._file_ids.pop(key, None)
+                if state is not None:
+                    session.delete(state)
+            elif state is None:
+                session.add(BotState(key=FILE_ID_KEY_PREFIX + key, value=file_id))
+            else:
+                state.value = file_id
+            if file_id is not None:
+                self._file_ids[key] = file_id
+            session.commit()
+
+    async def send_photo(self, bot, chat_id: int, item_id: str, tag: Optional[str] = None, **kwargs):
+        """
+        发送海报：有 file_id 直接复用，否则上传内存中的字节并记下返回的 file_id
+
+        Returns:
+            发出的 Message；拿不到海报时返回 None（由调用方改发纯文本）
+        """
+        file_id = self.file_id(item_id, tag)
+        if file_id:
+            try:
+                msg = await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+                self.stats["file_id"] += 1
+                return msg
+            except BadRequest as e:
+                # file_id 失效（换了 bot token 等），重新上传
+                logger.info(f"[Posters] file_id 失效，重新上传 {item_id}: {e}")
+                self.remember_file_id(item_id, tag, None)
+
+        data = await self.get_bytes(item_id, tag)
+        if data is None:
+            return None
+        msg = await bot.send_photo(chat_id=chat_id, photo=data, **kwargs)
+        self.stats["uploaded_bytes"] += len(data)
+        if msg.photo:
+            self.remember_file_id(item_id, tag, msg.photo[-1].file_id)
+        return msg
+
+
+poster_cache = PosterCache()
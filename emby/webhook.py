@@ -0,0 +1,130 @@
+"""
+Emby Webhook 接收端
+新片公告与观影奖励原本只能靠轮询发现（新片变更流每 EMBY_FEED_INTERVAL 秒、观影奖励每小时扫描全部绑定用户）。
+Emby 可以在事件发生时 POST library.new / playback.stop，这里内嵌一个可选的 aiohttp 端点：
+
+- EMBY_WEBHOOK_PORT 非 0 且配置了 EMBY_WEBHOOK_SECRET 时随 Bot 启动，与 Bot 共用事件循环
+- 共享密钥放在 URL 的 ?token= 或请求头 X-Webhook-Secret 中，恒定时间比较
+- 同时接受 application/json 与 Emby Webhooks 插件的 multipart/form-data（data 字段）
+- 收到后立即返回 204，事件交给订阅的处理函数在后台执行；轮询保留作对账兜底
+
+使用方式:
+    from emby import emby_webhook
+
+    async def on_playback_stop(event):     # event 为 Emby 推送的 JSON（含 Event / Item / User）
+        ...
+
+    emby_webhook.on("playback.stop", on_playback_stop)
+    await emby_webhook.start()
+
+Emby 端配置（设置 → 通知 → Webhooks）:
+    http://<bot 主机>:<EMBY_WEBHOOK_PORT><EMBY_WEBHOOK_PATH>?token=<EMBY_WEBHOOK_SECRET>
+"""
+import asyncio
+import hmac
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from aiohttp import web
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class EmbyWebhookServer:
+    """校验共享密钥、解析 Emby 事件并分发给订阅者的内嵌 HTTP 端点"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 path: Optional[str] = None, secret: Optional[str] = None):
+        self.host = host or Config.EMBY_WEBHOOK_HOST
+        self.port = port if port is not None else Config.EMBY_WEBHOOK_PORT
+        self.path = path or Config.EMBY_WEBHOOK_PATH
+        self.secret = secret if secret is not None else Config.EMBY_WEBHOOK_SECRET
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.bound_port: Optional[int] = None
+        self.stats = {"received": 0, "rejected": 0, "ignored": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.port) and bool(self.secret)
+
+    def on(self, event: str, handler: Handler):
+        """订阅事件（如 library.new / playback.stop），同一事件可有多个处理函数"""
+        self._handlers.setdefault(event, []).append(handler)
+
+    def _authorized(self, request: web.Request) -> bool:
+        token = request.query.get("token") or request.headers.get("X-Webhook-Secret") or ""
+        return hmac.compare_digest(token.encode(), self.secret.encode())
+
+    @staticmethod
+    async def _parse(request: web.Request) -> Optional[dict]:
+        try:
+            if request.content_type == "application/json":
+                return await request.json()
+            form = await request.post()
+            data = form.get("data")
+            return json.loads(data) if isinstance(data, str) else None
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    async def _dispatch(self, handler: Handler, event: dict):
+        try:
+            await handler(event)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"[EmbyWebhook] 处理 {event.get('Event')} 失败: {e}")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            self.stats["rejected"] += 1
+            return web.Response(status=401)
+
+        event = await self._parse(request)
+        if not isinstance(event, dict) or not event.get("Event"):
+            return web.Response(status=400)
+
+        handlers = self._handlers.get(event["Event"])
+        if not handlers:
+            self.stats["ignored"] += 1
+            return web.Response(status=204)
+
+        self.stats["received"] += 1
+        for handler in handlers:
+            task = asyncio.get_running_loop().create_task(self._dispatch(handler, event))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return web.Response(status=204)
+
+    async def start(self):
+        """启动 HTTP 端点（未配置端口或密钥时不启动）"""
+        if self._runner is not None:
+            return
+        if not self.port:
+            return
+        if not self.secret:
+            logger.warning("[EmbyWebhook] 未配置 EMBY_WEBHOOK_SECRET，不启动 Webhook 端点")
+            return
+
+        app = web.Application(client_max_size=1024 * 1024)
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.bound_port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"[EmbyWebhook] 已启动: {self.host}:{self.bound_port}{self.path}，"
+                    f"订阅事件 {', '.join(self._handlers) or '无'}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+emby_webhook = EmbyWebhookServer()
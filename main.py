@@ -11,10 +11,22 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from config import Config
 from app_config import BOT_COMMANDS
+from database.checkpoint import checkpoint_manager
+from database.counters import counter_store
+from database.leaderboard import leaderboards
+from database.migrate import ensure_schema, SchemaOutdatedError
+from emby import emby_client, emby_directory, emby_feed, emby_library, emby_webhook
+from messaging import OrderedUpdateProcessor, auto_deleter, broadcaster, edit_coalescer, send_queue
 
 # 加载配置
 Config.validate()
 
+# 数据库版本检查：版本一致时只读一行，落后时自动执行迁移（DB_AUTO_MIGRATE=false 时直接退出）
+try:
+    ensure_schema()
+except SchemaOutdatedError as e:
+    sys.exit(f"❌ {e}")
+
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
@@ -53,11 +65,90 @@ async def post_init(application: ApplicationBuilder) -> None:
     except Exception as e:
         print(f"⚠️ 设置命令菜单失败: {e}")
 
+    # 排行榜预热：一次扫描建好内存排行，之后随写入增量更新
+    print(f"✅ 排行榜已预热（{await leaderboards.warm_async()} 位已绑定用户）")
+
+    # 出站消息队列（全局 / 每聊天限速 + 优先级通道）
+    send_queue.start()
+    # 继续上次停止时未发完的全员广播
+    broadcaster.start(application.bot)
+    # 群消息自毁调度（恢复上次未删除的消息）
+    auto_deleter.start(application.bot)
+
+    # 活跃度/聊天任务计数定期写回
+    counter_store.start()
+
+    # SQLite WAL 后台 checkpoint
+    checkpoint_manager.start()
+
+    # Emby 共享连接池（长连接 + 相同请求合并）
+    emby_client.start()
+    # Emby 用户目录后台刷新（用户名 ↔ ID）
+    emby_directory.start()
+    # Emby 媒体库本地索引（抽卡 / 推荐 / 新片读本地）
+    emby_library.start()
+    # Emby 新片变更流（REMUX 推送 / 新片公告共用一次轮询）
+    emby_feed.start(application.bot)
+    # Emby Webhook 接收端（可选，EMBY_WEBHOOK_PORT 非 0 时启用）
+    await emby_webhook.start()
+
+
+async def post_stop(application: ApplicationBuilder) -> None:
+    """停止接收更新后、Bot 连接关闭前：尽量发完已排队的出站消息"""
+    # 广播先停（撤回未发出的部分并记下游标，下次启动续传），再排空发送队列
+    await broadcaster.stop()
+    # 合并中的消息编辑立即发出，让推送显示最终的领取状态
+    await edit_coalescer.stop()
+    await send_queue.stop()
+    # 未到期的自毁记录落库，下次启动继续删除
+    await auto_deleter.stop()
+
+
+async def post_shutdown(application: ApplicationBuilder) -> None:
+    """Bot 关闭时的清理回调"""
+    await emby_webhook.stop()
+    await emby_feed.stop()
+    await emby_library.stop()
+    await emby_directory.stop()
+    await emby_client.close()
+    # 先写回内存中的计数，再做 checkpoint
+    await counter_store.stop()
+    # 关闭前 TRUNCATE checkpoint，把 WAL 合并回主库
+    await checkpoint_manager.stop()
+    print("✅ 数据库已安全落盘")
+
+def build_application():
+    return (
+        ApplicationBuilder()
+        .token(Config.BOT_TOKEN)
+        # 更新并发处理：同一用户的更新按到达顺序依次处理，其余并行，慢处理器不再拖住所有人
+        .concurrent_updates(OrderedUpdateProcessor())
+        # Bot API 连接池：长连接复用；并发处理 + 发送队列同时发请求时，池满多等一会儿而不是直接超时
+        .connection_pool_size(Config.BOT_POOL_SIZE)
+        .pool_timeout(Config.BOT_POOL_TIMEOUT)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+
 if __name__ == '__main__':
     print("🪄 正在唤醒云海看板娘...")
-    app = ApplicationBuilder().token(Config.BOT_TOKEN).post_init(post_init).build()
+    app = build_application()
 
     load_plugins(app)
 
-    print("✅ 魔法阵启动成功！Bot is running...")
-    app.run_polling()
+    if Config.BOT_WEBHOOK_URL:
+        # Webhook 模式：本地端口只收反向代理转发的请求，启动时向 Telegram 注册公网地址
+        print(f"✅ 魔法阵启动成功！Webhook 监听 {Config.BOT_WEBHOOK_LISTEN}:{Config.BOT_WEBHOOK_PORT}/{Config.BOT_WEBHOOK_PATH}")
+        app.run_webhook(
+            listen=Config.BOT_WEBHOOK_LISTEN,
+            port=Config.BOT_WEBHOOK_PORT,
+            url_path=Config.BOT_WEBHOOK_PATH,
+            webhook_url=Config.BOT_WEBHOOK_URL,
+            secret_token=Config.BOT_WEBHOOK_SECRET or None,
+        )
+    else:
+        print("✅ 魔法阵启动成功！Bot is running...")
+        app.run_polling()
@@ -0,0 +1,16 @@
+"""
+Telegram 消息层：出站发送队列 / 广播 / 自毁 / 编辑合并，以及入站更新的并发调度
+"""
+from messaging.outbound import SendQueue, TokenBucket, send_queue, INTERACTIVE, NORMAL, BROADCAST
+from messaging.broadcast import BroadcastEngine, broadcaster, render_progress, clear_blocked
+from messaging.deletions import DeletionScheduler, auto_deleter
+from messaging.edits import EditCoalescer, edit_coalescer
+from messaging.updates import OrderedUpdateProcessor
+
+__all__ = [
+    "SendQueue", "TokenBucket", "send_queue", "INTERACTIVE", "NORMAL", "BROADCAST",
+    "BroadcastEngine", "broadcaster", "render_progress", "clear_blocked",
+    "DeletionScheduler", "auto_deleter",
+    "EditCoalescer", "edit_coalescer",
+    "OrderedUpdateProcessor",
+]
@@ -0,0 +1,293 @@
+"""
+可续传的全员广播
+/say 以前一次把全部 UserBinding 读进内存、逐个串行发送，最后只报成功 / 失败数；中途重启进度全丢，再发一次就会重复。
+现在每次广播是一条 broadcast_jobs 记录：
+
+- 按 tg_id 升序 keyset 分页取收件人（tg_id > 游标，每批 BATCH_SIZE 人），不把全表读进内存
+- 每批经发送队列的广播通道并发发送，限速与 flood wait 重试由队列负责
+- 每批结束写回游标与计数；暂停 / 取消 / Bot 停止时撤回还没发出的消息，游标停在连续送达的最后一个用户，
+  重启后从游标继续，已送达的用户不会再收到
+- 管理员的进度消息每 PROGRESS_INTERVAL 秒刷新一次，带暂停 / 继续 / 取消按钮
+- 发送时返回 Forbidden（屏蔽了 Bot / 账号注销）的用户记下 bindings.bot_blocked_at，之后的广播直接跳过；
+  用户再次 /start 时清除
+
+使用方式:
+    from messaging import broadcaster
+
+    job = broadcaster.create(admin_id, chat_id, text)
+    broadcaster.launch(bot, job.id)
+
+    await broadcaster.pause(job.id)
+    broadcaster.resume(bot, job.id)
+    await broadcaster.cancel(job.id)
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select, update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, TelegramError
+from database import get_session
+from database.models import BroadcastJob, UserBinding
+from messaging.outbound import SendQueue, send_queue, BROADCAST, NORMAL
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+PROGRESS_INTERVAL = 3.0
+WITHDRAW_TIMEOUT = 10                 # 暂停 / 停止时最多等待正在发送的消息多久
+
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+
+STATUS_LABELS = {RUNNING: "📤 发送中", PAUSED: "⏸️ 已暂停", CANCELLED: "🛑 已取消", DONE: "✅ 已完成"}
+
+
+def clear_blocked(tg_id: int):
+    """用户重新和 Bot 对话（/start）后恢复接收广播"""
+    with get_session() as session:
+        session.execute(
+            update(UserBinding)
+            .where(UserBinding.tg_id == tg_id, UserBinding.bot_blocked_at.is_not(None))
+            .values(bot_blocked_at=None)
+        )
+        session.commit()
+
+
+def render_progress(job: BroadcastJob) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """进度消息的文本与按钮"""
+    done = job.sent + job.failed + job.blocked
+    percent = done / job.total * 100 if job.total else 100
+    text = (
+        f"🗣️ <b>【 全员广播 #{job.id} 】</b>\n\n"
+        f"{STATUS_LABELS.get(job.status, job.status)}  {done}/{job.total}（{percent:.0f}%）\n"
+        f"━━━━━━━━━━━━━━━━━━\n"
+        f"✅ 成功：{job.sent}\n"
+        f"❌ 失败：{job.failed}\n"
+        f"🚫 已屏蔽 Bot：{job.blocked}"
+    )
+    if job.status == RUNNING:
+        buttons = [[InlineKeyboardButton("⏸️ 暂停", callback_data=f"bcast_pause:{job.id}"),
+                    InlineKeyboardButton("🛑 取消", callback_data=f"bcast_cancel:{job.id}")]]
+    elif job.status == PAUSED:
+        buttons = [[InlineKeyboardButton("▶️ 继续", callback_data=f"bcast_resume:{job.id}"),
+                    InlineKeyboardButton("🛑 取消", callback_data=f"bcast_cancel:{job.id}")]]
+    else:
+        return text, None
+    return text, InlineKeyboardMarkup(buttons)
+
+
+class BroadcastEngine:
+    """广播任务的创建、分批发送、进度持久化与暂停 / 继续 / 取消"""
+
+    def __init__(self, queue: Optional[SendQueue] = None, batch_size: int = BATCH_SIZE,
+                 progress_interval: float = PROGRESS_INTERVAL):
+        self.queue = queue or send_queue
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    # ==================== 任务记录 ====================
+
+    def create(self, admin_id: int, chat_id: int, text: str) -> BroadcastJob:
+        """新建广播任务（收件人数为当前未屏蔽 Bot 的用户数）"""
+        with get_session() as session:
+            total = session.scalar(
+                select(func.count()).select_from(UserBinding).where(UserBinding.bot_blocked_at.is_(None))
+            )
+            job = BroadcastJob(admin_id=admin_id, chat_id=chat_id, text=text, status=RUNNING, total=total or 0,
+                               sent=0, failed=0, blocked=0)
+            session.add(job)
+            session.commit()
+            return job
+
+    def get(self, job_id: int) -> Optional[BroadcastJob]:
+        with get_session() as session:
+            return session.get(BroadcastJob, job_id)
+
+    def attach_message(self, job_id: int, message_id: int):
+        """记录进度消息，之后发送过程中会刷新它"""
+        self._update(job_id, message_id=message_id)
+
+    def _update(self, job_id: int, **values) -> Optional[BroadcastJob]:
+        with get_session() as session:
+            job = session.get(BroadcastJob, job_id)
+            if job is None:
+                return None
+            for key, value in values.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.now()
+            session.commit()
+            return job
+
+    def _next_batch(self, cursor: Optional[int]) -> List[int]:
+        stmt = select(UserBinding.tg_id).where(UserBinding.bot_blocked_at.is_(None))
+        if cursor is not None:
+            stmt = stmt.where(UserBinding.tg_id > cursor)
+        with get_session() as session:
+            return list(session.scalars(stmt.order_by(UserBinding.tg_id).limit(self.batch_size)))
+
+    def _save_batch(self, job_id: int, recipients: List[int], futures: List[asyncio.Future]):
+        """
+        按收件人顺序统计已有结果的连续前缀，写回计数与游标；
+        前缀之后的消息（被撤回或还没轮到）下次从游标继续时重新发送
+        """
+        cursor = None
+        sent = failed = 0
+        blocked = []
+        contiguous = True
+        for tg_id, future in zip(recipients, futures):
+            contiguous = contiguous and future.done() and not future.cancelled()
+            if not contiguous:
+                if future.done() and not future.cancelled():
+                    future.exception()   # 取走结果，避免 "exception was never retrieved" 日志
+                continue
+            error = future.exception()
+            if error is None:
+                sent += 1
+            elif isinstance(error, Forbidden):
+                blocked.append(tg_id)
+            else:
+                failed += 1
+            cursor = tg_id
+        if cursor is None:
+            return
+
+        now = datetime.now()
+        with get_session() as session:
+            if blocked:
+                session.execute(
+                    update(UserBinding).where(UserBinding.tg_id.in_(blocked)).values(bot_blocked_at=now)
+                )
+            job = session.get(BroadcastJob, job_id)
+            job.cursor = cursor
+            job.sent += sent
+            job.failed += failed
+            job.blocked += len(blocked)
+            job.updated_at = now
+            session.commit()
+
+    # ==================== 发送 ====================
+
+    async def _report(self, bot, job_id: int):
+        """刷新管理员的进度消息；编辑失败（消息已删除、内容未变）不影响发送"""
+        job = self.get(job_id)
+        if job is None or not job.message_id:
+            return
+        text, markup = render_progress(job)
+        try:
+            await self.queue.submit(job.chat_id, lambda: bot.edit_message_text(
+                text, chat_id=job.chat_id, message_id=job.message_id, reply_markup=markup, parse_mode='HTML'
+            ), lane=NORMAL)
+        except TelegramError as e:
+            logger.debug(f"[Broadcast] 更新进度消息失败: {e}")
+
+    async def _run(self, bot, job_id: int):
+        reported = time.monotonic()
+        while True:
+            job = self.get(job_id)
+            if job is None or job.status != RUNNING:
+                return
+            recipients = self._next_batch(job.cursor)
+            if not recipients:
+                break
+
+            def send(tg_id: int):
+                return lambda: bot.send_message(chat_id=tg_id, text=job.text, parse_mode='HTML')
+
+            futures = [asyncio.ensure_future(self.queue.submit(tg_id, send(tg_id), lane=BROADCAST))
+                       for tg_id in recipients]
+            try:
+                await asyncio.wait(futures)
+            except asyncio.CancelledError:
+                # 暂停 / 取消 / 停止：撤回还没发出的消息；正在发送的等它出结果，免得续传时重复发送
+                in_flight = self.queue.withdraw(futures)
+                if in_flight:
+                    await asyncio.wait(in_flight, timeout=WITHDRAW_TIMEOUT)
+                raise
+            finally:
+                self._save_batch(job_id, recipients, futures)
+
+            if time.monotonic() - reported >= self.progress_interval:
+                reported = time.monotonic()
+                await self._report(bot, job_id)
+
+        job = self._update(job_id, status=DONE, finished_at=datetime.now())
+        logger.info(f"[Broadcast] #{job_id} 完成: 成功 {job.sent}，失败 {job.failed}，屏蔽 {job.blocked}")
+        await self._report(bot, job_id)
+
+    def launch(self, bot, job_id: int):
+        """在后台发送任务（同一任务只会有一个发送协程）"""
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.get_running_loop().create_task(self._run(bot, job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda t: self._finished(job_id, t))
+
+    def _finished(self, job_id: int, task: asyncio.Task):
+        if self._tasks.get(job_id) is task:
+            del self._tasks[job_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[Broadcast] #{job_id} 发送出错: {task.exception()}")
+
+    async def _halt(self, job_id: int):
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # ==================== 管理操作 ====================
+
+    async def pause(self, job_id: int) -> Optional[BroadcastJob]:
+        """暂停发送中的任务；返回更新后的任务，状态不对时返回 None"""
+        job = self.get(job_id)
+        if job is None or job.status != RUNNING:
+            return None
+        self._update(job_id, status=PAUSED)
+        await self._halt(job_id)
+        return self.get(job_id)
+
+    def resume(self, bot, job_id: int) -> Optional[BroadcastJob]:
+        """从游标继续已暂停的任务"""
+        job = self.get(job_id)
+        if job is None or job.status != PAUSED:
+            return None
+        job = self._update(job_id, status=RUNNING)
+        self.launch(bot, job_id)
+        return job
+
+    async def cancel(self, job_id: int) -> Optional[BroadcastJob]:
+        """取消发送中或已暂停的任务"""
+        job = self.get(job_id)
+        if job is None or job.status not in (RUNNING, PAUSED):
+            return None
+        self._update(job_id, status=CANCELLED, finished_at=datetime.now())
+        await self._halt(job_id)
+        return self.get(job_id)
+
+    # ==================== 生命周期 ====================
+
+    def start(self, bot):
+        """继续上次停止时仍在发送的任务"""
+        with get_session() as session:
+            job_ids = list(session.scalars(select(BroadcastJob.id).where(BroadcastJob.status == RUNNING)))
+        for job_id in job_ids:
+            self.launch(bot, job_id)
+        if job_ids:
+            logger.info(f"[Broadcast] 继续 {len(job_ids)} 个未完成的广播: {job_ids}")
+
+    async def stop(self):
+        """停止发送（状态保持 running，下次启动从游标继续）；需在发送队列停止之前调用"""
+        for job_id in list(self._tasks):
+            await self._halt(job_id)
+
+
+broadcaster = BroadcastEngine()
@@ -0,0 +1,231 @@
+"""
+群消息自毁调度器
+以前 reply_with_auto_delete / send_with_auto_delete / edit_with_auto_delete / smart_reply 每发一条群消息就
+create_task 一个睡 MESSAGE_DELETE_DELAY 秒再删除的协程：热闹的群里同时挂着成千上万个协程，
+重启时全部丢失，旧消息就永远留在群里。现在所有自毁请求交给一个调度器：
+
+- 一个按到期时间排序的堆 + 一个后台任务，只在最早的到期时间（再加 BATCH_WINDOW）醒来
+- 同一聊天在这段时间内到期的消息合并为 deleteMessages 调用（每次最多 MAX_BATCH 条）
+- 待删除记录写入 pending_deletions 表（每 FLUSH_INTERVAL 秒批量写一次，短于此的自毁不落库），
+  重启后继续删除；超过 MAX_OVERDUE 的记录直接丢弃（Telegram 不允许 Bot 删除 48 小时前的群消息）
+
+使用方式:
+    from messaging import auto_deleter
+
+    auto_deleter.schedule(message.chat_id, message.message_id, delay=30)
+
+    # Bot 启动 / 关闭时
+    auto_deleter.start(application.bot)
+    await auto_deleter.stop()
+"""
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, insert, select
+from telegram.error import RetryAfter, TelegramError
+from database import get_session
+from database.models import PendingDeletion
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 100                          # deleteMessages 单次最多 100 条
+BATCH_WINDOW = 1.0                       # 最早到期后再等这么久，期间到期的一起删（同群每秒最多一次调用）
+FLUSH_INTERVAL = 5                       # 新的待删除记录多久批量落库一次
+MAX_OVERDUE = timedelta(hours=48)        # 过期太久的记录已无法删除，启动时丢弃
+CONCURRENCY = 8                          # 同时进行的 deleteMessages 请求数
+DB_CHUNK = 500
+
+Key = Tuple[int, int]
+
+
+class DeletionScheduler:
+    """单个后台任务驱动的消息自毁调度（到期时间堆 + 批量删除 + 持久化）"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int]] = []     # (到期时间戳, chat_id, message_id)，可能含过时条目
+        self._due: Dict[Key, float] = {}                   # 每条消息当前的到期时间
+        self._unsaved: Dict[Key, float] = {}               # 还没落库的记录
+        self._persisted: Set[Key] = set()                  # 已落库的记录
+        self._next_flush = 0.0
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self.stats = {"scheduled": 0, "deleted": 0, "calls": 0, "failed": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._due)
+
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        """delay 秒后删除消息；同一条消息重复调度时以较早的到期时间为准"""
+        now = time.time()
+        due = now + delay
+        key = (chat_id, message_id)
+        current = self._due.get(key)
+        if current is not None and current <= due:
+            return
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, chat_id, message_id))
+        if not self._unsaved:
+            self._next_flush = now + FLUSH_INTERVAL
+            self._wake.set()
+        self._unsaved[key] = due
+        self.stats["scheduled"] += 1
+        if self._heap[0][0] == due:
+            self._wake.set()
+
+    # ==================== 持久化 ====================
+
+    def flush(self) -> int:
+        """把新的待删除记录写入数据库，返回写入条数"""
+        if not self._unsaved:
+            return 0
+        entries, self._unsaved = self._unsaved, {}
+        rows = [{"chat_id": c, "message_id": m, "due_at": datetime.fromtimestamp(due)}
+                for (c, m), due in entries.items()]
+        with get_session() as session:
+            self._delete_rows(session, [k for k in entries if k in self._persisted])
+            for start in range(0, len(rows), DB_CHUNK):
+                session.execute(insert(PendingDeletion), rows[start:start + DB_CHUNK])
+            session.commit()
+        self._persisted.update(entries)
+        return len(rows)
+
+    @staticmethod
+    def _delete_rows(session, keys: List[Key]):
+        by_chat: Dict[int, List[int]] = {}
+        for chat_id, message_id in keys:
+            by_chat.setdefault(chat_id, []).append(message_id)
+        for chat_id, ids in by_chat.items():
+            for start in range(0, len(ids), DB_CHUNK):
+                session.execute(delete(PendingDeletion).where(
+                    PendingDeletion.chat_id == chat_id, PendingDeletion.message_id.in_(ids[start:start + DB_CHUNK])
+                ))
+
+    def _forget(self, keys: List[Key]):
+        """删除完成（或放弃）的记录从数据库移除"""
+        stored = []
+        for key in keys:
+            self._unsaved.pop(key, None)
+            if key in self._persisted:
+                self._persisted.discard(key)
+                stored.append(key)
+        if stored:
+            with get_session() as session:
+                self._delete_rows(session, stored)
+                session.commit()
+
+    def load(self) -> int:
+        """从数据库恢复上次未完成的删除（启动时调用），返回恢复条数"""
+        cutoff = datetime.now() - MAX_OVERDUE
+        with get_session() as session:
+            session.execute(delete(PendingDeletion).where(PendingDeletion.due_at < cutoff))
+            rows = session.execute(
+                select(PendingDeletion.chat_id, PendingDeletion.message_id, PendingDeletion.due_at)
+            ).all()
+            session.commit()
+        for chat_id, message_id, due_at in rows:
+            key = (chat_id, message_id)
+            due = due_at.timestamp()
+            self._persisted.add(key)
+            if key not in self._due or due < self._due[key]:
+                self._due[key] = due
+                heapq.heappush(self._heap, (due, chat_id, message_id))
+        return len(rows)
+
+    # ==================== 删除 ====================
+
+    def _pop_due(self, now: float) -> Dict[int, List[int]]:
+        by_chat: Dict[int, List[int]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            due, chat_id, message_id = heapq.heappop(self._heap)
+            key = (chat_id, message_id)
+            if self._due.get(key) != due:
+                continue   # 已被更早的调度取代
+            del self._due[key]
+            by_chat.setdefault(chat_id, []).append(message_id)
+        return by_chat
+
+    async def _delete_chunk(self, chat_id: int, ids: List[int], limit: asyncio.Semaphore):
+        async with limit:
+            try:
+                await self._bot.delete_messages(chat_id, ids)
+                self.stats["calls"] += 1
+                self.stats["deleted"] += len(ids)
+            except RetryAfter as e:
+                ra = e.retry_after
+                retry = ra.total_seconds() if hasattr(ra, "total_seconds") else ra
+                for message_id in ids:
+                    self.schedule(chat_id, message_id, retry)
+            except TelegramError as e:
+                # 消息已被删除、Bot 不再是管理员等：放弃
+                self.stats["failed"] += len(ids)
+                logger.debug(f"[AutoDelete] 删除 chat {chat_id} 的 {len(ids)} 条消息失败: {e}")
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """删除所有已到期的消息，返回处理条数"""
+        by_chat = self._pop_due(now if now is not None else time.time())
+        if not by_chat:
+            return 0
+        limit = asyncio.Semaphore(CONCURRENCY)
+        await asyncio.gather(*(
+            self._delete_chunk(chat_id, ids[start:start + MAX_BATCH], limit)
+            for chat_id, ids in by_chat.items()
+            for start in range(0, len(ids), MAX_BATCH)
+        ))
+        done = [(c, m) for c, ids in by_chat.items() for m in ids if (c, m) not in self._due]
+        self._forget(done)
+        return sum(len(ids) for ids in by_chat.values())
+
+    # ==================== 生命周期 ====================
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_due()
+                if self._unsaved and time.time() >= self._next_flush:
+                    self.flush()
+            except Exception as e:
+                logger.error(f"[AutoDelete] 处理出错: {e}")
+
+            now = time.time()
+            timeout = self._heap[0][0] + BATCH_WINDOW - now if self._heap else None
+            if self._unsaved:
+                flush_in = self._next_flush - now
+                timeout = flush_in if timeout is None else min(timeout, flush_in)
+            # 定时器直接置位唤醒事件，不像 wait_for 那样每次等待再建一个任务
+            timer = asyncio.get_running_loop().call_later(max(timeout, 0), self._wake.set) \
+                if timeout is not None else None
+            try:
+                await self._wake.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def start(self, bot):
+        """恢复持久化的待删除记录并启动后台任务（需在事件循环中调用）"""
+        if self._task is not None:
+            return
+        self._bot = bot
+        restored = self.load()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        if restored:
+            logger.info(f"[AutoDelete] 恢复 {restored} 条待删除消息")
+
+    async def stop(self):
+        """停止后台任务，把还没落库的记录写入数据库（下次启动继续删除）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+
+auto_deleter = DeletionScheduler()
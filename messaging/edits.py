@@ -0,0 +1,182 @@
+"""
+消息编辑合并器
+有奖推送每来一个领取者，check_reply_reward 就用 build_updated_caption 重建整段文案，先 edit_message_caption、
+失败再 edit_message_text 编辑一次；热门推送几十人同时回复时，大部分编辑刚发出就被下一次覆盖，
+白白消耗群组限额（约 20 条/分钟）并触发 flood wait，文本推送每次还要先失败一次 caption 编辑。现在：
+
+- 调用方每次变更只登记渲染回调，业务状态（领取记录、积分）照常立即生效
+- 每条消息的第一次更新立即编辑，之后最多每 MESSAGE_EDIT_INTERVAL 秒编辑一次，渲染的是编辑那一刻的最新状态；
+  中间被取代的更新直接丢弃，渲染结果与上次相同时不编辑
+- 记住每条消息是 caption（图片 / 视频）还是文本：未知时先试 caption，失败改用文本并记住，之后不再重复失败的尝试；
+  两种都失败（消息已删除等）的消息标记为不可编辑
+- 编辑经发送队列，计入全局 / 每聊天限速
+
+使用方式:
+    from messaging import edit_coalescer
+
+    edit_coalescer.request(bot, chat_id, message_id, lambda: render(state), is_photo=True)
+    if not edit_coalescer.editable(chat_id, message_id):
+        ...   # 回退为发送新消息
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+from telegram.error import BadRequest, TelegramError
+from config import Config
+from messaging.outbound import SendQueue, send_queue, NORMAL
+
+logger = logging.getLogger(__name__)
+
+CAPTION = "caption"
+TEXT = "text"
+UNEDITABLE = "uneditable"
+
+MAX_ENTRIES = 1000            # 超过这么多条消息时回收闲置的记录
+IDLE_SECONDS = 3600
+
+Key = Tuple[int, int]
+
+
+class _Entry:
+    __slots__ = ("bot", "render", "mode", "last_text", "last_edit", "timer", "task", "dirty")
+
+    def __init__(self, mode: Optional[str]):
+        self.bot = None
+        self.render: Optional[Callable[[], str]] = None
+        self.mode = mode
+        self.last_text: Optional[str] = None
+        self.last_edit = float("-inf")
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None
+        self.dirty = False
+
+    @property
+    def idle(self) -> bool:
+        return self.timer is None and self.task is None
+
+
+class EditCoalescer:
+    """按消息合并编辑：立即登记、按间隔只编辑最新内容"""
+
+    def __init__(self, interval: Optional[float] = None, queue: Optional[SendQueue] = None):
+        self.interval = interval if interval is not None else Config.MESSAGE_EDIT_INTERVAL
+        self.queue = queue or send_queue
+        self._entries: Dict[Key, _Entry] = {}
+        self.stats = {"requested": 0, "edited": 0, "unchanged": 0, "fallback": 0, "failed": 0}
+
+    def editable(self, chat_id: int, message_id: int) -> bool:
+        entry = self._entries.get((chat_id, message_id))
+        return entry is None or entry.mode != UNEDITABLE
+
+    def request(self, bot, chat_id: int, message_id: int, render: Callable[[], str],
+                is_photo: Optional[bool] = None):
+        """
+        登记一次更新：render() 在真正编辑时才调用，返回消息的完整新文本（HTML）
+        is_photo: 消息是否为带 caption 的媒体消息，None 表示未知（先试 caption）
+        """
+        key = (chat_id, message_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= MAX_ENTRIES:
+                self._prune()
+            entry = self._entries[key] = _Entry(None if is_photo is None else (CAPTION if is_photo else TEXT))
+        if entry.mode == UNEDITABLE:
+            return
+        self.stats["requested"] += 1
+        entry.bot = bot
+        entry.render = render
+        entry.dirty = True
+        self._schedule(key, entry)
+
+    def forget(self, chat_id: int, message_id: int):
+        entry = self._entries.pop((chat_id, message_id), None)
+        if entry is not None and entry.timer is not None:
+            entry.timer.cancel()
+
+    def _prune(self):
+        cutoff = time.monotonic() - IDLE_SECONDS
+        for key in [k for k, e in self._entries.items() if e.idle and e.last_edit < cutoff]:
+            del self._entries[key]
+
+    # ==================== 编辑 ====================
+
+    def _schedule(self, key: Key, entry: _Entry):
+        # 已排定或正在编辑：那次编辑结束后会再按最新状态编辑
+        if not entry.idle:
+            return
+        delay = max(0.0, entry.last_edit + self.interval - time.monotonic())
+        entry.timer = asyncio.get_running_loop().call_later(delay, self._fire, key, entry)
+
+    def _fire(self, key: Key, entry: _Entry):
+        entry.timer = None
+        entry.task = asyncio.get_running_loop().create_task(self._flush(key, entry))
+
+    async def _flush(self, key: Key, entry: _Entry):
+        try:
+            entry.dirty = False
+            text = entry.render()
+            if text == entry.last_text:
+                self.stats["unchanged"] += 1
+                return
+            if await self._edit(key, entry, text):
+                entry.last_text = text
+            entry.last_edit = time.monotonic()
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"[EditCoalescer] 编辑消息 {key} 出错: {e}")
+        finally:
+            entry.task = None
+            if entry.dirty and entry.mode != UNEDITABLE and self._entries.get(key) is entry:
+                self._schedule(key, entry)
+
+    async def _edit(self, key: Key, entry: _Entry, text: str) -> bool:
+        chat_id, message_id = key
+        bot = entry.bot
+        for mode in ([entry.mode] if entry.mode else [CAPTION, TEXT]):
+            if mode == CAPTION:
+                def send():
+                    return bot.edit_message_caption(chat_id=chat_id, message_id=message_id,
+                                                    caption=text, parse_mode='HTML')
+            else:
+                def send():
+                    return bot.edit_message_text(chat_id=chat_id, message_id=message_id,
+                                                 text=text, parse_mode='HTML')
+            try:
+                await self.queue.submit(chat_id, send, lane=NORMAL)
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    entry.mode = mode
+                    return True
+                error = e
+                continue
+            except TelegramError as e:
+                # 限流重试用尽、网络错误：保留模式，下次更新再试
+                self.stats["failed"] += 1
+                logger.warning(f"[EditCoalescer] 编辑消息 {key} 失败: {e}")
+                return False
+            if entry.mode is None and mode == TEXT:
+                self.stats["fallback"] += 1
+            entry.mode = mode
+            self.stats["edited"] += 1
+            return True
+
+        entry.mode = UNEDITABLE
+        self.stats["failed"] += 1
+        logger.warning(f"[EditCoalescer] 消息 {key} 无法编辑，不再尝试: {error}")
+        return False
+
+    # ==================== 生命周期 ====================
+
+    async def stop(self):
+        """立即执行所有已排定的编辑（关闭前让消息显示最终状态）；需在发送队列停止之前调用"""
+        for key, entry in list(self._entries.items()):
+            if entry.timer is not None:
+                entry.timer.cancel()
+                self._fire(key, entry)
+        tasks = [e.task for e in self._entries.values() if e.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+edit_coalescer = EditCoalescer()
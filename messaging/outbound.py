@@ -0,0 +1,285 @@
+"""
+出站消息发送队列
+/say 以前逐个用户串行 send_message，成就炫耀直接 create_task 发送，全都不限速；一旦触发 Telegram 的
+flood wait（RetryAfter），后面的消息全部静默失败。现在所有出站消息经过一个随 Bot 启停的队列：
+
+- 全局令牌桶（SEND_RATE_PER_SECOND，默认 30 条/秒）+ 每个聊天一个令牌桶
+  （私聊约 1 条/秒、群组约 20 条/分钟，与 Telegram 的限制一致）
+- 聊天令牌按“预约”发放：某个聊天还没轮到时任务延后重新入队，不占用发送协程，其他聊天照常发送
+- 收到 RetryAfter 时全局暂停对应秒数，并把这条消息重新排队；网络错误有限次重试
+- 固定数量的发送协程（SEND_QUEUE_CONCURRENCY）并发发送
+- 优先级通道：交互回复 > 普通通知 > 广播，广播排得再长也不会拖慢命令回复
+
+使用方式:
+    from messaging import send_queue, BROADCAST
+
+    msg = await send_queue.submit(chat_id, lambda: bot.send_message(chat_id, text))      # 等待发送结果
+    send_queue.post(chat_id, lambda: bot.send_message(chat_id, text))                    # 发出即忘，失败只记日志
+    results = await asyncio.gather(*(send_queue.submit(uid, ..., lane=BROADCAST) for uid in ids),
+                                   return_exceptions=True)
+
+队列未启动时（脚本、测试）submit 直接发送，post 直接创建任务，行为与以前一致。
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 优先级通道（数值越小越先发）
+INTERACTIVE = 0
+NORMAL = 1
+BROADCAST = 2
+
+PRIVATE_RATE, PRIVATE_BURST = 1.0, 3          # 私聊：约 1 条/秒
+GROUP_RATE, GROUP_BURST = 20 / 60, 3          # 群组：约 20 条/分钟
+MAX_ATTEMPTS = 3                              # RetryAfter / 网络错误最多重试次数
+NETWORK_BACKOFF = 1.0
+MAX_CHAT_BUCKETS = 10000                      # 聊天令牌桶超过这么多个时回收已回满的
+BUCKET_PRUNE_INTERVAL = 60                    # 回收最多每分钟扫描一次（每来一个新聊天都扫一遍，大广播会变成平方级）
+
+Send = Callable[[], Awaitable[Any]]
+
+
+class TokenBucket:
+    """令牌桶；reserve() 立即扣一个令牌（可以欠账），返回需要等待的秒数，保证预约顺序即发送顺序"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        self._refill(now if now is not None else time.monotonic())
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def pause(self, seconds: float, now: Optional[float] = None):
+        """接下来 seconds 秒内不再发放令牌"""
+        self._refill(now if now is not None else time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class _Job:
+    __slots__ = ("chat_id", "send", "future", "reserved", "attempts")
+
+    def __init__(self, chat_id: int, send: Send, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.send = send
+        self.future = future
+        self.reserved = False
+        self.attempts = 0
+
+
+class SendQueue:
+    """带全局 / 每聊天令牌桶与优先级通道的出站消息队列"""
+
+    def __init__(self, rate: Optional[float] = None, concurrency: Optional[int] = None,
+                 private_rate: float = PRIVATE_RATE, group_rate: float = GROUP_RATE):
+        rate = rate or Config.SEND_RATE_PER_SECOND
+        self.concurrency = concurrency or Config.SEND_QUEUE_CONCURRENCY
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self._global = TokenBucket(rate, 1)           # 不留突发额度：任意 1 秒窗口内最多 rate + 1 条
+        self._chats: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._delayed: Dict[asyncio.TimerHandle, _Job] = {}
+        self._open: set = set()                # 尚未有结果的任务
+        self._sending: set = set()             # 正在调用 send() 的任务（已无法撤回）
+        self._seq = itertools.count()
+        self._next_prune = 0.0
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "flood_waits": 0, "deferred": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def pending(self) -> int:
+        """排队中、延后中与发送中的消息数"""
+        return len(self._open)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            now = time.monotonic()
+            if len(self._chats) > MAX_CHAT_BUCKETS and now >= self._next_prune:
+                self._prune_buckets(now)
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, GROUP_BURST)
+            else:
+                bucket = TokenBucket(self.private_rate, PRIVATE_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self, now: float):
+        """已回满的令牌桶与新建的等价，直接回收"""
+        self._next_prune = now + BUCKET_PRUNE_INTERVAL
+        for chat_id in [c for c, b in self._chats.items()
+                        if b.tokens + (now - b.updated) * b.rate >= b.capacity]:
+            del self._chats[chat_id]
+
+    # ==================== 入队 ====================
+
+    def _enqueue(self, lane: int, job: _Job):
+        self._queue.put_nowait((lane, next(self._seq), job))
+
+    def _enqueue_later(self, delay: float, lane: int, job: _Job):
+        self.stats["deferred"] += 1
+        handle = None
+
+        def fire():
+            self._delayed.pop(handle, None)
+            if self._queue is not None:
+                self._enqueue(lane, job)
+
+        handle = asyncio.get_running_loop().call_later(delay, fire)
+        self._delayed[handle] = job
+
+    def submit(self, chat_id: int, send: Send, lane: int = NORMAL) -> Awaitable[Any]:
+        """排队发送，返回可等待的发送结果（发送失败时抛出对应异常）"""
+        if not self.running:
+            return send()
+        future = asyncio.get_running_loop().create_future()
+        self._open.add(future)
+        future.add_done_callback(self._open.discard)
+        self._enqueue(lane, _Job(chat_id, send, future))
+        return future
+
+    def post(self, chat_id: int, send: Send, lane: int = NORMAL):
+        """排队发送，不等待结果；失败只记日志"""
+        if not self.running:
+            asyncio.get_running_loop().create_task(send())
+            return
+        future = self.submit(chat_id, send, lane)
+        future.add_done_callback(self._log_failure)
+
+    def withdraw(self, futures) -> list:
+        """撤回还没开始发送的消息（以 CancelledError 结束），返回正在发送、已无法撤回的那些"""
+        in_flight = []
+        for future in futures:
+            if future.done():
+                continue
+            if future in self._sending:
+                in_flight.append(future)
+            else:
+                future.cancel()
+        return in_flight
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"[SendQueue] 消息发送失败: {future.exception()}")
+
+    # ==================== 发送 ====================
+
+    async def _worker(self):
+        while True:
+            lane, _, job = await self._queue.get()
+            try:
+                await self._process(lane, job)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, lane: int, job: _Job):
+        if job.future.done():
+            return
+        if not job.reserved:
+            job.reserved = True
+            delay = self._chat_bucket(job.chat_id).reserve()
+            if delay > 0:
+                self._enqueue_later(delay, lane, job)
+                return
+
+        delay = self._global.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        job.attempts += 1
+        self._sending.add(job.future)
+        try:
+            result = await job.send()
+        except RetryAfter as e:
+            ra = e.retry_after
+            seconds = ra.total_seconds() if hasattr(ra, "total_seconds") else ra
+            self.stats["flood_waits"] += 1
+            self._global.pause(seconds)
+            self._chat_bucket(job.chat_id).pause(seconds)
+            logger.warning(f"[SendQueue] 触发 flood wait，暂停 {seconds}s（chat {job.chat_id}）")
+            self._retry(lane, job, e, delay=0)
+        except BadRequest as e:
+            self._fail(job, e)
+        except NetworkError as e:
+            self._retry(lane, job, e, delay=NETWORK_BACKOFF * job.attempts)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._sending.discard(job.future)
+
+    def _retry(self, lane: int, job: _Job, error: Exception, delay: float):
+        if job.attempts >= MAX_ATTEMPTS:
+            self._fail(job, error)
+            return
+        self.stats["retried"] += 1
+        job.reserved = False
+        if delay > 0:
+            self._enqueue_later(delay, lane, job)
+        else:
+            self._enqueue(lane, job)
+
+    def _fail(self, job: _Job, error: Exception):
+        self.stats["failed"] += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """在事件循环中启动发送协程"""
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"[SendQueue] 已启动: 全局 {self._global.rate:g} 条/秒，{self.concurrency} 个发送协程")
+
+    async def stop(self, timeout: float = 10):
+        """最多等待 timeout 秒发完已排队的消息，然后停止；没发出去的消息以 CancelledError 结束"""
+        if not self.running:
+            return
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for handle, job in self._delayed.items():
+            handle.cancel()
+            job.future.cancel()
+        self._delayed.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job.future.cancel()
+        self._queue = None
+
+
+send_queue = SendQueue()
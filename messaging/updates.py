@@ -0,0 +1,90 @@
+"""
+入站更新调度
+Application 默认逐条处理更新：一个慢处理器（/watch_stats 等 Emby 请求、gift_mp 逐个 get_chat_member）
+会让后面所有人的消息一起排队。这里换成并发处理，同时保留同一用户的顺序：
+
+- 同一用户（没有用户的更新按聊天，如频道消息）的更新按到达顺序依次处理，互不相关的更新并行
+- 私聊的聊天 ID 就是用户 ID，私聊内的顺序同样保留；群组里不同成员的消息互不等待
+- 最多 UPDATE_CONCURRENCY 个处理器同时运行；排队等待同一用户前序更新的不占并发名额
+
+使用方式:
+    from messaging import OrderedUpdateProcessor
+
+    app = ApplicationBuilder().token(...).concurrent_updates(OrderedUpdateProcessor()).build()
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = 10000       # 同时在调度中的更新数上限（超出时 Application 暂缓分发）
+
+
+def update_key(update: object) -> Optional[int]:
+    """决定更新顺序的键：用户 ID，没有用户时用聊天 ID；都没有（如投票状态）则不限顺序"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """同键串行、异键并行的更新处理器"""
+
+    def __init__(self, concurrency: Optional[int] = None):
+        # 父类的信号量只限制调度中的更新总数，真正的并发数由 _slots 在排到队之后再限制，
+        # 否则同一用户连发的更新排队时会占满并发名额
+        super().__init__(MAX_PENDING)
+        self.concurrency = concurrency or Config.UPDATE_CONCURRENCY
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._tails: Dict[int, asyncio.Future] = {}        # 每个键最后一条更新的完成信号
+        self.stats = {"processed": 0, "queued": 0, "errors": 0}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_key(update)
+        previous = done = None
+        if key is not None:
+            previous = self._tails.get(key)
+            done = asyncio.get_running_loop().create_future()
+            self._tails[key] = done
+        try:
+            if previous is not None and not previous.done():
+                self.stats["queued"] += 1
+                # 用 wait 而不是直接 await：本更新被取消时不能连带取消前序的完成信号
+                await asyncio.wait([previous])
+            async with self._slots:
+                await coroutine
+        except asyncio.CancelledError:
+            if asyncio.iscoroutine(coroutine):
+                coroutine.close()
+            raise
+        except Exception as e:
+            # Application.process_update 已自行处理处理器异常，这里只兜底
+            self.stats["errors"] += 1
+            logger.error(f"[Updates] 处理更新出错: {e}")
+        finally:
+            self.stats["processed"] += 1
+            if done is not None:
+                if previous is not None and not previous.done():
+                    # 排队时被取消：后续更新仍要等前序处理完
+                    previous.add_done_callback(lambda _: self._release(key, done))
+                else:
+                    self._release(key, done)
+
+    def _release(self, key: int, done: asyncio.Future):
+        done.set_result(None)
+        if self._tails.get(key) is done:
+            del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -9,7 +9,13 @@ import random
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.ledger import credit, credit_async
+from database.user_sets import (
+    get_user_set, user_set_contains, add_to_user_set, user_set_contains_async, add_to_user_set_async
+)
 from utils import reply_with_auto_delete
+from messaging import send_queue
 from datetime import datetime
 
 # ==========================================
@@ -571,6 +577,10 @@ async def broadcast_achievement_unlock(user: UserBinding, achievement: dict, con
         logging.getLogger(__name__).warning(f"广播成就失败: {e}")
 
 
+def _not_awarded() -> dict:
+    return {"new": False, "reward": 0, "name": "", "title": "", "emoji": "", "broadcasted": False}
+
+
 def check_and_award_achievement(user: UserBinding, achievement_id: str, session=None, context=None, chat_id=None) -> dict:
     """
     检查并颁发成就
@@ -579,32 +589,61 @@ def check_and_award_achievement(user: UserBinding, achievement_id: str, session=
     Args:
         user: 用户对象
         achievement_id: 成就ID
-        session: 数据库session
+        session: 数据库session（成就记录与奖励在同一事务中，由调用方提交）
         context: Telegram context (用于广播)
         chat_id: 触发成就的聊天ID (用于发送炫耀消息)
     """
     if achievement_id not in ACHIEVEMENTS:
-        return {"new": False, "reward": 0, "name": "", "title": "", "emoji": "", "broadcasted": False}
+        return _not_awarded()
 
-    # 检查是否已完成
-    completed = set(user.achievements.split(",")) if user.achievements else set()
-    if achievement_id in completed:
-        return {"new": False, "reward": 0, "name": "", "title": "", "emoji": "", "broadcasted": False}
+    # 检查是否已完成（user_achievements 主键查询）
+    if user_set_contains(user.tg_id, "achievement", achievement_id, session):
+        return _not_awarded()
 
     # 检查条件（如果定义了check函数）
     achievement = ACHIEVEMENTS[achievement_id]
     if "check" in achievement and not achievement["check"](user):
-        return {"new": False, "reward": 0, "name": "", "title": "", "emoji": "", "broadcasted": False}
+        return _not_awarded()
 
-    # 颁发成就
-    completed.add(achievement_id)
-    user.achievements = ",".join(filter(None, completed))
+    # 颁发成就（并发重复触发时只有一次插入成功，只发一次奖励）
+    if not add_to_user_set(user.tg_id, "achievement", [achievement_id], session):
+        return _not_awarded()
 
     # 发放奖励
-    reward = achievement["reward"]
     if achievement["reward_type"] == "points":
-        user.points += reward
+        credit(user.tg_id, achievement["reward"], f"成就 {achievement_id}", session=session)
+
+    return _awarded(user, achievement, context, chat_id)
+
+
+async def check_and_award_achievement_async(user: UserBinding, achievement_id: str, session: AsyncSession,
+                                            context=None, chat_id=None) -> dict:
+    """
+    check_and_award_achievement 的异步版本（如异步签到）：
+    成就记录与奖励都写在调用方的 AsyncSession 中，随调用方一起提交或回滚
+    """
+    if achievement_id not in ACHIEVEMENTS:
+        return _not_awarded()
+
+    if await user_set_contains_async(user.tg_id, "achievement", achievement_id, session):
+        return _not_awarded()
+
+    achievement = ACHIEVEMENTS[achievement_id]
+    if "check" in achievement and not achievement["check"](user):
+        return _not_awarded()
+
+    if not await add_to_user_set_async(user.tg_id, "achievement", [achievement_id], session):
+        return _not_awarded()
+
+    if achievement["reward_type"] == "points":
+        await credit_async(user.tg_id, achievement["reward"], f"成就 {achievement_id}", session=session)
+
+    return _awarded(user, achievement, context, chat_id)
 
+
+def _awarded(user: UserBinding, achievement: dict, context=None, chat_id=None) -> dict:
+    """新颁发成就的返回结果；群聊中触发的重要成就顺带发送炫耀消息"""
+    reward = achievement["reward"]
     result = {
         "new": True,
         "reward": reward,
@@ -643,9 +682,8 @@ def check_and_award_achievement(user: UserBinding, achievement_id: str, session=
                 txt += "━━━━━━━━━━━━━━━━━━\n"
                 txt += "<i>\"太厉害了！大家快来膜拜喵~\"</i>"
 
-                # 发送到群聊
-                import asyncio
-                asyncio.create_task(context.bot.send_message(chat_id=chat_id, text=txt, parse_mode='HTML'))
+                # 发送到群聊（经发送队列限速，失败只记日志）
+                send_queue.post(chat_id, lambda: context.bot.send_message(chat_id=chat_id, text=txt, parse_mode='HTML'))
                 result["broadcasted"] = True
         except Exception as e:
             import logging
@@ -666,7 +704,7 @@ def check_all_achievements(user: UserBinding, session=None, context=None, chat_i
         chat_id: 触发检查的聊天ID (用于发送炫耀消息)
     """
     new_achievements = []
-    completed = set(user.achievements.split(",")) if user.achievements else set()
+    completed = get_user_set(user.tg_id, "achievement", session)
 
     for ach_id, achievement in ACHIEVEMENTS.items():
         if ach_id in completed:
@@ -679,9 +717,9 @@ def check_all_achievements(user: UserBinding, session=None, context=None, chat_i
     return new_achievements
 
 
-def get_achievement_progress(user: UserBinding) -> dict:
+def get_achievement_progress(user: UserBinding, session=None) -> dict:
     """获取用户成就进度"""
-    completed = set(user.achievements.split(",")) if user.achievements else set()
+    completed = get_user_set(user.tg_id, "achievement", session) & ACHIEVEMENTS.keys()
 
     # 统计
     by_category = {}
@@ -704,9 +742,9 @@ def get_achievement_progress(user: UserBinding) -> dict:
     }
 
 
-def get_user_titles(user: UserBinding) -> list:
+def get_user_titles(user: UserBinding, session=None) -> list:
     """获取用户已解锁的称号列表"""
-    completed = set(user.achievements.split(",")) if user.achievements else set()
+    completed = get_user_set(user.tg_id, "achievement", session)
     titles = []
 
     for ach_id in completed:
@@ -716,18 +754,19 @@ def get_user_titles(user: UserBinding) -> list:
     return titles
 
 
-def get_next_achievements(user: UserBinding, limit: int = 3) -> list:
+def get_next_achievements(user: UserBinding, limit: int = 3, session=None) -> list:
     """
     获取用户即将解锁的成就（进度提示）
 
     Args:
         user: 用户对象
         limit: 返回数量限制
+        session: 数据库session（可选）
 
     Returns:
         即将解锁的成就列表，包含进度信息
     """
-    completed = set(user.achievements.split(",")) if user.achievements else set()
+    completed = get_user_set(user.tg_id, "achievement", session)
     next_achievements = []
 
     # 计算每个未完成成就的进度
@@ -919,9 +958,9 @@ async def achievement_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if new_achievements:
             session.commit()
 
-        completed = set(user.achievements.split(",")) if user.achievements else set()
-        progress = get_achievement_progress(user)
-        titles = get_user_titles(user)
+        completed = get_user_set(user.tg_id, "achievement", session)
+        progress = get_achievement_progress(user, session)
+        titles = get_user_titles(user, session)
 
         vip_badge = " 👑" if user.is_vip else ""
 
@@ -947,7 +986,7 @@ async def achievement_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
             txt += "━━━━━━━━━━━━━━━━━━\n"
 
         # [新增] 即将解锁的成就
-        next_achievements = get_next_achievements(user, limit=3)
+        next_achievements = get_next_achievements(user, limit=3, session=session)
         if next_achievements:
             txt += f"\n🎯 <b>【 即 将 解 锁 】</b>\n"
             for ach in next_achievements:
@@ -1001,7 +1040,7 @@ async def achievement_titles(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await reply_with_auto_delete(msg, "💔 <b>请先绑定账号喵！</b>")
             return
 
-        titles = get_user_titles(user)
+        titles = get_user_titles(user, session)
         vip_badge = " 👑" if user.is_vip else ""
 
         txt = (
@@ -8,7 +8,8 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from database import get_session, UserBinding
-from utils import edit_with_auto_delete
+from database.ledger import credit
+from utils import edit_with_auto_delete, reply_with_auto_delete
 from datetime import datetime, timedelta
 import random
 import asyncio
@@ -115,17 +116,17 @@ async def airdrop_expire(chat_id: int, delay: int):
     """空投过期任务"""
     await asyncio.sleep(delay)
 
-    if chat_id in ACTIVE_AIRDROPS:
-        data = ACTIVE_AIRDROPS[chat_id]
-        if data["expiry"] <= datetime.now():
-            try:
-                await data["msg"].edit_text(
-                    f"💨 <b>【 宝 箱 消 失 了 】</b>\n\n没有人捡到这个宝箱...",
-                    parse_mode='HTML'
-                )
-            except Exception:
-                pass
-            del ACTIVE_AIRDROPS[chat_id]
+    data = ACTIVE_AIRDROPS.get(chat_id)
+    if data and data["expiry"] <= datetime.now():
+        # 先移除再编辑消息：编辑期间的点击直接看到宝箱已消失
+        del ACTIVE_AIRDROPS[chat_id]
+        try:
+            await data["msg"].edit_text(
+                f"💨 <b>【 宝 箱 消 失 了 】</b>\n\n没有人捡到这个宝箱...",
+                parse_mode='HTML'
+            )
+        except Exception:
+            pass
 
 
 async def airdrop_open_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -136,17 +137,16 @@ async def airdrop_open_callback(update: Update, context: ContextTypes.DEFAULT_TY
     chat_id = query.message.chat.id
     user_id = query.from_user.id
 
-    # 检查空投是否存在
-    if chat_id not in ACTIVE_AIRDROPS:
+    # 检查空投是否存在（旧空投消息上的按钮不能打开当前的宝箱）
+    data = ACTIVE_AIRDROPS.get(chat_id)
+    if not data or data["msg"].message_id != query.message.message_id:
         await query.edit_message_text("💨 <b>宝箱已消失...</b>", parse_mode='HTML')
         return
 
-    data = ACTIVE_AIRDROPS[chat_id]
-
     # 检查是否过期
     if data["expiry"] <= datetime.now():
-        await query.edit_message_text("💨 <b>宝箱已过期...</b>", parse_mode='HTML')
         del ACTIVE_AIRDROPS[chat_id]
+        await query.edit_message_text("💨 <b>宝箱已过期...</b>", parse_mode='HTML')
         return
 
     # 检查是否已打开
@@ -154,14 +154,17 @@ async def airdrop_open_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.answer("你已经打开过这个宝箱了！", show_alert=True)
         return
 
-    # 标记为已打开（第一个打开的人获得）
+    # 先取走宝箱再读库 / await：第一个点击的人独占，之后的点击都看到宝箱已消失
+    del ACTIVE_AIRDROPS[chat_id]
     data["opened_by"].add(user_id)
 
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user_id).first()
 
         if not u or not u.emby_account:
-            await query.edit_message_text("💔 <b>请先绑定账号才能领取宝箱！</b>", parse_mode='HTML')
+            # 未绑定不能领取，宝箱放回去留给其他人
+            ACTIVE_AIRDROPS.setdefault(chat_id, data)
+            await query.answer("💔 请先绑定账号才能领取宝箱！", show_alert=True)
             return
 
         reward = data["reward"]
@@ -172,18 +175,14 @@ async def airdrop_open_callback(update: Update, context: ContextTypes.DEFAULT_TY
         if u.is_vip:
             bonus = int(reward * 0.5)
             total = reward + bonus
-            u.points += total
             vip_text = f"👑 <b>VIP加成：</b> +{bonus} MP\n"
         else:
             total = reward
-            u.points += reward
             vip_text = ""
+        credit(user_id, total, "空投宝箱", session=session)
 
         session.commit()
 
-        # 删除空投
-        del ACTIVE_AIRDROPS[chat_id]
-
         txt = (
             f"{chest_emoji} <b>【 宝 箱 已 开 启 】</b>\n"
             f"━━━━━━━━━━━━━━━━━━\n"
@@ -6,6 +6,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import bank_deposit, bank_withdraw
 from utils import reply_with_auto_delete, edit_with_auto_delete
 from datetime import datetime, timedelta, timezone
 
@@ -65,7 +66,7 @@ async def bank_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = session.query(UserBinding).filter_by(tg_id=user_id).first()
 
         if not user or not user.emby_account:
-            await reply_for_callback(update, "💔 <b>【 魔 法 契 约 丢 失 】</b>\n请先使用 <code>/bind</code> 缔结契约喵！")
+            await reply_with_auto_delete(msg, "💔 <b>【 魔 法 契 约 丢 失 】</b>\n请先使用 <code>/bind</code> 缔结契约喵！")
             return
 
         total = user.points + user.bank_points
@@ -133,18 +134,17 @@ async def deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if amount <= 0:
             raise ValueError
     except:
-        await reply_for_callback(update, "⚠️ <b>魔法咒语念错啦喵！</b>\n示例：<code>/deposit 100</code>")
+        await reply_with_auto_delete(msg, "⚠️ <b>魔法咒语念错啦喵！</b>\n示例：<code>/deposit 100</code>")
         return
 
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user.id).first()
 
-        if not u or u.points < amount:
-            await reply_for_callback(update, f"💸 <b>魔力不足喵！</b>\n\n钱包里只有 {u.points if u else 0} MP~")
+        # SQL 端校验余额并划转，防止并发重复存入
+        balances = bank_deposit(user.id, amount, session=session) if u else None
+        if balances is None:
+            await reply_with_auto_delete(msg, f"💸 <b>魔力不足喵！</b>\n\n钱包里只有 {u.points if u else 0} MP~")
             return
-
-        u.points -= amount
-        u.bank_points += amount
         session.commit()
 
         # 追踪任务进度
@@ -172,14 +172,14 @@ async def withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if amount <= 0:
             raise ValueError
     except:
-        await reply_for_callback(update, "⚠️ <b>魔法咒语念错啦喵！</b>\n示例：<code>/withdraw 100</code>")
+        await reply_with_auto_delete(msg, "⚠️ <b>魔法咒语念错啦喵！</b>\n示例：<code>/withdraw 100</code>")
         return
 
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user.id).first()
 
         if not u or u.bank_points < amount:
-            await reply_for_callback(update, f"🏦 <b>金库魔力不足喵！</b>\n\n金库里只有 {u.bank_points if u else 0} MP~")
+            await reply_with_auto_delete(msg, f"🏦 <b>金库魔力不足喵！</b>\n\n金库里只有 {u.bank_points if u else 0} MP~")
             return
 
         # 计算并结算利息
@@ -193,8 +193,11 @@ async def withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         fee = 0 if u.is_vip else int(amount * 0.05)
         actual = amount - fee
-        u.bank_points -= amount
-        u.points += actual + total_interest  # 取款金额 + 利息
+        # 取款金额 + 利息（SQL 端校验金库余额）
+        if bank_withdraw(user.id, amount, fee=fee, bonus=total_interest, session=session) is None:
+            session.rollback()
+            await reply_with_auto_delete(msg, f"🏦 <b>金库魔力不足喵！</b>\n\n金库里只有 {u.bank_points} MP~")
+            return
         session.commit()
 
         # 追踪任务进度
@@ -241,9 +244,7 @@ async def bank_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if query.data == "bank_dep_all":
             amount = u.points
-            if amount > 0:
-                u.points = 0
-                u.bank_points += amount
+            if amount > 0 and bank_deposit(user_id, amount, session=session) is not None:
                 session.commit()
                 await edit_with_auto_delete(
                     query,
@@ -272,8 +273,10 @@ async def bank_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             fee = 0 if u.is_vip else int(amount * 0.05)
             actual = amount - fee
-            u.bank_points = 0
-            u.points += actual + total_interest
+            if bank_withdraw(user_id, amount, fee=fee, bonus=total_interest, session=session) is None:
+                session.rollback()
+                await edit_with_auto_delete(query, "🏦 <b>金库余额已变动，请重试喵！</b>")
+                return
             session.commit()
 
             interest_text = f"\n💰 <b>利息收入：</b> +{total_interest} MP" if total_interest > 0 else ""
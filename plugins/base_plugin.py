@@ -16,7 +16,7 @@ import logging
 from typing import Optional, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import get_session, UserBinding
+from database import get_session, get_user_snapshot, UserBinding
 
 logger = logging.getLogger(__name__)
 
@@ -45,13 +45,12 @@ class BasePlugin:
         if session:
             return session.query(UserBinding).filter_by(tg_id=user_id).first()
 
-        with get_session() as s:
-            user = s.query(UserBinding).filter_by(tg_id=user_id).first()
-            # 返回detach的对象避免session过期问题
-            if user and user.emby_account:
-                # 重新查询获取最新数据
-                return s.query(UserBinding).filter_by(tg_id=user_id).first()
+        # 绑定状态走快照缓存，未绑定用户不查库
+        snap = get_user_snapshot(user_id)
+        if not snap or not snap.is_bound:
             return None
+        with get_session() as s:
+            return s.query(UserBinding).filter_by(tg_id=user_id).first()
 
     async def require_user(self, update: Update, session=None) -> Optional[UserBinding]:
         """
@@ -166,7 +165,7 @@ class BasePlugin:
         """
         is_new, result = await self.check_achievement(user, achievement_id, session)
         if is_new:
-            user.points += result.get("reward", 0)
+            # 奖励已由 check_and_award_achievement 在同一会话中入账
             return f"\n\n🎉 {result.get('emoji', '')} {result.get('name', '')} (+{result.get('reward', 0)}MP)"
         return ""
 
@@ -10,6 +10,8 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.guilds import set_attack
+from database.ledger import credit, debit_if_sufficient
 from utils import reply_with_auto_delete, edit_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -319,8 +321,8 @@ async def breakthrough_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
         cost = get_breakthrough_cost(level, is_vip)
         success_rate = get_breakthrough_success_rate(level, is_vip)
 
-        # 检查余额
-        if user.points < cost:
+        # 扣除消耗（SQL 端校验余额，防止并发重复扣款）
+        if debit_if_sufficient(user_id, cost, "境界突破", session=session) is None:
             await query.edit_message_text(
                 f"💸 <b>魔力不足喵！</b>\n\n"
                 f"突破需要 <b>{cost}</b> MP\n"
@@ -332,8 +334,6 @@ async def breakthrough_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
             return
 
-        # 扣除消耗
-        user.points -= cost
         user.total_mp_spent_breakthrough = (user.total_mp_spent_breakthrough or 0) + cost
 
         # 判断是否成功
@@ -344,7 +344,7 @@ async def breakthrough_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
             # 突破成功
             level_info = next_level
             user.breakthrough_level = level + 1
-            user.attack = (user.attack or 0) + level_info["power_bonus"]
+            set_attack(user, (user.attack or 0) + level_info["power_bonus"], session)
 
             result_text = (
                 f"🎉 <b>突 破 成 功 ！</b>\n"
@@ -366,7 +366,6 @@ async def breakthrough_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
             ach_result = check_and_award_achievement(user, f"breakthrough_{level + 1}", session)
             if ach_result["new"]:
                 result_text += f"\n\n🏆 {ach_result['emoji']} {ach_result['name']} (+{ach_result['reward']}MP)"
-                user.points += ach_result["reward"]
 
             session.commit()
 
@@ -377,7 +376,7 @@ async def breakthrough_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
         else:
             # 突破失败，返还部分消耗
             refund = int(cost * FAILURE_REFUND)
-            user.points += refund
+            credit(user_id, refund, "突破失败返还", session=session)
 
             result_text = (
                 f"💔 <b>突 破 失 败 ...</b>\n"
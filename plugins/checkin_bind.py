@@ -9,16 +9,16 @@
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
-from database import get_session, UserBinding, create_or_update_user
+from database import get_session, get_async_session, get_user_async, UserBinding, create_or_update_user
+from database.ledger import credit, credit_async
 from datetime import datetime, timedelta, date
 from utils import reply_with_auto_delete, get_unbound_message, edit_with_auto_delete
 from plugins.feedback_utils import progress_bar, get_crit_effect, success_burst, random_loading
 from plugins.quotes import get_checkin_greeting, get_milestone_congrats, random_cute_emoji
 from plugins.lucky_events import calculate_lucky_reward, check_random_drop
+from emby import emby_directory
 import random
 import logging
-import aiohttp
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -32,13 +32,13 @@ async def track_activity_wrapper(user_id: int, activity_type: str) -> tuple:
     return await track_and_check_task(user_id, activity_type)
 
 
-def check_achievement(user, user_id=None):
-    """检查成就（导入achievement模块）"""
+async def check_achievement(user, achievement_id, session):
+    """检查成就（导入achievement模块）：成就记录与奖励随签到的会话一起提交"""
     try:
-        from plugins.achievement import check_and_award_achievement
-        return check_and_award_achievement(user, user_id)
+        from plugins.achievement import check_and_award_achievement_async
     except ImportError:
         return None
+    return await check_and_award_achievement_async(user, achievement_id, session)
 
 
 async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -50,8 +50,8 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     first_name = update.effective_user.first_name or "酱"
 
-    with get_session() as session:
-        user = session.query(UserBinding).filter_by(tg_id=user_id).first()
+    async with get_async_session() as session:
+        user = await get_user_async(user_id, session)
 
         if not user or not user.emby_account:
             await reply_with_auto_delete(msg, await get_unbound_message(first_name))
@@ -106,7 +106,7 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         achievement_msg = ""
         new_achievements = []
         for ach_id in ["first_checkin", "checkin_1", "checkin_3", "checkin_7", "checkin_30", "checkin_100"]:
-            result = check_achievement(user, ach_id)
+            result = await check_achievement(user, ach_id, session)
             if result and result.get("new"):
                 new_achievements.append(result)
         if new_achievements:
@@ -139,8 +139,18 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
             actual_points = int(actual_points * 1.5)
 
         # 奖励入账
-        user.points += actual_points
-        session.commit()
+        await credit_async(user.tg_id, actual_points, "每日签到", session=session)
+
+        # 随机掉落（幸运草/盲盒券/锻造券）与奖励一起入账
+        if drop_result["dropped"]:
+            if drop_result["type"] == "lucky_grass":
+                user.lucky_boost = True
+            elif drop_result["type"] == "extra_gacha":
+                user.extra_gacha = (user.extra_gacha or 0) + drop_result["amount"]
+            elif drop_result["type"] == "free_forge":
+                user.free_forges = (user.free_forges or 0) + drop_result["amount"]
+
+        await session.commit()
 
         # === 构建签到消息 ===
         if user.is_vip:
@@ -173,25 +183,6 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         drop_text = ""
         if drop_result["dropped"]:
             drop_text = f"\n🎁 <b>随机掉落：</b> {drop_result['name']} x{drop_result['amount']}\n"
-            # 如果掉落的是幸运草或盲盒券，更新数据库
-            if drop_result["type"] == "lucky_grass":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.lucky_boost = True
-                        drop_session.commit()
-            elif drop_result["type"] == "extra_gacha":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.extra_gacha = (drop_user.extra_gacha or 0) + drop_result["amount"]
-                        drop_session.commit()
-            elif drop_result["type"] == "free_forge":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.free_forges = (drop_user.free_forges or 0) + drop_result["amount"]
-                        drop_session.commit()
 
         # 组装完整消息（精简版）
         # 压缩奖励显示
@@ -208,25 +199,6 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         extras = []
         if drop_result["dropped"]:
             extras.append(f"🎁{drop_result['name']}×{drop_result['amount']}")
-            # 处理掉落更新数据库...
-            if drop_result["type"] == "lucky_grass":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.lucky_boost = True
-                        drop_session.commit()
-            elif drop_result["type"] == "extra_gacha":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.extra_gacha = (drop_user.extra_gacha or 0) + drop_result["amount"]
-                        drop_session.commit()
-            elif drop_result["type"] == "free_forge":
-                with get_session() as drop_session:
-                    drop_user = drop_session.query(UserBinding).filter_by(tg_id=user_id).first()
-                    if drop_user:
-                        drop_user.free_forges = (drop_user.free_forges or 0) + drop_result["amount"]
-                        drop_session.commit()
         if new_achievements:
             extras.append(f"🏆{new_achievements[0]['name']}")
         extras_line = " | ".join(extras) if extras else ""
@@ -292,36 +264,12 @@ async def bind(update: Update, context: ContextTypes.DEFAULT_TYPE):
     emby_username = context.args[0]
     user = update.effective_user
 
-    # 验证 Emby 用户是否存在
-    emby_url = os.getenv("EMBY_URL", "")
-    emby_api_key = os.getenv("EMBY_API_KEY", "")
-
-    emby_valid = False
-    if emby_url and emby_api_key:
-        try:
-            headers = {
-                "X-Emby-Token": emby_api_key,
-                "Accept": "application/json",
-                "User-Agent": "curl/7.68.0"
-            }
-            async with aiohttp.ClientSession() as session:
-                url = f"{emby_url}/Users"
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        emby_users = {u.get('Name', ''): u.get('Id', '') for u in data}
-                        # 尝试精确匹配
-                        if emby_username in emby_users:
-                            emby_valid = True
-                        else:
-                            # 尝试忽略大小写匹配
-                            for key in emby_users.keys():
-                                if key.lower() == emby_username.lower():
-                                    emby_username = key  # 使用正确的用户名
-                                    emby_valid = True
-                                    break
-        except Exception:
-            pass  # 验证失败时继续，允许绑定
+    # 验证 Emby 用户是否存在（绑定时多半刚在 Emby 建号，先让用户目录失效再查）
+    emby_directory.invalidate()
+    canonical = await emby_directory.canonical_name(emby_username)
+    emby_valid = canonical is not None
+    if emby_valid:
+        emby_username = canonical  # 使用 Emby 中的实际大小写
 
     # 检查是否是新用户
     with get_session() as session:
@@ -348,7 +296,7 @@ async def bind(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_data = session.query(UserBinding).filter_by(tg_id=user.id).first()
             if user_data and not user_data.newbie_package_claimed:
                 # 发放新手礼包
-                user_data.points += 150  # 150 MP（增加到让新手能体验一次锻造）
+                credit(user.id, 150, "新手礼包", session=session)  # 150 MP（增加到让新手能体验一次锻造）
                 user_data.extra_gacha = (user_data.extra_gacha or 0) + 3  # 3个盲盒券
                 user_data.free_forges = (user_data.free_forges or 0) + 1  # 1张锻造券
                 user_data.attack = (user_data.attack or 0) + 10  # 初始战力
@@ -10,6 +10,8 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import debit_if_sufficient
+from database.user_sets import get_user_set, user_set_contains, add_to_user_set
 from utils import reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -181,43 +183,37 @@ LIMITED_EDITIONS = {
 # 工具函数
 # ==========================================
 
-def get_owned_list(user, item_type: str) -> list:
-    """获取用户拥有的外观列表"""
-    if item_type == "frames":
-        return (user.owned_frames or "").split(",") if user.owned_frames else ["default"]
-    elif item_type == "titles":
-        return (user.owned_titles or "").split(",") if user.owned_titles else ["novice"]
-    elif item_type == "themes":
-        return (user.owned_themes or "").split(",") if user.owned_themes else ["default"]
-    return []
-
-
-def add_owned_item(user, item_type: str, item_id: str) -> None:
-    """添加拥有的外观"""
-    if item_type == "frames":
-        current = user.owned_frames or ""
-        items = current.split(",") if current else ["default"]
-        if item_id not in items:
-            items.append(item_id)
-        user.owned_frames = ",".join(items)
-    elif item_type == "titles":
-        current = user.owned_titles or ""
-        items = current.split(",") if current else ["novice"]
-        if item_id not in items:
-            items.append(item_id)
-        user.owned_titles = ",".join(items)
-    elif item_type == "themes":
-        current = user.owned_themes or ""
-        items = current.split(",") if current else ["default"]
-        if item_id not in items:
-            items.append(item_id)
-        user.owned_themes = ",".join(items)
-
-
-def has_item(user, item_type: str, item_id: str) -> bool:
+# 外观类型 -> (集合名称, 默认拥有的外观)
+OWNED_SETS = {
+    "frames": ("frame", "default"),
+    "titles": ("title", "novice"),
+    "themes": ("theme", "default"),
+}
+
+
+def get_owned_list(user, item_type: str, session=None) -> list:
+    """获取用户拥有的外观列表（默认外观始终拥有）"""
+    if item_type not in OWNED_SETS:
+        return []
+    set_name, default = OWNED_SETS[item_type]
+    owned = get_user_set(user.tg_id, set_name, session)
+    return [default] + sorted(owned - {default})
+
+
+def add_owned_item(user, item_type: str, item_id: str, session=None) -> bool:
+    """添加拥有的外观，返回是否为新获得"""
+    if item_type not in OWNED_SETS:
+        return False
+    set_name, _ = OWNED_SETS[item_type]
+    return bool(add_to_user_set(user.tg_id, set_name, [item_id], session))
+
+
+def has_item(user, item_type: str, item_id: str, session=None) -> bool:
     """检查是否拥有某外观"""
-    owned = get_owned_list(user, item_type)
-    return item_id in owned
+    if item_type not in OWNED_SETS:
+        return False
+    set_name, default = OWNED_SETS[item_type]
+    return item_id == default or user_set_contains(user.tg_id, set_name, item_id, session)
 
 
 def get_rarity_color(rarity: str) -> str:
@@ -232,7 +228,7 @@ def get_rarity_color(rarity: str) -> str:
     return colors.get(rarity, "⚪")
 
 
-async def get_cosmetics_main_panel(user: UserBinding, first_name: str) -> tuple:
+async def get_cosmetics_main_panel(user: UserBinding, first_name: str, session=None) -> tuple:
     """获取外观主面板（用于编辑消息）"""
     # 获取当前装备
     current_frame = user.equipped_frame or "default"
@@ -240,9 +236,9 @@ async def get_cosmetics_main_panel(user: UserBinding, first_name: str) -> tuple:
     current_theme = user.equipped_theme or "default"
 
     # 获取拥有的数量
-    owned_frames = len(get_owned_list(user, "frames"))
-    owned_titles = len(get_owned_list(user, "titles"))
-    owned_themes = len(get_owned_list(user, "themes"))
+    owned_frames = len(get_owned_list(user, "frames", session))
+    owned_titles = len(get_owned_list(user, "titles", session))
+    owned_themes = len(get_owned_list(user, "themes", session))
 
     # 获取当前装备信息
     frame_info = AVATAR_FRAMES.get(current_frame, AVATAR_FRAMES["default"])
@@ -299,7 +295,7 @@ async def cosmetics_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await reply_with_auto_delete(msg, "💔 <b>请先绑定账号喵！</b>\n\n使用 <code>/bind 账号</code> 绑定后再来。")
             return
 
-        text, markup = await get_cosmetics_main_panel(user, update.effective_user.first_name)
+        text, markup = await get_cosmetics_main_panel(user, update.effective_user.first_name, session)
         await msg.reply_html(text, reply_markup=markup)
 
 
@@ -319,7 +315,7 @@ async def cosmetics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        text, markup = await get_cosmetics_main_panel(user, query.from_user.first_name)
+        text, markup = await get_cosmetics_main_panel(user, query.from_user.first_name, session)
         await query.edit_message_text(text, reply_markup=markup, parse_mode='HTML')
 
 
@@ -343,7 +339,7 @@ async def frame_shop(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        owned = get_owned_list(user, "frames")
+        owned = get_owned_list(user, "frames", session)
 
         # 构建商店列表
         lines = [
@@ -415,7 +411,7 @@ async def title_shop(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        owned = get_owned_list(user, "titles")
+        owned = get_owned_list(user, "titles", session)
 
         lines = [
             "🏷️ <b>【 称 号 商 店 】</b>",
@@ -482,13 +478,11 @@ async def buy_cosmetic(update: Update, context: ContextTypes.DEFAULT_TYPE):
         item_id = parts[3]
         item = AVATAR_FRAMES.get(item_id)
         item_type = "frames"
-        field = "owned_frames"
         equip_field = "equipped_frame"
     elif parts[2] == "title":
         item_id = parts[3]
         item = TITLES.get(item_id)
         item_type = "titles"
-        field = "owned_titles"
         equip_field = "equipped_title"
     else:
         await query.edit_message_text("⚠️ <b>未知的商品喵！</b>", parse_mode='HTML')
@@ -507,7 +501,7 @@ async def buy_cosmetic(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # 检查是否已拥有
-        if has_item(user, item_type, item_id):
+        if has_item(user, item_type, item_id, session):
             await query.answer("您已拥有此商品！", show_alert=True)
             return
 
@@ -516,7 +510,8 @@ async def buy_cosmetic(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user.is_vip:
             price = int(price * 0.8)  # VIP 8折
 
-        if user.points < price:
+        # 扣款（余额不足时不做任何修改）并添加
+        if debit_if_sufficient(user.tg_id, price, f"购买外观 {item_id}", session=session) is None:
             await query.edit_message_text(
                 f"💸 <b>魔力不足喵！</b>\n\n"
                 f"购买需要 <b>{price}</b> MP\n"
@@ -525,9 +520,7 @@ async def buy_cosmetic(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # 扣款并添加
-        user.points -= price
-        add_owned_item(user, item_type, item_id)
+        add_owned_item(user, item_type, item_id, session)
 
         session.commit()
 
@@ -605,7 +598,7 @@ async def cos_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        text, markup = await get_cosmetics_main_panel(user, query.from_user.first_name)
+        text, markup = await get_cosmetics_main_panel(user, query.from_user.first_name, session)
         await query.edit_message_text(text, reply_markup=markup, parse_mode='HTML')
 
 
@@ -0,0 +1,32 @@
+"""
+日切定时任务
+- 每天零点（本地时区）统一归零所有每日计数，见 database.daily_reset
+- 启动时补跑一次：Bot 跨零点停机时不会漏掉日切
+"""
+import logging
+from datetime import datetime, time
+from telegram.ext import ContextTypes
+from database.daily_reset import run_daily_rollover
+
+logger = logging.getLogger(__name__)
+
+# 零点后稍等几秒再执行，避免调度提前触发时 date.today() 仍是前一天
+ROLLOVER_TIME = time(0, 0, 5)
+
+
+async def daily_rollover_job(context: ContextTypes.DEFAULT_TYPE):
+    """定时任务：执行日切（当天已执行过则跳过）"""
+    try:
+        await run_daily_rollover()
+    except Exception as e:
+        logger.error(f"[Rollover] 日切失败: {e}")
+
+
+def register(app):
+    if not app.job_queue:
+        logger.warning("⚠️ 未启用 job_queue，日切任务未注册")
+        return
+    local_tz = datetime.now().astimezone().tzinfo
+    app.job_queue.run_daily(daily_rollover_job, time=ROLLOVER_TIME.replace(tzinfo=local_tz), name="daily_rollover")
+    app.job_queue.run_once(daily_rollover_job, when=1, name="daily_rollover_catchup")
+    logger.info("✨ 日切任务已注册（每天 00:00 归零每日计数）")
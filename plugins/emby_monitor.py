@@ -3,17 +3,15 @@ Emby 媒体库监控模块 - 仅推送 REMUX 电影入库
 """
 import asyncio
 import logging
-import os
-import tempfile
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple
-import aiohttp
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
-from telegram.ext import CommandHandler, ContextTypes, CallbackContext, CallbackQueryHandler
+from telegram.ext import CommandHandler, ContextTypes, CallbackQueryHandler
 from config import Config
 from utils import reply_with_auto_delete
 from database import get_session, UserBinding
+from emby import emby_client, emby_feed, emby_library, poster_cache, EmbyError
 
 logger = logging.getLogger(__name__)
 
@@ -21,9 +19,10 @@ logger = logging.getLogger(__name__)
 EMBY_URL = Config.EMBY_URL.rstrip('/')
 EMBY_API_KEY = Config.EMBY_API_KEY
 EMBY_USER_ID = "f622565cba214bfca04609d32d5d26d0"  # 默认用户ID
+SHARE_ITEM_FIELDS = "Path,Genres,Overview,OfficialRating,CommunityRating,MediaSources,ProductionYear"
 
-# 推送记录文件路径
-PUSHED_ITEMS_FILE = "data/pushed_emby_items.txt"
+# 已推送记录（emby_seen_items 中的 kind）
+PUSHED_KIND = "push"
 
 # === 📦 全局存储（从 reward_push.py 导入共享变量） ===
 # 注意：导入后使用 reward_push.ACTIVE_PUSHES 来访问
@@ -32,79 +31,10 @@ ACTIVE_PUSHES = reward_push.ACTIVE_PUSHES
 LAST_REWARD_TIME = reward_push.LAST_REWARD_TIME
 
 
-def load_pushed_items() -> set:
-    """从文件加载已推送的媒体ID集合"""
-    pushed = set()
-    try:
-        if os.path.exists(PUSHED_ITEMS_FILE):
-            with open(PUSHED_ITEMS_FILE, 'r') as f:
-                for line in f:
-                    item_id = line.strip()
-                    if item_id:
-                        pushed.add(item_id)
-            logger.info(f"已加载 {len(pushed)} 条已推送记录")
-    except Exception as e:
-        logger.error(f"加载推送记录失败: {e}")
-    return pushed
-
-
-def save_pushed_item(item_id: str):
-    """保存新推送的媒体ID到文件"""
-    try:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(PUSHED_ITEMS_FILE), exist_ok=True)
-        with open(PUSHED_ITEMS_FILE, 'a') as f:
-            f.write(f"{item_id}\n")
-    except Exception as e:
-        logger.error(f"保存推送记录失败: {e}")
-
-
-# 启动时加载已推送记录
-pushed_items = load_pushed_items()
-
 # REMUX 检测关键词（不区分大小写）
 REMUX_KEYWORDS = ['REMUX', 'Remux', 'remux']
 
 
-async def download_image(url: str) -> Optional[str]:
-    """
-    下载图片到临时文件
-
-    Args:
-        url: 图片URL
-
-    Returns:
-        临时文件路径，失败返回 None
-    """
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=get_emby_headers(), ssl=False, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status == 200:
-                    # 读取图片数据
-                    data = await resp.read()
-
-                    # 创建临时文件
-                    suffix = '.jpg'
-                    fd, path = tempfile.mkstemp(suffix=suffix)
-                    with os.fdopen(fd, 'wb') as f:
-                        f.write(data)
-
-                    return path
-    except Exception as e:
-        logger.error(f"下载图片失败 {url}: {e}")
-
-    return None
-
-
-def get_emby_headers():
-    """获取 Emby API 请求头"""
-    return {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
-
 def is_remux(item: Dict, details: Dict) -> bool:
     """
     检测是否为 REMUX 格式
@@ -139,7 +69,7 @@ def get_image_url(item_id: str, image_tag: str = None, image_type: str = "Primar
 
 async def fetch_latest_items(limit: int = 10, days: int = 1) -> List[Dict]:
     """
-    获取最新入库的电影项目（仅电影）
+    获取最新入库的电影项目（仅电影，读媒体库本地索引，索引为空时实时查询 Emby）
 
     Args:
         limit: 获取数量
@@ -153,25 +83,10 @@ async def fetch_latest_items(limit: int = 10, days: int = 1) -> List[Dict]:
         return []
 
     items = []
-    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            # 只获取电影类型
-            url = (
-                f"{EMBY_URL}/Users/{EMBY_USER_ID}/Items"
-                f"?SortBy=DateCreated"
-                f"&SortOrder=Descending"
-                f"&MinDateCreated={cutoff}"
-                f"&Recursive=true"
-                f"&IncludeItemTypes=Movie"
-                f"&Limit={limit}"
-            )
-            async with session.get(url, headers=get_emby_headers(), ssl=False) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    items = data.get('Items', [])
-
+        items = await emby_library.latest_items(["Movie"], limit=limit, since=cutoff)
     except Exception as e:
         logger.error(f"获取 Emby 最新项目失败: {e}")
 
@@ -181,6 +96,7 @@ async def fetch_latest_items(limit: int = 10, days: int = 1) -> List[Dict]:
 async def fetch_item_details(item_id: str) -> Optional[Dict]:
     """
     获取媒体项目详细信息（含码率、评分等）
+    本地索引中有该条目时直接使用（已含路径与视频流规格），否则实时查询 Emby
 
     Args:
         item_id: 媒体项目ID
@@ -192,11 +108,10 @@ async def fetch_item_details(item_id: str) -> Optional[Dict]:
         return None
 
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users/{EMBY_USER_ID}/Items/{item_id}"
-            async with session.get(url, headers=get_emby_headers(), ssl=False) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+        details = emby_library.get(item_id)
+        if details is not None:
+            return details
+        return await emby_client.get_json(f"/Users/{EMBY_USER_ID}/Items/{item_id}")
     except Exception as e:
         logger.error(f"获取项目 {item_id} 详情失败: {e}")
 
@@ -326,17 +241,11 @@ async def cmd_push_by_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # 查询 Emby API
     try:
-        async with aiohttp.ClientSession() as session:
-            url = (
-                f"{EMBY_URL}/Items"
-                f"?Ids={item_id}"
-                f"&Fields=Path,Genres,Overview,OfficialRating,CommunityRating,MediaSources,ProductionYear"
-            )
-            async with session.get(url, headers=get_emby_headers(), ssl=False, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status != 200:
-                    await reply_with_auto_delete(msg, f"❌ 连接 Emby 失败 (HTTP {resp.status})")
-                    return
-                data = await resp.json()
+        try:
+            data = await emby_client.get_json("/Items", {"Ids": item_id, "Fields": SHARE_ITEM_FIELDS}, timeout=30)
+        except EmbyError as e:
+            await reply_with_auto_delete(msg, f"❌ 连接 Emby 失败 ({f'HTTP {e.status}' if e.status else e})")
+            return
 
         if not data or not data.get("Items"):
             await reply_with_auto_delete(msg, "❌ 未找到该 ID 对应的媒体！")
@@ -364,8 +273,8 @@ async def cmd_push_by_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
         genres = details.get('Genres', [])
         genre_text = "/".join(genres[:2]) if genres else "未分类"
 
-        # 获取海报 URL
-        poster_url = get_image_url(item_id_internal)
+        # 海报 tag（海报缓存的键）
+        poster_tag = details.get('ImageTags', {}).get('Primary')
 
         # 构建甜蜜约会风文案
         caption = (
@@ -383,22 +292,13 @@ async def cmd_push_by_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"👇 <b>回复</b> 这条消息，领取今日份的魔力补给！"
         )
 
-        # 下载海报并发送
-        photo_path = await download_image(poster_url) if poster_url else None
-
-        if photo_path:
-            with open(photo_path, 'rb') as f:
-                push_msg = await context.bot.send_photo(
-                    chat_id=update.effective_chat.id,
-                    photo=f,
-                    caption=caption,
-                    parse_mode='HTML'
-                )
-            try:
-                os.unlink(photo_path)
-            except:
-                pass
-        else:
+        # 发送海报（已上传过的直接复用 file_id）
+        push_msg = await poster_cache.send_photo(
+            context.bot, update.effective_chat.id, item_id_internal, poster_tag,
+            caption=caption,
+            parse_mode='HTML'
+        )
+        if push_msg is None:
             push_msg = await context.bot.send_message(
                 chat_id=update.effective_chat.id,
                 text=caption,
@@ -414,13 +314,12 @@ async def cmd_push_by_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'created_at': datetime.now(),
             'is_manual_push': True,
             'original_caption': caption,
-            'claim_list': []
+            'claim_list': [],
+            'is_photo': bool(push_msg.photo)
         }
 
         await reply_with_auto_delete(msg, "✅ <b>推送成功！</b>\n已自动开启互动挖矿喵~")
 
-    except aiohttp.ClientError as e:
-        await reply_with_auto_delete(msg, f"❌ 连接 Emby 失败: {str(e)}")
     except Exception as e:
         logger.error(f"推送失败: {e}")
         await reply_with_auto_delete(msg, f"❌ 推送失败：{str(e)}")
@@ -450,6 +349,7 @@ async def cmd_emby_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 获取详细信息检查 REMUX
     lines = [f"🎬 <b>【 Emby 最新电影入库 】</b>\n━━━━━━━━━━━━━━━━━━"]
     remux_count = 0
+    pushed = emby_feed.seen_ids([item.get('Id') for item in items], PUSHED_KIND)
 
     for item in items:
         item_id = item.get('Id')
@@ -459,7 +359,7 @@ async def cmd_emby_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # 检查是否已推送
         status = ""
-        if item_id in pushed_items:
+        if item_id in pushed:
             status = " ✅已推送"
         elif item_id:
             details = await fetch_item_details(item_id)
@@ -507,6 +407,7 @@ async def cmd_new_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 构建按钮列表
     keyboard = []
     remux_items = []
+    pushed = emby_feed.seen_ids([item.get('Id') for item in items], PUSHED_KIND)
 
     for item in items:
         item_id = item.get('Id')
@@ -514,7 +415,7 @@ async def cmd_new_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
             continue
 
         # 跳过已推送的
-        if item_id in pushed_items:
+        if item_id in pushed:
             continue
 
         details = await fetch_item_details(item_id)
@@ -591,17 +492,11 @@ async def emby_push_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     try:
         # 获取媒体信息
-        async with aiohttp.ClientSession() as session:
-            url = (
-                f"{EMBY_URL}/Items"
-                f"?Ids={item_id}"
-                f"&Fields=Path,Genres,Overview,OfficialRating,CommunityRating,MediaSources,ProductionYear"
-            )
-            async with session.get(url, headers=get_emby_headers(), ssl=False, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status != 200:
-                    await query.edit_message_text(f"❌ 连接 Emby 失败 (HTTP {resp.status})")
-                    return
-                data = await resp.json()
+        try:
+            data = await emby_client.get_json("/Items", {"Ids": item_id, "Fields": SHARE_ITEM_FIELDS}, timeout=30)
+        except EmbyError as e:
+            await query.edit_message_text(f"❌ 连接 Emby 失败 ({f'HTTP {e.status}' if e.status else e})")
+            return
 
         if not data or not data.get("Items"):
             await query.edit_message_text("❌ 未找到该媒体")
@@ -627,7 +522,7 @@ async def emby_push_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         genres = details.get('Genres', [])
         genre_text = "/".join(genres[:2]) if genres else "未分类"
 
-        poster_url = get_image_url(item_id_internal)
+        poster_tag = details.get('ImageTags', {}).get('Primary')
 
         caption = (
             f"💌 <b>Master... 馆藏更新啦！</b>\n"
@@ -644,22 +539,13 @@ async def emby_push_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"👇 <b>回复</b> 这条消息，领取今日份的魔力补给！"
         )
 
-        # 下载海报并发送到群组
-        photo_path = await download_image(poster_url) if poster_url else None
-
-        if photo_path:
-            with open(photo_path, 'rb') as f:
-                push_msg = await context.bot.send_photo(
-                    chat_id=Config.GROUP_ID,
-                    photo=f,
-                    caption=caption,
-                    parse_mode='HTML'
-                )
-            try:
-                os.unlink(photo_path)
-            except:
-                pass
-        else:
+        # 发送海报到群组（已上传过的直接复用 file_id）
+        push_msg = await poster_cache.send_photo(
+            context.bot, Config.GROUP_ID, item_id_internal, poster_tag,
+            caption=caption,
+            parse_mode='HTML'
+        )
+        if push_msg is None:
             push_msg = await context.bot.send_message(
                 chat_id=Config.GROUP_ID,
                 text=caption,
@@ -675,13 +561,12 @@ async def emby_push_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             'created_at': datetime.now(),
             'is_manual_push': True,
             'original_caption': caption,
-            'claim_list': []
+            'claim_list': [],
+            'is_photo': bool(push_msg.photo)
         }
 
         # 标记为已推送
-        global pushed_items
-        pushed_items.add(item_id_internal)
-        save_pushed_item(item_id_internal)
+        emby_feed.mark_seen([item_id_internal], PUSHED_KIND)
 
         # 刷新列表
         await cmd_new_list(update, context)
@@ -691,112 +576,70 @@ async def emby_push_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text(f"❌ 推送失败: {str(e)}")
 
 
-async def auto_emby_check(context: CallbackContext):
+async def push_remux_releases(bot, items: List[Dict]):
     """
-    定时检查 Emby REMUX 电影入库，自动推送到群组
-    每30分钟检查一次，只推送 REMUX 格式电影
+    新片变更流订阅者：把新入库的 REMUX 电影自动推送到群组
+    变更流的列表请求已带上路径与媒体流字段，不再逐条拉详情
     """
-    if not EMBY_URL or not EMBY_API_KEY:
-        logger.warning("Emby 配置不完整，跳过自动检查")
-        return
-
     if not Config.GROUP_ID:
-        logger.warning("未配置群组 ID，跳过自动推送")
         return
 
-    global pushed_items
+    movies = [item for item in items if item.get('Type') == 'Movie' and is_remux(item, item)]
+    pushed = emby_feed.seen_ids([item['Id'] for item in movies], PUSHED_KIND)
+    new_push_count = 0
 
-    try:
-        # 获取最新电影
-        items = await fetch_latest_items(limit=50, days=1)
-
-        if not items:
-            return
+    for item in movies:
+        item_id = item['Id']
+        if item_id in pushed:
+            continue
 
-        new_push_count = 0
+        # 构建推送消息
+        text_msg, poster_url = build_showcase_message(item, item)
+        text_msg += (
+            f"\n━━━━━━━━━━━━━━\n"
+            f"✨ <b>互动有礼：</b>\n"
+            f"👇 动动手指 <b>回复</b> 一下，试试看能爆出多少魔力？<i>(每人限领一次喵!)</i>"
+        )
 
-        for item in items:
-            item_id = item.get('Id')
-            if not item_id:
-                continue
+        try:
+            # 发送海报（已上传过的直接复用 file_id）
+            push_msg = None
+            if poster_url:
+                push_msg = await poster_cache.send_photo(
+                    bot, Config.GROUP_ID, item_id, item['ImageTags']['Primary'],
+                    caption=text_msg,
+                    parse_mode='HTML'
+                )
+            if push_msg is None:
+                push_msg = await bot.send_message(
+                    chat_id=Config.GROUP_ID,
+                    text=text_msg,
+                    parse_mode='HTML'
+                )
 
-            # 跳过已推送的
-            if item_id in pushed_items:
-                continue
+            # 记录到 active_pushes 用于回复领奖（使用全局变量）
+            push_id = f"emby_auto_{push_msg.message_id}_{int(datetime.now().timestamp())}"
+            ACTIVE_PUSHES[push_msg.message_id] = {
+                'chat_id': Config.GROUP_ID,
+                'push_id': push_id,
+                'claimed_users': set(),
+                'created_at': datetime.now(),
+                'is_emby_push': True,
+                'original_caption': text_msg,
+                'claim_list': [],
+                'is_photo': bool(push_msg.photo)
+            }
 
-            details = await fetch_item_details(item_id)
-            if not details:
-                continue
-
-            # 只推送 REMUX 格式
-            if not is_remux(item, details):
-                # 标记为已检查（避免重复检查非 REMUX）
-                pushed_items.add(item_id)
-                continue
-
-            # 构建推送消息
-            text_msg, poster_url = build_showcase_message(item, details)
-            text_msg += (
-                f"\n━━━━━━━━━━━━━━\n"
-                f"✨ <b>互动有礼：</b>\n"
-                f"👇 动动手指 <b>回复</b> 一下，试试看能爆出多少魔力？<i>(每人限领一次喵!)</i>"
-            )
+            # 标记为已推送
+            emby_feed.mark_seen([item_id], PUSHED_KIND)
+            new_push_count += 1
+            logger.info(f"自动推送 REMUX 电影: {item.get('Name')} (ID: {item_id})")
 
-            try:
-                # 下载海报并发送
-                if poster_url:
-                    photo_path = await download_image(poster_url)
-                    if photo_path:
-                        with open(photo_path, 'rb') as f:
-                            push_msg = await context.bot.send_photo(
-                                chat_id=Config.GROUP_ID,
-                                photo=f,
-                                caption=text_msg,
-                                parse_mode='HTML'
-                            )
-                        try:
-                            os.unlink(photo_path)
-                        except:
-                            pass
-                    else:
-                        push_msg = await context.bot.send_message(
-                            chat_id=Config.GROUP_ID,
-                            text=text_msg,
-                            parse_mode='HTML'
-                        )
-                else:
-                    push_msg = await context.bot.send_message(
-                        chat_id=Config.GROUP_ID,
-                        text=text_msg,
-                        parse_mode='HTML'
-                    )
-
-                # 记录到 active_pushes 用于回复领奖（使用全局变量）
-                push_id = f"emby_auto_{push_msg.message_id}_{int(datetime.now().timestamp())}"
-                ACTIVE_PUSHES[push_msg.message_id] = {
-                    'chat_id': Config.GROUP_ID,
-                    'push_id': push_id,
-                    'claimed_users': set(),
-                    'created_at': datetime.now(),
-                    'is_emby_push': True,
-                    'original_caption': text_msg,
-                    'claim_list': []
-                }
-
-                # 标记为已推送（持久化到文件）
-                pushed_items.add(item_id)
-                save_pushed_item(item_id)
-                new_push_count += 1
-                logger.info(f"自动推送 REMUX 电影: {item.get('Name')} (ID: {item_id})")
-
-            except Exception as e:
-                logger.error(f"自动推送失败: {e}")
-
-        if new_push_count > 0:
-            logger.info(f"Emby 自动检查完成，推送了 {new_push_count} 部 REMUX 电影")
+        except Exception as e:
+            logger.error(f"自动推送失败: {e}")
 
-    except Exception as e:
-        logger.error(f"Emby 自动检查出错: {e}")
+    if new_push_count > 0:
+        logger.info(f"Emby 自动推送完成，推送了 {new_push_count} 部 REMUX 电影")
 
 
 def register(app):
@@ -811,7 +654,5 @@ def register(app):
     app.add_handler(CallbackQueryHandler(emby_push_callback, pattern="^emby_push_"))
     app.add_handler(CallbackQueryHandler(emby_push_callback, pattern="^emby_refresh_new$"))
 
-    # 注册定时任务：每30分钟检查一次 REMUX 电影
-    if EMBY_URL and EMBY_API_KEY:
-        app.job_queue.run_repeating(auto_emby_check, interval=1800, first=10)
-        logger.info("✨ Emby REMUX 电影自动推送任务已注册（每30分钟检查一次）")
+    # 订阅新片变更流：新入库的 REMUX 电影自动推送
+    emby_feed.subscribe("remux_push", push_remux_releases)
@@ -8,13 +8,22 @@ Emby 观影挖矿系统
 - 新片自动推送
 """
 import os
+import time
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
-from database import get_session, UserBinding
+from config import Config
+from database import get_session, get_user_snapshot, UserBinding
+from database.models import user_load_options
+from database.ledger import credit, credit_many
+from database.leaderboard import load_top_users
+from database.user_sets import get_user_set, user_set_contains, user_set_members, add_to_user_set
 from utils import reply_with_auto_delete, get_unbound_message
-import aiohttp
+from emby import (
+    emby_client, emby_directory, emby_feed, emby_library, emby_webhook, played_counts, EmbyError, parse_emby_date
+)
 import asyncio
 from collections import defaultdict
 
@@ -26,7 +35,6 @@ EMBY_API_KEY = os.getenv("EMBY_API_KEY", "")
 
 # 新片推送配置 - 环境变量配置多个群组，逗号分隔
 NOTIFICATION_CHATS = os.getenv("EMBY_NOTIFY_CHATS", "").split(",") if os.getenv("EMBY_NOTIFY_CHATS") else []
-CHECK_NEW_RELEASES_INTERVAL = 1800  # 每30分钟检查一次新片
 
 # 观影奖励配置
 MINUTES_PER_MP = 5  # 每5分钟1MP（降低门槛）
@@ -34,6 +42,8 @@ NEWBIE_MINUTES_PER_MP = 5  # 新手期也是5分钟1MP (统一)
 NEWBIE_DAYS = 7  # 新手期天数
 DAILY_MAX_MINUTES = 180  # 每日最多计算180分钟（即36MP）
 VIP_BONUS_MULTIPLIER = 1.5  # VIP加成
+WATCH_REWARD_INTERVAL = 3600  # 观影奖励每小时结算一次
+WATCH_APPLY_BATCH = 500  # 结算时每批加载的用户数
 NEW_RELEASE_LIMIT = 10  # 前N个看完得奖励
 NEW_RELEASE_REWARD = 100  # 首播奖励
 NEW_RELEASE_TIME_LIMIT_HOURS = 48  # 新片发布后48小时内算首播（延长到2天）
@@ -43,50 +53,23 @@ WEEKLY_TOP_REWARD = 500  # 周榜第一奖励
 WEEKLY_SECOND_REWARD = 300  # 周榜第二奖励
 WEEKLY_THIRD_REWARD = 150  # 周榜第三奖励
 
+# 最近一次观影奖励结算的统计（人数、耗时、吞吐）
+watch_ingest_stats = {}
+# 定时结算与 Webhook 触发的单用户结算互斥，避免同一段播放按旧水位被结算两次
+_ingest_lock = asyncio.Lock()
+
 # 追踪新片首播
 early_bird_tracking = {}  # {item_id: {user_id: finish_time}}
-announced_items = set()  # 已推送的新片ID集合
 
 # 首播冲刺活动存储
 active_races = {}  # {item_id: {"name": str, "premiere_time": datetime, "finishers": [user_ids], "limit": int}}
 
 
-async def get_emby_users():
-    """获取 Emby 用户列表"""
-    if not EMBY_URL or not EMBY_API_KEY:
-        return {}
-
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
-    try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users"
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    # 返回 {username: user_id} 映射
-                    return {u.get('Name', ''): u.get('Id', '') for u in data}
-    except Exception as e:
-        logger.error(f"获取 Emby 用户失败: {e}")
-
-    return {}
-
-
 async def get_user_watch_time(emby_user_id: str, date: datetime = None) -> int:
     """获取指定日期的观影时长（分钟）"""
     if not emby_user_id:
         return 0
 
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     # 计算日期范围
     if date is None:
         date = datetime.now(timezone.utc)
@@ -95,26 +78,22 @@ async def get_user_watch_time(emby_user_id: str, date: datetime = None) -> int:
     end_of_day = start_of_day + timedelta(days=1)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-            params = {
-                "Filters": "IsPlayed",
-                "SortBy": "DatePlayed",
-                "SortOrder": "Descending",
-                "MediaTypes": "Video",
-                "MinDatePlayed": start_of_day.isoformat(),
-                "MaxDatePlayed": end_of_day.isoformat(),
-                "Limit": 1000
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if 'Items' in data:
-                        total_seconds = 0
-                        for item in data['Items']:
-                            if item.get('RunTimeTicks'):
-                                total_seconds += (item['RunTimeTicks'] // 10000000)
-                        return total_seconds // 60  # 转换为分钟
+        params = {
+            "Filters": "IsPlayed",
+            "SortBy": "DatePlayed",
+            "SortOrder": "Descending",
+            "MediaTypes": "Video",
+            "MinDatePlayed": start_of_day.isoformat(),
+            "MaxDatePlayed": end_of_day.isoformat(),
+            "Limit": 1000
+        }
+        data = await emby_client.get_json(f"/Users/{emby_user_id}/Items", params)
+        if 'Items' in data:
+            total_seconds = 0
+            for item in data['Items']:
+                if item.get('RunTimeTicks'):
+                    total_seconds += (item['RunTimeTicks'] // 10000000)
+            return total_seconds // 60  # 转换为分钟
     except Exception as e:
         logger.error(f"获取观影时长失败: {e}")
 
@@ -140,27 +119,9 @@ def get_minutes_per_mp(user) -> int:
 
 
 async def get_recently_added_media(limit: int = 20) -> list:
-    """获取最近添加的媒体"""
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
+    """获取最近添加的媒体（本地索引，索引为空时实时查询 Emby）"""
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Items"
-            params = {
-                "SortBy": "DateCreated",
-                "SortOrder": "Descending",
-                "MediaTypes": "Video",
-                "Limit": limit,
-                "IncludeItemTypes": "Movie,Episode"
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data.get('Items', [])
+        return await emby_library.latest_items(["Movie", "Episode"], limit=limit)
     except Exception as e:
         logger.error(f"获取新媒体失败: {e}")
 
@@ -169,39 +130,23 @@ async def get_recently_added_media(limit: int = 20) -> list:
 
 async def get_item_played_users(item_id: str) -> list:
     """获取已播放指定媒体的所有用户"""
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     try:
-        async with aiohttp.ClientSession() as session:
-            # 先获取所有用户
-            users_url = f"{EMBY_URL}/Users"
-            async with session.get(users_url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    return []
-                users = await resp.json()
-
-            played_users = []
-            for user in users:
-                user_id = user.get('Id')
-                user_name = user.get('Name')
-                # 检查用户是否播放过此媒体
-                play_url = f"{EMBY_URL}/Users/{user_id}/Items"
-                params = {
-                    "Filters": "IsPlayed",
-                    "Ids": item_id,
-                    "Limit": 1
-                }
-                async with session.get(play_url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=5)) as play_resp:
-                    if play_resp.status == 200:
-                        play_data = await play_resp.json()
-                        if play_data.get('Items'):
-                            played_users.append({'user_id': user_id, 'user_name': user_name})
-
-            return played_users
+        played_users = []
+        for user_id, user_name in await emby_directory.all_users():
+            # 检查用户是否播放过此媒体
+            params = {
+                "Filters": "IsPlayed",
+                "Ids": item_id,
+                "Limit": 1
+            }
+            try:
+                play_data = await emby_client.get_json(f"/Users/{user_id}/Items", params, timeout=5)
+            except EmbyError:
+                continue
+            if play_data.get('Items'):
+                played_users.append({'user_id': user_id, 'user_name': user_name})
+
+        return played_users
     except Exception as e:
         logger.error(f"获取播放用户失败: {e}")
 
@@ -210,11 +155,10 @@ async def get_item_played_users(item_id: str) -> list:
 
 async def check_emby_binding(tg_id: int) -> tuple:
     """检查 Emby 绑定状态"""
-    with get_session() as session:
-        user = session.query(UserBinding).filter_by(tg_id=tg_id).first()
-        if not user or not user.emby_account:
-            return False, None
-        return True, user.emby_account
+    snap = get_user_snapshot(tg_id)
+    if not snap or not snap.is_bound:
+        return False, None
+    return True, snap.emby_account
 
 
 async def cmd_watch_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -232,8 +176,7 @@ async def cmd_watch_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # 获取观影数据
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await reply_with_auto_delete(
@@ -308,19 +251,8 @@ async def cmd_weekly_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not msg:
         return
 
-    with get_session() as session:
-        # 获取所有有 Emby 绑定的用户
-        users = session.query(UserBinding).filter(
-            UserBinding.emby_account != None,
-            UserBinding.emby_account != ""
-        ).all()
-
-        # 按 total_watch_minutes 排序
-        sorted_users = sorted(
-            [u for u in users if hasattr(u, 'total_watch_minutes') and u.total_watch_minutes],
-            key=lambda x: x.total_watch_minutes or 0,
-            reverse=True
-        )[:10]
+    # 前 10 名直接读内存排行榜，只加载上榜用户的展示字段
+    sorted_users = load_top_users("total_watch_minutes", 10)
 
     if not sorted_users:
         await reply_with_auto_delete(
@@ -366,8 +298,7 @@ async def claim_watch_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     # 获取观影数据
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await query.edit_message_text("💔 未找到 Emby 账号")
@@ -407,7 +338,9 @@ async def claim_watch_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         user.daily_watch_minutes = daily_watch + claimable_minutes
         user.total_watch_minutes = (total_watch or 0) + claimable_minutes
         user.last_watch_claimed = datetime.now()
-        user.points += mp_reward
+        # 手动领取已覆盖此前的播放，避免定时结算重复计入
+        user.watch_ingested_at = _utc_now()
+        credit(user_id, mp_reward, "观影奖励", session=session)
         session.commit()
 
     await query.edit_message_text(
@@ -425,54 +358,173 @@ async def claim_watch_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     )
 
 
-async def process_watch_rewards_job(context):
-    """定时任务：处理观影奖励（每小时执行一次）"""
-    logger.info("开始处理观影奖励...")
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
-    with get_session() as session:
-        users = session.query(UserBinding).filter(
-            UserBinding.emby_account != None,
-            UserBinding.emby_account != ""
-        ).all()
-
-        emby_users = await get_emby_users()
-        processed = 0
-
-        for user in users:
-            emby_user_id = emby_users.get(user.emby_account)
-            if not emby_user_id:
-                continue
 
-            # 获取今日观影时长
-            today_minutes = await get_user_watch_time(emby_user_id)
-            if today_minutes == 0:
-                continue
-
-            daily_watch = getattr(user, 'daily_watch_minutes', 0)
-
-            # 只有当有新观影时长时才更新
-            if today_minutes > daily_watch:
-                claimable_minutes = min(
-                    today_minutes - daily_watch,
-                    DAILY_MAX_MINUTES - daily_watch
-                )
-
-                if claimable_minutes >= MINUTES_PER_MP:
-                    # 新手期使用更快的兑换率
-                    minutes_per_mp = get_minutes_per_mp(user)
-                    mp_reward = claimable_minutes // minutes_per_mp
-                    if user.is_vip:
-                        mp_reward = int(mp_reward * VIP_BONUS_MULTIPLIER)
-
-                    user.daily_watch_minutes = daily_watch + claimable_minutes
-                    user.total_watch_minutes = (user.total_watch_minutes or 0) + claimable_minutes
-                    user.points += mp_reward
+async def fetch_new_plays(emby_user_id: str, since: datetime) -> Tuple[int, Optional[datetime]]:
+    """
+    since（UTC）之后新看完的观影分钟数，以及其中最晚的播放时间
+    Emby 的 MinDatePlayed 包含边界，已结算过的那一条在本地再过滤一次
+    """
+    params = {
+        "Filters": "IsPlayed",
+        "SortBy": "DatePlayed",
+        "SortOrder": "Descending",
+        "MediaTypes": "Video",
+        "MinDatePlayed": since.replace(tzinfo=timezone.utc).isoformat(),
+        "Limit": 1000,
+    }
+    data = await emby_client.get_json(f"/Users/{emby_user_id}/Items", params)
+    total_seconds = 0
+    latest = None
+    for item in data.get("Items", []):
+        played = parse_emby_date((item.get("UserData") or {}).get("LastPlayedDate"))
+        if played is not None and played <= since:
+            continue
+        total_seconds += (item.get("RunTimeTicks") or 0) // 10000000
+        if played is not None and (latest is None or played > latest):
+            latest = played
+    return total_seconds // 60, latest
+
+
+async def collect_watch_plays(bound_users: list, concurrency: int = None) -> Tuple[list, int]:
+    """
+    网络阶段：有界并发地拉取每个绑定用户水位之后的新播放，不持有数据库会话
+    bound_users: [(tg_id, emby_account, watch_ingested_at)]
+    返回 ([(tg_id, 新增分钟, 新水位)], 失败数)
+    """
+    semaphore = asyncio.Semaphore(concurrency or Config.EMBY_WATCH_CONCURRENCY)
+    day_start = _utc_now().replace(hour=0, minute=0, second=0, microsecond=0)
+    run_started = _utc_now()
+
+    async def fetch(tg_id, emby_account, watermark):
+        emby_user_id = await emby_directory.resolve_id(emby_account)
+        if not emby_user_id:
+            return None
+        since = max(watermark or day_start, day_start)
+        async with semaphore:
+            minutes, latest = await fetch_new_plays(emby_user_id, since)
+        if minutes <= 0:
+            return None
+        played_counts.invalidate(emby_user_id)
+        # 条目没有播放时间时以本轮开始时间作为水位
+        return tg_id, minutes, latest or run_started
+
+    results = await asyncio.gather(*(fetch(*row) for row in bound_users), return_exceptions=True)
+    plays, errors = [], 0
+    for result in results:
+        if isinstance(result, Exception):
+            errors += 1
+            logger.warning(f"[WatchIngest] 拉取观影记录失败: {result}")
+        elif result is not None:
+            plays.append(result)
+    return plays, errors
+
+
+def apply_watch_rewards(plays: list) -> int:
+    """
+    结算阶段：一个事务内按规则发放观影奖励并推进水位，返回获奖人数
+    不足 MINUTES_PER_MP 的新增时长不推进水位，留到下次与新播放合并结算
+    """
+    if not plays:
+        return 0
+    by_user = {tg_id: (minutes, watermark) for tg_id, minutes, watermark in plays}
+    tg_ids = list(by_user)
+    rewards = {}
+    with get_session() as session:
+        for i in range(0, len(tg_ids), WATCH_APPLY_BATCH):
+            users = session.query(UserBinding).options(*user_load_options(["identity", "emby_watch"])).filter(
+                UserBinding.tg_id.in_(tg_ids[i:i + WATCH_APPLY_BATCH])
+            ).all()
+            for user in users:
+                minutes, watermark = by_user[user.tg_id]
+                daily_watch = user.daily_watch_minutes or 0
+                claimable_minutes = min(minutes, DAILY_MAX_MINUTES - daily_watch)
+                if claimable_minutes < MINUTES_PER_MP:
+                    if daily_watch >= DAILY_MAX_MINUTES:
+                        # 今日已封顶，这些播放不会再计奖励
+                        user.watch_ingested_at = watermark
+                    continue
+
+                # 新手期使用更快的兑换率
+                mp_reward = claimable_minutes // get_minutes_per_mp(user)
+                if user.is_vip:
+                    mp_reward = int(mp_reward * VIP_BONUS_MULTIPLIER)
+
+                user.daily_watch_minutes = daily_watch + claimable_minutes
+                user.total_watch_minutes = (user.total_watch_minutes or 0) + claimable_minutes
+                user.watch_ingested_at = watermark
+                rewards[user.tg_id] = mp_reward
+                logger.debug(f"用户 {user.tg_id} 观影奖励: +{mp_reward} MP ({claimable_minutes}分钟)")
+
+        credit_many(rewards, "观影奖励", session=session)
+        session.commit()
+    return len(rewards)
+
+
+async def process_watch_rewards_job(context=None) -> dict:
+    """定时任务：增量采集观影记录并结算奖励（每小时执行一次）"""
+    started = time.perf_counter()
+
+    async with _ingest_lock:
+        # 水位必须在锁内读取：等锁期间 Webhook 结算可能已推进水位，锁外读到的旧水位会重复发奖
+        with get_session() as session:
+            bound_users = session.query(
+                UserBinding.tg_id, UserBinding.emby_account, UserBinding.watch_ingested_at
+            ).filter(UserBinding.emby_account != None, UserBinding.emby_account != "").all()
+        plays, errors = await collect_watch_plays(bound_users)
+        fetched_in = time.perf_counter() - started
+        rewarded = apply_watch_rewards(plays)
+    duration = time.perf_counter() - started
+
+    stats = {
+        "users": len(bound_users),
+        "with_plays": len(plays),
+        "rewarded": rewarded,
+        "errors": errors,
+        "fetch_seconds": round(fetched_in, 3),
+        "duration": round(duration, 3),
+        "users_per_second": round(len(bound_users) / duration, 1) if duration else 0.0,
+    }
+    watch_ingest_stats.update(stats, runs=watch_ingest_stats.get("runs", 0) + 1)
+    logger.info(
+        f"观影奖励处理完成: {rewarded} 人获奖 / {len(plays)} 人有新播放 / 扫描 {len(bound_users)} 人，"
+        f"失败 {errors}，耗时 {duration:.1f}s（网络 {fetched_in:.1f}s，{stats['users_per_second']} 人/秒）"
+    )
+    if duration > WATCH_REWARD_INTERVAL:
+        logger.warning(f"观影奖励处理耗时 {duration:.0f}s 超过调度间隔 {WATCH_REWARD_INTERVAL}s")
+    return stats
+
+
+async def ingest_user_plays(emby_account: str) -> int:
+    """只结算一个 Emby 账号的新播放（Webhook 的 playback.stop 触发），走与定时结算相同的水位流程，返回获奖人数"""
+    async with _ingest_lock:
+        # 同样在锁内读取水位（同一账号连续两次 playback.stop、或正赶上每小时的全量结算）
+        with get_session() as session:
+            bound_users = session.query(
+                UserBinding.tg_id, UserBinding.emby_account, UserBinding.watch_ingested_at
+            ).filter(UserBinding.emby_account == emby_account).all()
+        if not bound_users:
+            return 0
+        plays, errors = await collect_watch_plays(bound_users)
+        return apply_watch_rewards(plays)
+
+
+async def on_emby_playback_stop(event: dict):
+    """Webhook：播放结束立即结算该用户的观影奖励（只处理播放完成的视频）"""
+    user_name = (event.get("User") or {}).get("Name")
+    playback = event.get("PlaybackInfo") or {}
+    if not user_name or playback.get("PlayedToCompletion") is False:
+        return
+    rewarded = await ingest_user_plays(user_name)
+    if rewarded:
+        logger.info(f"[EmbyWebhook] {user_name} 播放结束，已结算观影奖励")
 
-                    logger.info(f"用户 {user.tg_id} 观影奖励: +{mp_reward} MP ({claimable_minutes}分钟)")
-                    processed += 1
 
-        session.commit()
-        logger.info(f"观影奖励处理完成: {processed} 人")
+async def on_emby_library_new(event: dict):
+    """Webhook：新条目入库，提前唤醒新片变更流"""
+    emby_feed.trigger()
 
 
 async def cmd_early_bird(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -492,8 +544,7 @@ async def cmd_early_bird(update: Update, context: ContextTypes.DEFAULT_TYPE):
     recent_media = await get_recently_added_media(limit=20)
 
     # 获取当前用户的Emby ID
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await reply_with_auto_delete(
@@ -506,25 +557,15 @@ async def cmd_early_bird(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # 获取用户已观看的媒体
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     user_watched_ids = set()
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-            params = {
-                "Filters": "IsPlayed",
-                "Limit": 1000,
-                "IncludeItemTypes": "Movie,Episode"
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    user_watched_ids = {item['Id'] for item in data.get('Items', [])}
+        params = {
+            "Filters": "IsPlayed",
+            "Limit": 1000,
+            "IncludeItemTypes": "Movie,Episode"
+        }
+        data = await emby_client.get_json(f"/Users/{emby_user_id}/Items", params)
+        user_watched_ids = {item['Id'] for item in data.get('Items', [])}
     except Exception as e:
         logger.error(f"获取用户观看记录失败: {e}")
 
@@ -532,8 +573,8 @@ async def cmd_early_bird(update: Update, context: ContextTypes.DEFAULT_TYPE):
     with get_session() as session:
         user = session.query(UserBinding).filter_by(tg_id=user_id).first()
         claimed_ids = set()
-        if user and user.claimed_early_bird_items:
-            claimed_ids = set(user.claimed_early_bird_items.split(',')) if user.claimed_early_bird_items else set()
+        if user:
+            claimed_ids = user_set_members(user.tg_id, "early_bird", [m.get('Id') for m in recent_media[:10]], session)
         is_vip = user.is_vip if user else False
         early_birds = user.early_bird_wins or 0 if user else 0
 
@@ -658,13 +699,20 @@ async def cmd_claim_early_bird(update: Update, context: ContextTypes.DEFAULT_TYP
 
     short_id = context.args[0]
 
-    # 获取新片列表找到完整ID
-    recent_media = await get_recently_added_media(limit=50)
+    # 先查变更流开启的首播冲刺，再查新片列表找到完整ID
     target_item = None
-    for media in recent_media:
-        if media.get('Id', '').startswith(short_id):
-            target_item = media
+    for race_id, race in active_races.items():
+        if race_id.startswith(short_id):
+            target_item = emby_library.get(race_id) or {
+                'Id': race_id, 'Name': race['name'], 'DateCreated': race['premiere_time'],
+            }
             break
+    if target_item is None:
+        recent_media = await get_recently_added_media(limit=50)
+        for media in recent_media:
+            if media.get('Id', '').startswith(short_id):
+                target_item = media
+                break
 
     if not target_item:
         await reply_with_auto_delete(
@@ -702,33 +750,22 @@ async def cmd_claim_early_bird(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     # 获取用户Emby ID
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await reply_with_auto_delete(msg, "💔 未找到 Emby 账号")
         return
 
     # 检查是否看过
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     has_watched = False
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-            params = {
-                "Filters": "IsPlayed",
-                "Ids": item_id,
-                "Limit": 1
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    has_watched = len(data.get('Items', [])) > 0
+        params = {
+            "Filters": "IsPlayed",
+            "Ids": item_id,
+            "Limit": 1
+        }
+        data = await emby_client.get_json(f"/Users/{emby_user_id}/Items", params)
+        has_watched = len(data.get('Items', [])) > 0
     except Exception as e:
         logger.error(f"检查观看状态失败: {e}")
 
@@ -750,11 +787,7 @@ async def cmd_claim_early_bird(update: Update, context: ContextTypes.DEFAULT_TYP
             await reply_with_auto_delete(msg, "💔 用户不存在")
             return
 
-        claimed_ids = set()
-        if user.claimed_early_bird_items:
-            claimed_ids = set(user.claimed_early_bird_items.split(',')) if user.claimed_early_bird_items else set()
-
-        if item_id in claimed_ids:
+        if user_set_contains(user.tg_id, "early_bird", item_id, session):
             await reply_with_auto_delete(
                 msg,
                 f"🎁 <b>【首播奖励领取】</b>\n"
@@ -784,11 +817,11 @@ async def cmd_claim_early_bird(update: Update, context: ContextTypes.DEFAULT_TYP
         if user.is_vip:
             reward = int(reward * 1.5)
 
-        # 更新已领取列表
-        claimed_ids.add(item_id)
-        user.claimed_early_bird_items = ','.join(claimed_ids)
+        # 记录已领取（重复领取时插入为空，不再发奖）
+        if not add_to_user_set(user.tg_id, "early_bird", [item_id], session):
+            return
         user.early_bird_wins = (user.early_bird_wins or 0) + 1
-        user.points += reward
+        credit(user.tg_id, reward, "首播冲刺", session=session)
         user.total_earned = (user.total_earned or 0) + reward
         session.commit()
 
@@ -825,80 +858,43 @@ async def cmd_watch_recommend(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     # 获取随机媒体
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     try:
-        async with aiohttp.ClientSession() as session:
-            # 获取电影和剧集总数
-            url = f"{EMBY_URL}/Items"
-            params = {
-                "IncludeItemTypes": "Movie,Episode",
-                "Recursive": True,
-                "Limit": 1
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    raise Exception("获取媒体失败")
-                data = await resp.json()
-                total_count = data.get('TotalRecordCount', 0)
+        # 随机选取电影或剧集（本地索引，索引为空时实时查询 Emby）
+        items = await emby_library.random_items(["Movie", "Episode"])
+        if not items:
+            await reply_with_auto_delete(msg, "📭 媒体库空空如也喵~")
+            return
 
-            if total_count == 0:
-                await reply_with_auto_delete(msg, "📭 媒体库空空如也喵~")
-                return
+        item = items[0]
+        item_name = item.get('Name', '未知')
+        item_type = item.get('Type', '')
+        production_year = item.get('ProductionYear', '')
+        genres = item.get('Genres', [])
+        overview = item.get('Overview', '')
 
-            # 随机选取
-            import random
-            random_offset = random.randint(0, max(0, total_count - 1))
+        type_icon = "🎬" if item_type == "Movie" else "📺"
+        genre_text = f"{' | '.join(genres[:3])}" if genres else "未分类"
 
-            params = {
-                "IncludeItemTypes": "Movie,Episode",
-                "Recursive": True,
-                "StartIndex": random_offset,
-                "Limit": 1
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    raise Exception("获取推荐失败")
-                data = await resp.json()
-                items = data.get('Items', [])
-                if not items:
-                    await reply_with_auto_delete(msg, "📭 推荐获取失败喵~")
-                    return
-
-                item = items[0]
-                item_name = item.get('Name', '未知')
-                item_type = item.get('Type', '')
-                production_year = item.get('ProductionYear', '')
-                genres = item.get('Genres', [])
-                overview = item.get('Overview', '')
-
-                type_icon = "🎬" if item_type == "Movie" else "📺"
-                genre_text = f"{' | '.join(genres[:3])}" if genres else "未分类"
-
-                # 截断简介
-                if overview and len(overview) > 100:
-                    overview = overview[:100] + "..."
-
-                lines = [
-                    f"🎲 <b>【 今 日 观 影 推 荐 】</b>",
-                    "━━━━━━━━━━━━━━━━━━",
-                    f"{type_icon} <b>{item_name}</b>",
-                    f"📅 {production_year}" if production_year else "",
-                    f"🏷️ {genre_text}" if genre_text else "",
-                    "━━━━━━━━━━━━━━━━━━",
-                ]
-
-                if overview:
-                    lines.append(f"📝 {overview}")
-                    lines.append("━━━━━━━━━━━━━━━━━━")
-
-                lines.append(f"<i>\"今天就看这个吧 Master！(｡•̀ᴗ-)✧\"</i>")
-
-                await reply_with_auto_delete(msg, "\n".join(lines))
+        # 截断简介
+        if overview and len(overview) > 100:
+            overview = overview[:100] + "..."
+
+        lines = [
+            f"🎲 <b>【 今 日 观 影 推 荐 】</b>",
+            "━━━━━━━━━━━━━━━━━━",
+            f"{type_icon} <b>{item_name}</b>",
+            f"📅 {production_year}" if production_year else "",
+            f"🏷️ {genre_text}" if genre_text else "",
+            "━━━━━━━━━━━━━━━━━━",
+        ]
+
+        if overview:
+            lines.append(f"📝 {overview}")
+            lines.append("━━━━━━━━━━━━━━━━━━")
+
+        lines.append(f"<i>\"今天就看这个吧 Master！(｡•̀ᴗ-)✧\"</i>")
+
+        await reply_with_auto_delete(msg, "\n".join(lines))
 
     except Exception as e:
         logger.error(f"观影推荐失败: {e}")
@@ -918,8 +914,7 @@ async def cmd_watch_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await reply_with_auto_delete(msg, await get_unbound_message())
         return
 
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await reply_with_auto_delete(msg, "💔 未找到 Emby 账号")
@@ -947,30 +942,12 @@ async def cmd_watch_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if registered_date:
         member_days = (datetime.now() - registered_date.replace(tzinfo=None)).days + 1
 
-    # 获取用户观看的媒体数量
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
+    # 获取用户观看的媒体数量（只取总数，按用户缓存）
     movies_watched = 0
     episodes_watched = 0
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-            params = {
-                "Filters": "IsPlayed",
-                "Limit": 10000
-            }
-            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    for item in data.get('Items', []):
-                        if item.get('Type') == 'Movie':
-                            movies_watched += 1
-                        elif item.get('Type') == 'Episode':
-                            episodes_watched += 1
+        counts = await played_counts.get(emby_user_id)
+        movies_watched, episodes_watched = counts["Movie"], counts["Episode"]
     except Exception as e:
         logger.error(f"获取观看统计失败: {e}")
 
@@ -1064,30 +1041,17 @@ async def check_watch_achievements(user, session, emby_user_id=None):
     """检查并发放观影成就"""
     new_achievements = []
 
-    claimed = set()
-    if user.watch_achievements:
-        claimed = set(user.watch_achievements.split(',')) if user.watch_achievements else set()
+    claimed = get_user_set(user.tg_id, "watch_achievement", session)
 
     total_minutes = user.total_watch_minutes or 0
     early_birds = user.early_bird_wins or 0
     weekly_completed = user.weekly_challenge_completed or 0
 
-    # 获取观看的电影数量
+    # 获取观看的电影数量（只取总数，按用户缓存）
     movies_count = 0
     if emby_user_id:
         try:
-            headers = {
-                "X-Emby-Token": EMBY_API_KEY,
-                "Accept": "application/json",
-                "User-Agent": "curl/7.68.0"
-            }
-            async with aiohttp.ClientSession() as session_http:
-                url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-                params = {"Filters": "IsPlayed", "Limit": 10000, "IncludeItemTypes": "Movie"}
-                async with session_http.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        movies_count = len(data.get('Items', []))
+            movies_count = (await played_counts.get(emby_user_id))["Movie"]
         except Exception:
             pass
 
@@ -1107,8 +1071,8 @@ async def check_watch_achievements(user, session, emby_user_id=None):
 
         if unlocked:
             claimed.add(ach_id)
-            user.watch_achievements = ','.join(claimed)
-            user.points += ach_data["reward"]
+            add_to_user_set(user.tg_id, "watch_achievement", [ach_id], session)
+            credit(user.tg_id, ach_data["reward"], "观影成就", session=session)
             user.total_earned = (user.total_earned or 0) + ach_data["reward"]
             session.commit()
             new_achievements.append({
@@ -1134,8 +1098,7 @@ async def cmd_watch_achievements(update: Update, context: ContextTypes.DEFAULT_T
         await reply_with_auto_delete(msg, await get_unbound_message())
         return
 
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     with get_session() as session:
         user = session.query(UserBinding).filter_by(tg_id=user_id).first()
@@ -1148,26 +1111,13 @@ async def cmd_watch_achievements(update: Update, context: ContextTypes.DEFAULT_T
         weekly_completed = user.weekly_challenge_completed or 0
         is_vip = user.is_vip
 
-        claimed = set()
-        if user.watch_achievements:
-            claimed = set(user.watch_achievements.split(',')) if user.watch_achievements else set()
+        claimed = get_user_set(user.tg_id, "watch_achievement", session)
 
-    # 获取观看的电影数量
+    # 获取观看的电影数量（只取总数，按用户缓存）
     movies_count = 0
     if emby_user_id:
         try:
-            headers = {
-                "X-Emby-Token": EMBY_API_KEY,
-                "Accept": "application/json",
-                "User-Agent": "curl/7.68.0"
-            }
-            async with aiohttp.ClientSession() as session_http:
-                url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-                params = {"Filters": "IsPlayed", "Limit": 10000, "IncludeItemTypes": "Movie"}
-                async with session_http.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        movies_count = len(data.get('Items', []))
+            movies_count = (await played_counts.get(emby_user_id))["Movie"]
         except Exception:
             pass
 
@@ -1226,6 +1176,33 @@ async def cmd_watch_achievements(update: Update, context: ContextTypes.DEFAULT_T
 
 # ==================== 每周观影挑战 ====================
 
+def current_week_start(now: Optional[datetime] = None) -> datetime:
+    """本周开始时间（周一0点）"""
+    now = now or datetime.now()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=now.weekday())
+
+
+def roll_weekly_challenge(user: UserBinding, week_start: datetime) -> bool:
+    """
+    周挑战跨周：进度与领取状态归零，按上周完成情况调整目标，并记下本周
+    没有周标记的旧数据只归零、不调整目标；返回是否发生了重置
+    """
+    marked = user.weekly_challenge_week
+    if marked is not None and marked.replace(tzinfo=None) >= week_start:
+        return False
+
+    if marked is not None:
+        target = user.weekly_challenge_target or 30
+        if (user.weekly_challenge_progress or 0) >= target:
+            user.weekly_challenge_target = min(600, target + 30)  # 增加目标，最多600分钟
+        else:
+            user.weekly_challenge_target = max(30, target - 15)  # 降低目标，最少30分钟
+    user.weekly_challenge_progress = 0
+    user.weekly_challenge_reward_claimed = False
+    user.weekly_challenge_week = week_start
+    return True
+
+
 async def cmd_weekly_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """每周观影挑战"""
     msg = update.effective_message
@@ -1239,19 +1216,16 @@ async def cmd_weekly_challenge(update: Update, context: ContextTypes.DEFAULT_TYP
         await reply_with_auto_delete(msg, await get_unbound_message())
         return
 
-    emby_users = await get_emby_users()
-    emby_user_id = emby_users.get(emby_account)
+    emby_user_id = await emby_directory.resolve_id(emby_account)
 
     if not emby_user_id:
         await reply_with_auto_delete(msg, "💔 未找到 Emby 账号")
         return
 
     # 获取本周开始时间（周一0点）
-    from datetime import timedelta as td
     now = datetime.now()
-    weekday = now.weekday()  # 0=周一, 6=周日
-    week_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - td(days=weekday)
-    week_end = week_start + td(days=7)
+    week_start = current_week_start(now)
+    week_end = week_start + timedelta(days=7)
 
     with get_session() as session:
         user = session.query(UserBinding).filter_by(tg_id=user_id).first()
@@ -1266,55 +1240,26 @@ async def cmd_weekly_challenge(update: Update, context: ContextTypes.DEFAULT_TYP
         if not user.weekly_challenge_target:
             # 新用户默认30分钟目标（降低门槛）
             user.weekly_challenge_target = 30
-            session.commit()
+
+        # 新的一周：重置进度并调整目标（周标记独立于每日任务的 task_date，日切不会影响）
+        roll_weekly_challenge(user, week_start)
+        session.commit()
 
         target = user.weekly_challenge_target
-        progress = user.weekly_challenge_progress or 0
         reward_claimed = user.weekly_challenge_reward_claimed
 
-        # 检查是否需要重置（新的一周）
-        if user.task_date:
-            last_task = user.task_date.replace(tzinfo=None)
-            if last_task < week_start:
-                # 新的一周，重置进度
-                user.weekly_challenge_progress = 0
-                user.weekly_challenge_reward_claimed = False
-                # 根据上周完成情况调整目标
-                if progress >= target:
-                    user.weekly_challenge_target = min(600, target + 30)  # 增加目标，最多600分钟
-                else:
-                    user.weekly_challenge_target = max(30, target - 15)  # 降低目标，最少30分钟
-                session.commit()
-                target = user.weekly_challenge_target
-                progress = 0
-                reward_claimed = False
-
-        # 更新任务日期
-        user.task_date = now
-        session.commit()
-
     # 获取本周实际观影时长（从Emby）
-    headers = {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
     week_watch_minutes = 0
     try:
-        async with aiohttp.ClientSession() as session_http:
-            url = f"{EMBY_URL}/Users/{emby_user_id}/Items"
-            params = {
-                "Filters": "IsPlayed",
-                "MinDatePlayed": week_start.isoformat(),
-                "Limit": 1000
-            }
-            async with session_http.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    for item in data.get('Items', []):
-                        if item.get('RunTimeTicks'):
-                            week_watch_minutes += (item['RunTimeTicks'] // 10000000) // 60
+        params = {
+            "Filters": "IsPlayed",
+            "MinDatePlayed": week_start.isoformat(),
+            "Limit": 1000
+        }
+        data = await emby_client.get_json(f"/Users/{emby_user_id}/Items", params)
+        for item in data.get('Items', []):
+            if item.get('RunTimeTicks'):
+                week_watch_minutes += (item['RunTimeTicks'] // 10000000) // 60
     except Exception as e:
         logger.error(f"获取本周观影数据失败: {e}")
 
@@ -1390,6 +1335,10 @@ async def cmd_claim_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await reply_with_auto_delete(msg, "💔 用户不存在")
             return
 
+        # 跨周后上周的进度与领取状态作废
+        if roll_weekly_challenge(user, current_week_start()):
+            session.commit()
+
         target = user.weekly_challenge_target or 60
         progress = user.weekly_challenge_progress or 0
         reward_claimed = user.weekly_challenge_reward_claimed
@@ -1422,7 +1371,7 @@ async def cmd_claim_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         user.weekly_challenge_reward_claimed = True
         user.weekly_challenge_completed = (user.weekly_challenge_completed or 0) + 1
-        user.points += base_reward
+        credit(user.tg_id, base_reward, "周挑战", session=session)
         user.total_earned = (user.total_earned or 0) + base_reward
         session.commit()
 
@@ -1442,8 +1391,7 @@ async def cmd_claim_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         # 检查成就
-        emby_users = await get_emby_users()
-        emby_user_id = emby_users.get(emby_account)
+        emby_user_id = await emby_directory.resolve_id(emby_account)
         new_achievements = await check_watch_achievements(user, session, emby_user_id)
 
 
@@ -1535,76 +1483,61 @@ async def cmd_vip_watch_benefits(update: Update, context: ContextTypes.DEFAULT_T
 
 # ==================== 新片自动推送 ====================
 
-async def check_and_announce_new_releases(context):
-    """定时检查并推送新片到配置的群组"""
-    if not EMBY_URL or not EMBY_API_KEY:
-        return
-
+def new_release_window(items: list) -> list:
+    """变更流条目中仍在首播窗口内的电影 / 剧集"""
+    now = datetime.now(timezone.utc)
+    releases = []
+    for media in items:
+        if media.get('Type') not in ('Movie', 'Episode'):
+            continue
+        premiere_time = parse_emby_date(media.get('DateCreated'))
+        if premiere_time is None:
+            continue
+        premiere_time = premiere_time.replace(tzinfo=timezone.utc)
+        if (now - premiere_time).total_seconds() / 3600 > NEW_RELEASE_TIME_LIMIT_HOURS:
+            continue
+        releases.append({
+            'id': media.get('Id'),
+            'name': media.get('Name', '未知'),
+            'type': media.get('Type'),
+            'year': media.get('ProductionYear', ''),
+            'genres': media.get('Genres', []),
+            'overview': media.get('Overview', ''),
+            'premiere_time': premiere_time
+        })
+    return releases
+
+
+async def announce_new_releases(bot, items: list):
+    """新片变更流订阅者：推送新片公告到配置的群组"""
     if not NOTIFICATION_CHATS:
         return
 
-    try:
-        # 获取最近添加的媒体（最近24小时）
-        recent_media = await get_recently_added_media(limit=50)
-
-        now = datetime.now(timezone.utc)
-        new_items = []
+    new_items = new_release_window(items)
+    for item in new_items:
+        await send_new_release_notification(bot, item)
 
-        for media in recent_media:
-            item_id = media.get('Id')
-            item_name = media.get('Name', '未知')
-            item_type = media.get('Type', '')
-            premiere_date = media.get('DateCreated', '')
-            production_year = media.get('ProductionYear', '')
-            genres = media.get('Genres', [])
-            overview = media.get('Overview', '')
-
-            # 跳过已推送的
-            if item_id in announced_items:
-                continue
+    if new_items:
+        logger.info(f"推送了 {len(new_items)} 部新片")
 
-            # 检查是否是48小时内的新片
-            try:
-                if isinstance(premiere_date, str):
-                    premiere_time = datetime.fromisoformat(premiere_date.replace('Z', '+00:00'))
-                else:
-                    premiere_time = premiere_date
-                hours_since = (now - premiere_time).total_seconds() / 3600
-            except:
-                continue
-
-            if hours_since > NEW_RELEASE_TIME_LIMIT_HOURS:
-                continue
 
-            # 只推送电影和剧集
-            if item_type not in ['Movie', 'Episode']:
-                continue
-
-            new_items.append({
-                'id': item_id,
-                'name': item_name,
-                'type': item_type,
-                'year': production_year,
-                'genres': genres,
-                'overview': overview,
-                'premiere_time': premiere_time
-            })
-
-            # 标记为已推送
-            announced_items.add(item_id)
-
-        # 如果有新片，发送通知
-        if new_items:
-            for item in new_items:
-                await send_new_release_notification(context, item)
-
-            logger.info(f"推送了 {len(new_items)} 部新片")
+async def open_early_bird_races(bot, items: list):
+    """新片变更流订阅者：为首播窗口内的新片开启首播冲刺，并清理已过期的冲刺"""
+    now = datetime.now(timezone.utc)
+    for race_id in [k for k, race in active_races.items()
+                    if (now - race['premiere_time']).total_seconds() / 3600 > NEW_RELEASE_TIME_LIMIT_HOURS]:
+        del active_races[race_id]
 
-    except Exception as e:
-        logger.error(f"检查新片失败: {e}")
+    for item in new_release_window(items):
+        active_races.setdefault(item['id'], {
+            "name": item['name'],
+            "premiere_time": item['premiere_time'],
+            "finishers": [],
+            "limit": NEW_RELEASE_LIMIT,
+        })
 
 
-async def send_new_release_notification(context, item):
+async def send_new_release_notification(bot, item):
     """发送新片通知到配置的群组"""
     type_icon = "🎬" if item['type'] == "Movie" else "📺"
     type_name = "电影" if item['type'] == "Movie" else "剧集"
@@ -1647,7 +1580,7 @@ async def send_new_release_notification(context, item):
             chat_id = chat_id.strip()
             if not chat_id:
                 continue
-            await context.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
         except Exception as e:
             logger.error(f"发送通知到群组 {chat_id} 失败: {e}")
 
@@ -1682,7 +1615,7 @@ async def cmd_notify_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     lines.extend([
         "\n━━━━━━━━━━━━━━━━━━",
-        f"⏰ 检查频率: 每{CHECK_NEW_RELEASES_INTERVAL//60}分钟",
+        f"⏰ 检查频率: 每{Config.EMBY_FEED_INTERVAL//60}分钟",
         f"🕐 推送窗口: 新片{NEW_RELEASE_TIME_LIMIT_HOURS}小时内",
         "\n<i>\"有新片上线时会自动推送喵~(｡•̀ᴗ-)✧\"</i>"
     ])
@@ -1733,10 +1666,17 @@ def register(app):
     # 观影奖励回调
     app.add_handler(CallbackQueryHandler(claim_watch_callback, pattern="^claim_watch_reward$"))
 
-    # 注册定时任务（检查新片推送）
+    # 订阅新片变更流（新片公告、首播冲刺）
+    emby_feed.subscribe("release_announce", announce_new_releases)
+    emby_feed.subscribe("early_bird_race", open_early_bird_races)
+    # Emby Webhook（可选）：入库立即唤醒变更流，播放结束立即结算；轮询保留作对账
+    emby_webhook.on("library.new", on_emby_library_new)
+    emby_webhook.on("playback.stop", on_emby_playback_stop)
+
+    # 注册定时任务（观影奖励结算）
     # 注意：需要在主程序中配置 job queue
     if hasattr(app, 'job_queue') and app.job_queue:
-        app.job_queue.run_repeating(check_and_announce_new_releases, CHECK_NEW_RELEASES_INTERVAL, first=10)
-        logger.info(f"新片推送任务已启动: 每{CHECK_NEW_RELEASES_INTERVAL//60}分钟检查一次")
+        app.job_queue.run_repeating(process_watch_rewards_job, WATCH_REWARD_INTERVAL, first=60)
+        logger.info(f"观影奖励结算任务已启动: 每{WATCH_REWARD_INTERVAL//60}分钟结算一次")
     else:
-        logger.warning("Job queue 未启用，新片推送功能不可用")
+        logger.warning("Job queue 未启用，观影奖励结算不可用")
@@ -8,6 +8,9 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.guilds import set_attack
+from database.ledger import debit_if_sufficient
+from database.user_sets import add_weapon, get_weapon_counts
 from utils import reply_with_auto_delete, edit_with_auto_delete
 from plugins.feedback_utils import detailed_power_change, success_burst, get_rarity_effect, random_loading
 from plugins.quotes import get_forge_success_quote, get_forge_fail_comfort, random_cute_emoji
@@ -150,7 +153,8 @@ async def forge_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             boost_rarity = False
             used_ticket = None
 
-        if not used_ticket and u.points < cost:
+        # 不用券时在 SQL 端校验余额并扣费
+        if not used_ticket and debit_if_sufficient(user_id, cost, "锻造", session=session) is None:
             points = u.points
             is_vip = u.is_vip
             if is_vip:
@@ -190,7 +194,6 @@ async def forge_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             u.free_forges -= 1
             remaining = u.free_forges
         else:
-            u.points -= cost
             remaining = 0
 
         # 获取保底计数
@@ -362,18 +365,14 @@ async def forge_result_callback(update: Update, context: ContextTypes.DEFAULT_TY
         if action == "equip":
             # 装备新武器
             u.weapon = new_name
-            u.attack = base_atk
+            set_attack(u, base_atk, session)
             await track_activity_wrapper(user.id, "forge")
 
             # [新增] 自动收藏高稀有度武器 (SR及以上)
             collection_msg = ""
             if rarity_tier >= 2:  # SR 或 SSR
                 # 添加到收藏
-                current_collection = u.weapon_collection if u.weapon_collection else ""
-                if current_collection:
-                    u.weapon_collection = current_collection + "," + new_name
-                else:
-                    u.weapon_collection = new_name
+                add_weapon(u.tg_id, new_name, session)
 
                 if rarity_tier == 3:  # SSR
                     collection_msg = "\n🏆 <b>已自动收藏到武器馆！</b>"
@@ -526,16 +525,12 @@ async def weapon_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # 获取收藏的武器
-        raw_collection = u.weapon_collection if u.weapon_collection else ""
+        weapon_counts = get_weapon_counts(u.tg_id, session)
+        total_count = sum(weapon_counts.values())
 
-        if not raw_collection.strip():
+        if not weapon_counts:
             collection_display = "🍃 <i>\"还没有收藏任何武器...\\n去锻造一些精品武器吧喵~\"</i>"
         else:
-            # 解析收藏列表
-            weapons = raw_collection.split(",") if raw_collection else []
-            # 按稀有度排序
-            from collections import Counter
-            weapon_counts = Counter(weapons)
 
             # 按稀有度分组
             rarity_groups = {
@@ -588,7 +583,7 @@ async def weapon_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"🏆 <b>【 武 器 收 藏 馆 】</b>\n"
             f"━━━━━━━━━━━━━━━━━━\n"
             f"👤 <b>{u.emby_account}</b>{vip_badge}\n"
-            f"📊 收藏数：{len(raw_collection.split(',')) if raw_collection else 0} 件\n"
+            f"📊 收藏数：{total_count} 件\n"
             f"━━━━━━━━━━━━━━━━━━\n"
             f"{collection_display}\n"
             f"━━━━━━━━━━━━━━━━━━\n"
@@ -18,8 +18,11 @@ from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, ContextTypes, CallbackQueryHandler
 from database import get_session, UserBinding
+from database.guilds import set_attack
+from database.ledger import credit, debit_if_sufficient
 from utils import reply_with_auto_delete
 from config import Config
+from emby import emby_library, EmbyError
 
 # 正面反馈增强
 from plugins.feedback_utils import get_crit_effect, success_burst, get_rarity_effect
@@ -41,54 +44,25 @@ async def track_activity_wrapper(user_id: int, activity_type: str):
 # Emby API 配置
 EMBY_URL = Config.EMBY_URL.rstrip('/')
 EMBY_API_KEY = Config.EMBY_API_KEY
-EMBY_USER_ID = "f622565cba214bfca04609d32d5d26d0"  # 默认用户ID
 
 # ==========================================
 # 🔮 Emby API 工具函数
 # ==========================================
 
-def get_emby_headers():
-    """获取 Emby API 请求头"""
-    return {
-        "X-Emby-Token": EMBY_API_KEY,
-        "Accept": "application/json",
-        "User-Agent": "curl/7.68.0"
-    }
-
 async def fetch_random_movie() -> dict:
-    """从 Emby 获取随机电影（使用 aiohttp）"""
-    import aiohttp
-    import warnings
-    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
-
+    """随机电影：读媒体库本地索引，索引为空时实时查询 Emby"""
     if not EMBY_URL or not EMBY_API_KEY:
         logger.error("Emby 配置不完整")
         return None
 
-    url = (
-        f"{EMBY_URL}/Users/{EMBY_USER_ID}/Items"
-        f"?SortBy=Random"
-        f"&Recursive=true"
-        f"&IncludeItemTypes=Movie"
-        f"&Limit=50"
-        f"&Fields=CommunityRating,ProductionYear,Genres,Overview"
-    )
-
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=get_emby_headers(), ssl=False, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status != 200:
-                    text = await resp.text()
-                    logger.error(f"Emby API 返回状态码: {resp.status}, 响应: {text[:200]}")
-                    return None
-                data = await resp.json()
-                items = data.get('Items', [])
-                if not items:
-                    logger.warning("Emby 媒体库为空")
-                    return None
-                return random.choice(items)
-    except asyncio.TimeoutError:
-        logger.error("Emby API 请求超时")
+        items = await emby_library.random_items(["Movie"])
+        if not items:
+            logger.warning("Emby 媒体库为空")
+            return None
+        return items[0]
+    except EmbyError as e:
+        logger.error(f"Emby API 请求失败: {e}")
         return None
     except Exception as e:
         logger.error(f"Emby API 请求失败: {e}", exc_info=True)
@@ -202,12 +176,9 @@ async def blind_box_gacha(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await loading_msg.edit_text(error_text)
             return
 
-        # 检查是否有免费次数（每日一次）
+        # 检查是否有免费次数（每日一次）：daily_tarot_count 由每日重置任务清零，今天的第一抽免费
         now = datetime.now()
-        today = now.date()
-        last_tarot_date = user.last_tarot.date() if user.last_tarot else None
-
-        has_free = last_tarot_date is None or last_tarot_date < today
+        has_free = (user.daily_tarot_count or 0) == 0
         has_extra = user.extra_gacha and user.extra_gacha > 0
 
         # 计算消耗
@@ -260,17 +231,22 @@ async def blind_box_gacha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         year = movie.get('ProductionYear', '????')
         item_name = f"{rarity_emoji} {title} ({rarity_code})"
 
-        # 扣费
+        # 扣费（付费抽取在 SQL 端校验余额：等待 Emby 期间余额可能已被其它操作花掉）
         if has_free:
             user.last_tarot = now
         elif has_extra:
             user.extra_gacha -= 1
-        else:
-            user.points -= cost
+        elif debit_if_sufficient(user_id, cost, "命运抽卡", session=session) is None:
+            error_text = f"💸 <b>魔力不足喵！</b>\n\n抽取需要 <b>{cost} MP</b>"
+            if query:
+                await query.edit_message_text(error_text, parse_mode='HTML')
+            else:
+                await loading_msg.edit_text(error_text, parse_mode='HTML')
+            return
 
         # 返利
         if bonus > 0:
-            user.points += bonus
+            credit(user_id, bonus, "抽卡返利", session=session)
 
         # 更新累计抽卡次数
         user.gacha_total_count = (user.gacha_total_count or 0) + 1
@@ -289,7 +265,7 @@ async def blind_box_gacha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             user.items = item_name
 
-        # 更新每日计数
+        # 更新每日计数（含免费的第一抽，之后当天不再免费）
         user.daily_tarot_count = (user.daily_tarot_count or 0) + 1
 
         # 保存需要用于显示的值
@@ -379,7 +355,6 @@ async def blind_box_gacha(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 异步发送图片（仅命令模式）
     if not query:
         try:
-            import asyncio
             await asyncio.wait_for(
                 msg.reply_photo(
                     photo=poster_url,
@@ -670,8 +645,8 @@ async def duel_ai_bet_callback(update: Update, context: ContextTypes.DEFAULT_TYP
                 await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
                 return
 
-            # 检查余额
-            if u.points < bet:
+            # 押注先扣下（SQL 端校验余额），结算时再按胜负发放
+            if debit_if_sufficient(user.id, bet, "AI决斗押注", session=session) is None:
                 await query.edit_message_text(
                     f"💸 <b>魔力不足喵！</b>\n\n"
                     f"只有 {u.points} MP，无法发起 {bet} MP 的决斗！",
@@ -705,8 +680,7 @@ async def duel_ai_bet_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             if player_wins:
                 # 玩家胜利
                 reward = int(bet * ai["reward_multiplier"])
-                u.points += bet  # 返还赌注
-                u.points += reward - bet  # 额外奖励
+                credit(user.id, bet + reward, "AI决斗胜利", session=session)  # 返还赌注 + 奖励
                 u.win = (u.win or 0) + 1
                 u.win_streak = (u.win_streak or 0) + 1
 
@@ -732,13 +706,11 @@ async def duel_ai_bet_callback(update: Update, context: ContextTypes.DEFAULT_TYP
                 result = check_and_award_achievement(u, "duel_1", session)
                 if result["new"]:
                     result_text += f"\n\n🎉 {result['emoji']} {result['name']} (+{result['reward']}MP)"
-                    u.points += result["reward"]
 
                 session.commit()
 
             else:
-                # 玩家失败
-                u.points -= bet
+                # 玩家失败（押注已扣）
                 u.lost = (u.lost or 0) + 1
                 u.win_streak = 0
                 u.lose_streak = (u.lose_streak or 0) + 1
@@ -747,7 +719,7 @@ async def duel_ai_bet_callback(update: Update, context: ContextTypes.DEFAULT_TYP
                 consolation = min(bet // 10, 20)
                 if u.lose_streak >= 3:
                     consolation += 30
-                u.points += consolation
+                credit(user.id, consolation, "AI决斗安慰奖", session=session)
 
                 result_text = (
                     f"⚔️ <b>【 决 斗 结 束 】</b>\n"
@@ -1091,8 +1063,8 @@ async def duel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # 检查决斗是否过期 (60秒)
     if (datetime.now() - duel_data["created_at"]).total_seconds() > 60:
-        await query.edit_message_text("⏰ <b>决斗已超时喵！</b>\n\n<i>\"犹豫就会败北...\"</i>", parse_mode='HTML')
         delete_duel_data(context, duel_id)
+        await query.edit_message_text("⏰ <b>决斗已超时喵！</b>\n\n<i>\"犹豫就会败北...\"</i>", parse_mode='HTML')
         return
 
     # 处理取消（仅发起者可操作）
@@ -1100,12 +1072,12 @@ async def duel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user.id != duel_data["challenger_id"]:
             await query.answer("只有发起者才能取消决斗喵！", show_alert=True)
             return
+        delete_duel_data(context, duel_id)
         await query.answer("❌ 已取消")
         await query.edit_message_text(
             "❌ <b>决斗已取消</b>\n\n<i>\"发起者主动取消了这场决斗...\"</i>",
             parse_mode='HTML'
         )
-        delete_duel_data(context, duel_id)
         return
 
     # 只有应战者能操作接受/拒绝
@@ -1113,16 +1085,15 @@ async def duel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("这不是你的决斗喵！吃瓜群众请后退！", show_alert=True)
         return
 
+    # 先取走决斗数据再 await：应战者接受 / 拒绝与发起者取消同时点击时只有第一个生效
+    delete_duel_data(context, duel_id)
+
     if action == "reject":
         await query.answer("🏳️ 已拒绝")
         # 认怂，挑战者获得少量安慰奖
         consolation = max(5, duel_data["bet"] // 10)  # 10% 安慰奖
         try:
-            with get_session() as session:
-                u_cha = session.query(UserBinding).filter_by(tg_id=duel_data["challenger_id"]).first()
-                if u_cha:
-                    u_cha.points += consolation
-                    session.commit()
+            credit(duel_data["challenger_id"], consolation, "决斗认怂安慰奖")
 
             await query.edit_message_text(
                 f"🏳️ <b>决斗取消</b>\n\n"
@@ -1158,8 +1129,8 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
 
             bet = duel_data["bet"]
 
-            # 再次检查余额
-            if not u_opp or u_opp.points < bet:
+            # 双方押注先扣下（SQL 端校验余额；发起者余额不足时回滚，已扣的应战者押注一并退回）
+            if not u_opp or debit_if_sufficient(u_opp.tg_id, bet, "决斗押注", session=session) is None:
                 await query.edit_message_text(
                     f"💸 <b>决斗取消</b>\n\n"
                     f"{user.first_name or '应战者'} 的钱不够付赌注喵！\n"
@@ -1169,7 +1140,8 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
                 delete_duel_data(context, duel_id)
                 return
 
-            if not u_cha or u_cha.points < bet:
+            if not u_cha or debit_if_sufficient(u_cha.tg_id, bet, "决斗押注", session=session) is None:
+                session.rollback()
                 await query.edit_message_text(
                     f"💸 <b>决斗取消</b>\n\n"
                     f"{duel_data['challenger_name']} 的钱已经花光了喵！\n"
@@ -1238,36 +1210,17 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
             loser.win_streak = 0
             loser.lose_streak = (loser.lose_streak or 0) + 1
 
-            # 资金转移（扣除5%场地费）
+            # 资金转移（扣除5%场地费）：胜者拿回自己的押注，再赢得对方押注扣场地费后的部分
             arena_fee = max(1, bet // 20)  # 5% 场地费，最低1 MP
-            winner.points += bet - arena_fee
+            winner_gain = bet + bet - arena_fee
             winner.win += 1
             winner.lose_streak = 0  # 重置连败
 
-            # 更新每日决斗计数
+            # 更新每日决斗计数（每天零点由日切任务归零）
             now = datetime.now()
-            today = now.date()
-
-            # 检查胜者的计数器是否需要重置
-            if winner.last_duel_date:
-                last_date = winner.last_duel_date.date() if isinstance(winner.last_duel_date, datetime) else winner.last_duel_date
-                if last_date < today:
-                    winner.daily_duel_count = 1
-                else:
-                    winner.daily_duel_count = (winner.daily_duel_count or 0) + 1
-            else:
-                winner.daily_duel_count = 1
+            winner.daily_duel_count = (winner.daily_duel_count or 0) + 1
             winner.last_duel_date = now
-
-            # 检查败者的计数器是否需要重置
-            if loser.last_duel_date:
-                last_date = loser.last_duel_date.date() if isinstance(loser.last_duel_date, datetime) else loser.last_duel_date
-                if last_date < today:
-                    loser.daily_duel_count = 1
-                else:
-                    loser.daily_duel_count = (loser.daily_duel_count or 0) + 1
-            else:
-                loser.daily_duel_count = 1
+            loser.daily_duel_count = (loser.daily_duel_count or 0) + 1
             loser.last_duel_date = now
 
             # 财富追踪：胜者获得赌注
@@ -1290,12 +1243,11 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
             if loser.shield_active:
                 shield_protected = True
                 loser.shield_active = False  # 消耗防御卷轴
-                # 防御卷轴：不扣赌注，但获得安慰奖
-                loser.points += total_consolation
+                # 防御卷轴：退还押注，并获得安慰奖
+                credit(lose_id, bet + total_consolation, "决斗防御卷轴", session=session)
             else:
-                # 无防御卷轴：扣除赌注，但返还安慰奖
-                loser.points -= bet
-                loser.points += total_consolation
+                # 无防御卷轴：押注归胜者，返还安慰奖
+                credit(lose_id, total_consolation, "决斗安慰奖", session=session)
                 # 财富追踪：败者失去赌注（净消费）
                 loser.total_spent = (loser.total_spent or 0) + bet
 
@@ -1303,15 +1255,15 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
             power_up = 0
             if random.random() < 0.15:  # 15%概率
                 power_up = random.randint(1, 3)
-                winner.attack = (winner.attack or 0) + power_up
+                set_attack(winner, (winner.attack or 0) + power_up, session)
 
             # 连胜额外奖励
             streak_bonus = 0
             if winner_streak >= 5:
                 streak_bonus = winner_streak * 5  # 每连胜场数×5 MP
-                winner.points += streak_bonus
                 winner.total_earned = (winner.total_earned or 0) + streak_bonus
 
+            credit(win_id, winner_gain + streak_bonus, "决斗胜利", session=session)
             session.commit()
 
             # 更新内存中的决斗统计
@@ -1372,7 +1324,7 @@ async def process_duel_battle(query, context: ContextTypes.DEFAULT_TYPE, duel_da
             with get_session() as bonus_session:
                 bonus_winner = bonus_session.query(UserBinding).filter_by(tg_id=win_id).first()
                 if bonus_winner:
-                    bonus_winner.points += crit_bonus
+                    credit(win_id, crit_bonus, "决斗连胜暴击", session=bonus_session)
                     bonus_winner.total_earned = (bonus_winner.total_earned or 0) + crit_bonus
                     bonus_session.commit()
 
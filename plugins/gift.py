@@ -8,6 +8,7 @@ import logging
 from telegram import Update
 from telegram.ext import CommandHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import transfer, get_balance
 from utils import reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -137,11 +138,18 @@ async def gift_mp(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
-            # 执行转账
-            sender.points -= amount
-            receiver.points += actual_received
-            await track_activity_wrapper(user_id, "gift")
+            # 执行转账（SQL 端原子扣款 + 到账，余额不足时不做任何修改）
+            if transfer(user_id, target_user.id, amount, fee=fee, reason="魔力转赠", session=session) is None:
+                await reply_with_auto_delete(
+                    msg,
+                    f"💸 <b>【 魔 力 不 足 】</b>\n"
+                    f"━━━━━━━━━━━━━━━━━━\n"
+                    f"钱包里只有 <b>{get_balance(user_id, session)} MP</b>\n"
+                    f"无法转赠 <b>{amount} MP</b> 喵~"
+                )
+                return
             session.commit()
+            await track_activity_wrapper(user_id, "gift")
 
             # 在session关闭前保存需要的值
             is_vip = sender.is_vip
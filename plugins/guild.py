@@ -12,6 +12,8 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from database import get_session, UserBinding, Guild
+from database.guilds import join_guild, leave_guild, get_guild_members
+from database.ledger import debit_if_sufficient
 from utils import reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -102,23 +104,15 @@ async def get_guild_info_panel(guild: Guild, user: UserBinding, session, first_n
     """获取公会信息面板（用于编辑消息）"""
     level_info = get_guild_level_info(guild.level or 1)
     benefits = get_guild_benefit(guild)
-    guild_power = calculate_guild_power(guild)
+    guild_power = guild.total_power or 0
     is_leader = (guild.leader_id == user.tg_id)
 
-    # 获取公会成员信息
-    member_list = []
-    member_ids = []
-    if guild.members:
-        member_ids = [int(uid) for uid in guild.members.split(",") if uid]
-        for uid in member_ids[:10]:  # 只显示前10个
-            m = session.query(UserBinding).filter_by(tg_id=uid).first()
-            if m:
-                role = "👑会长" if uid == guild.leader_id else "👤成员"
-                member_list.append(f"{role} {m.first_name or '神秘人'} (⚡{m.attack or 0})")
+    # 获取公会成员信息（按 guild_id 索引查询，只取前10个）
+    member_list = format_member_list(guild, session)
 
     members_text = "\n".join(member_list) if member_list else "暂无成员"
-    if len(member_ids) > 10:
-        members_text += f"\n... 还有 {len(member_ids) - 10} 位成员"
+    if (guild.member_count or 0) > 10:
+        members_text += f"\n... 还有 {guild.member_count - 10} 位成员"
 
     lines = [
         "🏰 <b>【 公 会 信 息 】</b>",
@@ -196,39 +190,13 @@ def get_guild_next_level_exp(level: int) -> int:
     return GUILD_LEVELS[level + 1]["exp"]
 
 
-def add_guild_member(guild: Guild, user_id: int) -> None:
-    """添加公会成员"""
-    members = guild.members or ""
-    member_list = members.split(",") if members else []
-    if str(user_id) not in member_list:
-        member_list.append(str(user_id))
-        guild.members = ",".join(member_list)
-        guild.member_count = len(member_list)
-
-
-def remove_guild_member(guild: Guild, user_id: int) -> None:
-    """移除公会成员"""
-    members = guild.members or ""
-    member_list = members.split(",") if members else []
-    if str(user_id) in member_list:
-        member_list.remove(str(user_id))
-        guild.members = ",".join(member_list)
-        guild.member_count = len(member_list)
-
-
-def calculate_guild_power(guild: Guild) -> int:
-    """计算公会总战力"""
-    if not guild.members:
-        return 0
-    from database import get_session
-    total = 0
-    with get_session() as session:
-        member_ids = [int(uid) for uid in guild.members.split(",") if uid]
-        for uid in member_ids:
-            user = session.query(UserBinding).filter_by(tg_id=uid).first()
-            if user:
-                total += (user.attack or 0)
-    return total
+def format_member_list(guild: Guild, session, limit: int = 10) -> list:
+    """公会成员展示行（按战力排序）"""
+    lines = []
+    for m in get_guild_members(guild.id, limit=limit, session=session):
+        role = "👑会长" if m.tg_id == guild.leader_id else "👤成员"
+        lines.append(f"{role} {m.emby_account or '神秘人'} (⚡{m.attack or 0})")
+    return lines
 
 
 def get_guild_benefit(guild: Guild) -> dict:
@@ -318,22 +286,15 @@ async def show_guild_info(msg, guild: Guild, user: UserBinding, session):
     """显示公会信息"""
     level_info = get_guild_level_info(guild.level or 1)
     benefits = get_guild_benefit(guild)
-    guild_power = calculate_guild_power(guild)
+    guild_power = guild.total_power or 0
     is_leader = (guild.leader_id == user.tg_id)
 
-    # 获取公会成员信息
-    member_list = []
-    if guild.members:
-        member_ids = [int(uid) for uid in guild.members.split(",") if uid]
-        for uid in member_ids[:10]:  # 只显示前10个
-            m = session.query(UserBinding).filter_by(tg_id=uid).first()
-            if m:
-                role = "👑会长" if uid == guild.leader_id else "👤成员"
-                member_list.append(f"{role} {m.first_name or '神秘人'} (⚡{m.attack or 0})")
+    # 获取公会成员信息（按 guild_id 索引查询，只取前10个）
+    member_list = format_member_list(guild, session)
 
     members_text = "\n".join(member_list) if member_list else "暂无成员"
-    if len(member_ids) > 10:
-        members_text += f"\n... 还有 {len(member_ids) - 10} 位成员"
+    if (guild.member_count or 0) > 10:
+        members_text += f"\n... 还有 {guild.member_count - 10} 位成员"
 
     lines = [
         "🏰 <b>【 公 会 信 息 】</b>",
@@ -488,15 +449,11 @@ async def guild_apply(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("⚠️ <b>公会已满员喵！</b>", parse_mode='HTML')
             return
 
-        # 加入公会
-        add_guild_member(guild, user_id)
-        user.guild_id = guild.id
+        # 加入公会（成员数与公会战力增量更新）
+        join_guild(user, guild, session)
         user.guild_join_date = datetime.now()
         user.guild_contribution = 0
 
-        # 重新计算公会战力
-        guild.total_power = calculate_guild_power(guild)
-
         session.commit()
 
         # 获取公会信息面板
@@ -540,7 +497,7 @@ async def guild_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         level_info = get_guild_level_info(guild.level or 1)
         benefits = get_guild_benefit(guild)
-        guild_power = calculate_guild_power(guild)
+        guild_power = guild.total_power or 0
 
         lines = [
             "🏰 <b>【 公 会 信 息 】</b>",
@@ -707,7 +664,8 @@ async def guild_create_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user.is_vip:
             cost = int(cost * 0.7)
 
-        if user.points < cost:
+        # SQL 端校验余额并扣除，与建会同一事务提交
+        if debit_if_sufficient(user_id, cost, "创建公会", session=session) is None:
             await msg.reply_html(f"💸 <b>魔力不足！</b>\n\n需要 {cost} MP")
             del context.bot_data[f"creating_guild_{user_id}"]
             return
@@ -721,18 +679,18 @@ async def guild_create_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
             name=guild_name,
             leader_id=user_id,
             leader_name=leader_name,
-            members=str(user_id),
             member_count=1,
             max_members=20,
             total_power=(user.attack or 0)
         )
 
-        user.points -= cost
+        session.add(guild)
+        session.flush()  # 分配公会ID
+
         user.guild_id = guild.id
         user.guild_join_date = datetime.now()
         user.guild_contribution = cost
 
-        session.add(guild)
         session.commit()
 
         del context.bot_data[f"creating_guild_{user_id}"]
@@ -839,15 +797,11 @@ async def guild_leave(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # 移除成员
-        remove_guild_member(guild, user_id)
-        user.guild_id = None
+        # 移除成员（成员数与公会战力增量更新）
+        leave_guild(user, guild, session)
         user.guild_join_date = None
         user.guild_contribution = 0
 
-        # 重新计算公会战力
-        guild.total_power = calculate_guild_power(guild)
-
         session.commit()
 
         await query.edit_message_text(
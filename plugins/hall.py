@@ -6,7 +6,8 @@
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, ContextTypes
-from database import get_session, UserBinding
+from database import get_session, get_user
+from database.leaderboard import leaderboards, load_top_users
 from utils import reply_with_auto_delete
 
 # 排行榜每页显示数量
@@ -81,7 +82,7 @@ async def hall_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     with get_session() as session:
-        current_user = session.query(UserBinding).filter_by(tg_id=user_id).first()
+        current_user = get_user(user_id, session, groups=("identity", "combat"))
 
         if not current_user or not current_user.emby_account:
             error_txt = "💔 <b>【 魔 法 契 约 丢 失 】</b>\n请先使用 <code>/bind</code> 缔结魔法契约喵！"
@@ -91,13 +92,11 @@ async def hall_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await reply_with_auto_delete(msg, error_txt)
             return
 
-        # 获取所有有战力的用户
-        all_users = session.query(UserBinding).filter(
-            UserBinding.emby_account != None,
-            UserBinding.attack > 0
-        ).order_by(UserBinding.attack.desc()).all()
+        # 排名与 TOP 10 直接读内存排行榜，只按 tg_id 加载上榜用户的展示字段
+        top_users = load_top_users("attack", PAGE_SIZE, session)
+        current_rank = leaderboards.rank_of("attack", user_id)
 
-        if not all_users:
+        if not top_users:
             empty_txt = (
                 f"🏆 <b>【 荣 耀 殿 堂 】</b>\n"
                 f"━━━━━━━━━━━━━━━━━━\n"
@@ -110,16 +109,6 @@ async def hall_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await reply_with_auto_delete(msg, empty_txt)
             return
 
-        # 获取当前用户排名
-        current_rank = None
-        for i, u in enumerate(all_users):
-            if u.tg_id == user_id:
-                current_rank = i + 1
-                break
-
-        # 获取 TOP 10
-        top_users = all_users[:PAGE_SIZE]
-
         # 在session关闭前保存需要的数据
         is_vip = current_user.is_vip
         attack = current_user.attack
@@ -8,8 +8,9 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import credit
 from utils import reply_with_auto_delete, edit_with_auto_delete
-from datetime import datetime, date
+from datetime import datetime
 import random
 
 # 转盘奖励配置
@@ -34,9 +35,6 @@ WHEEL_PRIZES = [
 # 转盘概率说明
 WHEEL_PROBABILITY = """💡 <b>概率</b>: 5MP(26%) | 10MP(21%) | 20MP(16%) | 50MP(8%) | 100MP(4%) | 200MP(2%) | 500MP(0.5%) | 道具各(4%)"""
 
-def get_today():
-    return datetime.now().date()
-
 
 def spin_wheel(user: UserBinding, is_vip_bonus: bool = False) -> dict:
     """转动转盘，返回结果"""
@@ -101,15 +99,8 @@ async def wheel_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await reply_for_callback(update, "💔 <b>请先绑定账号喵！</b>")
             return
 
-        today = get_today()
-        spin_date = u.last_wheel_date
-        if spin_date:
-            last_date = spin_date.date() if isinstance(spin_date, datetime) else spin_date
-        else:
-            last_date = None
-
-        # 检查今日已转次数
-        spun_today = last_date and last_date >= today
+        # 检查今日已转次数（wheel_spins_today 每天零点由日切任务归零）
+        spun_today = (u.wheel_spins_today or 0) > 0
         free_spins = 0
         if not spun_today:
             free_spins = 1
@@ -159,15 +150,9 @@ async def wheel_spin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             await edit_with_auto_delete(query, "💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        today = get_today()
-        spin_date = u.last_wheel_date
-        if spin_date:
-            last_date = spin_date.date() if isinstance(spin_date, datetime) else spin_date
-        else:
-            last_date = None
-
         # 检查是否还能抽
-        spun_today = last_date and last_date >= today
+        # wheel_spins_today 每天零点由日切任务归零
+        spun_today = (u.wheel_spins_today or 0) > 0
 
         # VIP检查
         can_spin = not spun_today
@@ -183,11 +168,8 @@ async def wheel_spin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
 
         # 记录抽奖次数
-        if not spun_today:
-            u.wheel_spins_today = 1
-            u.last_wheel_date = datetime.now()
-        else:
-            u.wheel_spins_today = (u.wheel_spins_today or 1) + 1
+        u.wheel_spins_today = (u.wheel_spins_today or 0) + 1
+        u.last_wheel_date = datetime.now()
 
         # 转动转盘
         result = spin_wheel(u)
@@ -195,7 +177,7 @@ async def wheel_spin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         # 发放奖励
         reward_msg = ""
         if result["type"] == "points":
-            u.points += result["value"]
+            credit(user_id, result["value"], "幸运转盘", session=session)
             reward_msg = f"+{result['value']} MP"
         elif result["type"] == "lucky":
             u.lucky_boost = True
@@ -274,14 +256,8 @@ async def wheel_back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             await edit_with_auto_delete(query, "💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
             return
 
-        today = get_today()
-        spin_date = u.last_wheel_date
-        if spin_date:
-            last_date = spin_date.date() if isinstance(spin_date, datetime) else spin_date
-        else:
-            last_date = None
-
-        spun_today = last_date and last_date >= today
+        # wheel_spins_today 每天零点由日切任务归零
+        spun_today = (u.wheel_spins_today or 0) > 0
         free_spins = 0 if spun_today else (2 if u.is_vip else 1)
 
         vip_badge = " 👑" if u.is_vip else ""
@@ -10,6 +10,7 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import credit, debit_if_sufficient
 from utils import edit_with_auto_delete, reply_with_auto_delete, get_unbound_message
 
 logger = logging.getLogger(__name__)
@@ -208,7 +209,7 @@ async def do_resonance(user_id: int) -> dict:
         user = session.query(UserBinding).filter_by(tg_id=user_id).first()
         if user:
             user.intimacy = (user.intimacy or 0) + intimacy_gain
-            user.points = (user.points or 0) + points_gain
+            credit(user_id, points_gain, "灵魂共鸣", session=session)
 
             # 记录共鸣次数
             if not hasattr(user, 'resonance_count') or user.resonance_count is None:
@@ -466,7 +467,8 @@ async def resonance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             is_vip = user.is_vip
             cost = 20 if is_vip else 50
 
-            if user.points < cost:
+            # 扣除消耗（SQL 端校验余额）
+            if debit_if_sufficient(user_id, cost, "灵魂共鸣", session=session) is None:
                 await edit_with_auto_delete(
                     query,
                     f"💸 <b>魔力不足喵！</b>\n\n"
@@ -476,8 +478,6 @@ async def resonance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
                 return
 
-            # 扣除消耗
-            user.points -= cost
             session.commit()
             logger.info(f"[灵魂共鸣] 用户{user_id}扣费{cost}MP成功")
 
@@ -564,11 +564,7 @@ async def resonance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             parse_mode='HTML'
         )
         # 退还消耗的MP
-        with get_session() as session:
-            user = session.query(UserBinding).filter_by(tg_id=user_id).first()
-            if user:
-                user.points += cost
-                session.commit()
+        credit(user_id, cost, "灵魂共鸣失败退还")
         return
 
 
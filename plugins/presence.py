@@ -8,6 +8,9 @@
 from telegram import Update
 from telegram.ext import CommandHandler, MessageHandler, filters, ContextTypes
 from database import get_session, UserBinding
+from database.counters import counter_store
+from database.leaderboard import load_top_users
+from database.ledger import credit_async
 from utils import reply_with_auto_delete
 from datetime import datetime, timedelta
 import random
@@ -38,71 +41,49 @@ async def track_presence(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if chat.type == "private":
         return
 
-    text = update.message.text.lower() if update.message.text else ""
-
-    with get_session() as session:
-        u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-
-        if not u:
-            return
-
-        now = datetime.now()
-
-        # 检查上次活跃时间
-        if u.last_active_time:
-            time_diff = (now - u.last_active_time).total_seconds()
-            if time_diff > TIME_WINDOW * 60:
-                # 超过时间窗口，重置今日累积
-                u.daily_presence_points = 0
-
-        # 增加活跃度
-        gain = POINTS_PER_MESSAGE
-        if u.is_vip:
-            gain = 2  # VIP双倍
-
-        u.daily_presence_points = (u.daily_presence_points or 0) + gain
-        u.total_presence_points = (u.total_presence_points or 0) + gain
-        u.last_active_time = now
-
-        # 检查是否达到奖励阈值
-        reward_given = False
-        reward_msg = None
-
-        for level_info in PRESENCE_LEVELS:
-            level = level_info["level"]
-            threshold = level_info["points"]
-
-            # 获取用户当前已领取的最高等级
-            claimed_levels = u.presence_levels_claimed or "0"
-            claimed_list = [int(x) for x in claimed_levels.split(",") if x.isdigit()]
-
-            if level not in claimed_list and u.daily_presence_points >= threshold:
-                # 发放奖励
-                base_reward = threshold // 2  # 奖励是阈值的一半
-                if u.is_vip:
-                    base_reward = int(base_reward * 1.5)
-
-                u.points += base_reward
-                u.presence_levels_claimed = f"{claimed_levels},{level}" if claimed_levels else str(level)
-
-                reward_given = True
-                reward_msg = (
-                    f"🎉 <b>【 活 跃 度 · 达 成 ！】</b>\n"
-                    f"━━━━━━━━━━━━━━━━━━\n"
-                    f"{level_info['emoji']} <b>称号：</b> {level_info['name']}\n"
-                    f"📊 <b>今日活跃：</b> {u.daily_presence_points} 点\n"
-                    f"💰 <b>奖励：</b> +{base_reward} MP\n"
-                    f"━━━━━━━━━━━━━━━━━━\n"
-                )
-                break
+    entry = await counter_store.get(user.id)
+    if entry is None:
+        return
 
-        session.commit()
+    now = datetime.now()
+
+    # 增加活跃度（只累积在内存中，由 counter_store 定期批量写回）
+    gain = POINTS_PER_MESSAGE
+    if entry.is_vip:
+        gain = 2  # VIP双倍
+    daily = entry.add_presence(gain, now, TIME_WINDOW * 60)
+
+    # 检查是否达到奖励阈值
+    reward_msg = None
+
+    for level_info in PRESENCE_LEVELS:
+        level = level_info["level"]
+        threshold = level_info["points"]
+
+        if level not in entry.claimed_levels and daily >= threshold:
+            # 发放奖励（MP 立即入账，领取记录随计数一起写回）
+            base_reward = threshold // 2  # 奖励是阈值的一半
+            if entry.is_vip:
+                base_reward = int(base_reward * 1.5)
+
+            entry.claim_presence_level(level)
+            await credit_async(user.id, base_reward, f"活跃度等级 {level}")
+
+            reward_msg = (
+                f"🎉 <b>【 活 跃 度 · 达 成 ！】</b>\n"
+                f"━━━━━━━━━━━━━━━━━━\n"
+                f"{level_info['emoji']} <b>称号：</b> {level_info['name']}\n"
+                f"📊 <b>今日活跃：</b> {daily} 点\n"
+                f"💰 <b>奖励：</b> +{base_reward} MP\n"
+                f"━━━━━━━━━━━━━━━━━━\n"
+            )
+            break
 
-        # 如果获得了奖励，发送通知
-        if reward_given and reward_msg:
-            # 只有小概率发送通知，避免刷屏
-            if random.random() < 0.3:
-                await reply_with_auto_delete(update.message, reward_msg, disable_notification=True)
+    # 如果获得了奖励，发送通知
+    if reward_msg:
+        # 只有小概率发送通知，避免刷屏
+        if random.random() < 0.3:
+            await reply_with_auto_delete(update.message, reward_msg, disable_notification=True)
 
 
 async def presence_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -114,6 +95,9 @@ async def presence_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
 
+    # 先写回内存中的活跃度，保证显示的是最新值
+    await counter_store.flush()
+
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user_id).first()
 
@@ -125,18 +109,10 @@ async def presence_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await reply_with_auto_delete(msg, error_txt)
             return
 
-        # 计算当前等级和下一级
+        # 计算当前等级和下一级（今日活跃每天零点由日切任务归零）
         current_points = u.daily_presence_points or 0
         total_points = u.total_presence_points or 0
 
-        # 检查是否需要重置（跨天）
-        today = datetime.now().date()
-        if u.last_active_time:
-            last_date = u.last_active_time.date() if isinstance(u.last_active_time, datetime) else u.last_active_time
-            if last_date < today:
-                current_points = 0
-                u.daily_presence_points = 0
-
         current_level = 0
         next_level = None
         progress_percent = 0
@@ -198,42 +174,31 @@ async def presence_rank_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not msg:
         return
 
-    with get_session() as session:
-        # 获取今日活跃度排行榜
-        users = session.query(UserBinding).filter(
-            UserBinding.emby_account != None,
-            UserBinding.daily_presence_points > 0
-        ).order_by(UserBinding.daily_presence_points.desc()).limit(10).all()
-
-        txt = "🏆 <b>【 今 日 活 跃 排 行 榜 】</b>\n"
-        txt += "━━━━━━━━━━━━━━━━━━\n"
-
-        for i, u in enumerate(users, 1):
-            medal = ""
-            if i == 1:
-                medal = "🥇"
-            elif i == 2:
-                medal = "🥈"
-            elif i == 3:
-                medal = "🥉"
-            else:
-                medal = f"{i:2d}."
+    await counter_store.flush()
+
+    # 今日榜跨天自动清空，不再逐行过滤昨天的数据
+    users = load_top_users("daily_presence_points", 10)
 
-            vip_badge = "👑" if u.is_vip else ""
-            points = u.daily_presence_points or 0
+    txt = "🏆 <b>【 今 日 活 跃 排 行 榜 】</b>\n"
+    txt += "━━━━━━━━━━━━━━━━━━\n"
 
-            # 检查是否需要重置
-            today = datetime.now().date()
-            if u.last_active_time:
-                last_date = u.last_active_time.date() if isinstance(u.last_active_time, datetime) else u.last_active_time
-                if last_date < today:
-                    points = 0
+    for i, u in enumerate(users, 1):
+        medal = ""
+        if i == 1:
+            medal = "🥇"
+        elif i == 2:
+            medal = "🥈"
+        elif i == 3:
+            medal = "🥉"
+        else:
+            medal = f"{i:2d}."
 
-            if points > 0:
-                txt += f"{medal} {u.emby_account[:12]:12s} {vip_badge}  {points:4d} 点\n"
+        vip_badge = "👑" if u.is_vip else ""
+        points = u.daily_presence_points or 0
+        txt += f"{medal} {u.emby_account[:12]:12s} {vip_badge}  {points:4d} 点\n"
 
-        txt += "━━━━━━━━━━━━━━━━━━\n"
-        txt += "<i>\"每天保持活跃，奖励拿不停！\"</i>"
+    txt += "━━━━━━━━━━━━━━━━━━\n"
+    txt += "<i>\"每天保持活跃，奖励拿不停！\"</i>"
 
     await reply_with_auto_delete(msg, txt)
 
@@ -5,13 +5,14 @@ MP红包系统
 - VIP权益：更高红包上限
 """
 import random
-import json
 import logging
 import uuid
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
-from database import get_session, UserBinding, RedPacket
+from database import get_session, get_async_session, get_user_async, UserBinding, RedPacket
+from database.ledger import credit_async, debit_if_sufficient, get_balance
+from database.redpackets import claim_red_packet_async, get_red_packet_async, list_claims_async
 from utils import reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -140,8 +141,16 @@ async def send_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # 扣除金额
-        user.points -= amount
+        # 扣除金额（SQL 端校验余额，防止并发重复扣款）
+        balance = debit_if_sufficient(user_id, amount, "发红包", session=session)
+        if balance is None:
+            await reply_with_auto_delete(
+                msg,
+                f"💸 <b>魔力不足喵！</b>\n\n"
+                f"你的余额: {get_balance(user_id, session)} MP\n"
+                f"红包金额: {amount} MP"
+            )
+            return
         user.total_spent = (user.total_spent or 0) + amount
         session.commit()
 
@@ -163,8 +172,7 @@ async def send_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
             remaining_amount=amount,
             remaining_count=count,
             packet_type='random',
-            greeting=greeting,
-            claimed_by=""
+            greeting=greeting
         )
         session.add(packet)
         session.commit()
@@ -202,6 +210,20 @@ async def send_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"[红包] 用户{user_id}发送红包: {amount}MPx{count}, ID={packet_id}")
 
 
+def finished_text(packet: RedPacket, claims) -> str:
+    """已抢完的红包：显示前 5 条领取记录"""
+    claimed_list = [f"✨ 用户{str(uid)[-4:]}: +{amt} MP" for uid, amt in claims[:5]]
+    return (
+        f"🧧 <b>【 红包已抢完 】</b>\n"
+        f"━━━━━━━━━━━━━━━━━━\n"
+        f"💰 <b>总金额：</b>{packet.total_amount} MP\n"
+        f"🎯 <b>数量：</b>{packet.total_count} 个\n\n"
+        f"<b>领取记录：</b>\n"
+        + "\n".join(claimed_list) +
+        (f"\n... 还有 {len(claims) - 5} 人" if len(claims) > 5 else "")
+    )
+
+
 async def open_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """抢红包回调"""
     query = update.callback_query
@@ -210,8 +232,8 @@ async def open_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     packet_id = query.data.replace("rp_open_", "")
 
-    with get_session() as session:
-        packet = session.query(RedPacket).filter_by(id=packet_id).first()
+    async with get_async_session() as session:
+        packet = await get_red_packet_async(packet_id, session)
 
         if not packet:
             await query.edit_message_text(
@@ -238,71 +260,52 @@ async def open_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # 检查红包是否已抢完
         if packet.remaining_count <= 0:
-            # 显示已抢完的红包
-            claimed_by = json.loads(packet.claimed_by) if packet.claimed_by else {}
-            claimed_list = []
-            for uid, amt in list(claimed_by.items())[:5]:  # 只显示前5个
-                claimed_list.append(f"✨ 用户{uid[-4:]}: +{amt} MP")
-
-            await query.edit_message_text(
-                f"🧧 <b>【 红包已抢完 】</b>\n"
-                f"━━━━━━━━━━━━━━━━━━\n"
-                f"💰 <b>总金额：</b>{packet.total_amount} MP\n"
-                f"🎯 <b>数量：</b>{packet.total_count} 个\n\n"
-                f"<b>领取记录：</b>\n"
-                + "\n".join(claimed_list) +
-                (f"\n... 还有 {len(claimed_by) - 5} 人" if len(claimed_by) > 5 else ""),
-                parse_mode='HTML'
-            )
+            claims = await list_claims_async(packet_id, session)
+            await query.edit_message_text(finished_text(packet, claims), parse_mode='HTML')
             return
 
-        # 检查是否已经抢过
-        claimed_by = json.loads(packet.claimed_by) if packet.claimed_by else {}
-        if str(user_id) in claimed_by:
-            already_got = claimed_by[str(user_id)]
-            # 已抢过，使用 alert 提示而不是修改消息
+        # 检查用户是否存在
+        user = await get_user_async(user_id, session, groups=("identity", "wallet"))
+        if not user:
+            # 未绑定用户，使用 alert 提示
             await query.answer(
-                f"💰 你已抢过此红包，获得 +{already_got} MP\n每个红包只能抢一次喵~",
+                "💔 请先缔结魔法契约才能抢红包喵！\n使用 /bind 账号 绑定后再来~",
                 show_alert=True
             )
             return
 
-        # 检查用户是否存在
-        user = session.query(UserBinding).filter_by(tg_id=user_id).first()
-        if not user:
-            # 未绑定用户，使用 alert 提示
+        # 条件扣减 + 领取记录：多人同时点击时每个名额只会被领走一次
+        result = await claim_red_packet_async(packet_id, user_id, session)
+        packet = result.packet
+
+        if result.status == "missing":
+            await query.edit_message_text("💔 <b>红包不存在或已过期</b>", parse_mode='HTML')
+            return
+
+        if result.status == "claimed":
+            # 已抢过，使用 alert 提示而不是修改消息
             await query.answer(
-                "💔 请先缔结魔法契约才能抢红包喵！\n使用 /bind 账号 绑定后再来~",
+                f"💰 你已抢过此红包，获得 +{result.amount} MP\n每个红包只能抢一次喵~",
                 show_alert=True
             )
             return
 
-        # 计算抢到的金额
-        if packet.remaining_count == 1:
-            # 最后一个红包，获得剩余全部金额
-            got_amount = packet.remaining_amount
-        else:
-            # 随机金额：确保每个红包至少1MP
-            max_get = packet.remaining_amount - packet.remaining_count + 1
-            if max_get <= 1:
-                got_amount = 1
-            else:
-                got_amount = random.randint(1, max_get)
-
-        # 更新红包
-        packet.remaining_amount -= got_amount
-        packet.remaining_count -= 1
-        claimed_by[str(user_id)] = got_amount
-        packet.claimed_by = json.dumps(claimed_by)
-
-        # 给用户加钱
-        user.points += got_amount
+        if result.status == "empty":
+            # 等待期间被别人抢完
+            claims = await list_claims_async(packet_id, session)
+            await query.edit_message_text(finished_text(packet, claims), parse_mode='HTML')
+            return
+
+        got_amount = result.amount
+
+        # 给用户加钱（与领取记录同一事务提交）
+        await credit_async(user_id, got_amount, "抢红包", session=session)
         user.total_earned = (user.total_earned or 0) + got_amount
 
-        session.commit()
+        await session.commit()
 
         # 获取发送者信息
-        sender = session.query(UserBinding).filter_by(tg_id=packet.sender_id).first()
+        sender = await get_user_async(packet.sender_id, session, groups=("identity",))
 
         # 生成结果文本
         if got_amount >= packet.total_amount // 3:
@@ -313,7 +316,7 @@ async def open_redpacket(update: Update, context: ContextTypes.DEFAULT_TYPE):
             effect = "💰 <b>抢到红包啦！</b> 💰"
 
         # 判断是否是运气最佳
-        all_amounts = list(claimed_by.values())
+        all_amounts = [amt for _, amt in await list_claims_async(packet_id, session)]
         is_best = got_amount == max(all_amounts) and len(all_amounts) > 1
 
         best_tag = "\n🌟 <b>运气最佳！</b> 🌟" if is_best else ""
@@ -8,7 +8,9 @@ from telegram import Update
 from telegram.ext import CommandHandler, MessageHandler, filters, ContextTypes
 from config import Config
 from utils import reply_with_auto_delete
-from database import get_session, UserBinding
+from database import get_async_session, get_user_snapshot_async
+from database.ledger import credit_async
+from messaging import edit_coalescer
 
 
 # === ⚙️ 配置区域 ===
@@ -173,89 +175,69 @@ async def check_reply_reward(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if last_time and (datetime.now() - last_time).total_seconds() < REWARD_COOLDOWN_SECONDS:
         return
 
-    # ✅ 发放奖励
-    with get_session() as session:
-        u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-
-        # 用户必须已绑定
-        if not u:
-            await reply_with_auto_delete(
-                msg,
-                "⚠️ <b>未缔结契约</b>\n\n"
-                "请先使用 <code>/bind</code> 缔结魔法契约，才能领取奖励喵~"
-            )
-            return
-
-        # 计算奖励
-        reward = random.randint(*REWARD_RANGE)
-
-        # VIP 暴击逻辑
-        if u.is_vip:
-            reward *= VIP_REWARD_MULTIPLIER
-            icon = "✨"
-            flair = "[VIP暴击]"
-        else:
-            icon = "💰"
-            flair = "[共鸣]"
-
-        u.points += reward
-        session.commit()
-
-        # 📝 标记为已领取
-        claimed_users.add(user.id)
-
-        # 记录领取信息
-        user_name = user.first_name or user.username or "神秘魔法师"
-        if 'claim_list' not in push_data:
-            push_data['claim_list'] = []
-        push_data['claim_list'].append((user_name, reward))
-
-        # 记录领取时间（防刷）
-        LAST_REWARD_TIME[user.id] = datetime.now()
-
-    # 📝 编辑原推送消息，显示领取状态
+    # 📝 先占名额再 await：同时回复的人不会超出名额，也不会重复领取
+    claimed_users.add(user.id)
     try:
-        original_caption = push_data.get('original_caption', '')
-        claim_count = len(claimed_users)
-        claim_list = push_data.get('claim_list', [])
-
-        new_caption = build_updated_caption(original_caption, claim_count, claim_list)
-
-        # 编辑原消息的 caption
-        await context.bot.edit_message_caption(
-            chat_id=push_data['chat_id'],
-            message_id=target_msg_id,
-            caption=new_caption,
-            parse_mode='HTML'
+        async with get_async_session() as session:
+            # VIP 标记走快照缓存，不查库
+            snap = await get_user_snapshot_async(user.id, session)
+
+            # 用户必须已绑定
+            if snap is None:
+                claimed_users.discard(user.id)
+                await reply_with_auto_delete(
+                    msg,
+                    "⚠️ <b>未缔结契约</b>\n\n"
+                    "请先使用 <code>/bind</code> 缔结魔法契约，才能领取奖励喵~"
+                )
+                return
+
+            # 计算奖励
+            reward = random.randint(*REWARD_RANGE)
+
+            # VIP 暴击逻辑
+            if snap.is_vip:
+                reward *= VIP_REWARD_MULTIPLIER
+                icon = "✨"
+                flair = "[VIP暴击]"
+            else:
+                icon = "💰"
+                flair = "[共鸣]"
+
+            # ✅ 发放奖励
+            await credit_async(user.id, reward, "有奖推送", session=session)
+    except BaseException:
+        claimed_users.discard(user.id)
+        raise
+
+    # 记录领取信息
+    user_name = user.first_name or user.username or "神秘魔法师"
+    push_data.setdefault('claim_list', []).append((user_name, reward))
+
+    # 记录领取时间（防刷）
+    LAST_REWARD_TIME[user.id] = datetime.now()
+
+    # 📝 刷新原推送消息的领取状态：领取已立即生效，消息编辑合并为每 MESSAGE_EDIT_INTERVAL 秒最多一次，
+    # 编辑时按最新的领取列表渲染；caption / 文本的选择按消息记住
+    chat_id = push_data['chat_id']
+    if edit_coalescer.editable(chat_id, target_msg_id):
+        edit_coalescer.request(
+            context.bot, chat_id, target_msg_id,
+            lambda: build_updated_caption(
+                push_data.get('original_caption', ''), len(push_data['claim_list']), push_data['claim_list']
+            ),
+            is_photo=push_data.get('is_photo'),
         )
-    except Exception as e:
-        # 如果编辑失败（可能是图片消息没有 caption），尝试编辑文本消息
+    else:
+        # 原消息已无法编辑（被删除等），回退到发送新消息
         try:
-            original_caption = push_data.get('original_caption', '')
-            claim_count = len(claimed_users)
-            claim_list = push_data.get('claim_list', [])
-
-            new_caption = build_updated_caption(original_caption, claim_count, claim_list)
-
-            await context.bot.edit_message_text(
-                chat_id=push_data['chat_id'],
-                message_id=target_msg_id,
-                text=new_caption,
-                parse_mode='HTML'
+            await msg.reply_html(
+                f"{icon} <b>{flair} +{reward} MP</b>\n"
+                f"<i>魔力已注入您的契约喵~ (｡•̀ᴗ-)✧</i>",
+                disable_notification=True
             )
-        except Exception as e2:
-            # 如果还是失败，回退到发送新消息
-            logger = __import__('logging').getLogger(__name__)
-            logger.warning(f"编辑原消息失败: {e2}, 回退到发送新消息")
-            try:
-                await msg.reply_html(
-                    f"{icon} <b>{flair} +{reward} MP</b>\n"
-                    f"<i>魔力已注入您的契约喵~ (｡•̀ᴗ-)✧</i>",
-                    disable_notification=True
-                )
-            except Exception:
-                pass
-
+        except Exception:
+            pass
 
 def register(app):
     """注册命令处理器"""
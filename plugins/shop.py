@@ -8,8 +8,9 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import credit, debit_if_sufficient, get_balance
 from utils import reply_with_auto_delete, edit_with_auto_delete
-from datetime import datetime, date
+from datetime import datetime
 import random
 
 
@@ -22,29 +23,6 @@ async def track_activity_wrapper(user_id: int, activity_type: str):
     await track_and_check_task(user_id, activity_type)
 
 
-# 辅助函数：获取今日日期（用于每日限购重置）
-def get_today():
-    """获取今日日期，用于每日重置判断"""
-    return datetime.now().date()
-
-
-def get_box_limit_status(user: UserBinding) -> tuple:
-    """
-    获取用户神秘宝箱限购状态
-    返回：(今日已购买次数, 今日剩余次数, 是否需要重置)
-    """
-    today = get_today()
-    need_reset = False
-
-    # 检查是否需要重置（跨天）
-    if user.last_box_buy_date:
-        last_date = user.last_box_buy_date.date() if isinstance(user.last_box_buy_date, datetime) else user.last_box_buy_date
-        if last_date < today:
-            need_reset = True
-
-    return user.daily_box_buy_count or 0, need_reset
-
-
 # 商店商品配置
 SHOP_ITEMS = {
     "tarot": {
@@ -287,11 +265,8 @@ async def buy_item(update: Update, context: ContextTypes.DEFAULT_TYPE, item_id:
 
         # 检查神秘宝箱限购
         if item_id == "box":
-            bought_count, need_reset = get_box_limit_status(u)
-            if need_reset:
-                # 跨天了，重置计数
-                u.daily_box_buy_count = 0
-                bought_count = 0
+            # daily_box_buy_count 每天零点由日切任务归零
+            bought_count = u.daily_box_buy_count or 0
 
             limit = 5 if u.is_vip else 3
             if bought_count >= limit:
@@ -305,24 +280,22 @@ async def buy_item(update: Update, context: ContextTypes.DEFAULT_TYPE, item_id:
                 )
                 return
 
-        if u.points < price:
+        # 扣除费用（SQL 端校验余额，防止并发重复扣款）
+        if debit_if_sufficient(user_id, price, f"商店购买 {item_id}", session=session) is None:
             await reply_with_auto_delete(
                 msg,
                 f"💸 <b>【 魔 力 不 足 】</b>\n\n"
-                f"钱包里只有 <b>{u.points} MP</b>\n"
+                f"钱包里只有 <b>{get_balance(user_id, session)} MP</b>\n"
                 f"购买 {item['name']} 需要 <b>{price} MP</b> 喵~"
             )
             return
 
-        # 扣除费用
-        u.points -= price
-
         # 处理商品效果
         result_msg = ""
         if item_id == "energy":
             # 能量药水：直接获得300MP (从200提升)
             gain = 300
-            u.points += gain
+            credit(user_id, gain, "能量药水", session=session)
             result_msg = f"⚡ <b>获得 300 MP！(净赚150)</b>"
 
         elif item_id == "box":
@@ -385,7 +358,7 @@ async def buy_item(update: Update, context: ContextTypes.DEFAULT_TYPE, item_id:
             reward_texts = []
             for reward_type, amount, emoji in rewards:
                 if reward_type == "MP":
-                    u.points += amount
+                    credit(user_id, amount, "神秘宝箱", session=session)
                     reward_texts.append(f"{emoji} {amount} MP")
                 elif reward_type == "lucky_boost":
                     u.lucky_boost = True
@@ -505,11 +478,8 @@ async def shop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # 检查神秘宝箱限购
         if item_id == "box":
-            bought_count, need_reset = get_box_limit_status(u)
-            if need_reset:
-                # 跨天了，重置计数
-                u.daily_box_buy_count = 0
-                bought_count = 0
+            # daily_box_buy_count 每天零点由日切任务归零
+            bought_count = u.daily_box_buy_count or 0
 
             limit = 5 if u.is_vip else 3
             if bought_count >= limit:
@@ -524,24 +494,22 @@ async def shop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
-        if u.points < price:
+        # 扣除费用（SQL 端校验余额，防止并发重复扣款）
+        if debit_if_sufficient(user_id, price, f"商店购买 {item_id}", session=session) is None:
             await edit_with_auto_delete(
                 query,
                 f"💸 <b>【 魔 力 不 足 】</b>\n\n"
-                f"钱包里只有 <b>{u.points} MP</b>\n"
+                f"钱包里只有 <b>{get_balance(user_id, session)} MP</b>\n"
                 f"购买 {item['name']} 需要 <b>{price} MP</b> 喵~",
                 parse_mode='HTML'
             )
             return
 
-        # 扣除费用
-        u.points -= price
-
         # 处理商品效果
         result_msg = ""
         if item_id == "energy":
             gain = 300
-            u.points += gain
+            credit(user_id, gain, "能量药水", session=session)
             result_msg = f"⚡ <b>获得 300 MP！(净赚150)</b>"
         elif item_id == "box":
             # 神秘宝箱：多种稀有度掉落
@@ -603,7 +571,7 @@ async def shop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reward_texts = []
             for reward_type, amount, emoji in rewards:
                 if reward_type == "MP":
-                    u.points += amount
+                    credit(user_id, amount, "神秘宝箱", session=session)
                     reward_texts.append(f"{emoji} {amount} MP")
                 elif reward_type == "lucky_boost":
                     u.lucky_boost = True
@@ -1,11 +1,11 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
-from database import get_session, UserBinding
+from database import get_session, get_user, get_user_snapshot
 from utils import reply_with_auto_delete
 from types import SimpleNamespace
-import aiohttp
+from emby import emby_library
+from messaging import clear_blocked
 import re
-import random
 import os
 import logging
 
@@ -293,11 +293,25 @@ def get_menu_text(user, is_vip: bool = False, user_data=None) -> str:
         return base_text
 
 
+def load_menu_user(tg_id: int) -> tuple:
+    """
+    主菜单所需的用户状态 -> (is_vip, user_data)
+    VIP 标记与绑定状态走快照缓存；只有已绑定用户才查询进度提示需要的列
+    """
+    snap = get_user_snapshot(tg_id)
+    if not snap or not snap.is_bound:
+        return False, snap
+    with get_session() as session:
+        u = get_user(tg_id, session, groups=("identity", "combat", "daily_counters"))
+    return snap.is_vip, u
+
+
 async def start_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    with get_session() as session:
-        u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-        is_vip = u.is_vip if u else False
+    if update.effective_chat.type == "private":
+        # 之前屏蔽过 Bot 的用户重新私聊，恢复接收广播
+        clear_blocked(user.id)
+    is_vip, u = load_menu_user(user.id)
 
     txt = get_menu_text(user, is_vip, u)
     buttons = get_menu_layout(is_vip)
@@ -323,10 +337,9 @@ async def help_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def ensure_emby_bound(user_id: int, query) -> bool:
     """检查用户是否已绑定 Emby，未绑定则显示提示"""
-    with get_session() as session:
-        user = session.query(UserBinding).filter_by(tg_id=user_id).first()
-        if not user or not user.emby_account:
-            txt = """💔 <b>【 未 缔 契 约 】</b>
+    user = get_user_snapshot(user_id)
+    if not user or not user.is_bound:
+        txt = """💔 <b>【 未 缔 契 约 】</b>
 
 我看不到您的灵魂波长... (´;ω;`)
 
@@ -342,9 +355,9 @@ async def ensure_emby_bound(user_id: int, query) -> bool:
 ━━━━━━━━━━━━━━━━━━
 
 <i>"绑定后即可开始冒险喵~(｡•̀ᴗ-)✧"</i>"""
-            await edit_callback_message(query, txt)
-            return False
-        return True
+        await edit_callback_message(query, txt)
+        return False
+    return True
 
 
 async def handle_watch_recommend(query):
@@ -357,81 +370,54 @@ async def handle_watch_recommend(query):
         return
 
     try:
-        headers = {
-            "X-Emby-Token": EMBY_API_KEY,
-            "Accept": "application/json",
-            "User-Agent": "curl/7.68.0"
-        }
-
-        async with aiohttp.ClientSession() as session:
-            # 获取媒体总数
-            async with session.get(f"{EMBY_URL}/Items", headers=headers,
-                                   params={"IncludeItemTypes": "Movie,Episode", "Recursive": "true", "Limit": 1},
-                                   timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    raise Exception("获取媒体失败")
-                data = await resp.json()
-                total_count = data.get('TotalRecordCount', 0)
-
-            if total_count == 0:
-                await edit_callback_message(query, "📭 媒体库空空如也喵~")
-                return
-
-            # 随机选取
-            async with session.get(f"{EMBY_URL}/Items", headers=headers,
-                                   params={"IncludeItemTypes": "Movie,Episode", "Recursive": "true",
-                                           "StartIndex": random.randint(0, max(0, total_count - 1)), "Limit": 1},
-                                   timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    raise Exception("获取推荐失败")
-                data = await resp.json()
-                items = data.get('Items', [])
-                if not items:
-                    await edit_callback_message(query, "📭 推荐获取失败喵~")
-                    return
-
-                item = items[0]
-                item_type = str(item.get('Type', '')) if not isinstance(item.get('Type'), bool) else ''
-
-                # 对于剧集，优先显示剧集名称
-                if item_type == "Episode":
-                    series_name = str(item.get('SeriesName', '')) if not isinstance(item.get('SeriesName'), bool) else ''
-                    episode_name = str(item.get('Name', '')) if not isinstance(item.get('Name'), bool) else ''
-                    item_name = f"{series_name} · {episode_name}" if series_name else (episode_name or '未知')
-                else:
-                    item_name = str(item.get('Name', '未知')) if not isinstance(item.get('Name'), bool) else '未知'
-
-                production_year = item.get('ProductionYear')
-                genres = item.get('Genres') or []
-                overview = str(item.get('Overview', '')) if not isinstance(item.get('Overview'), bool) else ''
-
-                type_icon = "🎬" if item_type == "Movie" else "📺"
-                genre_text = f"{' | '.join(str(g) for g in genres[:3] if g and not isinstance(g, bool))}" if genres else "未分类"
-
-                # 清理HTML标签
-                if overview:
-                    overview = re.sub(r'<[^>]+>', '', overview)
-                    if len(overview) > 100:
-                        overview = overview[:100] + "..."
-
-                lines = [
-                    f"🎲 <b>【 今 日 观 影 推 荐 】</b>",
-                    "━━━━━━━━━━━━━━━━━━",
-                    f"{type_icon} <b>{item_name}</b>",
-                ]
-
-                if production_year and isinstance(production_year, int):
-                    lines.append(f"📅 {production_year}")
-                if genre_text != "未分类":
-                    lines.append(f"🏷️ {genre_text}")
-
-                lines.append("━━━━━━━━━━━━━━━━━━")
-                if overview:
-                    lines.append(f"📝 {overview}")
-                    lines.append("━━━━━━━━━━━━━━━━━━")
-                lines.append(f"<i>\"今天就看这个吧 Master！(｡•̀ᴗ-)✧\"</i>")
-
-                await edit_callback_message(query, "\n".join(lines))
+        # 随机选取电影或剧集（本地索引，索引为空时实时查询 Emby）
+        items = await emby_library.random_items(["Movie", "Episode"])
+        if not items:
+            await edit_callback_message(query, "📭 媒体库空空如也喵~")
+            return
+
+        item = items[0]
+        item_type = str(item.get('Type', '')) if not isinstance(item.get('Type'), bool) else ''
+
+        # 对于剧集，优先显示剧集名称
+        if item_type == "Episode":
+            series_name = str(item.get('SeriesName', '')) if not isinstance(item.get('SeriesName'), bool) else ''
+            episode_name = str(item.get('Name', '')) if not isinstance(item.get('Name'), bool) else ''
+            item_name = f"{series_name} · {episode_name}" if series_name else (episode_name or '未知')
+        else:
+            item_name = str(item.get('Name', '未知')) if not isinstance(item.get('Name'), bool) else '未知'
+
+        production_year = item.get('ProductionYear')
+        genres = item.get('Genres') or []
+        overview = str(item.get('Overview', '')) if not isinstance(item.get('Overview'), bool) else ''
+
+        type_icon = "🎬" if item_type == "Movie" else "📺"
+        genre_text = f"{' | '.join(str(g) for g in genres[:3] if g and not isinstance(g, bool))}" if genres else "未分类"
+
+        # 清理HTML标签
+        if overview:
+            overview = re.sub(r'<[^>]+>', '', overview)
+            if len(overview) > 100:
+                overview = overview[:100] + "..."
+
+        lines = [
+            f"🎲 <b>【 今 日 观 影 推 荐 】</b>",
+            "━━━━━━━━━━━━━━━━━━",
+            f"{type_icon} <b>{item_name}</b>",
+        ]
+
+        if production_year and isinstance(production_year, int):
+            lines.append(f"📅 {production_year}")
+        if genre_text != "未分类":
+            lines.append(f"🏷️ {genre_text}")
+
+        lines.append("━━━━━━━━━━━━━━━━━━")
+        if overview:
+            lines.append(f"📝 {overview}")
+            lines.append("━━━━━━━━━━━━━━━━━━")
+        lines.append(f"<i>\"今天就看这个吧 Master！(｡•̀ᴗ-)✧\"</i>")
+
+        await edit_callback_message(query, "\n".join(lines))
 
     except Exception as e:
         logger.exception("观影推荐失败")
@@ -460,9 +446,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 返回菜单
     if data == "back_menu":
         user = query.from_user
-        with get_session() as session:
-            u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-            is_vip = u.is_vip if u else False
+        is_vip, u = load_menu_user(user.id)
 
         txt = get_menu_text(user, is_vip, u)
         buttons = get_menu_layout(is_vip)
@@ -537,9 +521,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 返回主菜单
     elif data == "back_main":
         user = query.from_user
-        with get_session() as session:
-            u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-            is_vip = u.is_vip if u else False
+        is_vip, u = load_menu_user(user.id)
 
         txt = get_menu_text(user, is_vip, u)
         buttons = get_menu_layout(is_vip)
@@ -715,9 +697,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # VIP中心
     elif data == "vip":
         user = query.from_user
-        with get_session() as session:
-            u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-            is_vip = u.is_vip if u else False
+        snap = get_user_snapshot(user.id)
+        is_vip = snap.is_vip if snap else False
 
         if is_vip:
             txt = (
@@ -1,8 +1,12 @@
 from telegram import Update, BotCommand, BotCommandScopeChat, BotCommandScopeDefault, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from config import Config
 from utils import reply_with_auto_delete
-from database import get_session, UserBinding, VIPApplication
+from messaging import broadcaster, render_progress
+from database import get_session, UserBinding, VIPApplication, user_cache
+from database.ledger import credit, debit_if_sufficient, get_balance
+from emby import emby_directory, emby_library
 
 MY_ADMIN_ID = Config.OWNER_ID  # 从配置加载管理员ID
 
@@ -45,6 +49,36 @@ async def sync_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await reply_with_auto_delete(update.message, "✅ <b>管理员隐形菜单已激活！</b>")
 
 
+def format_cache_stats() -> str:
+    """用户快照缓存命中统计"""
+    stats = user_cache.stats
+    lookups = stats["hits"] + stats["misses"]
+    rate = stats["hits"] / lookups * 100 if lookups else 0
+    return f"⚡ <b>用户缓存：</b> {len(user_cache)} 人 | 命中率 {rate:.1f}% ({stats['hits']}/{lookups})\n"
+
+
+def format_emby_directory_stats() -> str:
+    """Emby 用户目录人数与更新时间"""
+    age = emby_directory.age
+    if age is None:
+        return "🎬 <b>Emby 目录：</b> 未加载\n"
+    updated = f"{int(age)} 秒前" if age < 120 else f"{int(age // 60)} 分钟前"
+    stats = emby_directory.stats
+    return (f"🎬 <b>Emby 目录：</b> {len(emby_directory)} 人 | 更新于 {updated} | "
+            f"刷新 {stats['refreshes']} 次，失败 {stats['errors']} 次\n")
+
+
+def format_emby_library_stats() -> str:
+    """Emby 媒体库本地索引条目数与同步时间"""
+    age = emby_library.age
+    if age is None:
+        return "📚 <b>媒体库索引：</b> 本次启动尚未同步\n"
+    updated = f"{int(age)} 秒前" if age < 120 else f"{int(age // 60)} 分钟前"
+    stats = emby_library.stats
+    return (f"📚 <b>媒体库索引：</b> {emby_library.size} 条 | 同步于 {updated} | "
+            f"本地 {stats['local']} 次，回退 Emby {stats['fallback']} 次，失败 {stats['errors']} 次\n")
+
+
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """管理员控制台主面板"""
     if update.effective_user.id != MY_ADMIN_ID:
@@ -76,6 +110,10 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"👛 <b>钱包总额：</b> {wallet_points} MP\n"
         f"🏦 <b>金库总额：</b> {bank_points} MP\n"
         f"💎 <b>总流通量：</b> <b>{total_points}</b> MP\n"
+        f"━━━━━━━━━━━━━━━━━━\n"
+        f"{format_cache_stats()}"
+        f"{format_emby_directory_stats()}"
+        f"{format_emby_library_stats()}"
         f"━━━━━━━━━━━━━━━━━━"
     )
 
@@ -145,6 +183,10 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"👛 <b>钱包总额：</b> {wallet_points} MP\n"
             f"🏦 <b>金库总额：</b> {bank_points} MP\n"
             f"💎 <b>总流通量：</b> <b>{wallet_points + bank_points}</b> MP\n"
+            f"━━━━━━━━━━━━━━━━━━\n"
+            f"{format_cache_stats()}"
+            f"{format_emby_directory_stats()}"
+            f"{format_emby_library_stats()}"
             f"━━━━━━━━━━━━━━━━━━"
         )
         buttons = [
@@ -216,7 +258,8 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "请使用以下命令发送广播：\n"
             "<code>/say &lt;消息内容&gt;</code>\n\n"
             "示例：\n"
-            "<code>/say 系统维护通知...</code>",
+            "<code>/say 系统维护通知...</code>\n\n"
+            "发送进度会实时更新，可随时暂停 / 继续 / 取消；屏蔽了 Bot 的用户自动跳过。",
             parse_mode='HTML',
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 返回", callback_data="admin_back")]])
         )
@@ -276,17 +319,11 @@ async def cmd_addpoints(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await reply_with_auto_delete(update.message, "⚠️ <b>参数错误</b>\n用户ID和数量必须是数字")
         return
+    if amount < 0:
+        await reply_with_auto_delete(update.message, "⚠️ <b>参数错误</b>\n数量不能为负数，扣除请用 /delpoints")
+        return
 
-    with get_session() as session:
-        user = session.query(UserBinding).filter_by(tg_id=target_id).first()
-        if user:
-            user.points += amount
-            session.commit()
-            success = True
-        else:
-            success = False
-
-    if not success:
+    if credit(target_id, amount, "管理员添加") is None:
         await reply_with_auto_delete(update.message, f"❌ 用户 <code>{target_id}</code> 不存在")
     else:
         await reply_with_auto_delete(update.message, f"✅ <b>操作成功</b>\n已给用户 <code>{target_id}</code> 添加 <b>{amount}</b> MP")
@@ -307,17 +344,18 @@ async def cmd_delpoints(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await reply_with_auto_delete(update.message, "⚠️ <b>参数错误</b>\n用户ID和数量必须是数字")
         return
+    if amount < 0:
+        await reply_with_auto_delete(update.message, "⚠️ <b>参数错误</b>\n数量不能为负数")
+        return
 
     with get_session() as session:
-        user = session.query(UserBinding).filter_by(tg_id=target_id).first()
-        if user:
-            user.points = max(0, user.points - amount)
-            session.commit()
-            success = True
-        else:
-            success = False
+        balance = get_balance(target_id, session)
+        if balance is not None and debit_if_sufficient(target_id, amount, "管理员扣除", session=session) is None:
+            # 余额不足时扣到 0 为止（扣除查询到的余额，期间新入账的部分保留）
+            amount = max(0, balance)
+            debit_if_sufficient(target_id, amount, "管理员扣除", session=session)
 
-    if not success:
+    if balance is None:
         await reply_with_auto_delete(update.message, f"❌ 用户 <code>{target_id}</code> 不存在")
     else:
         await reply_with_auto_delete(update.message, f"✅ <b>操作成功</b>\n已扣除用户 <code>{target_id}</code> 的 <b>{amount}</b> MP")
@@ -384,7 +422,7 @@ async def cmd_unvip(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cmd_say(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """发送全员广播"""
+    """发送全员广播（后台分批发送，进度消息上可暂停 / 继续 / 取消，重启后自动续传）"""
     if update.effective_user.id != MY_ADMIN_ID:
         return
 
@@ -393,21 +431,42 @@ async def cmd_say(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     message = " ".join(context.args)
+    text = f"🗣️ <b>【 管理员广播 】</b>\n\n{message}"
 
-    with get_session() as session:
-        users = session.query(UserBinding).all()
+    job = broadcaster.create(update.effective_user.id, update.effective_chat.id, text)
+    body, markup = render_progress(job)
+    progress = await update.message.reply_html(body, reply_markup=markup)
+    broadcaster.attach_message(job.id, progress.message_id)
+    broadcaster.launch(context.bot, job.id)
 
-    success = 0
-    failed = 0
 
-    for user in users:
-        try:
-            await context.bot.send_message(chat_id=user.tg_id, text=f"🗣️ <b>【 管理员广播 】</b>\n\n{message}", parse_mode='HTML')
-            success += 1
-        except Exception:
-            failed += 1
+async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """广播进度消息上的暂停 / 继续 / 取消按钮"""
+    query = update.callback_query
+    if query.from_user.id != MY_ADMIN_ID:
+        await query.answer("⛔ 权限不足", show_alert=True)
+        return
 
-    await reply_with_auto_delete(update.message, f"✅ <b>广播发送完成</b>\n成功：{success}\n失败：{failed}")
+    action, _, job_id = query.data.partition(":")
+    job_id = int(job_id)
+    if action == "bcast_pause":
+        job = await broadcaster.pause(job_id)
+    elif action == "bcast_resume":
+        job = broadcaster.resume(context.bot, job_id)
+    else:
+        job = await broadcaster.cancel(job_id)
+
+    if job is None:
+        await query.answer("⚠️ 广播已结束或状态已变化", show_alert=True)
+        job = broadcaster.get(job_id)
+    else:
+        await query.answer()
+    if job is not None:
+        body, markup = render_progress(job)
+        try:
+            await query.edit_message_text(body, reply_markup=markup, parse_mode='HTML')
+        except BadRequest:
+            pass  # 进度没有变化
 
 
 def register(app):
@@ -420,3 +479,4 @@ def register(app):
     app.add_handler(CommandHandler("unvip", cmd_unvip))
     app.add_handler(CommandHandler("say", cmd_say))
     app.add_handler(CallbackQueryHandler(admin_callback, pattern="^admin_"))
+    app.add_handler(CallbackQueryHandler(broadcast_callback, pattern="^bcast_"))
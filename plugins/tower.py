@@ -12,6 +12,8 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.guilds import set_attack
+from database.ledger import credit
 from utils import reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -307,8 +309,8 @@ async def tower_fight_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         # 构建战斗结果
         if result["is_win"]:
             # 胜利
-            user.points = (user.points or 0) + result["mp_reward"]
-            user.attack = (user.attack or 0) + result["attack_bonus"]
+            credit(user_id, result["mp_reward"], f"爬塔第 {current_floor} 层", session=session)
+            set_attack(user, (user.attack or 0) + result["attack_bonus"], session)
             user.tower_current_floor = current_floor + 1
             user.tower_max_floor = max(user.tower_max_floor or 0, current_floor)
             user.tower_total_wins = (user.tower_total_wins or 0) + 1
@@ -7,7 +7,9 @@
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from database import get_session, UserBinding
+from database import get_session, get_async_session, get_user_async, UserBinding
+from database.counters import counter_store, apply_task_progress_async
+from database.ledger import credit, credit_async, debit_if_sufficient
 from utils import reply_with_auto_delete
 from datetime import datetime, date, timedelta
 import random
@@ -145,24 +147,14 @@ CURRENT_BOUNTY = {}
 # ==========================================
 # 辅助函数
 # ==========================================
-def get_today():
-    return datetime.now().date()
+# 今日任务尚未载入内存时，基线最多缓存多久（秒）
+TASK_BASELINE_MAX_AGE = 30
 
 
 def get_user_daily_tasks(user: UserBinding) -> dict:
     """获取用户今日任务，如果没有则生成"""
-    today = get_today()
-
-    # 先检查是否需要刷新（生成新任务）
-    need_refresh = False
-    if user.task_date:
-        last_date = user.task_date.date() if isinstance(user.task_date, datetime) else user.task_date
-        if last_date < today:
-            need_refresh = True
-    else:
-        need_refresh = True
-
-    if need_refresh:
+    # 每日任务在零点由日切任务清空，为空时生成今日任务
+    if not user.daily_tasks or not user.task_date:
         selected_tasks = []
         # 1. 聊天任务（必选）
         selected_tasks.append(random.choice(TASK_POOL[0]))
@@ -178,6 +170,7 @@ def get_user_daily_tasks(user: UserBinding) -> dict:
         user.task_date = datetime.now()
         user.daily_tasks = ",".join(selected_tasks)
         user.task_progress = "0,0,0"
+        counter_store.invalidate(user.tg_id)
 
     # 确保读取最新的 task_progress
     task_ids = (user.daily_tasks or "").split(",")
@@ -200,30 +193,24 @@ def get_user_daily_tasks(user: UserBinding) -> dict:
     return tasks
 
 
-def update_task_progress(user: UserBinding, task_type: str, delta: int = 1) -> tuple:
+def pending_task_progress(user: UserBinding, task_type: str, delta: int = 1) -> dict:
     """
-    更新每日任务进度
-    返回：(是否完成新任务，任务名称，奖励)
+    计算每日任务进度增量（不修改 user）
+    返回：{(下标, 任务ID): [增量, 目标]}，与 counter_store 写回的增量格式一致
     """
-    task_ids = (user.daily_tasks or "").split(",")
-    if not task_ids or not user.task_date:
-        return False, None, 0
-
-    today = get_today()
-    last_date = user.task_date.date() if isinstance(user.task_date, datetime) else user.task_date
-    if last_date < today:
-        return False, None, 0
+    # 今日任务尚未生成（日切后未打开过任务面板）
+    if not user.daily_tasks or not user.task_date:
+        return {}
+    task_ids = user.daily_tasks.split(",")
 
     progress_list = ((user.task_progress or "0,0,0").split(","))
-    new_completed = False
-    task_name = None
-    reward = 0
+    pending = {}
 
     for i, tid in enumerate(task_ids):
         if tid not in DAILY_TASKS:
             continue
         target = DAILY_TASKS[tid]["target"]
-        current = int(progress_list[i]) if i < len(progress_list) else 0
+        current = int(progress_list[i]) if i < len(progress_list) and progress_list[i].isdigit() else 0
         if current >= target:
             continue
 
@@ -248,16 +235,23 @@ def update_task_progress(user: UserBinding, task_type: str, delta: int = 1) -> t
             should_update = True
 
         if should_update:
-            new_val = min(current + delta, target)
-            progress_list[i] = str(new_val)
+            pending[(i, tid)] = [delta, target]
+
+    return pending
 
-            if new_val >= target and current < target:
-                new_completed = True
-                task_name = DAILY_TASKS[tid]["name"]
-                reward = DAILY_TASKS[tid]["reward"]
 
-    user.task_progress = ",".join(progress_list)
-    return new_completed, task_name, reward
+def newly_completed_task(pending: dict, before: str, after: str) -> tuple:
+    """
+    对比合并前后的 task_progress
+    返回：(任务名称，奖励)，没有新完成的任务返回 (None, 0)
+    """
+    old = [int(x) if x.isdigit() else 0 for x in before.split(",")]
+    new = [int(x) if x.isdigit() else 0 for x in after.split(",")]
+    for (i, tid), (_, target) in pending.items():
+        prev = old[i] if i < len(old) else 0
+        if i < len(new) and new[i] >= target > prev:
+            return DAILY_TASKS[tid]["name"], DAILY_TASKS[tid]["reward"]
+    return None, 0
 
 
 # ==========================================
@@ -273,6 +267,9 @@ async def mission_main(update: Update, context: ContextTypes.DEFAULT_TYPE, tab:
 
     user_id = update.effective_user.id
 
+    # 先写回内存中的聊天计数，保证任务进度是最新的
+    await counter_store.flush()
+
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user_id).first()
 
@@ -408,7 +405,7 @@ async def post_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE):
         answer = str(eval(f"{a}{op}{b}"))
         question = f"{a} {op} {b} = ?"
 
-        CURRENT_BOUNTY[chat_id] = {
+        bounty = {
             "type": "quiz",
             "answer": answer,
             "question": question,
@@ -417,7 +414,7 @@ async def post_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "start_time": datetime.now(),
         }
     else:
-        CURRENT_BOUNTY[chat_id] = {
+        bounty = {
             "type": task_type,
             "target": target,
             "progress": {},
@@ -425,6 +422,7 @@ async def post_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "reward": reward,
             "start_time": datetime.now(),
         }
+    CURRENT_BOUNTY[chat_id] = bounty
 
     txt = (
         f"📜 <b>【 公 会 · 紧 急 悬 赏 】</b>\n"
@@ -443,8 +441,8 @@ async def post_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"<i>\"猎人们，行动起来！\"</i>"
     )
 
-    sent_msg = await msg.reply_html(txt)
-    CURRENT_BOUNTY[chat_id]["msg"] = sent_msg
+    # 发送期间悬赏可能已被答出并移除，只更新本次发布的这一条
+    bounty["msg"] = await msg.reply_html(txt)
 
 
 # ==========================================
@@ -579,7 +577,8 @@ async def check_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def settle_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE, winner_id: int, title: str):
     """结算悬赏任务"""
     chat_id = update.effective_chat.id
-    mission = CURRENT_BOUNTY.get(chat_id)
+    # 先取走悬赏再 await：同时答对的人只有第一个结算
+    mission = CURRENT_BOUNTY.pop(chat_id, None)
 
     if not mission:
         return
@@ -599,7 +598,7 @@ async def settle_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE, winn
                 reward += bonus
                 bonus_msg = f" (👑 VIP加成 +{bonus})"
 
-            u.points += reward
+            credit(winner_id, reward, f"悬赏任务 {title}", session=session)
             winner_name = u.emby_account or winner_name
             points_awarded = True
             session.commit()
@@ -628,8 +627,6 @@ async def settle_bounty(update: Update, context: ContextTypes.DEFAULT_TYPE, winn
     except Exception:
         pass
 
-    del CURRENT_BOUNTY[chat_id]
-
 
 # ==========================================
 # 消息监听（聊天挖矿 + 悬赏进度 + 数学题）
@@ -647,40 +644,42 @@ async def on_chat_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 先检查数学题（即使未绑定也能回答）
     await check_quiz_answer(update, context)
 
-    with get_session() as session:
-        u = session.query(UserBinding).filter_by(tg_id=user.id).first()
-
-        if not u:
-            return
-
-        # 检查每日任务进度
-        new_completed, task_name, base_reward = update_task_progress(u, "chat", 1)
-
-        # 始终提交 session 以保存 task_progress
-        session.commit()
-
-        if new_completed:
-            reward = base_reward
-            if u.is_vip:
-                reward = int(reward * 1.5)
-
-            # 任务完成后额外奖励魔力
-            with get_session() as reward_session:
-                reward_user = reward_session.query(UserBinding).filter_by(tg_id=user.id).first()
-                if reward_user:
-                    reward_user.points += reward
-                    reward_session.commit()
-
-            msg = (
-                f"🎉 <b>【 每 日 任 务 · 完 成 ！】</b>\n"
-                f"━━━━━━━━━━━━━━━━━━\n"
-                f"✨ <b>完成任务：</b> {task_name}\n"
-                f"💰 <b>获得奖励：</b> +{reward} MP\n"
-                f"{'👑 VIP加成 +50%' if u.is_vip else ''}\n"
-                f"━━━━━━━━━━━━━━━━━━"
-            )
-            await reply_with_auto_delete(update.message, msg, disable_notification=True)
+    entry = await counter_store.get(user.id)
+    if entry is not None and not entry.task_ids:
+        # 今日任务可能刚生成，基线稍旧时重新加载一次
+        entry = await counter_store.get(user.id, max_age=TASK_BASELINE_MAX_AGE)
+    if entry is None:
+        return
 
+    # 检查每日任务进度（聊天计数只累积在内存中，由 counter_store 定期批量写回）
+    new_completed, task_name, reward = False, None, 0
+    if entry.task_ids:
+        for i, tid in enumerate(entry.task_ids):
+            if tid not in ["chat_10", "chat_20"]:
+                continue
+            target = DAILY_TASKS[tid]["target"]
+            before, after = entry.add_task_progress(i, 1, target)
+            if before < target <= after:
+                new_completed = True
+                task_name = DAILY_TASKS[tid]["name"]
+                reward = DAILY_TASKS[tid]["reward"]
+            break
+
+    if new_completed:
+        if entry.is_vip:
+            reward = int(reward * 1.5)
+        # 任务完成奖励立即入账
+        await credit_async(user.id, reward, f"每日任务 {task_name}")
+
+        msg = (
+            f"🎉 <b>【 每 日 任 务 · 完 成 ！】</b>\n"
+            f"━━━━━━━━━━━━━━━━━━\n"
+            f"✨ <b>完成任务：</b> {task_name}\n"
+            f"💰 <b>获得奖励：</b> +{reward} MP\n"
+            f"{'👑 VIP加成 +50%' if entry.is_vip else ''}\n"
+            f"━━━━━━━━━━━━━━━━━━"
+        )
+        await reply_with_auto_delete(update.message, msg, disable_notification=True)
 
     # 检查悬赏进度（在 with 块外）
     await check_bounty_progress(update, context, "chat")
@@ -694,21 +693,29 @@ async def track_and_check_task(user_id: int, task_type: str) -> tuple:
     追踪并检查任务进度
     返回：(是否有新完成，消息文本)
     """
-    with get_session() as session:
-        u = session.query(UserBinding).filter_by(tg_id=user_id).first()
+    async with get_async_session() as session:
+        u = await get_user_async(user_id, session, groups=("identity", "wallet", "daily_counters"))
 
         if not u:
             return False, None
 
-        new_completed, task_name, base_reward = update_task_progress(u, task_type, 1)
+        # task_progress 同时被 counter_store 写回，不能整串写回 ORM 读到的旧值
+        pending = pending_task_progress(u, task_type, 1)
+        if not pending:
+            return False, None
+        task_date = u.task_date.date() if isinstance(u.task_date, datetime) else u.task_date
+        merged = await apply_task_progress_async(user_id, pending, task_date, session)
+        if merged is None:
+            return False, None
 
-        if new_completed:
+        task_name, base_reward = newly_completed_task(pending, *merged)
+        if task_name:
             reward = base_reward
             if u.is_vip:
                 reward = int(reward * 1.5)
 
-            u.points += reward
-            session.commit()
+            await credit_async(user_id, reward, f"每日任务 {task_name}", session=session)
+            await session.commit()
 
             msg = (
                 f"🎉 <b>【 每 日 任 务 · 完 成 ！】</b>\n"
@@ -728,6 +735,8 @@ async def get_task_status(user_id: int) -> dict:
     获取用户当前任务状态（实时）
     返回任务字典，包含最新进度
     """
+    await counter_store.flush()
+
     with get_session() as session:
         u = session.query(UserBinding).filter_by(tg_id=user_id).first()
         if not u:
@@ -776,7 +785,7 @@ async def mission_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await old_bounty["msg"].delete()
             except Exception:
                 pass
-            del CURRENT_BOUNTY[chat_id]
+            CURRENT_BOUNTY.pop(chat_id, None)
         # 发布新悬赏
         fake_update = type('Update', (), {
             'effective_message': query.message,
@@ -798,8 +807,8 @@ async def mission_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.edit_message_text("💔 <b>请先绑定账号喵！</b>", parse_mode='HTML')
                 return
 
-            # 检查魔力
-            if u.points < refresh_cost:
+            # 检查魔力并扣除消耗（SQL 端校验余额）
+            if debit_if_sufficient(user_id, refresh_cost, "刷新每日任务", session=session) is None:
                 await query.edit_message_text(
                     f"💸 <b>【 魔 力 不 足 】</b>\n\n"
                     f"刷新任务需要 <b>{refresh_cost} MP</b>\n"
@@ -808,9 +817,6 @@ async def mission_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
-            # 扣除消耗
-            u.points -= refresh_cost
-
             # 重新生成每日任务
             selected_tasks = []
             # 1. 聊天任务（必选）
@@ -829,6 +835,7 @@ async def mission_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             u.task_progress = "0,0,0"
 
             session.commit()
+            counter_store.invalidate(u.tg_id)
 
             remaining_points = u.points
 
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 from database import get_session, UserBinding
+from database.ledger import credit
 from utils import edit_with_auto_delete, reply_with_auto_delete
 
 logger = logging.getLogger(__name__)
@@ -112,12 +113,12 @@ async def apply_reward(user_id: int, reward: dict) -> str:
         amount = reward['amount']
 
         if r_type == "points":
-            user.points += amount
+            credit(user_id, amount, "VIP宝箱", session=session)
             session.commit()
             return f"💰 <b>获得魔力：</b>+{amount} MP"
 
         elif r_type == "points_bonus":
-            user.points += amount
+            credit(user_id, amount, "VIP宝箱暴击", session=session)
             session.commit()
             return f"💫 <b>暴击奖励：</b>+{amount} MP"
 
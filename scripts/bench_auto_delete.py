@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+群消息自毁基准测试
+20 个群共 10k 条待自毁消息，对比：
+- 旧版：每条消息 create_task 一个睡眠后 message.delete() 的协程
+- 新版：自毁调度器（一个后台任务 + 到期时间堆，同群同时到期的合并为 deleteMessages）
+统计调度后的内存占用、存活任务数，以及全部删除完需要的 API 调用次数。
+
+运行方式：
+    python scripts/bench_auto_delete.py [消息数] [群数]
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from database.models import Base
+from database.repository import engine
+from messaging import DeletionScheduler
+
+DELAY = 1.0
+
+
+class Bot:
+    def __init__(self):
+        self.calls = 0
+        self.deleted = 0
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls += 1
+        self.deleted += 1
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.calls += 1
+        self.deleted += len(message_ids)
+
+
+class Message:
+    def __init__(self, bot, chat_id, message_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def delete(self):
+        await self.bot.delete_message(self.chat_id, self.message_id)
+
+
+async def _delete_after(message, delay):
+    try:
+        await asyncio.sleep(delay)
+        await message.delete()
+    except Exception:
+        pass
+
+
+async def measure(name, schedule, wait_done, bot, n):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    schedule()
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    tasks = len(asyncio.all_tasks()) - 1
+
+    start = time.perf_counter()
+    await wait_done()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {memory / 1024:>8.0f}KB {tasks:>8} {bot.calls:>10} {bot.deleted:>8} {elapsed:>8.2f}s")
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    Base.metadata.create_all(engine)
+    messages = [(-1000 - i % chats, i) for i in range(n)]
+    print(f"📊 {chats} 个群共 {n} 条待自毁消息（{DELAY:g}s 后删除）\n")
+    print(f"{'方案':<10} {'调度内存':>10} {'存活任务':>6} {'删除API调用':>6} {'已删除':>6} {'删完耗时':>6}")
+
+    bot = Bot()
+    tasks = []
+
+    def old_schedule():
+        tasks.extend(asyncio.create_task(_delete_after(Message(bot, c, m), DELAY)) for c, m in messages)
+
+    async def old_wait():
+        await asyncio.gather(*tasks)
+
+    await measure("旧版 每条一个任务", old_schedule, old_wait, bot, n)
+
+    bot = Bot()
+    scheduler = DeletionScheduler()
+    scheduler.start(bot)
+
+    def new_schedule():
+        for c, m in messages:
+            scheduler.schedule(c, m, DELAY)
+
+    async def new_wait():
+        while scheduler.pending:
+            await asyncio.sleep(0.01)
+
+    await measure("新版 调度器", new_schedule, new_wait, bot, n)
+    await scheduler.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
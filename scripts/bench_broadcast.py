@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+全员广播基准测试
+临时 SQLite 库里造 N 个用户，用一个按 Telegram 规则限速的假 Bot API（超限抛 RetryAfter，单次调用有往返耗时）对比：
+- 旧版 /say：query(UserBinding).all() 整表读进内存，逐个串行 send_message（按前 SAMPLE 人外推总耗时）
+- 新版广播任务：keyset 分批 + 发送队列并发限速；中途停止再启动，统计重复发送数
+
+为了缩短运行时间，全局限额放大 SCALE 倍（真实限额 30 条/秒）。
+
+运行方式：
+    python scripts/bench_broadcast.py [用户数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from sqlalchemy import insert
+from telegram.error import RetryAfter
+from database import UserBinding, get_session
+from database.models import Base
+from database.repository import engine
+from messaging import BroadcastEngine, SendQueue
+from messaging.broadcast import DONE
+
+SCALE = 50
+GLOBAL_RATE = 30 * SCALE
+LATENCY = 0.02          # 单次 API 调用的往返耗时
+SAMPLE = 2000
+
+
+class Bot:
+    def __init__(self):
+        self.window = deque()
+        self.delivered = Counter()
+        self.flood_errors = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(LATENCY)
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1.0:
+            self.window.popleft()
+        if len(self.window) >= GLOBAL_RATE + 5:
+            self.flood_errors += 1
+            raise RetryAfter(1)
+        self.window.append(now)
+        self.delivered[chat_id] += 1
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+def seed(n: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserBinding.__table__), [{"tg_id": 10_000 + i, "points": 0} for i in range(n)])
+
+
+async def old_say(bot) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    with get_session() as session:
+        users = session.query(UserBinding).all()
+    load = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for u in users[:SAMPLE]:
+        try:
+            await bot.send_message(chat_id=u.tg_id, text="公告")
+        except Exception:
+            pass
+    per_user = (time.perf_counter() - start) / SAMPLE
+    return load, peak, load + per_user * len(users)
+
+
+async def wait_done(engine, job_id):
+    while engine.get(job_id).status != DONE or job_id in engine._tasks:
+        await asyncio.sleep(0.05)
+
+
+async def new_say(bot, interrupt_after: float = None) -> float:
+    queue = SendQueue(rate=GLOBAL_RATE, concurrency=64)
+    queue.start()
+    engine = BroadcastEngine(queue=queue)
+    start = time.perf_counter()
+    job = engine.create(1, 1, "公告")
+    engine.launch(bot, job.id)
+    if interrupt_after is not None:
+        await asyncio.sleep(interrupt_after)
+        await engine.stop()
+        await queue.stop()
+        queue = SendQueue(rate=GLOBAL_RATE, concurrency=64)
+        queue.start()
+        engine = BroadcastEngine(queue=queue)
+        engine.start(bot)
+    await wait_done(engine, job.id)
+    elapsed = time.perf_counter() - start
+    await queue.stop(timeout=0)
+    return elapsed
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    seed(n)
+    print(f"📊 向 {n} 个用户广播（假 Bot API：全局 {GLOBAL_RATE} 条/秒（真实限额 ×{SCALE}），往返 {LATENCY * 1000:.0f}ms）\n")
+
+    load, peak, total = await old_say(Bot())
+    print(f"旧版 串行    读全表 {load:.2f}s（峰值内存 {peak / 1024 / 1024:.0f}MB），"
+          f"发送按前 {SAMPLE} 人外推，总计约 {total:.0f}s（{n / total:.0f} 条/秒）")
+
+    bot = Bot()
+    elapsed = await new_say(bot)
+    print(f"新版 广播任务 {elapsed:.1f}s（{n / elapsed:.0f} 条/秒），送达 {len(bot.delivered)}，"
+          f"flood {bot.flood_errors}")
+
+    bot = Bot()
+    elapsed = await new_say(bot, interrupt_after=elapsed / 2)
+    duplicates = sum(c - 1 for c in bot.delivered.values())
+    print(f"新版 中途重启 {elapsed:.1f}s，送达 {len(bot.delivered)}，重复发送 {duplicates}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
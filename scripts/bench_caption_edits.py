@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+有奖推送领取编辑基准测试
+30 个已绑定用户同时回复同一条文本推送，走真实的 check_reply_reward（临时 SQLite 库记账），对比：
+- 旧版：每个领取者各编辑一次原消息，先试 edit_message_caption（文本消息必然失败）再 edit_message_text
+- 新版：编辑合并器（首次立即编辑，之后每 MESSAGE_EDIT_INTERVAL 秒最多一次，记住文本 / caption）
+假 Bot API 按群组编辑限额（每分钟 EDIT_LIMIT 次）抛 RetryAfter，单次调用有往返耗时。
+统计编辑 API 调用次数、失败的 caption 尝试、flood 次数，以及原消息最终显示的领取人数和出现时间。
+
+运行方式：
+    python scripts/bench_caption_edits.py [领取人数] [编辑间隔秒]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from sqlalchemy import insert
+from telegram.error import BadRequest, RetryAfter
+from database import UserBinding
+from database.models import Base
+from database.repository import engine
+from messaging import EditCoalescer, SendQueue
+from plugins import reward_push
+
+CHAT_ID = -100
+PUSH_ID = 1
+LATENCY = 0.03          # 单次 API 调用的往返耗时
+EDIT_LIMIT = 20         # 群组内每分钟可编辑次数
+
+
+class Bot:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.edits = []
+        self.calls = 0
+        self.caption_failures = 0
+        self.flood_errors = 0
+        self.replies = 0
+        self.text = None
+        self.shown_at = None
+
+    async def _edit(self, kind, text):
+        await asyncio.sleep(LATENCY)
+        self.calls += 1
+        if kind == "caption":
+            self.caption_failures += 1
+            raise BadRequest("There is no caption in the message to edit")
+        now = time.perf_counter()
+        self.edits = [t for t in self.edits if now - t < 60]
+        if len(self.edits) >= EDIT_LIMIT:
+            self.flood_errors += 1
+            raise RetryAfter(int(60 - (now - self.edits[0])) + 1)
+        self.edits.append(now)
+        if text != self.text:
+            self.text = text
+            self.shown_at = now - self.start
+
+    async def edit_message_caption(self, chat_id, message_id, caption, **kwargs):
+        await self._edit("caption", caption)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._edit("text", text)
+
+    def shown_claims(self) -> int:
+        marker = "已领取："
+        if not self.text or marker not in self.text:
+            return 0
+        return int(self.text.split(marker)[1].split("/")[0])
+
+
+class LegacyEditor:
+    """旧版：每次领取立即编辑，caption 失败再编辑文本，都失败时回复领取结果"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def editable(self, chat_id, message_id):
+        return True
+
+    def request(self, bot, chat_id, message_id, render, is_photo=None):
+        async def edit():
+            text = render()
+            try:
+                await bot.edit_message_caption(chat_id=chat_id, message_id=message_id, caption=text, parse_mode='HTML')
+            except Exception:
+                try:
+                    await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode='HTML')
+                except Exception:
+                    bot.replies += 1
+        self.tasks.append(asyncio.create_task(edit()))
+
+    async def wait(self):
+        await asyncio.gather(*self.tasks)
+
+
+def seed(n: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserBinding.__table__), [{"tg_id": 10_000 + i, "points": 0} for i in range(n)])
+
+
+def new_push():
+    reward_push.ACTIVE_PUSHES.clear()
+    reward_push.LAST_REWARD_TIME.clear()
+    reward_push.ACTIVE_PUSHES[PUSH_ID] = {
+        'chat_id': CHAT_ID,
+        'push_id': 'bench',
+        'claimed_users': set(),
+        'created_at': None,
+        'original_caption': "📜 <b>魔法传讯</b>",
+        'claim_list': [],
+        'is_photo': False,
+    }
+
+
+async def claim_all(bot, n: int):
+    async def reply_html(*args, **kwargs):
+        bot.replies += 1
+
+    context = SimpleNamespace(bot=bot)
+    updates = [
+        SimpleNamespace(message=SimpleNamespace(
+            reply_to_message=SimpleNamespace(message_id=PUSH_ID),
+            from_user=SimpleNamespace(id=10_000 + i, first_name=f"用户{i}", username=None),
+            reply_html=reply_html,
+        ))
+        for i in range(n)
+    ]
+    await asyncio.gather(*(reward_push.check_reply_reward(u, context) for u in updates))
+
+
+def report(name, bot, n):
+    shown = f"{bot.shown_at:.2f}s" if bot.shown_at is not None else "-"
+    print(f"{name:<10} {bot.calls:>8} {bot.caption_failures:>10} {bot.flood_errors:>6} {bot.replies:>8} "
+          f"{bot.shown_claims():>6}/{n} {shown:>10}")
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    seed(n)
+    print(f"📊 {n} 人同时回复同一条文本推送（假 Bot API：群组每分钟 {EDIT_LIMIT} 次编辑，往返 {LATENCY * 1000:.0f}ms，"
+          f"合并间隔 {interval:g}s）\n")
+    print(f"{'方案':<10} {'编辑API调用':>6} {'失败caption尝试':>6} {'flood':>6} {'回退回复':>6} {'最终显示':>6} {'最终显示时间':>6}")
+
+    bot = Bot()
+    legacy = LegacyEditor()
+    reward_push.edit_coalescer = legacy
+    new_push()
+    await claim_all(bot, n)
+    await legacy.wait()
+    report("旧版 逐个编辑", bot, n)
+
+    bot = Bot()
+    queue = SendQueue()
+    queue.start()
+    coalescer = EditCoalescer(interval=interval, queue=queue)
+    reward_push.edit_coalescer = coalescer
+    new_push()
+    await claim_all(bot, n)
+    await asyncio.sleep(interval + 0.5)
+    await coalescer.stop()
+    await queue.stop()
+    report("新版 合并编辑", bot, n)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Emby 客户端基准测试
+在本地起一个 Emby 桩服务器（固定响应延迟），对比旧做法（每次调用新建 ClientSession）
+与共享 EmbyClient（连接池 + 长连接 + 单飞合并）的延迟、上游请求数和 TCP 连接数
+
+请求混合：一半是相同的 /Users（多人同时打开面板），一半是各不相同的 /Users/{id}/Items
+
+运行方式：
+    python scripts/bench_emby_client.py [请求数] [并发数]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiohttp import web
+from emby import EmbyClient
+
+API_KEY = "bench"
+SERVER_DELAY = 0.02
+HEADERS = {"X-Emby-Token": API_KEY, "Accept": "application/json", "User-Agent": "curl/7.68.0"}
+
+
+class Stub:
+    def __init__(self):
+        self.requests = 0
+        self.peers = set()
+        self.url = ""
+
+    @property
+    def connections(self) -> int:
+        # 每条 TCP 连接对应一个客户端端口
+        return len(self.peers)
+
+    async def handle(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(SERVER_DELAY)
+        if request.path == "/Users":
+            return web.json_response([{"Name": f"user{i}", "Id": f"id{i}"} for i in range(200)])
+        return web.json_response({"Items": [{"Id": "x", "RunTimeTicks": 36000000000}], "TotalRecordCount": 1})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return runner
+
+    def reset(self):
+        self.requests = 0
+        self.peers.clear()
+
+
+def paths(count: int):
+    return [("/Users", None) if i % 2 == 0 else (f"/Users/id{i}/Items", {"Filters": "IsPlayed", "Limit": 1})
+            for i in range(count)]
+
+
+async def run(fetch, jobs, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(path, params):
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(path, params)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p, q) for p, q in jobs))
+    return time.perf_counter() - start, latencies
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    stub = Stub()
+    runner = await stub.start()
+    jobs = paths(count)
+
+    async def old_fetch(path, params):
+        # 旧做法：每次调用新建会话（新连接、重建请求头）
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{stub.url}{path}", headers=dict(HEADERS), params=params,
+                                   timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                return await resp.json()
+
+    client = EmbyClient(base_url=stub.url, api_key=API_KEY)
+    client.start()
+
+    async def new_fetch(path, params):
+        return await client.get_json(path, params)
+
+    print(f"📊 {count} 个请求，并发 {concurrency}，桩服务器延迟 {SERVER_DELAY * 1000:.0f}ms\n")
+    print(f"{'方案':<24} {'总耗时':>8} {'p50':>8} {'p95':>8} {'上游请求':>8} {'TCP连接':>8}")
+    for name, fetch in (("旧版 每次新建会话", old_fetch), ("共享 EmbyClient", new_fetch)):
+        stub.reset()
+        elapsed, latencies = await run(fetch, jobs, concurrency)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:<24} {elapsed:>7.2f}s {statistics.median(latencies):>6.1f}ms {p95:>6.1f}ms "
+              f"{stub.requests:>8} {stub.connections:>8}")
+
+    await client.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Emby 媒体库本地索引基准测试
+本地起一个 Emby 桩服务器（固定响应延迟），对比抽卡 / 推荐在实时查询 Emby 与读本地索引时的延迟，
+以及全量 / 增量同步耗时和 Emby 停机后的表现
+
+运行方式：
+    python scripts/bench_emby_library.py [条目数] [桩服务器延迟ms]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from aiohttp import web
+from database.models import Base
+from database.repository import engine
+from emby import EmbyClient, EmbyError, EmbyLibrary
+
+ROUNDS = 200
+
+
+class Stub:
+    def __init__(self, count: int, delay: float):
+        self.delay = delay
+        self.items = [
+            {"Id": f"id{i}", "Name": f"电影{i}", "Type": "Movie" if i % 3 else "Episode",
+             "ProductionYear": 1980 + i % 45, "Genres": ["剧情"], "CommunityRating": round(random.uniform(3, 9.5), 1),
+             "Overview": "简介" * 40, "DateCreated": f"2024-01-01T00:00:{i % 60:02d}.0000000Z",
+             "ImageTags": {"Primary": "abc"}, "Path": f"/media/{i}.mkv",
+             "MediaStreams": [{"Type": "Video", "Width": 1920, "Codec": "h264"}]}
+            for i in range(count)
+        ]
+        self.requests = 0
+        self.url = ""
+
+    async def items_handler(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        q = request.query
+        types = q.get("IncludeItemTypes", "Movie").split(",")
+        items = [i for i in self.items if i["Type"] in types]
+        if "MinDateCreated" in q:
+            items = []          # 增量同步：没有新条目
+        if q.get("SortBy") == "Random":
+            items = random.sample(items, min(int(q.get("Limit", 1)), len(items)))
+        start = int(q.get("StartIndex", 0))
+        limit = int(q.get("Limit", 100))
+        return web.json_response({"Items": items[start:start + limit], "TotalRecordCount": len(items)})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/Items", self.items_handler)
+        app.router.add_get("/Users/{id}/Items", self.items_handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return runner
+
+
+async def timed(fn, rounds: int = ROUNDS):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), sorted(latencies)[int(rounds * 0.95) - 1]
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    delay = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    Base.metadata.create_all(engine)
+    stub = Stub(count, delay)
+    runner = await stub.start()
+    client = EmbyClient(base_url=stub.url, api_key="bench")
+    client.start()
+    library = EmbyLibrary(client=client)
+
+    async def old_gacha():
+        data = await client.get_json("/Users/x/Items", {"SortBy": "Random", "Recursive": True,
+                                                        "IncludeItemTypes": "Movie", "Limit": 50})
+        return random.choice(data["Items"])
+
+    async def old_recommend():
+        data = await client.get_json("/Items", {"IncludeItemTypes": "Movie,Episode", "Recursive": True, "Limit": 1})
+        offset = random.randint(0, data["TotalRecordCount"] - 1)
+        return await client.get_json("/Items", {"IncludeItemTypes": "Movie,Episode", "Recursive": True,
+                                                "StartIndex": offset, "Limit": 1})
+
+    print(f"📊 {count} 个条目，桩服务器延迟 {delay * 1000:.0f}ms，每项 {ROUNDS} 次\n")
+    start = time.perf_counter()
+    await library.sync()
+    print(f"全量同步: {time.perf_counter() - start:.2f}s（{stub.requests} 个请求）")
+    stub.requests = 0
+    start = time.perf_counter()
+    await library.sync()
+    print(f"增量同步: {(time.perf_counter() - start) * 1000:.1f}ms（{stub.requests} 个请求）\n")
+
+    print(f"{'场景':<20} {'p50':>9} {'p95':>9}")
+    for name, fn in (
+        ("抽卡 实时 Emby", old_gacha),
+        ("抽卡 本地索引", lambda: library.random_items(["Movie"])),
+        ("推荐 实时 Emby", old_recommend),
+        ("推荐 本地索引", lambda: library.random_items(["Movie", "Episode"])),
+        ("高分抽样 本地索引", lambda: library.random_items(["Movie"], min_rating=8.5)),
+    ):
+        p50, p95 = await timed(fn)
+        print(f"{name:<20} {p50:>7.2f}ms {p95:>7.2f}ms")
+
+    await runner.cleanup()
+    print("\n🔌 Emby 停机后:")
+    try:
+        await old_gacha()
+        print("  实时 Emby: 成功")
+    except EmbyError as e:
+        print(f"  实时 Emby: 失败 ({e})")
+    items = await library.random_items(["Movie"])
+    print(f"  本地索引: {'成功 ' + items[0]['Name'] if items else '失败'}")
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
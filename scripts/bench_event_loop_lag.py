@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟基准测试
+对比同步 get_session() 与异步 get_async_session() 在并发负载下对事件循环的阻塞
+
+运行方式：
+    python scripts/bench_event_loop_lag.py [并发消息数]
+
+原理：
+- 一个探针协程每 5ms 醒来一次，记录实际醒来时间与预期时间的差值（即事件循环延迟）
+- 同时并发处理 N 条"群消息"，每条消息都做一次活跃度式的读-改-写
+- 同步路径下 DB IO 在事件循环线程中执行，探针延迟会随负载飙升
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 使用临时数据库，避免污染正式数据
+_tmpdir = tempfile.mkdtemp(prefix="royalbot_bench_")
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmpdir, "bench.db")
+os.environ["DB_URL"] = f"sqlite:///{os.environ['DB_PATH']}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from database import (
+    get_session, UserBinding,
+    get_async_session, get_user_async, async_engine
+)
+
+USER_COUNT = 200
+PROBE_INTERVAL = 0.005
+
+
+def seed_users():
+    with get_session() as session:
+        session.add_all(UserBinding(tg_id=i, emby_account=f"user{i}") for i in range(USER_COUNT))
+
+
+async def handle_sync(tg_id: int):
+    """旧写法：async 回调中直接使用同步会话"""
+    with get_session() as session:
+        u = session.query(UserBinding).filter_by(tg_id=tg_id).first()
+        u.daily_presence_points = (u.daily_presence_points or 0) + 1
+        u.last_active_time = datetime.now()
+        session.commit()
+    await asyncio.sleep(0)
+
+
+async def handle_async(tg_id: int):
+    """新写法：异步会话，IO 期间让出事件循环"""
+    async with get_async_session() as session:
+        u = await get_user_async(tg_id, session)
+        u.daily_presence_points = (u.daily_presence_points or 0) + 1
+        u.last_active_time = datetime.now()
+        await session.commit()
+
+
+async def run(handler, messages: int) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(max(0.0, loop.time() - expected) * 1000)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    # 限制同时在处理的消息数，模拟 Application 的并发处理
+    sem = asyncio.Semaphore(32)
+
+    async def one(i):
+        async with sem:
+            await handler(i % USER_COUNT)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    elapsed = time.perf_counter() - start
+
+    done.set()
+    await probe_task
+
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": messages / elapsed,
+        "p50": statistics.median(lags) if lags else 0.0,
+        "p99": lags[int(len(lags) * 0.99) - 1] if lags else 0.0,
+        "max": lags[-1] if lags else 0.0,
+        "samples": len(lags),
+    }
+
+
+def report(name: str, r: dict):
+    print(
+        f"{name:<8} 耗时 {r['elapsed']:.2f}s | {r['throughput']:.0f} msg/s | "
+        f"循环延迟 p50 {r['p50']:.1f}ms  p99 {r['p99']:.1f}ms  max {r['max']:.1f}ms "
+        f"(探针样本 {r['samples']})"
+    )
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seed_users()
+    print(f"📊 数据库: {os.environ['DB_PATH']}  并发消息: {messages}")
+
+    report("sync", await run(handle_sync, messages))
+    report("async", await run(handle_async, messages))
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+排行榜基准测试
+对比旧版（加载全部有战力用户 → 线性查找自己的名次）与内存排行榜的 rank_of / top / around 耗时，
+以及预热扫描与增量更新的开销
+
+运行方式：
+    python scripts/bench_leaderboard.py [用户数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, UserBinding
+from database.leaderboard import LeaderboardService
+
+OLD_ROUNDS = 3
+QUERY_ROUNDS = 20000
+
+
+def seed(engine, user_count: int):
+    rng = random.Random(42)
+    now = datetime.now()
+    rows = [
+        {
+            "tg_id": i,
+            "emby_account": f"user{i}",
+            "attack": rng.randint(0, 20000),
+            "bank_points": rng.randint(0, 100000),
+            "total_watch_minutes": rng.randint(0, 50000),
+            "daily_presence_points": rng.randint(0, 500),
+            "consecutive_checkin": rng.randint(0, 365),
+            "tower_max_floor": rng.randint(0, 100),
+            "last_active_time": now,
+        }
+        for i in range(user_count)
+    ]
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 5000):
+            conn.execute(insert(UserBinding), rows[i:i + 5000])
+
+
+def timed(fn, rounds: int) -> float:
+    """每次调用的平均耗时（µs）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    path = os.path.join(tempfile.mkdtemp(prefix="royalbot_bench_"), "bench.db")
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    seed(engine, user_count)
+    rng = random.Random(7)
+
+    def old_rank():
+        # 旧版 hall_leaderboard：加载全部有战力用户，再线性查找自己的名次
+        tg_id = rng.randrange(user_count)
+        with Session() as s:
+            users = s.query(UserBinding).filter(
+                UserBinding.emby_account != None,
+                UserBinding.attack > 0
+            ).order_by(UserBinding.attack.desc()).all()
+            for i, u in enumerate(users):
+                if u.tg_id == tg_id:
+                    return i + 1
+
+    service = LeaderboardService()
+    start = time.perf_counter()
+    with Session() as s:
+        service.warm(s)
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    board = service.boards["attack"]
+
+    def update():
+        board.update(rng.randrange(user_count), rng.randint(1, 20000))
+
+    print(f"📊 {user_count} 个已绑定用户，{len(service.boards)} 个排行榜\n")
+    print(f"{'操作':<28} {'耗时/次':>14}")
+    print(f"{'旧版 加载全表 + 线性查名次':<28} {timed(old_rank, OLD_ROUNDS) / 1000:>12.1f}ms")
+    print(f"{'预热（一次扫描，全部榜）':<28} {warm_ms:>12.1f}ms")
+    print(f"{'rank_of':<28} {timed(lambda: board.rank_of(rng.randrange(user_count)), QUERY_ROUNDS):>12.2f}µs")
+    print(f"{'top(10)':<28} {timed(lambda: board.top(10), QUERY_ROUNDS):>12.2f}µs")
+    print(f"{'around(±5)':<28} {timed(lambda: board.around(rng.randrange(user_count), 5), QUERY_ROUNDS):>12.2f}µs")
+    print(f"{'增量更新分数':<28} {timed(update, QUERY_ROUNDS):>12.2f}µs")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+已看数量统计基准测试
+本地起一个 Emby 桩服务器，模拟看过大量剧集的用户，对比：
+- 旧版：Filters=IsPlayed&Limit=10000 下载全部条目后本地计数
+- 新版：每种类型一个 Limit=0 请求只读 TotalRecordCount，以及命中缓存时
+
+运行方式：
+    python scripts/bench_played_counts.py [已看条目数]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from emby import EmbyClient, PlayedCountCache
+
+ROUNDS = 50
+
+
+class Stub:
+    def __init__(self, played: int):
+        # 与 Emby 默认返回字段相近的条目
+        self.items = [
+            {"Name": f"第 {i} 集", "ServerId": "s" * 32, "Id": str(100000 + i), "RunTimeTicks": 27000000000,
+             "IsFolder": False, "Type": "Movie" if i % 10 == 0 else "Episode", "SeriesName": "某剧",
+             "UserData": {"PlaybackPositionTicks": 0, "PlayCount": 1, "IsFavorite": False, "Played": True,
+                          "LastPlayedDate": "2024-05-01T12:00:00.0000000Z"},
+             "ImageTags": {"Primary": "a" * 32}, "BackdropImageTags": [], "MediaType": "Video"}
+            for i in range(played)
+        ]
+        self.bytes_sent = 0
+        self.url = ""
+
+    async def handle(self, request):
+        types = request.query.get("IncludeItemTypes")
+        items = [i for i in self.items if not types or i["Type"] in types.split(",")]
+        limit = int(request.query.get("Limit", 100))
+        response = web.json_response({"Items": items[:limit], "TotalRecordCount": len(items)})
+        self.bytes_sent += len(response.body)
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/Users/{id}/Items", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return runner
+
+
+async def main():
+    played = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    stub = Stub(played)
+    runner = await stub.start()
+    client = EmbyClient(base_url=stub.url, api_key="bench")
+    client.start()
+    cache = PlayedCountCache(client=client, ttl=3600)
+
+    async def old():
+        data = await client.get_json("/Users/u/Items", {"Filters": "IsPlayed", "Limit": 10000})
+        return sum(1 for i in data["Items"] if i["Type"] == "Movie"), sum(1 for i in data["Items"] if i["Type"] == "Episode")
+
+    async def uncached():
+        return await cache.fetch("u")
+
+    async def cached():
+        return await cache.get("u")
+
+    print(f"📊 已看 {played} 个条目，每项 {ROUNDS} 次\n")
+    print(f"{'方案':<20} {'p50':>9} {'每次下载':>10}")
+    for name, fn in (("旧版 Limit=10000", old), ("Limit=0 计数", uncached), ("命中缓存", cached)):
+        stub.bytes_sent = 0
+        latencies = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            await fn()
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<20} {statistics.median(latencies):>7.2f}ms {stub.bytes_sent / ROUNDS / 1024:>8.1f}KB")
+
+    await client.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
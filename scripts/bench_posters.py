@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+推送海报缓存基准测试
+本地起一个返回固定大小海报的 Emby 桩服务器，用只统计上传字节的假 bot 对比重复推送同一部片时：
+- 旧版：每次下载海报 → 写临时文件 → open() 读回上传 → 删除
+- 新版：首次下载并上传，之后复用 file_id
+
+运行方式：
+    python scripts/bench_posters.py [推送次数] [海报KB]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from aiohttp import web
+from database.models import Base
+from database.repository import engine
+from emby import EmbyClient, PosterCache
+
+
+class Bot:
+    def __init__(self):
+        self.uploaded = 0
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if isinstance(photo, str):
+            file_id = photo
+        else:
+            data = photo.read() if hasattr(photo, "read") else photo
+            self.uploaded += len(data)
+            file_id = "fid"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+
+async def main():
+    pushes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    poster = os.urandom((int(sys.argv[2]) if len(sys.argv) > 2 else 400) * 1024)
+    Base.metadata.create_all(engine)
+
+    downloaded = 0
+
+    async def image(request):
+        nonlocal downloaded
+        downloaded += len(poster)
+        return web.Response(body=poster, content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/Items/{id}/Images/Primary", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    client = EmbyClient(base_url=f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}", api_key="bench")
+    client.start()
+    cache = PosterCache(client=client, directory=os.path.join(_tmp, "posters"))
+
+    async def old(bot):
+        data = await client.get_bytes("/Items/item1/Images/Primary")
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with open(path, "rb") as f:
+            await bot.send_photo(chat_id=1, photo=f)
+        os.unlink(path)
+
+    async def new(bot):
+        await cache.send_photo(bot, 1, "item1", "tag")
+
+    print(f"📊 同一部片推送 {pushes} 次，海报 {len(poster) // 1024}KB\n")
+    print(f"{'方案':<16} {'总耗时':>9} {'下载':>10} {'上传':>10}")
+    for name, fn in (("旧版 临时文件", old), ("新版 file_id", new)):
+        bot = Bot()
+        downloaded = 0
+        start = time.perf_counter()
+        for _ in range(pushes):
+            await fn(bot)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:<16} {elapsed:>7.1f}ms {downloaded / 1024:>8.0f}KB {bot.uploaded / 1024:>8.0f}KB")
+
+    await client.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+出站发送队列基准测试
+用一个按 Telegram 规则限速的假 bot（全局 30 条/秒、单聊天 1 条/秒，超限抛 RetryAfter）对比 /say 广播：
+- 旧版：逐个用户串行 send_message，吞吐受单次往返耗时限制，远低于 Telegram 允许的速率
+- 直接并发：asyncio.gather 一把全发，不限速（快，但大量 RetryAfter，消息丢失）
+- 新版：全部提交到发送队列，令牌桶限速，RetryAfter 时暂停并重试
+
+同时测量广播进行中一条交互回复要等多久。为了缩短运行时间，速率整体放大 SCALE 倍。
+
+运行方式：
+    python scripts/bench_send_queue.py [用户数]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.error import RetryAfter
+from messaging import SendQueue, BROADCAST, INTERACTIVE
+
+SCALE = 10
+GLOBAL_RATE = 30 * SCALE
+CHAT_RATE = 1 * SCALE
+LATENCY = 0.02          # 单次 API 调用的往返耗时
+
+
+class Bot:
+    def __init__(self):
+        self.window = deque()
+        self.chat_windows = defaultdict(deque)
+        self.blocked_until = 0.0
+        self.delivered = 0
+        self.flood_errors = 0
+
+    @staticmethod
+    def _count(window, now):
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+        return len(window)
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(LATENCY)
+        now = time.monotonic()
+        if now < self.blocked_until or self._count(self.window, now) >= GLOBAL_RATE + 5 or \
+                self._count(self.chat_windows[chat_id], now) >= CHAT_RATE + 3:
+            self.flood_errors += 1
+            self.blocked_until = max(self.blocked_until, now + 1.0 / SCALE)
+            raise RetryAfter(1)
+        self.window.append(now)
+        self.chat_windows[chat_id].append(now)
+        self.delivered += 1
+
+
+async def old(bot, users):
+    success = fail = 0
+    for uid in users:
+        try:
+            await bot.send_message(uid, "公告")
+            success += 1
+        except Exception:
+            fail += 1
+    return success, fail
+
+
+async def unthrottled(bot, users):
+    results = await asyncio.gather(*(bot.send_message(uid, "公告") for uid in users), return_exceptions=True)
+    fail = sum(isinstance(r, BaseException) for r in results)
+    return len(results) - fail, fail
+
+
+async def new(bot, users, queue):
+    results = await asyncio.gather(*(
+        queue.submit(uid, lambda uid=uid: bot.send_message(uid, "公告"), lane=BROADCAST) for uid in users
+    ), return_exceptions=True)
+    fail = sum(isinstance(r, BaseException) for r in results)
+    return len(results) - fail, fail
+
+
+async def reply_latency(bot, queue):
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    if queue is None:
+        # 旧版：交互回复与广播抢同一个 Bot，直接发
+        try:
+            await bot.send_message(-1, "回复")
+        except RetryAfter:
+            return None
+    else:
+        await queue.submit(-1, lambda: bot.send_message(-1, "回复"), lane=INTERACTIVE)
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    users = list(range(1, (int(sys.argv[1]) if len(sys.argv) > 1 else 1500) + 1))
+    print(f"📊 向 {len(users)} 个用户广播（速率放大 {SCALE} 倍：全局 {GLOBAL_RATE} 条/秒，单聊天 {CHAT_RATE} 条/秒）\n")
+    print(f"{'方案':<10} {'耗时':>8} {'送达':>6} {'失败':>6} {'flood':>6} {'条/秒':>8} {'交互回复':>10}")
+
+    for name in ("旧版 串行", "直接并发", "新版 队列"):
+        bot = Bot()
+        queue = None
+        if name.startswith("新版"):
+            queue = SendQueue(rate=GLOBAL_RATE, concurrency=16, private_rate=CHAT_RATE, group_rate=CHAT_RATE)
+            queue.start()
+        start = time.perf_counter()
+        probe = asyncio.ensure_future(reply_latency(bot, queue))
+        if name.startswith("旧版"):
+            success, fail = await old(bot, users)
+        elif queue is None:
+            success, fail = await unthrottled(bot, users)
+        else:
+            success, fail = await new(bot, users, queue)
+        elapsed = time.perf_counter() - start
+        latency = await probe
+        if queue is not None:
+            await queue.stop(timeout=0)
+        latency_text = f"{latency:.0f}ms" if latency is not None else "被限流"
+        print(f"{name:<10} {elapsed:>7.2f}s {success:>6} {fail:>6} {bot.flood_errors:>6} "
+              f"{success / elapsed:>8.1f} {latency_text:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
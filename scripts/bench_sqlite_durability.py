@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+SQLite 持久化档位基准测试
+对比旧版提交路径（FULL + 每次提交后新建连接 TRUNCATE checkpoint）与各 DB_DURABILITY 档位的每秒提交数
+
+运行方式：
+    python scripts/bench_sqlite_durability.py [提交次数]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, UserBinding
+from database.repository import DURABILITY_PROFILES, apply_sqlite_pragmas
+from database.checkpoint import CheckpointManager
+
+USER_COUNT = 100
+
+
+def legacy_pragmas(dbapi_conn, connection_record):
+    """旧版 PRAGMA 组合"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=FULL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA wal_autocheckpoint=100")
+    cursor.close()
+
+
+def bench(mode: str, commits: int) -> float:
+    path = os.path.join(tempfile.mkdtemp(prefix="royalbot_bench_"), "bench.db")
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        poolclass=StaticPool,
+    )
+    if mode == "legacy":
+        event.listen(engine, "connect", legacy_pragmas)
+    else:
+        event.listen(engine, "connect", lambda conn, rec: apply_sqlite_pragmas(conn, mode))
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    with Session() as s:
+        s.add_all(UserBinding(tg_id=i, emby_account=f"user{i}") for i in range(USER_COUNT))
+        s.commit()
+
+    start = time.perf_counter()
+    for i in range(commits):
+        with Session() as s:
+            u = s.query(UserBinding).filter_by(tg_id=i % USER_COUNT).first()
+            u.daily_presence_points = (u.daily_presence_points or 0) + 1
+            u.last_active_time = datetime.now()
+            s.commit()
+        if mode == "legacy":
+            # 旧版 get_session() 在每次提交后执行的 checkpoint
+            conn = sqlite3.connect(path, timeout=30)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.close()
+    elapsed = time.perf_counter() - start
+
+    # 新版：checkpoint 在后台执行，这里补一次关闭时的 TRUNCATE 以保证对比完整
+    if mode != "legacy":
+        manager = CheckpointManager(db_path=path)
+        manager.checkpoint("TRUNCATE")
+    engine.dispose()
+    return commits / elapsed
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"📊 每种模式执行 {commits} 次单行更新提交\n")
+    for mode in ["legacy", *DURABILITY_PROFILES]:
+        rate = bench(mode, commits)
+        label = "旧版(FULL+TRUNCATE)" if mode == "legacy" else f"DB_DURABILITY={mode}"
+        print(f"{label:<26} {rate:>8.0f} commits/s")
+
+
+if __name__ == "__main__":
+    main()
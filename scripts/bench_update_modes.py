@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+更新接收 / 处理模式基准测试
+按固定到达速率回放合成更新（多数是 5ms 的普通命令，少数是 /watch_stats 式的 Emby 请求和 gift_mp 式的
+逐个 get_chat_member 慢处理器），走真实的 Application + Updater，Bot API 用本地假实现代替，对比：
+- 旧版：长轮询 + 逐条处理（main.py 原来的 run_polling 默认配置）
+- 长轮询 + 有序并发（OrderedUpdateProcessor）
+- Webhook + 有序并发（本地 tornado 端点，回放端像 Telegram 一样 POST 更新）
+统计从更新发出到处理完成的 p50 / p99 延迟（普通更新单独统计），以及同一用户更新的乱序次数。
+
+运行方式：
+    python scripts/bench_update_modes.py [更新数] [每秒到达数]
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+from telegram.request import BaseRequest
+from messaging import OrderedUpdateProcessor
+
+TOKEN = "123456:BENCH"
+SECRET = "bench-secret"
+POLL_RTT = 0.03          # 假 getUpdates 的往返耗时
+CONCURRENCY = 16
+USERS = 200
+GROUP_ID = -100
+WORK = {                 # 命令: (占比, 处理耗时)
+    "fast": (0.92, 0.005),
+    "emby": (0.07, 0.3),
+    "gift": (0.01, 2.0),
+}
+
+
+class FakeBotApi(BaseRequest):
+    """假 Bot API：getMe / setWebhook 等直接成功，getUpdates 长轮询回放端放进来的更新"""
+
+    def __init__(self):
+        self.pending = []
+        self.arrived = asyncio.Event()
+
+    def put(self, update: dict):
+        self.pending.append(update)
+        self.arrived.set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif endpoint == "getUpdates":
+            timeout = float((request_data.parameters if request_data else {}).get("timeout") or 0)
+            if not self.pending and timeout:
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            await asyncio.sleep(POLL_RTT)
+            result, self.pending = self.pending, []
+            self.arrived.clear()
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def make_workload(n: int, rate: float, seed: int = 42):
+    rng = random.Random(seed)
+    kinds, weights = zip(*((k, w) for k, (w, _) in WORK.items()))
+    workload = []
+    for i in range(n):
+        user = 1000 + rng.randrange(USERS)
+        chat = GROUP_ID if rng.random() < 0.7 else user
+        kind = rng.choices(kinds, weights)[0]
+        workload.append((i / rate, {
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1, "date": int(time.time()), "text": kind,
+                "chat": {"id": chat, "type": "supergroup" if chat < 0 else "private"},
+                "from": {"id": user, "is_bot": False, "first_name": f"u{user}"},
+            },
+        }))
+    return workload
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_mode(transport: str, processor, workload) -> dict:
+    api = FakeBotApi()
+    builder = ApplicationBuilder().token(TOKEN).request(api).get_updates_request(api)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    app = builder.build()
+
+    sent_at = {}
+    latencies = {kind: [] for kind in WORK}
+    last_seen = {}
+    disorder = 0
+
+    async def handle(update: Update, context):
+        nonlocal disorder
+        kind = update.message.text
+        await asyncio.sleep(WORK[kind][1])
+        user = update.effective_user.id
+        if last_seen.get(user, 0) > update.update_id:
+            disorder += 1
+        last_seen[user] = update.update_id
+        latencies[kind].append(time.perf_counter() - sent_at[update.update_id])
+
+    app.add_handler(TypeHandler(Update, handle))
+
+    async with app:
+        await app.start()
+        session = None
+        if transport == "polling":
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+            deliver = api.put
+        else:
+            port = free_port()
+            await app.updater.start_webhook(listen="127.0.0.1", port=port, url_path="telegram",
+                                            webhook_url="https://bot.example/telegram", secret_token=SECRET)
+            # Telegram 默认最多 40 个并发 Webhook 连接
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=40))
+            url = f"http://127.0.0.1:{port}/telegram"
+            posts = []
+
+            def deliver(update):
+                posts.append(asyncio.create_task(session.post(
+                    url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})))
+
+        start = time.perf_counter()
+        for offset, update in workload:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent_at[update["update_id"]] = time.perf_counter()
+            deliver(update)
+
+        while sum(len(v) for v in latencies.values()) < len(workload):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        if session is not None:
+            for response in await asyncio.gather(*posts):
+                response.release()
+            await session.close()
+        await app.updater.stop()
+        await app.stop()
+
+    return {"latencies": latencies, "disorder": disorder, "elapsed": elapsed}
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def report(name, result):
+    everything = [x for v in result["latencies"].values() for x in v]
+    fast = result["latencies"]["fast"]
+    print(f"{name:<18} {pct(everything, 0.5):>8.0f}ms {pct(everything, 0.99):>8.0f}ms "
+          f"{pct(fast, 0.5):>8.0f}ms {pct(fast, 0.99):>8.0f}ms {result['disorder']:>6} {result['elapsed']:>8.1f}s")
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    workload = make_workload(n, rate)
+    mix = Counter(update["message"]["text"] for _, update in workload)
+    print(f"📊 回放 {n} 条更新（{rate:g} 条/秒，{USERS} 个用户）："
+          + "，".join(f"{k} {mix[k]} 条 × {WORK[k][1] * 1000:.0f}ms" for k in WORK)
+          + f"；并发 {CONCURRENCY}\n")
+    print(f"{'模式':<18} {'全部p50':>8} {'全部p99':>8} {'普通p50':>8} {'普通p99':>8} {'乱序':>4} {'处理完耗时':>6}")
+
+    report("旧版 轮询+逐条", await run_mode("polling", None, workload))
+    report("轮询+有序并发", await run_mode("polling", OrderedUpdateProcessor(CONCURRENCY), workload))
+    report("Webhook+有序并发", await run_mode("webhook", OrderedUpdateProcessor(CONCURRENCY), workload))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+用户查询列分组基准测试
+对比加载整行 bindings（旧版，包括大文本列）与按列分组加载时，每次查询读取的数据量与耗时
+
+运行方式：
+    python scripts/bench_user_lookup.py [查询次数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker, undefer_group
+from sqlalchemy.pool import StaticPool
+from database.models import Base, UserBinding, user_lookup_statement
+
+USER_COUNT = 2000
+
+CASES = [
+    ("整行（旧版）", None),
+    ("默认（collections 延迟）", ()),
+    ("identity", ("identity",)),
+    ("identity + wallet", ("identity", "wallet")),
+]
+
+
+def value_size(value) -> int:
+    """估算一个已加载字段的字节数"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, datetime):
+        return 26
+    return 8
+
+
+def seed(Session):
+    rng = random.Random(42)
+    with Session() as s:
+        for i in range(USER_COUNT):
+            s.add(UserBinding(
+                tg_id=i,
+                emby_account=f"user{i}",
+                points=rng.randint(0, 10000),
+                items=",".join(f"道具{rng.randint(1, 500)}" for _ in range(rng.randint(20, 300))),
+                achievements=",".join(f"ach_{n}" for n in range(rng.randint(0, 60))),
+                weapon_collection=",".join(f"传说的武器{rng.randint(1, 50)}" for _ in range(rng.randint(0, 80))),
+                claimed_early_bird_items=",".join(f"{rng.getrandbits(64):032x}" for _ in range(rng.randint(0, 200))),
+                registered_date=datetime.now(),
+            ))
+        s.commit()
+
+
+def bench(Session, groups, lookups: int):
+    rng = random.Random(7)
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(lookups):
+        # 每次新会话，避免命中 identity map
+        with Session() as s:
+            tg_id = rng.randrange(USER_COUNT)
+            if groups is None:
+                # 旧版：session.query(UserBinding).filter_by(...).first() 并读取全部列
+                u = s.query(UserBinding).options(undefer_group("collections")).filter_by(tg_id=tg_id).first()
+            else:
+                u = s.execute(user_lookup_statement(groups), {"tg_id": tg_id}).scalars().first()
+            _ = (u.emby_account, u.is_vip)
+            total_bytes += sum(value_size(v) for k, v in inspect(u).dict.items() if not k.startswith("_"))
+    elapsed = time.perf_counter() - start
+    return total_bytes / lookups, elapsed / lookups * 1e6
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    path = os.path.join(tempfile.mkdtemp(prefix="royalbot_bench_"), "bench.db")
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    seed(Session)
+
+    print(f"📊 {USER_COUNT} 个用户，每种方式随机查询 {lookups} 次（读取 emby_account + is_vip）\n")
+    print(f"{'加载方式':<24} {'字节/次':>10} {'耗时/次':>12}")
+    for label, groups in CASES:
+        size, latency = bench(Session, groups, lookups)
+        print(f"{label:<24} {size:>10.0f} {latency:>10.1f}µs")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
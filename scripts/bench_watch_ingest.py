@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+观影奖励采集基准测试
+本地起一个 Emby 桩服务器（固定响应延迟，每人当天若干条播放记录），对比：
+- 旧版：逐个用户串行请求当天全部播放记录，整个过程持有一个数据库会话
+- 新版：有界并发拉取水位之后的新播放，最后一个事务批量结算（首轮 + 无新播放的增量轮）
+
+运行方式：
+    python scripts/bench_watch_ingest.py [绑定用户数] [并发数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+from sqlalchemy import insert
+from database import get_session, UserBinding
+from database.models import Base
+from database.repository import engine
+from database.ledger import credit
+from emby import EmbyClient, EmbyUserDirectory, parse_emby_date
+from plugins import emby_watch
+
+SERVER_DELAY = 0.02
+PLAYS_PER_USER = 6
+
+
+class Stub:
+    def __init__(self, user_count: int):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.user_count = user_count
+        self.plays = [now - timedelta(minutes=10 * (i + 1)) for i in range(PLAYS_PER_USER)]
+        self.requests = 0
+        self.url = ""
+
+    async def users(self, request):
+        return web.json_response([{"Name": f"user{i}", "Id": f"id{i}"} for i in range(self.user_count)])
+
+    async def items(self, request):
+        self.requests += 1
+        await asyncio.sleep(SERVER_DELAY)
+        since = parse_emby_date(request.query.get("MinDatePlayed"))
+        items = [
+            {"RunTimeTicks": 25 * 60 * 10000000,
+             "UserData": {"LastPlayedDate": played.strftime("%Y-%m-%dT%H:%M:%S.%f0Z")}}
+            for played in self.plays if since is None or played >= since
+        ]
+        return web.json_response({"Items": items, "TotalRecordCount": len(items)})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/Users", self.users)
+        app.router.add_get("/Users/{id}/Items", self.items)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return runner
+
+
+def seed(user_count: int):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rows = [{"tg_id": i, "emby_account": f"user{i}", "points": 0,
+             "daily_watch_minutes": 0, "total_watch_minutes": 0} for i in range(user_count)]
+    with engine.begin() as conn:
+        conn.execute(insert(UserBinding), rows)
+
+
+async def old_job():
+    """旧版 process_watch_rewards_job 的做法（串行 + 会话跨越全部网络请求）"""
+    with get_session() as session:
+        users = session.query(UserBinding).filter(UserBinding.emby_account != None).all()
+        for user in users:
+            emby_user_id = await emby_watch.emby_directory.resolve_id(user.emby_account)
+            today_minutes = await emby_watch.get_user_watch_time(emby_user_id)
+            daily_watch = user.daily_watch_minutes or 0
+            claimable = min(today_minutes - daily_watch, emby_watch.DAILY_MAX_MINUTES - daily_watch)
+            if claimable >= emby_watch.MINUTES_PER_MP:
+                user.daily_watch_minutes = daily_watch + claimable
+                user.total_watch_minutes = (user.total_watch_minutes or 0) + claimable
+                credit(user.tg_id, claimable // emby_watch.MINUTES_PER_MP, "观影奖励", session=session)
+        session.commit()
+
+
+async def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    stub = Stub(user_count)
+    runner = await stub.start()
+    client = EmbyClient(base_url=stub.url, api_key="bench", pool_size=concurrency + 2)
+    client.start()
+    emby_watch.emby_client = client
+    emby_watch.emby_directory = EmbyUserDirectory(client=client)
+    emby_watch.Config.EMBY_WATCH_CONCURRENCY = concurrency
+    await emby_watch.emby_directory.refresh()
+
+    print(f"📊 {user_count} 个绑定用户，每人 {PLAYS_PER_USER} 条播放，"
+          f"桩服务器延迟 {SERVER_DELAY * 1000:.0f}ms，并发 {concurrency}\n")
+    print(f"{'方案':<22} {'总耗时':>8} {'吞吐(人/秒)':>12} {'上游请求':>8}")
+
+    seed(user_count)
+    stub.requests = 0
+    start = time.perf_counter()
+    await old_job()
+    elapsed = time.perf_counter() - start
+    print(f"{'旧版 串行':<22} {elapsed:>7.2f}s {user_count / elapsed:>12.0f} {stub.requests:>8}")
+
+    seed(user_count)
+    for name in ("新版 首轮", "新版 增量（无新播放）"):
+        stub.requests = 0
+        stats = await emby_watch.process_watch_rewards_job()
+        print(f"{name:<22} {stats['duration']:>7.2f}s {stats['users_per_second']:>12.0f} {stub.requests:>8}")
+
+    await client.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from telegram import Bot
 from database import get_session, UserBinding
+from database.ledger import credit_many
 from config import Config
 
 
@@ -31,13 +32,13 @@ async def send_compensation():
 
         for user in users:
             try:
-                # 发放补偿
-                user.points = (user.points or 0) + COMPENSATION_MP
+                # 发放补偿（MP 在循环后一次批量入账）
                 user.extra_gacha = (user.extra_gacha or 0) + COMPENSATION_GACHA
                 compensated += 1
             except Exception as e:
                 print(f"补偿用户 {user.tg_id} 失败: {e}")
 
+        credit_many({user.tg_id: COMPENSATION_MP for user in users}, "全服补偿", session=session)
         session.commit()
 
     # 发送群组通知
@@ -14,8 +14,11 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 
 import pytest
+import pytest_asyncio
 from database.models import Base
 from database.repository import engine, SessionLocal
+from database.user_cache import user_cache
+from database.leaderboard import leaderboards
 from telegram import Update, User, Chat, Message
 from datetime import datetime
 
@@ -25,6 +28,9 @@ def db_session():
     """创建测试用的数据库会话"""
     # 创建所有表
     Base.metadata.create_all(bind=engine)
+    # 每个测试都是新库，清空进程内用户快照缓存与排行榜
+    user_cache.invalidate()
+    leaderboards.reset()
 
     session = SessionLocal()
     try:
@@ -74,3 +80,21 @@ def mock_update(mock_message):
         update_id=1,
         message=mock_message
     )
+
+
+@pytest_asyncio.fixture
+async def async_db():
+    """创建测试用的异步数据库（内存库，与同步引擎相互独立）"""
+    from database.async_repository import async_engine
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    user_cache.invalidate()
+    leaderboards.reset()
+    try:
+        yield async_engine
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        # 连接绑定在当前事件循环上，测试结束后释放
+        await async_engine.dispose()
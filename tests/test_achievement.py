@@ -3,8 +3,11 @@
 """
 import pytest
 from database.models import UserBinding
+from database.async_repository import get_async_session, get_user_async
+from database.user_sets import add_to_user_set, user_set_contains, user_set_contains_async
 from plugins.achievement import (
     check_and_award_achievement,
+    check_and_award_achievement_async,
     check_all_achievements,
     get_achievement_progress,
     get_user_titles,
@@ -36,17 +39,17 @@ class TestAchievementSystem:
 
         assert result["new"] is True
         assert result["reward"] == 20
-        assert "duel_1" in user.achievements
+        assert user_set_contains(123456, "achievement", "duel_1", db_session)
 
     def test_check_already_completed_achievement(self, db_session):
         """测试已完成的成就不会重复颁发"""
         user = UserBinding(
             tg_id=123456,
             emby_account="test",
-            achievements="duel_1",  # 已完成
             win=1
         )
         db_session.add(user)
+        add_to_user_set(123456, "achievement", ["duel_1"], db_session)  # 已完成
         db_session.commit()
 
         result = check_and_award_achievement(user, "duel_1", db_session)
@@ -93,14 +96,14 @@ class TestAchievementSystem:
         user = UserBinding(
             tg_id=123456,
             emby_account="test",
-            achievements="duel_1,power_100",
             win=5,
             attack=100
         )
         db_session.add(user)
+        add_to_user_set(123456, "achievement", ["duel_1", "power_100"], db_session)
         db_session.commit()
 
-        progress = get_achievement_progress(user)
+        progress = get_achievement_progress(user, db_session)
 
         assert progress["total"] > 0
         assert progress["done"] == 2  # duel_1 和 power_100
@@ -112,13 +115,13 @@ class TestAchievementSystem:
         user = UserBinding(
             tg_id=123456,
             emby_account="test",
-            # 带称号的成就ID
-            achievements="duel_100,power_1000,checkin_30"
         )
         db_session.add(user)
+        # 带称号的成就ID
+        add_to_user_set(123456, "achievement", ["duel_100", "power_1000", "checkin_30"], db_session)
         db_session.commit()
 
-        titles = get_user_titles(user)
+        titles = get_user_titles(user, db_session)
 
         assert len(titles) > 0
         assert "决斗冠军" in titles
@@ -162,3 +165,39 @@ class TestAchievementSystem:
 
         assert result["new"] is True
         assert result["title"] == "热血战士"
+
+
+@pytest.mark.asyncio
+class TestAchievementAsync:
+    """异步签到使用的成就颁发：记录与奖励在调用方的 AsyncSession 中一起提交"""
+
+    async def _user(self):
+        async with get_async_session() as session:
+            session.add(UserBinding(tg_id=42, emby_account="test", points=10, total_checkin_days=1))
+            await session.commit()
+
+    async def test_award_commits_with_caller(self, async_db):
+        await self._user()
+        async with get_async_session() as session:
+            user = await get_user_async(42, session)
+            result = await check_and_award_achievement_async(user, "first_checkin", session)
+            assert result["new"] is True
+            assert user.points == 10 + result["reward"]
+            again = await check_and_award_achievement_async(user, "first_checkin", session)
+            assert again["new"] is False
+            await session.commit()
+
+        async with get_async_session() as session:
+            assert (await get_user_async(42, session)).points == 10 + result["reward"]
+            assert await user_set_contains_async(42, "achievement", "first_checkin", session)
+
+    async def test_rollback_drops_record_and_reward(self, async_db):
+        await self._user()
+        async with get_async_session() as session:
+            user = await get_user_async(42, session)
+            assert (await check_and_award_achievement_async(user, "first_checkin", session))["new"]
+            await session.rollback()
+
+        async with get_async_session() as session:
+            assert (await get_user_async(42, session)).points == 10
+            assert not await user_set_contains_async(42, "achievement", "first_checkin", session)
@@ -0,0 +1,103 @@
+"""
+异步数据库仓库层测试
+"""
+import pytest
+from sqlalchemy import inspect
+from database.models import UserBinding
+from database.async_repository import (
+    to_async_url, get_async_session,
+    get_user_async, create_user_async, get_or_create_user_async, update_user_async,
+    get_top_users_by_attack_async, get_top_users_by_bank_async,
+    get_user_count_async, get_vip_count_async
+)
+
+
+class TestAsyncUrl:
+    """异步驱动 URL 转换测试"""
+
+    def test_sqlite_url(self):
+        assert to_async_url("sqlite:///data/magic.db") == "sqlite+aiosqlite:///data/magic.db"
+
+    def test_postgres_url(self):
+        assert to_async_url("postgresql://u:p@h:5432/db") == "postgresql+asyncpg://u:p@h:5432/db"
+        assert to_async_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+    def test_already_async(self):
+        assert to_async_url("sqlite+aiosqlite:///:memory:") == "sqlite+aiosqlite:///:memory:"
+
+
+class TestAsyncUserRepository:
+    """异步用户数据仓库测试"""
+
+    @pytest.mark.asyncio
+    async def test_create_and_get_user(self, async_db):
+        await create_user_async(123456, "test_account")
+
+        user = await get_user_async(123456)
+        assert user is not None
+        assert user.emby_account == "test_account"
+        assert user.points == 0
+
+    @pytest.mark.asyncio
+    async def test_get_or_create_user(self, async_db):
+        async with get_async_session() as session:
+            user = await get_or_create_user_async(123456, "new_account", session=session)
+            assert user.tg_id == 123456
+
+        async with get_async_session() as session:
+            found = await get_or_create_user_async(123456, "other", session=session)
+            assert found.emby_account == "new_account"
+
+    @pytest.mark.asyncio
+    async def test_update_user(self, async_db):
+        await create_user_async(123456, "test")
+
+        assert await update_user_async(123456, points=100, attack=50) is True
+        assert await update_user_async(999, points=1) is False
+
+        user = await get_user_async(123456)
+        assert user.points == 100
+        assert user.attack == 50
+
+    @pytest.mark.asyncio
+    async def test_get_user_with_groups(self, async_db):
+        await create_user_async(123456, "test")
+        await update_user_async(123456, points=7, attack=3)
+
+        user = await get_user_async(123456, groups=("identity", "wallet"))
+        assert (user.emby_account, user.points) == ("test", 7)
+        assert "attack" in inspect(user).unloaded
+
+    @pytest.mark.asyncio
+    async def test_leaderboards(self, async_db):
+        async with get_async_session() as session:
+            session.add_all([
+                UserBinding(tg_id=1, emby_account="a", attack=100, bank_points=5),
+                UserBinding(tg_id=2, emby_account="b", attack=500, bank_points=1),
+                UserBinding(tg_id=3, emby_account="c", attack=300, bank_points=9),
+                UserBinding(tg_id=4, emby_account="d", attack=0, is_vip=True),
+            ])
+
+        top = await get_top_users_by_attack_async()
+        assert [u.emby_account for u in top] == ["b", "c", "a"]
+
+        rich = await get_top_users_by_bank_async(limit=1)
+        assert rich[0].emby_account == "c"
+
+        assert await get_user_count_async() == 4
+        assert await get_vip_count_async() == 1
+
+    @pytest.mark.asyncio
+    async def test_session_rollback_on_error(self, async_db):
+        """会话内抛出异常时应回滚"""
+        await create_user_async(1, "a")
+
+        with pytest.raises(RuntimeError):
+            async with get_async_session() as session:
+                user = await get_user_async(1, session)
+                user.points = 999
+                await session.flush()
+                raise RuntimeError("boom")
+
+        user = await get_user_async(1)
+        assert user.points == 0
@@ -0,0 +1,116 @@
+"""
+群消息自毁调度器测试（假 Bot + 内存库）
+"""
+import asyncio
+import time
+import pytest
+from datetime import datetime, timedelta
+from telegram.error import BadRequest, RetryAfter
+from database import PendingDeletion, get_session
+from messaging import DeletionScheduler
+from messaging.deletions import MAX_BATCH
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self.fail = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        if self.fail:
+            raise self.fail.pop(0)
+        self.calls.append((chat_id, list(message_ids)))
+        return True
+
+
+def stored():
+    with get_session() as session:
+        return sorted(session.query(PendingDeletion.chat_id, PendingDeletion.message_id).all())
+
+
+@pytest.fixture
+def scheduler(db_session):
+    s = DeletionScheduler()
+    s._bot = FakeBot()
+    return s
+
+
+@pytest.mark.asyncio
+class TestDeletionScheduler:
+
+    async def test_due_messages_are_batched_per_chat(self, scheduler):
+        for message_id in range(250):
+            scheduler.schedule(-100, message_id, 0)
+        for message_id in range(3):
+            scheduler.schedule(-200, message_id, 0)
+        scheduler.schedule(-200, 99, 60)
+
+        assert await scheduler.run_due() == 253
+        calls = scheduler._bot.calls
+        assert sorted(len(ids) for chat, ids in calls) == [3, 50, MAX_BATCH, MAX_BATCH]
+        assert sorted(m for chat, ids in calls if chat == -100 for m in ids) == list(range(250))
+        assert scheduler.pending == 1 and scheduler.stats["calls"] == 4
+
+    async def test_earliest_schedule_wins(self, scheduler):
+        scheduler.schedule(-1, 1, 60)
+        scheduler.schedule(-1, 1, 0)
+        scheduler.schedule(-1, 1, 120)
+        assert await scheduler.run_due() == 1
+        assert scheduler.pending == 0
+        assert await scheduler.run_due(now=time.time() + 200) == 0
+        assert scheduler._bot.calls == [(-1, [1])]
+
+    async def test_pending_deletions_survive_restart(self, scheduler):
+        scheduler.schedule(-1, 1, 0)
+        scheduler.schedule(-1, 2, 60)
+        scheduler.schedule(-2, 3, 60)
+        await scheduler.run_due()
+        # 已删除的不落库
+        assert scheduler.flush() == 2
+        assert stored() == [(-2, 3), (-1, 2)]
+
+        restarted = DeletionScheduler()
+        restarted._bot = FakeBot()
+        assert restarted.load() == 2 and restarted.pending == 2
+        assert await restarted.run_due() == 0
+        assert await restarted.run_due(now=time.time() + 61) == 2
+        assert sorted(restarted._bot.calls) == [(-2, [3]), (-1, [2])]
+        assert stored() == []
+
+    async def test_stale_records_are_dropped(self, scheduler):
+        with get_session() as session:
+            session.add(PendingDeletion(chat_id=-1, message_id=1, due_at=datetime.now() - timedelta(hours=49)))
+            session.add(PendingDeletion(chat_id=-1, message_id=2, due_at=datetime.now() - timedelta(minutes=5)))
+            session.commit()
+        assert scheduler.load() == 1
+        await scheduler.run_due()
+        assert scheduler._bot.calls == [(-1, [2])] and stored() == []
+
+    async def test_retry_after_and_errors(self, scheduler):
+        scheduler._bot.fail = [RetryAfter(1)]
+        scheduler.schedule(-1, 1, 0)
+        await scheduler.run_due()
+        assert scheduler.pending == 1 and scheduler._bot.calls == []
+        assert await scheduler.run_due(now=time.time() + 1.5) == 1
+        assert scheduler._bot.calls == [(-1, [1])]
+
+        scheduler._bot.fail = [BadRequest("Message can't be deleted")]
+        scheduler.schedule(-1, 2, 0)
+        await scheduler.run_due()
+        assert scheduler.pending == 0 and scheduler.stats["failed"] == 1
+
+    async def test_background_task(self, db_session, monkeypatch):
+        monkeypatch.setattr("messaging.deletions.BATCH_WINDOW", 0.1)
+        scheduler = DeletionScheduler()
+        bot = FakeBot()
+        scheduler.start(bot)
+        try:
+            scheduler.schedule(-1, 1, 0.05)
+            scheduler.schedule(-1, 2, 0.1)
+            scheduler.schedule(-1, 3, 3600)
+            await asyncio.sleep(0.4)
+            assert bot.calls == [(-1, [1, 2])]
+            assert len(asyncio.all_tasks()) <= 2      # 测试本身 + 调度器
+        finally:
+            await scheduler.stop()
+        assert stored() == [(-1, 3)]
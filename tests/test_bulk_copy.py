@@ -0,0 +1,120 @@
+"""
+整库搬迁测试（SQLite -> SQLite，覆盖分块、续传与校验；COPY 只测字段编码）
+大库吞吐见 scripts/bench_migrate_to_postgres.py
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert, select, func, update
+from database import bulk_copy
+from database.migrate import upgrade
+from database.models import UserBinding, UserAchievement, VIPApplication
+from database.bulk_copy import copy_database, verify_tables, TransferError
+
+USERS = 1200
+CHUNK = 100
+
+
+@pytest.fixture
+def source(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    upgrade(engine)
+    now = datetime(2026, 1, 2, 3, 4, 5, 678901)
+    with engine.begin() as conn:
+        conn.execute(insert(UserBinding), [
+            {"tg_id": i, "emby_account": f"user{i}", "points": i * 7, "is_vip": i % 5 == 0,
+             "weapon": 'say "hi", ok' if i % 2 else None, "last_active_time": now}
+            for i in range(USERS)
+        ])
+        conn.execute(insert(UserAchievement), [
+            {"tg_id": i, "kind": "general", "achievement_id": f"ach_{k}", "unlocked_at": now}
+            for i in range(0, USERS, 3) for k in range(2)
+        ])
+        conn.execute(insert(VIPApplication), [{"tg_id": 1, "status": "pending"}, {"tg_id": 2, "status": "approved"}])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def target(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    yield engine
+    engine.dispose()
+
+
+def count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_copy_and_verify(source, target):
+    stats = {s.name: s.rows for s in copy_database(source, target, chunk_size=CHUNK)}
+    assert stats["bindings"] == USERS
+    assert stats["user_achievements"] == 800
+    assert stats["vip_applications"] == 2
+    assert all(c.ok for c in verify_tables(source, target))
+
+    with target.connect() as conn:
+        row = conn.execute(select(UserBinding).where(UserBinding.tg_id == 5)).one()
+    assert row.is_vip is True and row.weapon == 'say "hi", ok'
+    assert row.last_active_time == datetime(2026, 1, 2, 3, 4, 5, 678901)
+
+
+def test_resume_after_failure(source, target, monkeypatch):
+    original = bulk_copy.write_rows
+    written = []
+
+    def flaky_write(conn, table, rows):
+        if table.name == "bindings" and len(written) == 3:
+            raise RuntimeError("connection lost")
+        original(conn, table, rows)
+        if table.name == "bindings":
+            written.append(len(rows))
+
+    monkeypatch.setattr(bulk_copy, "write_rows", flaky_write)
+    with pytest.raises(RuntimeError):
+        copy_database(source, target, chunk_size=CHUNK)
+    # 失败分块整体回滚，断点停在最后一个成功的分块
+    assert count(target, UserBinding) == 3 * CHUNK
+
+    monkeypatch.setattr(bulk_copy, "write_rows", original)
+    stats = {s.name: s.rows for s in copy_database(source, target, chunk_size=CHUNK)}
+    assert stats["bindings"] == USERS - 3 * CHUNK
+    assert count(target, UserBinding) == USERS
+    assert all(c.ok for c in verify_tables(source, target))
+
+    # 已完成的表不再重复搬迁
+    assert sum(s.rows for s in copy_database(source, target, chunk_size=CHUNK)) == 0
+
+
+def test_restart_recopies(source, target):
+    copy_database(source, target, chunk_size=CHUNK)
+    stats = {s.name: s.rows for s in copy_database(source, target, chunk_size=CHUNK, restart=True)}
+    assert stats["bindings"] == USERS
+    assert count(target, UserBinding) == USERS
+
+
+def test_verify_detects_differences(source, target):
+    copy_database(source, target, chunk_size=CHUNK)
+    with target.begin() as conn:
+        conn.execute(update(UserBinding).where(UserBinding.tg_id == 42).values(points=1))
+    checks = {c.name: c for c in verify_tables(source, target)}
+    assert not checks["bindings"].ok
+    assert checks["bindings"].source_rows == checks["bindings"].target_rows
+    assert checks["user_achievements"].ok
+
+
+def test_source_must_be_migrated(tmp_path, target):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    UserBinding.__table__.create(legacy)
+    with pytest.raises(TransferError):
+        copy_database(legacy, target)
+    legacy.dispose()
+
+
+def test_copy_csv_fields():
+    assert bulk_copy._csv_field(None) == ""
+    assert bulk_copy._csv_field("") == '""'
+    assert bulk_copy._csv_field('a"b,c') == '"a""b,c"'
+    assert bulk_copy._csv_field(True) == "t"
+    assert bulk_copy._csv_field(3) == "3"
+    assert bulk_copy._csv_field(datetime(2026, 1, 2, 3, 4, 5)) == "2026-01-02T03:04:05"
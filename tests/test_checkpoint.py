@@ -0,0 +1,78 @@
+"""
+SQLite 持久化档位与后台 checkpoint 测试
+"""
+import sqlite3
+import pytest
+from database.repository import DURABILITY_PROFILES, apply_sqlite_pragmas, get_durability_profile
+from database.checkpoint import CheckpointManager
+
+
+SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2}
+
+
+@pytest.fixture
+def wal_db(tmp_path):
+    """临时 WAL 文件库，已写入若干数据"""
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    apply_sqlite_pragmas(conn, "balanced")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [("x" * 100,)] * 500)
+    conn.commit()
+    yield path, conn
+    conn.close()
+
+
+class TestDurabilityProfiles:
+    """持久化档位测试"""
+
+    @pytest.mark.parametrize("profile", sorted(DURABILITY_PROFILES))
+    def test_profile_pragmas_applied(self, tmp_path, profile):
+        """每个档位的 PRAGMA 都应实际生效"""
+        conn = sqlite3.connect(str(tmp_path / f"{profile}.db"))
+        apply_sqlite_pragmas(conn, profile)
+
+        expected = DURABILITY_PROFILES[profile]
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == SYNCHRONOUS_LEVELS[expected["synchronous"]]
+        assert conn.execute("PRAGMA wal_autocheckpoint").fetchone()[0] == expected["wal_autocheckpoint"]
+        conn.close()
+
+    def test_unknown_profile_falls_back_to_strict(self):
+        assert get_durability_profile("nope") == DURABILITY_PROFILES["strict"]
+        assert get_durability_profile("FAST") == DURABILITY_PROFILES["fast"]
+
+
+class TestCheckpointManager:
+    """后台 checkpoint 管理器测试"""
+
+    def test_passive_below_threshold(self, wal_db):
+        path, _ = wal_db
+        manager = CheckpointManager(db_path=path, interval=1, wal_threshold_mb=64)
+
+        assert manager.wal_size() > 0
+        assert manager.run_once() == "PASSIVE"
+        assert manager.stats["passive"] == 1
+
+    def test_restart_above_threshold(self, wal_db):
+        path, _ = wal_db
+        manager = CheckpointManager(db_path=path, interval=1, wal_threshold_mb=0)
+
+        assert manager.run_once() == "RESTART"
+        assert manager.stats["restart"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stop_truncates_wal(self, wal_db):
+        path, conn = wal_db
+        manager = CheckpointManager(db_path=path, interval=3600, wal_threshold_mb=64)
+        manager.start()
+
+        await manager.stop()
+
+        assert manager.stats["truncate"] == 1
+        assert manager.wal_size() == 0
+        # 数据已合并回主库
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 500
+
+    def test_memory_db_disabled(self):
+        assert CheckpointManager(db_path=":memory:").enabled is False
@@ -152,6 +152,28 @@ class TestCodePatterns:
                 f"错误位置:\n{error_msg}"
             )
 
+    def test_no_orm_points_arithmetic(self):
+        """插件不应通过 ORM 读改写余额（user.points += x），并发下会丢失更新"""
+        errors = []
+
+        for py_file in PLUGINS_DIR.glob("*.py"):
+            content = py_file.read_text(encoding='utf-8')
+            lines = content.splitlines()
+
+            for i, line in enumerate(lines, 1):
+                if re.search(r'\.points\s*([+-]?=)(?!=)', line):
+                    # 排除注释行
+                    if not line.strip().startswith('#'):
+                        errors.append(f"{py_file.name}:{i} - {line.strip()}")
+
+        if errors:
+            error_msg = "\n".join(errors)
+            pytest.fail(
+                f"发现 {len(errors)} 处直接修改 .points 的代码！\n"
+                f"请使用 database.ledger 的 credit / debit_if_sufficient（或 *_async）\n\n"
+                f"错误位置:\n{error_msg}"
+            )
+
 
 class TestSessionManagementSafety:
     """会话管理安全性测试"""
@@ -0,0 +1,159 @@
+"""
+活跃度 / 聊天任务写回缓冲测试
+"""
+import pytest
+from datetime import datetime, timedelta
+from database.async_repository import get_async_session, get_user_async
+from database.counters import CounterStore
+from database.models import UserBinding
+from database.user_sets import get_user_set_async, add_to_user_set_async
+
+
+async def seed(tg_id=1001, **kwargs):
+    async with get_async_session() as session:
+        session.add(UserBinding(tg_id=tg_id, emby_account=f"user{tg_id}", **kwargs))
+
+
+async def load(tg_id=1001) -> UserBinding:
+    async with get_async_session() as session:
+        return await get_user_async(tg_id, session)
+
+
+@pytest.mark.asyncio
+class TestCounterStore:
+    """写回缓冲测试"""
+
+    async def test_buffer_until_flush(self, async_db):
+        """增量先留在内存，flush 时一次写回"""
+        await seed(daily_presence_points=5, total_presence_points=100, last_active_time=datetime.now())
+        store = CounterStore(flush_interval=3600)
+
+        entry = await store.get(1001)
+        now = datetime.now()
+        for _ in range(20):
+            entry.add_presence(1, now, 3600)
+        assert entry.daily_presence == 25
+
+        u = await load()
+        assert u.daily_presence_points == 5
+
+        assert await store.flush() == 1
+        u = await load()
+        assert u.daily_presence_points == 25
+        assert u.total_presence_points == 120
+        assert await store.flush() == 0
+
+    async def test_increments_do_not_clobber_other_writers(self, async_db):
+        """写回是 SQL 端增量，不覆盖期间其它写入"""
+        await seed(daily_presence_points=0, total_presence_points=0)
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+        entry.add_presence(3, datetime.now(), 3600)
+
+        async with get_async_session() as session:
+            u = await get_user_async(1001, session)
+            u.total_presence_points = 50
+            u.points = 999
+
+        await store.flush()
+        u = await load()
+        assert u.total_presence_points == 53
+        assert u.points == 999
+
+    async def test_window_reset(self, async_db):
+        """超过活跃窗口后今日累积从 0 开始"""
+        await seed(daily_presence_points=40, total_presence_points=40,
+                   last_active_time=datetime.now() - timedelta(hours=2))
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+
+        assert entry.add_presence(1, datetime.now(), 3600) == 1
+        await store.flush()
+        u = await load()
+        assert u.daily_presence_points == 1
+        assert u.total_presence_points == 41
+
+    async def test_claimed_level_persisted(self, async_db):
+        await seed()
+        await add_to_user_set_async(1001, "presence_level", [1])
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+        assert entry.claimed_levels == {1}
+
+        entry.claim_presence_level(2)
+        await store.flush()
+        assert await get_user_set_async(1001, "presence_level") == {"1", "2"}
+
+    async def test_task_progress_capped(self, async_db):
+        await seed(daily_tasks="chat_10,checkin,forge", task_progress="8,1,0", task_date=datetime.now())
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+
+        results = [entry.add_task_progress(0, 1, 10) for _ in range(5)]
+        assert results[1] == (9, 10)
+        assert entry.task_progress(0) == 10
+
+        await store.flush()
+        u = await load()
+        assert u.task_progress == "10,1,0"
+
+    async def test_task_delta_dropped_after_refresh(self, async_db):
+        """任务被刷新后，旧任务的增量不会写到新任务上"""
+        await seed(daily_tasks="chat_10,checkin,forge", task_progress="3,0,0", task_date=datetime.now())
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+        entry.add_task_progress(0, 4, 10)
+
+        async with get_async_session() as session:
+            u = await get_user_async(1001, session)
+            u.daily_tasks = "chat_20,checkin,forge"
+            u.task_progress = "0,0,0"
+
+        await store.flush()
+        u = await load()
+        assert u.task_progress == "0,0,0"
+
+    async def test_unbound_user(self, async_db):
+        store = CounterStore(flush_interval=3600)
+        assert await store.get(424242) is None
+        # 否定缓存：不会再次查库
+        loads = store.stats["loads"]
+        assert await store.get(424242) is None
+        assert store.stats["loads"] == loads
+
+    async def test_stop_flushes(self, async_db):
+        await seed()
+        store = CounterStore(flush_interval=3600)
+        store.start()
+        entry = await store.get(1001)
+        entry.add_presence(7, datetime.now(), 3600)
+        await store.stop()
+
+        u = await load()
+        assert u.daily_presence_points == 7
+
+    async def test_track_task_keeps_concurrent_flush(self, async_db, monkeypatch):
+        """其它任务推进期间聊天计数写回，两边的进度都保留"""
+        from plugins import unified_mission
+        await seed(daily_tasks="chat_10,checkin,forge", task_progress="3,0,0", task_date=datetime.now())
+        store = CounterStore(flush_interval=3600)
+        entry = await store.get(1001)
+        entry.add_task_progress(0, 2, 10)
+
+        load_user = unified_mission.get_user_async
+
+        async def load_then_flush(*args, **kwargs):
+            u = await load_user(*args, **kwargs)
+            await store.flush()        # 读取用户之后、写入任务进度之前写回聊天计数
+            return u
+
+        monkeypatch.setattr(unified_mission, "get_user_async", load_then_flush)
+        completed, _ = await unified_mission.track_and_check_task(1001, "checkin")
+        assert completed
+
+        u = await load()
+        assert u.task_progress == "5,1,0"
+        assert u.points == unified_mission.DAILY_TASKS["checkin"]["reward"]
+
+        # 已完成的任务不会重复发奖
+        assert await unified_mission.track_and_check_task(1001, "checkin") == (False, None)
@@ -0,0 +1,93 @@
+"""
+日切任务测试
+"""
+import pytest
+from datetime import date, datetime, timedelta
+from database.async_repository import get_async_session, get_user_async
+from database.counters import counter_store
+from database.daily_reset import run_daily_rollover, get_last_rollover
+from database.leaderboard import leaderboards
+from database.models import UserBinding
+from database.user_sets import add_to_user_set_async, get_user_set_async
+
+
+async def seed(tg_id=1001, **kwargs):
+    async with get_async_session() as session:
+        session.add(UserBinding(tg_id=tg_id, emby_account=f"user{tg_id}", **kwargs))
+
+
+@pytest.mark.asyncio
+class TestDailyRollover:
+
+    async def test_resets_daily_state(self, async_db):
+        await seed(
+            daily_duel_count=3, daily_tarot_count=9, daily_watch_minutes=120,
+            daily_presence_points=80, total_presence_points=500,
+            wheel_spins_today=2, daily_box_buy_count=3, consecutive_checkin=7,
+            daily_tasks="chat_10,tarot,forge", task_progress="10,1,0", task_date=datetime.now(),
+        )
+        await seed(tg_id=1002)
+        async with get_async_session() as session:
+            await add_to_user_set_async(1001, "presence_level", {"1", "2"}, session)
+            await add_to_user_set_async(1001, "early_bird", {"item-a"}, session)
+
+        assert await run_daily_rollover() == 1   # 没有当日数据的用户不改写
+
+        async with get_async_session() as session:
+            u = await get_user_async(1001, session)
+            assert (u.daily_duel_count, u.daily_tarot_count, u.daily_watch_minutes) == (0, 0, 0)
+            assert (u.daily_presence_points, u.wheel_spins_today, u.daily_box_buy_count) == (0, 0, 0)
+            assert (u.daily_tasks, u.task_progress, u.task_date) == ("", "0,0,0", None)
+            # 非每日数据保持不变
+            assert (u.total_presence_points, u.consecutive_checkin) == (500, 7)
+            assert await get_user_set_async(1001, "presence_level", session) == set()
+            assert await get_user_set_async(1001, "early_bird", session) == {"item-a"}
+
+        assert await get_last_rollover() == date.today()
+
+    async def test_idempotent_per_day(self, async_db):
+        await seed(wheel_spins_today=1)
+        assert await run_daily_rollover() == 1
+
+        async with get_async_session() as session:
+            (await get_user_async(1001, session)).wheel_spins_today = 1
+        assert await run_daily_rollover() is None
+        assert await run_daily_rollover(today=date.today() + timedelta(days=1)) == 1
+
+    async def test_flushes_and_resets_in_memory_state(self, async_db):
+        await seed(last_active_time=datetime.now())
+        entry = await counter_store.get(1001)
+        entry.add_presence(40, datetime.now(), 3600)
+        entry.claim_presence_level(1)
+
+        await run_daily_rollover()
+
+        assert entry.daily_presence == 0
+        assert entry.claimed_levels == set()
+        assert leaderboards.boards["daily_presence_points"].top(10) == []
+        counter_store.invalidate()
+
+    async def test_weekly_challenge_survives_rollover(self, async_db):
+        """日切清空 task_date 不影响周挑战：下周仍会重置，可以再次领取"""
+        from plugins.emby_watch import current_week_start, roll_weekly_challenge
+        this_week = current_week_start()
+        await seed(
+            weekly_challenge_target=30, weekly_challenge_progress=45,
+            weekly_challenge_reward_claimed=True, weekly_challenge_week=this_week,
+            daily_tasks="chat_10,tarot,forge", task_progress="0,0,0", task_date=datetime.now(),
+        )
+
+        await run_daily_rollover()
+
+        async with get_async_session() as session:
+            u = await get_user_async(1001, session)
+            assert u.task_date is None
+            assert not roll_weekly_challenge(u, this_week)      # 同一周：已领取状态保留
+            assert u.weekly_challenge_reward_claimed
+
+            assert roll_weekly_challenge(u, this_week + timedelta(days=7))
+        async with get_async_session() as session:
+            u = await get_user_async(1001, session)
+            assert not u.weekly_challenge_reward_claimed         # 新的一周可以再次领取
+            assert (u.weekly_challenge_progress, u.weekly_challenge_target) == (0, 60)
+            assert u.weekly_challenge_week == this_week + timedelta(days=7)
@@ -2,7 +2,8 @@
 数据库仓库层测试
 """
 import pytest
-from database.models import UserBinding, VIPApplication
+from sqlalchemy import inspect
+from database.models import UserBinding, VIPApplication, USER_COLUMN_GROUPS
 from database.repository import (
     get_user, create_user, get_or_create_user, update_user,
     get_top_users_by_attack, get_user_count, get_vip_count
@@ -125,6 +126,42 @@ class TestUserRepository:
         assert count == 2
 
 
+class TestUserColumnGroups:
+    """列分组加载测试"""
+
+    def test_groups_cover_all_columns(self):
+        grouped = [c for cols in USER_COLUMN_GROUPS.values() for c in cols]
+        assert len(grouped) == len(set(grouped))
+        assert set(grouped) == {c.key for c in UserBinding.__table__.columns}
+
+    def test_get_user_with_groups(self, db_session):
+        db_session.add(UserBinding(tg_id=1, emby_account="test", points=42, items="a,b"))
+        db_session.commit()
+        db_session.expunge_all()
+
+        user = get_user(1, db_session, groups=("identity",))
+        unloaded = inspect(user).unloaded
+        assert user.emby_account == "test"
+        assert "points" in unloaded and "items" in unloaded
+
+        # 分组外的列在同步会话中按需加载
+        assert user.points == 42
+
+    def test_collections_deferred_by_default(self, db_session):
+        db_session.add(UserBinding(tg_id=1, items="a,b"))
+        db_session.commit()
+        db_session.expunge_all()
+
+        user = get_user(1, db_session)
+        assert "items" in inspect(user).unloaded
+        assert "points" not in inspect(user).unloaded
+        assert user.items == "a,b"
+
+    def test_unknown_group(self, db_session):
+        with pytest.raises(ValueError):
+            get_user(1, db_session, groups=("nope",))
+
+
 class TestVIPApplicationRepository:
     """VIP申请数据仓库测试"""
 
@@ -0,0 +1,126 @@
+"""
+消息编辑合并器测试（假 Bot，发送队列未启动时直接调用）
+"""
+import asyncio
+import pytest
+from telegram.error import BadRequest, RetryAfter
+from messaging import EditCoalescer, SendQueue
+
+
+class FakeBot:
+    """photos 里的消息带 caption，其余为文本消息；deleted 里的消息两种编辑都失败"""
+
+    def __init__(self, photos=(), deleted=()):
+        self.photos = set(photos)
+        self.deleted = set(deleted)
+        self.calls = []
+        self.texts = {}
+        self.fail = []
+
+    async def _edit(self, kind, message_id, text):
+        self.calls.append((kind, message_id))
+        if self.fail:
+            raise self.fail.pop(0)
+        if message_id in self.deleted:
+            raise BadRequest("Message to edit not found")
+        if (kind == "caption") != (message_id in self.photos):
+            raise BadRequest("There is no caption in the message to edit" if kind == "caption"
+                             else "There is no text in the message to edit")
+        self.texts[message_id] = text
+
+    async def edit_message_caption(self, chat_id, message_id, caption, **kwargs):
+        await self._edit("caption", message_id, caption)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._edit("text", message_id, text)
+
+
+def coalescer(interval=0.2):
+    return EditCoalescer(interval=interval, queue=SendQueue())
+
+
+@pytest.mark.asyncio
+class TestEditCoalescer:
+
+    async def test_burst_collapses_to_latest(self):
+        edits = coalescer()
+        bot = FakeBot(photos={1})
+        claims = []
+        for i in range(30):
+            claims.append(i)
+            edits.request(bot, -1, 1, lambda: f"claims={len(claims)}", is_photo=True)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.3)
+        # 第一次立即编辑，其余合并为窗口结束时的一次
+        assert bot.calls == [("caption", 1), ("caption", 1)]
+        assert bot.texts[1] == "claims=30"
+        assert edits.stats["requested"] == 30 and edits.stats["edited"] == 2
+
+    async def test_interval_between_edits(self):
+        edits = coalescer(interval=0.1)
+        bot = FakeBot()
+        loop = asyncio.get_running_loop()
+        times = []
+        original = bot._edit
+
+        async def timed(kind, message_id, text):
+            times.append(loop.time())
+            await original(kind, message_id, text)
+
+        bot._edit = timed
+        for i in range(6):
+            edits.request(bot, -1, 1, lambda i=i: f"v{i}", is_photo=False)
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.15)
+        assert bot.texts[1] == "v5"
+        assert all(b - a >= 0.095 for a, b in zip(times, times[1:]))
+        assert len(times) < 6
+
+    async def test_text_fallback_is_remembered(self):
+        edits = coalescer(interval=0.05)
+        bot = FakeBot()
+        edits.request(bot, -1, 1, lambda: "a")
+        await asyncio.sleep(0.01)
+        edits.request(bot, -1, 1, lambda: "b")
+        await asyncio.sleep(0.1)
+        assert bot.calls == [("caption", 1), ("text", 1), ("text", 1)]
+        assert bot.texts[1] == "b" and edits.stats["fallback"] == 1
+
+    async def test_unchanged_render_is_skipped(self):
+        edits = coalescer(interval=0.05)
+        bot = FakeBot(photos={1})
+        edits.request(bot, -1, 1, lambda: "same", is_photo=True)
+        await asyncio.sleep(0.01)
+        edits.request(bot, -1, 1, lambda: "same", is_photo=True)
+        await asyncio.sleep(0.1)
+        assert bot.calls == [("caption", 1)] and edits.stats["unchanged"] == 1
+
+    async def test_uneditable_message(self):
+        edits = coalescer(interval=0.05)
+        bot = FakeBot(deleted={1})
+        edits.request(bot, -1, 1, lambda: "a")
+        await asyncio.sleep(0.01)
+        assert not edits.editable(-1, 1) and edits.editable(-1, 2)
+        edits.request(bot, -1, 1, lambda: "b")
+        await asyncio.sleep(0.1)
+        assert bot.calls == [("caption", 1), ("text", 1)]
+
+    async def test_failed_edit_is_retried_on_next_update(self):
+        edits = coalescer(interval=0.05)
+        bot = FakeBot(photos={1})
+        bot.fail = [RetryAfter(1)]
+        edits.request(bot, -1, 1, lambda: "a", is_photo=True)
+        await asyncio.sleep(0.01)
+        assert edits.editable(-1, 1) and 1 not in bot.texts
+        edits.request(bot, -1, 1, lambda: "b", is_photo=True)
+        await asyncio.sleep(0.1)
+        assert bot.texts[1] == "b"
+
+    async def test_stop_flushes_pending(self):
+        edits = coalescer(interval=60)
+        bot = FakeBot(photos={1})
+        edits.request(bot, -1, 1, lambda: "a", is_photo=True)
+        await asyncio.sleep(0.01)
+        edits.request(bot, -1, 1, lambda: "b", is_photo=True)
+        await edits.stop()
+        assert bot.texts[1] == "b" and len(bot.calls) == 2
@@ -0,0 +1,125 @@
+"""
+共享 Emby 客户端测试（本地桩服务器）
+"""
+import asyncio
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from emby import EmbyClient, EmbyError
+
+
+class StubEmby:
+    """记录请求数与 TCP 连接数的 Emby 桩服务器"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.runner = None
+        self.url = ""
+
+    async def users(self, request):
+        return await self._reply(request, [{"Name": "alice", "Id": "u1"}])
+
+    async def items(self, request):
+        if request.query.get("Fail"):
+            return await self._reply(request, None, body=b"boom", status=500)
+        return await self._reply(request, {"Items": [], "TotalRecordCount": int(request.query.get("Limit", 0))})
+
+    async def image(self, request):
+        return await self._reply(request, None, body=b"\x89PNG")
+
+    async def _reply(self, request, data, body=None, status=200):
+        self.requests.append((request.path, dict(request.query), request.headers.get("X-Emby-Token")))
+        self.connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(self.delay)
+        return web.Response(body=body, status=status) if body is not None else web.json_response(data)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/Users", self.users)
+        app.router.add_get("/Items", self.items)
+        app.router.add_get("/Items/{id}/Images/Primary", self.image)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@pytest_asyncio.fixture
+async def stub():
+    server = StubEmby()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def client(stub):
+    c = EmbyClient(base_url=stub.url, api_key="secret", pool_size=4)
+    c.start()
+    yield c
+    await c.close()
+
+
+@pytest.mark.asyncio
+class TestEmbyClient:
+
+    async def test_concurrent_identical_gets_coalesce(self, client, stub):
+        results = await asyncio.gather(*(client.get_json("/Users") for _ in range(10)))
+        assert all(r == [{"Name": "alice", "Id": "u1"}] for r in results)
+        assert len(stub.requests) == 1
+        assert client.stats["coalesced"] == 9
+        assert stub.requests[0][2] == "secret"
+
+    async def test_different_params_are_not_coalesced(self, client, stub):
+        await asyncio.gather(client.get_json("/Items", {"Limit": 1}), client.get_json("/Items", {"Limit": 2}))
+        assert len(stub.requests) == 2
+        # 合并只针对同时在途的请求：完成后再次请求会重新发出
+        await client.get_json("/Items", {"Limit": 1})
+        assert len(stub.requests) == 3
+
+    async def test_keep_alive_reuses_connection(self, client, stub):
+        stub.delay = 0
+        for i in range(20):
+            await client.get_json("/Items", {"Limit": i})
+        assert len(stub.connections) == 1
+
+    async def test_pool_is_bounded(self, client, stub):
+        await asyncio.gather(*(client.get_json("/Items", {"Limit": i}) for i in range(12)))
+        assert len(stub.requests) == 12
+        assert len(stub.connections) <= 4
+
+    async def test_bool_params_and_bytes(self, client, stub):
+        await client.get_json("/Items", {"Recursive": True, "Limit": 1})
+        assert stub.requests[-1][1]["Recursive"] == "true"
+        assert await client.get_bytes("/Items/abc/Images/Primary") == b"\x89PNG"
+
+    async def test_error_status_raises_for_all_waiters(self, client, stub):
+        results = await asyncio.gather(
+            *(client.get_json("/Items", {"Fail": 1}) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, EmbyError) and r.status == 500 for r in results)
+        assert len(stub.requests) == 1
+        assert client.stats["errors"] == 1
+
+    async def test_cancelled_waiter_does_not_cancel_shared_request(self, client, stub):
+        first = asyncio.ensure_future(client.get_json("/Users"))
+        second = asyncio.ensure_future(client.get_json("/Users"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == [{"Name": "alice", "Id": "u1"}]
+
+    async def test_timeout_raises_emby_error(self, client, stub):
+        stub.delay = 0.5
+        with pytest.raises(EmbyError):
+            await client.get_json("/Items", {"Limit": 1}, timeout=0.05)
+
+    async def test_unconfigured_client(self):
+        with pytest.raises(EmbyError):
+            await EmbyClient(base_url="", api_key="").get_json("/Users")
@@ -0,0 +1,95 @@
+"""
+Emby 用户目录缓存测试
+"""
+import asyncio
+import pytest
+from emby import EmbyUserDirectory, EmbyError
+from emby import directory as directory_module
+
+
+class FakeClient:
+    """只记录 /Users 调用次数的假客户端"""
+
+    def __init__(self, users):
+        self.users = users
+        self.calls = 0
+        self.fail = False
+        self.configured = True
+
+    async def get_json(self, path, params=None, timeout=None):
+        assert path == "/Users"
+        self.calls += 1
+        if self.fail:
+            raise EmbyError("down", 502)
+        return [{"Name": name, "Id": user_id} for name, user_id in self.users.items()]
+
+
+@pytest.fixture
+def client():
+    return FakeClient({"Alice": "id-a", "alice": "id-a2", "Bob": "id-b"})
+
+
+@pytest.fixture
+def directory(client):
+    return EmbyUserDirectory(client=client, ttl=600)
+
+
+def age_by(directory, seconds):
+    directory._loaded_at -= seconds
+
+
+@pytest.mark.asyncio
+class TestEmbyUserDirectory:
+
+    async def test_lookups_served_from_memory(self, directory, client):
+        assert await directory.resolve_id("Bob") == "id-b"
+        assert await directory.resolve_id("Bob") == "id-b"
+        assert directory.name_of("id-b") == "Bob"
+        assert client.calls == 1
+        assert len(directory) == 3
+
+    async def test_case_insensitive_with_exact_match_first(self, directory):
+        assert await directory.resolve_id("alice") == "id-a2"
+        assert await directory.resolve_id("Alice") == "id-a"
+        assert await directory.canonical_name("BOB") == "Bob"
+
+    async def test_miss_refreshes_at_most_once_per_interval(self, directory, client):
+        assert await directory.resolve_id("Carol") is None
+        assert client.calls == 1            # 刚加载过，不重复拉取
+
+        client.users["Carol"] = "id-c"
+        age_by(directory, directory_module.MISS_REFRESH_INTERVAL + 1)
+        assert await directory.resolve_id("carol") == "id-c"
+        assert client.calls == 2
+
+    async def test_invalidate_forces_refresh(self, directory, client):
+        await directory.resolve_id("Bob")
+        client.users["Dave"] = "id-d"
+        directory.invalidate()
+        assert await directory.resolve_id("Dave") == "id-d"
+        assert client.calls == 2
+
+    async def test_expired_entries_refresh_in_background(self, directory, client):
+        await directory.resolve_id("Bob")
+        client.users["Bob"] = "id-b2"
+        age_by(directory, 601)
+        # 过期先返回旧值，后台刷新完成后生效
+        assert await directory.resolve_id("Bob") == "id-b"
+        await asyncio.sleep(0)
+        await directory._refreshing
+        assert await directory.resolve_id("Bob") == "id-b2"
+        assert directory.age < 1
+
+    async def test_refresh_failure_keeps_old_directory(self, directory, client):
+        await directory.resolve_id("Bob")
+        client.fail = True
+        directory.invalidate()
+        assert await directory.resolve_id("Bob") == "id-b"
+        assert directory.stats["errors"] == 1
+
+    async def test_unconfigured_client_resolves_nothing(self, client):
+        client.configured = False
+        directory = EmbyUserDirectory(client=client)
+        assert await directory.resolve_id("Bob") is None
+        assert await directory.all_users() == []
+        assert client.calls == 0
@@ -0,0 +1,146 @@
+"""
+Emby 新片变更流测试（假 Emby 客户端 + 内存库）
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from database import EmbySeenItem, get_session
+from emby import EmbyChangeFeed, EmbyError, parse_emby_date
+from emby.feed import SEEN_RETENTION
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def make_item(n: int, age: timedelta, kind: str = "Movie", path: str = None) -> dict:
+    return {
+        "Id": f"item{n}", "Name": f"电影{n}", "Type": kind, "ProductionYear": 2024,
+        "DateCreated": (utc_now() - age).strftime("%Y-%m-%dT%H:%M:%S.0000000Z"),
+        "Genres": ["剧情"], "Overview": "简介", "Path": path or f"/media/电影{n}.mkv",
+    }
+
+
+class FakeEmby:
+    """/Items：按 MinDateCreated 过滤、按入库时间升序分页"""
+
+    configured = True
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.calls = []
+        self.fail = False
+
+    async def get_json(self, path, params=None, timeout=None):
+        assert path == "/Items"
+        self.calls.append(dict(params))
+        if self.fail:
+            raise EmbyError("down", 502)
+        since = parse_emby_date(params["MinDateCreated"])
+        items = sorted((i for i in self.items if parse_emby_date(i["DateCreated"]) >= since),
+                       key=lambda i: i["DateCreated"])
+        start = params["StartIndex"]
+        return {"Items": items[start:start + params["Limit"]], "TotalRecordCount": len(items)}
+
+
+@pytest.fixture
+def emby():
+    return FakeEmby([make_item(1, timedelta(days=3)), make_item(2, timedelta(hours=5)),
+                     make_item(3, timedelta(hours=2), kind="Episode")])
+
+
+@pytest.fixture
+def feed(db_session, emby):
+    return EmbyChangeFeed(client=emby, interval=60)
+
+
+@pytest.mark.asyncio
+class TestEmbyChangeFeed:
+
+    async def test_one_request_per_poll_with_durable_watermark(self, feed, emby):
+        delivered = []
+
+        async def subscriber(bot, items):
+            delivered.append([i["Id"] for i in items])
+
+        feed.subscribe("test", subscriber)
+        assert await feed.run_once(bot=None) == 2
+        assert delivered == [["item2", "item3"]]
+        assert len(emby.calls) == 1
+        assert "MediaSources" in emby.calls[0]["Fields"] and "Path" in emby.calls[0]["Fields"]
+
+        # 新实例（重启）：水位与已处理记录都在库里，重叠窗口内的条目不会重复分发
+        fresh = EmbyChangeFeed(client=emby, interval=60)
+        fresh.subscribe("test", subscriber)
+        assert await fresh.run_once(bot=None) == 0
+        assert abs(fresh.watermark() - parse_emby_date(emby.items[2]["DateCreated"])) < timedelta(seconds=1)
+
+        emby.items.append(make_item(4, timedelta(minutes=1)))
+        assert await fresh.run_once(bot=None) == 1
+        assert delivered[-1] == ["item4"]
+
+    async def test_late_item_within_overlap_is_delivered(self, feed, emby):
+        await feed.poll()
+        # 入库时间早于水位，但落在重叠窗口内（例如扫描较慢）
+        emby.items.append(make_item(5, timedelta(hours=2, minutes=30)))
+        assert [i["Id"] for i in await feed.poll()] == ["item5"]
+
+    async def test_pages_when_many_new_items(self, feed, emby, monkeypatch):
+        monkeypatch.setattr("emby.feed.PAGE_LIMIT", 2)
+        emby.items += [make_item(n, timedelta(minutes=n)) for n in range(10, 15)]
+        assert len(await feed.poll()) == 7
+        assert [c["StartIndex"] for c in emby.calls] == [0, 2, 4, 6]
+
+    async def test_errors_are_isolated(self, feed, emby):
+        calls = []
+
+        async def broken(bot, items):
+            raise RuntimeError("boom")
+
+        async def ok(bot, items):
+            calls.append(len(items))
+
+        feed.subscribe("broken", broken)
+        feed.subscribe("ok", ok)
+        emby.fail = True
+        assert await feed.run_once(bot=None) == 0
+        assert feed.watermark() is None and feed.stats["errors"] == 1
+
+        emby.fail = False
+        assert await feed.run_once(bot=None) == 2
+        assert calls == [2]
+
+    async def test_seen_records_are_pruned(self, feed):
+        feed.mark_seen(["a", "b"])
+        feed.mark_seen(["a"], kind="push")
+        assert feed.seen_ids(["a", "b", "c"]) == {"a", "b"}
+        assert feed.is_seen("a", "push") and not feed.is_seen("b", "push")
+
+        assert feed.prune(utc_now() + SEEN_RETENTION + timedelta(days=1)) == 3
+        with get_session() as session:
+            assert session.query(EmbySeenItem).count() == 0
+
+    async def test_remux_subscriber_pushes_once(self, feed, emby, monkeypatch):
+        from plugins import emby_monitor
+
+        class Bot:
+            def __init__(self):
+                self.sent = []
+
+            async def send_message(self, chat_id, text, **kwargs):
+                self.sent.append(text)
+                return SimpleNamespace(message_id=len(self.sent), photo=())
+
+        monkeypatch.setattr(emby_monitor.Config, "GROUP_ID", -100)
+        monkeypatch.setattr(emby_monitor, "emby_feed", feed)
+        monkeypatch.setattr(emby_monitor, "ACTIVE_PUSHES", {})
+        items = [make_item(1, timedelta(hours=1), path="/media/a.REMUX.mkv"),
+                 make_item(2, timedelta(hours=1)),
+                 make_item(3, timedelta(hours=1), kind="Episode", path="/media/b.REMUX.mkv")]
+
+        bot = Bot()
+        feed.mark_seen(["item9"], emby_monitor.PUSHED_KIND)
+        await emby_monitor.push_remux_releases(bot, items)
+        await emby_monitor.push_remux_releases(bot, items)
+        assert len(bot.sent) == 1 and "电影1" in bot.sent[0]
+        assert feed.seen_ids(["item1", "item2"], emby_monitor.PUSHED_KIND) == {"item1"}
@@ -0,0 +1,188 @@
+"""
+Emby 媒体库本地索引测试（假 Emby 客户端 + 内存库）
+"""
+import asyncio
+import random
+import pytest
+from datetime import datetime, timedelta
+from database import EmbyItem, get_session
+from emby import EmbyLibrary, EmbyError, parse_emby_date
+from emby.library import FULL_SYNC_STATE_KEY
+from database.models import BotState
+
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def emby_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+
+
+def make_item(n: int, kind: str = "Movie", rating: float = 7.0, created: datetime = None) -> dict:
+    created = created or BASE + timedelta(minutes=n)
+    return {
+        "Id": f"item{n}", "Name": f"电影{n}", "Type": kind, "ProductionYear": 2000 + n,
+        "Genres": ["剧情", "科幻"], "CommunityRating": rating, "Overview": "简介",
+        "DateCreated": emby_time(created), "DateModified": emby_time(created),
+        "ImageTags": {"Primary": f"tag{n}"}, "BackdropImageTags": [],
+        "Path": f"/media/电影{n}.REMUX.mkv",
+        "MediaStreams": [{"Type": "Audio", "Codec": "truehd"},
+                         {"Type": "Video", "Width": 3840, "Codec": "hevc", "VideoRange": "HDR", "BitDepth": 10}],
+    }
+
+
+class FakeEmby:
+    """支持分页、类型过滤、MinDateCreated / MinDateLastSaved 与随机排序的 /Items"""
+
+    configured = True
+
+    def __init__(self, items):
+        self.items = {item["Id"]: item for item in items}
+        self.calls = []
+        self.fail = False
+        self.garbage = False
+
+    async def get_json(self, path, params=None, timeout=None):
+        assert path == "/Items"
+        self.calls.append(dict(params))
+        if self.fail:
+            raise EmbyError("down", 502)
+        if self.garbage:
+            return ["unexpected"]
+        types = params["IncludeItemTypes"].split(",")
+        items = [i for i in self.items.values() if i["Type"] in types]
+        for key, field in (("MinDateCreated", "DateCreated"), ("MinDateLastSaved", "DateModified")):
+            if key in params:
+                since = parse_emby_date(params[key])
+                items = [i for i in items if parse_emby_date(i[field]) >= since]
+        if params.get("SortBy") == "Random":
+            random.shuffle(items)
+        else:
+            items.sort(key=lambda i: i["DateCreated"])
+        start = params.get("StartIndex", 0)
+        return {"Items": items[start:start + params["Limit"]], "TotalRecordCount": len(items)}
+
+
+@pytest.fixture
+def emby():
+    return FakeEmby([make_item(n) for n in range(5)] + [make_item(5, "Episode", rating=9.1)])
+
+
+@pytest.fixture
+def library(db_session, emby):
+    return EmbyLibrary(client=emby, page_size=2)
+
+
+@pytest.mark.asyncio
+class TestEmbyLibrary:
+
+    async def test_full_sync_pages_through_library(self, library, emby):
+        assert await library.sync() == 6
+        assert len(emby.calls) == 3 + 1     # 3 页满页 + 1 个空页
+        assert library.size == 6 and library.ready()
+
+        item = library.get("item1")
+        assert (item["Name"], item["Genres"], item["ImageTags"]) == ("电影1", ["剧情", "科幻"], {"Primary": "tag1"})
+        assert item["Path"].endswith("REMUX.mkv")
+        assert item["MediaSources"][0]["MediaStreams"][0] == {
+            "Type": "Video", "Width": 3840, "Codec": "hevc", "VideoRange": "HDR", "BitDepth": 10
+        }
+        assert parse_emby_date(item["DateCreated"]) == BASE + timedelta(minutes=1)
+
+    async def test_incremental_sync_uses_watermarks(self, library, emby):
+        await library.sync()
+        emby.calls.clear()
+
+        emby.items["item9"] = make_item(9, created=BASE + timedelta(hours=1))
+        emby.items["item2"]["Name"] = "电影2 导演剪辑版"
+        emby.items["item2"]["DateModified"] = emby_time(BASE + timedelta(hours=2))
+
+        await library.sync()
+        assert [sorted(k for k in c if k.startswith("Min")) for c in emby.calls if c["StartIndex"] == 0] == \
+            [["MinDateCreated"], ["MinDateLastSaved"]]
+        assert library.get("item9")["Name"] == "电影9"
+        assert library.get("item2")["Name"] == "电影2 导演剪辑版"
+        assert library.stats["incremental"] == 1
+
+    async def test_full_sync_removes_deleted_items(self, library, emby):
+        await library.sync()
+        del emby.items["item3"]
+        await library.sync(full=True)
+        assert library.get("item3") is None
+        assert library.size == 5
+
+        # Emby 返回空结果时不清空索引
+        emby.items.clear()
+        await library.sync(full=True)
+        assert library.size == 5
+
+    async def test_full_sync_is_rescheduled_daily(self, library, emby):
+        await library.sync()
+        with get_session() as session:
+            session.get(BotState, FULL_SYNC_STATE_KEY).value = (BASE - timedelta(days=2)).isoformat()
+            session.commit()
+        await library.sync()
+        assert library.stats["full"] == 2
+
+    async def test_random_items_are_served_locally(self, library, emby):
+        # sample_key 是随机的，固定种子避免某条恰好落在极小的区间里、200 次都抽不到
+        random.seed(7)
+        await library.sync()
+        emby.fail = True
+        calls = len(emby.calls)
+
+        seen = set()
+        for _ in range(200):
+            [item] = await library.random_items(["Movie"])
+            assert item["Type"] == "Movie"
+            seen.add(item["Id"])
+        assert seen == {f"item{n}" for n in range(5)}
+
+        [best] = await library.random_items(["Movie", "Episode"], min_rating=9)
+        assert best["Id"] == "item5"
+        assert len(await library.random_items(["Movie", "Episode"], limit=10)) == 6
+        assert len(emby.calls) == calls
+        assert library.stats["fallback"] == 0
+
+    async def test_failed_sync_keeps_index(self, library, emby):
+        await library.sync()
+        emby.fail = True
+        assert await library.sync() == 0
+        assert library.stats["errors"] == 1
+        assert library.size == 6
+
+    async def test_background_sync_survives_unexpected_errors(self, library, emby):
+        emby.garbage = True
+        library.interval = 0.01
+        library.start()
+        try:
+            await asyncio.sleep(0.1)
+            assert not library._task.done()
+            assert library.stats["errors"] >= 2
+            emby.garbage = False
+            await asyncio.sleep(0.1)
+            assert library.size == 6
+        finally:
+            await library.stop()
+
+    async def test_empty_index_falls_back_to_emby(self, library, emby):
+        items = await library.random_items(["Movie"], limit=2)
+        assert len(items) == 2
+        assert emby.calls[-1]["SortBy"] == "Random"
+        latest = await library.latest_items(["Movie"], limit=1)
+        assert emby.calls[-1]["SortOrder"] == "Descending" and len(latest) == 1
+        assert library.stats["fallback"] == 2
+
+    async def test_latest_items(self, library, emby):
+        await library.sync()
+        latest = await library.latest_items(["Movie", "Episode"], limit=3)
+        assert [i["Id"] for i in latest] == ["item5", "item4", "item3"]
+        recent = await library.latest_items(["Movie"], since=BASE + timedelta(minutes=3))
+        assert [i["Id"] for i in recent] == ["item4", "item3"]
+
+    async def test_sample_key_survives_resync(self, library, emby):
+        await library.sync()
+        with get_session() as session:
+            before = session.get(EmbyItem, "item1").sample_key
+        await library.sync(full=True)
+        with get_session() as session:
+            assert session.get(EmbyItem, "item1").sample_key == before
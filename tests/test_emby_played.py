@@ -0,0 +1,79 @@
+"""
+Emby 已看数量缓存测试
+"""
+import pytest
+from emby import PlayedCountCache, EmbyError, played_counts
+
+
+class FakeEmby:
+    """按 IncludeItemTypes 返回 TotalRecordCount，记录请求参数"""
+
+    configured = True
+
+    def __init__(self, totals):
+        self.totals = totals
+        self.calls = []
+        self.fail = False
+
+    async def get_json(self, path, params=None, timeout=None):
+        self.calls.append((path, dict(params)))
+        if self.fail:
+            raise EmbyError("down", 503)
+        return {"Items": [], "TotalRecordCount": self.totals[params["IncludeItemTypes"]]}
+
+
+@pytest.fixture
+def client():
+    return FakeEmby({"Movie": 12, "Episode": 340})
+
+
+@pytest.mark.asyncio
+class TestPlayedCountCache:
+
+    async def test_counts_use_limit_zero(self, client):
+        cache = PlayedCountCache(client=client, ttl=60)
+        assert await cache.get("u1") == {"Movie": 12, "Episode": 340}
+        assert all(params["Limit"] == 0 and params["Filters"] == "IsPlayed" for _, params in client.calls)
+        assert {params["IncludeItemTypes"] for _, params in client.calls} == {"Movie", "Episode"}
+        assert client.calls[0][0] == "/Users/u1/Items"
+
+    async def test_cached_until_ttl_or_invalidate(self, client):
+        cache = PlayedCountCache(client=client, ttl=60)
+        await cache.get("u1")
+        client.totals["Movie"] = 13
+        assert (await cache.get("u1"))["Movie"] == 12
+        assert len(client.calls) == 2
+
+        cache.invalidate("u1")
+        assert (await cache.get("u1"))["Movie"] == 13
+
+        cache.ttl = 0
+        client.totals["Movie"] = 14
+        assert (await cache.get("u1"))["Movie"] == 14
+        assert cache.stats["hits"] == 1
+
+    async def test_stale_value_on_error(self, client):
+        cache = PlayedCountCache(client=client, ttl=0)
+        await cache.get("u1")
+        client.fail = True
+        assert (await cache.get("u1"))["Episode"] == 340
+        assert cache.stats["stale"] == 1
+        with pytest.raises(EmbyError):
+            await cache.get("u2")
+
+    async def test_watch_ingest_invalidates_users_with_new_plays(self, client, monkeypatch):
+        from datetime import datetime
+        from plugins import emby_watch
+
+        async def resolve_id(name):
+            return f"id-{name}"
+
+        async def fetch_new_plays(emby_user_id, since):
+            return (30, datetime(2024, 5, 1, 11)) if emby_user_id == "id-alice" else (0, None)
+
+        monkeypatch.setattr(emby_watch.emby_directory, "resolve_id", resolve_id)
+        monkeypatch.setattr(emby_watch, "fetch_new_plays", fetch_new_plays)
+        monkeypatch.setattr(played_counts, "_entries", {"id-alice": ({}, 0.0), "id-bob": ({}, 0.0)})
+
+        await emby_watch.collect_watch_plays([(1, "alice", None), (2, "bob", None)])
+        assert set(played_counts._entries) == {"id-bob"}
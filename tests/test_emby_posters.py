@@ -0,0 +1,109 @@
+"""
+Emby 海报缓存测试（假 Emby 客户端 + 假 bot）
+"""
+import os
+import pytest
+from types import SimpleNamespace
+from telegram.error import BadRequest
+from emby import PosterCache, EmbyError
+
+
+class FakeEmby:
+    configured = True
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    async def get_bytes(self, path, params=None, timeout=None):
+        self.calls.append((path, params))
+        if self.fail:
+            raise EmbyError("down", 502)
+        item_id = path.split("/")[2]
+        return f"{item_id}:{(params or {}).get('tag')}".encode() * 100
+
+
+class FakeBot:
+    """send_photo 记录收到的 photo，上传字节时返回新的 file_id"""
+
+    def __init__(self):
+        self.sent = []
+        self.stale_file_ids = set()
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent.append(photo)
+        if isinstance(photo, str):
+            if photo in self.stale_file_ids:
+                raise BadRequest("Wrong file identifier")
+            file_id = photo
+        else:
+            assert isinstance(photo, bytes)
+            file_id = f"fid-{len(self.sent)}"
+        return SimpleNamespace(message_id=len(self.sent), photo=[SimpleNamespace(file_id=file_id)])
+
+
+@pytest.fixture
+def emby():
+    return FakeEmby()
+
+
+@pytest.fixture
+def cache(db_session, emby, tmp_path):
+    return PosterCache(client=emby, directory=str(tmp_path), max_bytes=10_000)
+
+
+@pytest.mark.asyncio
+class TestPosterCache:
+
+    async def test_repeat_push_reuses_file_id(self, cache, emby):
+        bot = FakeBot()
+        await cache.send_photo(bot, 1, "item1", "tagA", caption="x")
+        await cache.send_photo(bot, 2, "item1", "tagA", caption="x")
+        assert isinstance(bot.sent[0], bytes) and bot.sent[1] == "fid-1"
+        assert emby.calls == [("/Items/item1/Images/Primary", {"tag": "tagA"})]
+        assert cache.stats["file_id"] == 1
+
+        # 新进程：file_id 从 bot_state 读回
+        fresh = PosterCache(client=emby, directory=cache.directory)
+        await fresh.send_photo(bot, 3, "item1", "tagA")
+        assert bot.sent[2] == "fid-1" and len(emby.calls) == 1
+
+    async def test_new_tag_is_new_poster(self, cache, emby):
+        bot = FakeBot()
+        await cache.send_photo(bot, 1, "item1", "tagA")
+        await cache.send_photo(bot, 1, "item1", "tagB")
+        assert [params["tag"] for _, params in emby.calls] == ["tagA", "tagB"]
+        assert cache.file_id("item1", "tagB") == "fid-2"
+
+    async def test_stale_file_id_is_reuploaded(self, cache, emby):
+        bot = FakeBot()
+        await cache.send_photo(bot, 1, "item1", "tagA")
+        bot.stale_file_ids.add("fid-1")
+        msg = await cache.send_photo(bot, 1, "item1", "tagA")
+        assert isinstance(bot.sent[-1], bytes)
+        assert cache.file_id("item1", "tagA") == msg.photo[-1].file_id != "fid-1"
+        assert cache.stats["disk"] == 1 and len(emby.calls) == 1
+
+    async def test_disk_lru_is_bounded(self, cache, emby, tmp_path):
+        # 每张 1000+ 字节，上限 10000 字节
+        for n in range(15):
+            await cache.get_bytes(f"item{n:02d}", "t")
+            await cache.get_bytes("item00", "t")       # 保持最近使用
+        assert cache.size <= cache.max_bytes
+        assert cache.stats["evicted"] > 0
+        assert len(os.listdir(tmp_path)) == len(cache._files)
+
+        emby.fail = True
+        assert await cache.get_bytes("item00", "t") is not None
+        assert await cache.get_bytes("item01", "t") is None
+
+        # 重启后按修改时间恢复缓存索引
+        fresh = PosterCache(client=emby, directory=str(tmp_path), max_bytes=10_000)
+        assert await fresh.get_bytes("item14", "t") is not None
+        assert fresh.size == cache.size
+
+    async def test_missing_poster_returns_none(self, cache, emby):
+        emby.fail = True
+        bot = FakeBot()
+        assert await cache.send_photo(bot, 1, "item1", "tagA") is None
+        assert bot.sent == []
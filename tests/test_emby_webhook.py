@@ -0,0 +1,163 @@
+"""
+Emby Webhook 接收端测试（本地起端点，假 Emby 通过 HTTP 推送事件）
+"""
+import asyncio
+import json
+import socket
+import aiohttp
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta, timezone
+from database import UserBinding, get_session
+from emby import EmbyChangeFeed, EmbyUserDirectory, EmbyWebhookServer
+from plugins import emby_watch
+
+SECRET = "s3cret"
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeEmby:
+    """Webhook 另一端：向端点推送事件；同时作为 Bot 查询用的 Emby API"""
+
+    configured = True
+
+    def __init__(self, url: str):
+        self.url = url
+        self.plays = []          # [(分钟, 播放时间)]，都属于 alice
+        self.items = []
+        self.requests = 0
+
+    async def post(self, event: dict, token: str = SECRET, form: bool = False) -> int:
+        async with aiohttp.ClientSession() as http:
+            if form:
+                data = aiohttp.FormData({"data": json.dumps(event)})
+                response = await http.post(f"{self.url}?token={token}", data=data)
+            else:
+                response = await http.post(f"{self.url}?token={token}", json=event)
+            return response.status
+
+    async def get_json(self, path, params=None, timeout=None):
+        self.requests += 1
+        if path == "/Users":
+            return [{"Name": "alice", "Id": "id-alice"}]
+        if path == "/Items":
+            return {"Items": self.items[params["StartIndex"]:], "TotalRecordCount": len(self.items)}
+        return {"Items": [
+            {"RunTimeTicks": minutes * 60 * 10000000,
+             "UserData": {"LastPlayedDate": played.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")}}
+            for minutes, played in self.plays
+        ]}
+
+
+@pytest_asyncio.fixture
+async def server():
+    webhook = EmbyWebhookServer(host="127.0.0.1", port=free_port(), path="/emby/webhook", secret=SECRET)
+    yield webhook
+    await webhook.stop()
+
+
+@pytest.fixture
+def emby(server):
+    return FakeEmby(f"http://127.0.0.1:{server.port}{server.path}")
+
+
+async def settle(server):
+    for _ in range(100):
+        if not server._tasks:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+class TestEmbyWebhook:
+
+    async def test_secret_and_payload_are_checked(self, server, emby):
+        received = []
+
+        async def handler(event):
+            received.append(event["Item"]["Id"])
+
+        server.on("library.new", handler)
+        await server.start()
+        event = {"Event": "library.new", "Item": {"Id": "item1"}}
+
+        assert await emby.post(event, token="wrong") == 401
+        assert await emby.post({"Title": "no event"}) == 400
+        assert await emby.post({"Event": "user.authenticated"}) == 204
+        assert await emby.post(event) == 204
+        assert await emby.post(event, form=True) == 204
+        await settle(server)
+        assert received == ["item1", "item1"]
+        assert server.stats == {"received": 2, "rejected": 1, "ignored": 1, "errors": 0}
+
+    async def test_disabled_without_secret(self):
+        webhook = EmbyWebhookServer(host="127.0.0.1", port=free_port(), secret="")
+        await webhook.start()
+        assert not webhook.enabled and webhook._runner is None
+
+    async def test_library_new_wakes_change_feed(self, db_session, server, emby, monkeypatch):
+        feed = EmbyChangeFeed(client=emby, interval=3600)
+        delivered = []
+
+        async def subscriber(bot, items):
+            delivered.extend(i["Id"] for i in items)
+
+        feed.subscribe("test", subscriber)
+        monkeypatch.setattr(emby_watch, "emby_feed", feed)
+        monkeypatch.setattr("emby.feed.TRIGGER_DEBOUNCE", 0)
+        server.on("library.new", emby_watch.on_emby_library_new)
+        await server.start()
+        feed.start(bot=None)
+        try:
+            await asyncio.sleep(0.05)
+            polls = feed.stats["polls"]
+            emby.items.append({"Id": "item7", "Type": "Movie",
+                               "DateCreated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.0000000Z")})
+            assert await emby.post({"Event": "library.new", "Item": {"Id": "item7"}}) == 204
+            for _ in range(100):
+                if delivered:
+                    break
+                await asyncio.sleep(0.01)
+            assert delivered == ["item7"]
+            assert feed.stats["polls"] == polls + 1
+        finally:
+            await feed.stop()
+
+    async def test_playback_stop_credits_watch_time(self, db_session, server, emby, monkeypatch):
+        monkeypatch.setattr(emby_watch, "emby_client", emby)
+        monkeypatch.setattr(emby_watch, "emby_directory", EmbyUserDirectory(client=emby))
+        monkeypatch.setattr(emby_watch, "_utc_now", lambda: NOW)
+        db_session.add(UserBinding(tg_id=1, emby_account="alice", points=0,
+                                   daily_watch_minutes=0, total_watch_minutes=0))
+        db_session.commit()
+        server.on("playback.stop", emby_watch.on_emby_playback_stop)
+        await server.start()
+
+        emby.plays.append((50, NOW - timedelta(minutes=5)))
+        event = {"Event": "playback.stop", "User": {"Name": "alice", "Id": "id-alice"},
+                 "Item": {"Id": "item1"}, "PlaybackInfo": {"PlayedToCompletion": True}}
+        assert await emby.post(event) == 204
+        await settle(server)
+        with get_session() as session:
+            user = session.get(UserBinding, 1)
+            assert (user.points, user.daily_watch_minutes) == (10, 50)
+
+        # 重复事件与随后的定时对账都不会重复结算
+        assert await emby.post(event) == 204
+        await settle(server)
+        await emby_watch.process_watch_rewards_job()
+        with get_session() as session:
+            assert session.get(UserBinding, 1).points == 10
+
+        # 没看完的播放不发请求
+        requests = emby.requests
+        event["PlaybackInfo"]["PlayedToCompletion"] = False
+        assert await emby.post(event) == 204
+        await settle(server)
+        assert emby.requests == requests
@@ -0,0 +1,82 @@
+"""
+公会成员与战力测试
+"""
+from database.models import Guild, UserBinding
+from database.repository import engine
+from database.guilds import (
+    set_attack, join_guild, leave_guild, get_guild_members,
+    calculate_guild_powers, calculate_guild_power, reconcile_guild_stats, migrate_legacy_guild_members,
+)
+
+
+def make_guild(session, **kwargs):
+    leader = UserBinding(tg_id=1, attack=100)
+    session.add(leader)
+    guild = Guild(name="测试公会", leader_id=1, member_count=1, total_power=100, **kwargs)
+    session.add(guild)
+    session.flush()
+    leader.guild_id = guild.id
+    session.commit()
+    return guild, leader
+
+
+class TestGuildPower:
+    """增量维护的公会战力"""
+
+    def test_join_attack_leave(self, db_session):
+        guild, leader = make_guild(db_session)
+        member = UserBinding(tg_id=2, attack=40)
+        db_session.add(member)
+        db_session.commit()
+
+        join_guild(member, guild, db_session)
+        db_session.commit()
+        assert (guild.total_power, guild.member_count) == (140, 2)
+
+        assert set_attack(member, 55, db_session) == 15
+        set_attack(leader, 90, db_session)
+        db_session.commit()
+        assert guild.total_power == 145
+        assert guild.total_power == calculate_guild_power(guild.id)
+
+        leave_guild(member, guild, db_session)
+        db_session.commit()
+        assert (guild.total_power, guild.member_count) == (90, 1)
+        assert [m.tg_id for m in get_guild_members(guild.id)] == [1]
+
+    def test_attack_without_guild(self, db_session):
+        user = UserBinding(tg_id=3, attack=10)
+        db_session.add(user)
+        db_session.commit()
+        assert set_attack(user, 12, db_session) == 2
+        assert user.attack == 12
+
+    def test_group_by_and_reconcile(self, db_session):
+        guild, _ = make_guild(db_session)
+        db_session.add_all([UserBinding(tg_id=i, attack=i, guild_id=guild.id) for i in range(10, 13)])
+        db_session.commit()
+
+        assert calculate_guild_powers() == {guild.id: {"power": 133, "members": 4}}
+        assert reconcile_guild_stats() == 1
+        assert reconcile_guild_stats() == 0
+        db_session.refresh(guild)
+        assert (guild.total_power, guild.member_count) == (133, 4)
+
+
+class TestLegacyMembers:
+    """Guild.members 逗号串迁移"""
+
+    def test_migrate_members_string(self, db_session):
+        db_session.add_all([UserBinding(tg_id=i, attack=10) for i in (1, 2, 3)])
+        guild = Guild(name="旧公会", leader_id=1, members="2,3")
+        db_session.add(guild)
+        db_session.commit()
+
+        with engine.begin() as conn:
+            assert migrate_legacy_guild_members(conn) == 3
+        with engine.begin() as conn:
+            assert migrate_legacy_guild_members(conn) == 0
+
+        assert len(get_guild_members(guild.id)) == 3
+        db_session.refresh(guild)
+        assert guild.members == ""
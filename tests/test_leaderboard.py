@@ -0,0 +1,128 @@
+"""
+内存排行榜测试
+"""
+import random
+import pytest
+from datetime import datetime
+from database.models import UserBinding
+from database.repository import get_session, SessionLocal
+from database.async_repository import get_async_session
+from database.ledger import bank_deposit
+from database.guilds import set_attack
+from database.counters import CounterStore
+from database.leaderboard import SortedKeys, Leaderboard, leaderboards, load_top_users
+
+
+class TestSortedKeys:
+    """分块有序列表与普通排序列表逐步对拍"""
+
+    def test_matches_sorted_list(self):
+        rng = random.Random(1)
+        keys = SortedKeys()
+        keys.LOAD = 8  # 小块，频繁触发分裂与删空
+        expected = []
+        for _ in range(3000):
+            key = rng.randrange(500)
+            if key in expected and rng.random() < 0.5:
+                expected.remove(key)
+                keys.remove(key)
+            elif key not in expected:
+                expected.append(key)
+                keys.add(key)
+            expected.sort()
+            assert len(keys) == len(expected)
+        for i, key in enumerate(expected):
+            assert keys.index(key) == i
+        assert keys.slice(0, len(expected)) == expected
+        assert keys.slice(17, 42) == expected[17:42]
+
+    def test_missing_key(self):
+        keys = SortedKeys([1, 3])
+        with pytest.raises(KeyError):
+            keys.remove(2)
+
+
+class TestLeaderboard:
+
+    def test_rank_top_around(self):
+        board = Leaderboard("attack")
+        board.load({1: 50, 2: 80, 3: 80, 4: 10, 5: 0})
+        assert board.top(3) == [(2, 80), (3, 80), (1, 50)]   # 同分按 tg_id
+        assert board.rank_of(4) == 4
+        assert board.rank_of(5) is None                       # 0 分不上榜
+        assert board.around(1, 1) == [(2, 3, 80), (3, 1, 50), (4, 4, 10)]
+
+        board.update(4, 100)
+        assert board.rank_of(4) == 1
+        board.update(2, 0)
+        assert 2 not in board and board.rank_of(3) == 2
+
+
+class TestLeaderboardService:
+
+    def _seed(self, db_session):
+        db_session.add_all([
+            UserBinding(tg_id=1, emby_account="alice", attack=300, bank_points=10),
+            UserBinding(tg_id=2, emby_account="bob", attack=500),
+            UserBinding(tg_id=3, emby_account=None, attack=900),          # 未绑定不上榜
+            UserBinding(tg_id=4, emby_account="dave", daily_presence_points=30),
+        ])
+        db_session.commit()
+
+    def test_warm(self, db_session):
+        self._seed(db_session)
+        assert leaderboards.top("attack", 10) == [(2, 500), (1, 300)]
+        assert leaderboards.rank_of("attack", 3) is None
+        assert leaderboards.top("daily_presence_points", 10) == [(4, 30)]
+        assert [row.emby_account for row in load_top_users("attack", 10)] == ["bob", "alice"]
+
+    def test_orm_commit_updates_rank(self, db_session):
+        self._seed(db_session)
+        assert leaderboards.rank_of("attack", 1) == 2
+
+        with get_session() as session:
+            user = session.query(UserBinding).filter_by(tg_id=1).first()
+            set_attack(user, 800, session)
+        assert leaderboards.rank_of("attack", 1) == 1
+
+        # 回滚的修改不生效
+        session = SessionLocal()
+        session.query(UserBinding).filter_by(tg_id=1).first().attack = 1
+        session.flush()
+        session.rollback()
+        session.close()
+        assert leaderboards.score_of("attack", 1) == 800
+
+    def test_bind_and_unbind(self, db_session):
+        self._seed(db_session)
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=3).first().emby_account = "carol"
+        assert leaderboards.rank_of("attack", 3) == 1
+
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=3).first().emby_account = None
+        assert leaderboards.rank_of("attack", 3) is None
+
+    def test_ledger_bank_transfer(self, db_session):
+        self._seed(db_session)
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=2).first().points = 1000
+        assert leaderboards.top("bank_points", 1) == [(1, 10)]
+        bank_deposit(2, 200)
+        assert leaderboards.top("bank_points", 1) == [(2, 200)]
+
+
+@pytest.mark.asyncio
+async def test_counter_flush_updates_presence(async_db):
+    async with get_async_session() as session:
+        session.add(UserBinding(tg_id=1, emby_account="alice", last_active_time=datetime.now()))
+
+    # 异步内存库与同步库相互独立，这里用异步会话预热
+    assert await leaderboards.warm_async() == 1
+    assert leaderboards.size("daily_presence_points") == 0
+
+    store = CounterStore(flush_interval=3600)
+    entry = await store.get(1)
+    entry.add_presence(5, datetime.now(), 3600)
+    await store.flush()
+    assert leaderboards.top("daily_presence_points", 5) == [(1, 5)]
@@ -0,0 +1,143 @@
+"""
+MP 账本测试
+"""
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database.models import Base, UserBinding
+from database.repository import apply_sqlite_pragmas
+from database.ledger import (
+    credit, credit_many, debit_if_sufficient, transfer, get_balance, bank_deposit, bank_withdraw,
+    credit_async, debit_if_sufficient_async, transfer_async,
+)
+
+
+@pytest.fixture
+def accounts(db_session):
+    db_session.add_all([
+        UserBinding(tg_id=1, emby_account="alice", points=100, bank_points=0),
+        UserBinding(tg_id=2, emby_account="bob", points=10, bank_points=50),
+    ])
+    db_session.commit()
+    return db_session
+
+
+class TestLedger:
+    """同步接口"""
+
+    def test_credit(self, accounts):
+        assert credit(1, 25, "测试") == 125
+        assert get_balance(1) == 125
+
+    def test_credit_unknown_user(self, accounts):
+        assert credit(999, 10) is None
+
+    def test_negative_amount_rejected(self, accounts):
+        with pytest.raises(ValueError):
+            credit(1, -5)
+
+    def test_debit_if_sufficient(self, accounts):
+        assert debit_if_sufficient(1, 60) == 40
+        assert debit_if_sufficient(1, 60) is None
+        assert get_balance(1) == 40
+
+    def test_transfer_with_fee(self, accounts):
+        assert transfer(1, 2, 100, fee=5) == (0, 105)
+
+    def test_transfer_insufficient_changes_nothing(self, accounts):
+        assert transfer(2, 1, 50) is None
+        assert get_balance(1) == 100
+        assert get_balance(2) == 10
+
+    def test_transfer_to_missing_user_is_compensated(self, accounts):
+        assert transfer(1, 999, 30) is None
+        assert transfer(999, 1, 30) is None
+        assert get_balance(1) == 100
+
+    def test_session_objects_stay_in_sync(self, accounts):
+        """在调用方会话内执行时，已加载对象的余额同步更新，后续 ORM 提交不会覆盖"""
+        user = accounts.query(UserBinding).filter_by(tg_id=1).first()
+        credit(1, 50, session=accounts)
+        assert user.points == 150
+        user.points += 1
+        accounts.commit()
+        assert get_balance(1) == 151
+
+    def test_credit_many(self, accounts):
+        assert credit_many({1: 5, 2: 7, 999: 3}, "批量") == 2
+        assert (get_balance(1), get_balance(2)) == (105, 17)
+        assert credit_many({}) == 0
+
+    def test_credit_many_expires_loaded_balances(self, accounts):
+        user = accounts.query(UserBinding).filter_by(tg_id=1).first()
+        user.daily_watch_minutes = 30
+        credit_many({1: 10}, session=accounts)
+        accounts.commit()
+        assert user.points == 110
+        assert user.daily_watch_minutes == 30
+
+    def test_bank_moves(self, accounts):
+        assert bank_deposit(1, 40) == (60, 40)
+        assert bank_deposit(1, 100) is None
+        assert bank_withdraw(2, 50, fee=2, bonus=3) == (61, 0)
+        assert bank_withdraw(2, 1) is None
+
+
+@pytest_asyncio.fixture
+async def file_engine(tmp_path):
+    """文件库 + 连接池，让并发任务真正使用不同连接竞争同一行"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'ledger.db'}",
+        connect_args={"timeout": 30},
+    )
+    event.listen(engine.sync_engine, "connect", lambda conn, rec: apply_sqlite_pragmas(conn, "balanced"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with sessions() as s:
+        s.add_all([UserBinding(tg_id=1, points=1000), UserBinding(tg_id=2, points=0)])
+        await s.commit()
+    try:
+        yield sessions
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+class TestLedgerConcurrency:
+    """并发压测同一账户"""
+
+    async def run(self, sessions, op):
+        async with sessions() as s:
+            result = await op(s)
+            await s.commit()
+            return result
+
+    async def test_concurrent_credits_not_lost(self, file_engine):
+        await asyncio.gather(*(
+            self.run(file_engine, lambda s: credit_async(1, 3, session=s)) for _ in range(60)
+        ))
+        async with file_engine() as s:
+            points = (await s.execute(UserBinding.__table__.select().where(UserBinding.tg_id == 1))).first().points
+        assert points == 1180
+
+    async def test_concurrent_debits_never_overdraw(self, file_engine):
+        results = await asyncio.gather(*(
+            self.run(file_engine, lambda s: debit_if_sufficient_async(1, 30, session=s)) for _ in range(60)
+        ))
+        succeeded = [r for r in results if r is not None]
+        assert len(succeeded) == 1000 // 30
+        async with file_engine() as s:
+            points = (await s.execute(UserBinding.__table__.select().where(UserBinding.tg_id == 1))).first().points
+        assert points == 1000 - 30 * len(succeeded)
+
+    async def test_concurrent_transfers_conserve_total(self, file_engine):
+        ops = [lambda s: transfer_async(1, 2, 7, fee=0, session=s) for _ in range(40)]
+        ops += [lambda s: transfer_async(2, 1, 3, fee=0, session=s) for _ in range(40)]
+        await asyncio.gather(*(self.run(file_engine, op) for op in ops))
+        async with file_engine() as s:
+            rows = (await s.execute(UserBinding.__table__.select())).all()
+        assert sum(r.points for r in rows) == 1000
+        assert all(r.points >= 0 for r in rows)
@@ -0,0 +1,151 @@
+"""
+版本化迁移测试（每个测试使用独立的临时 SQLite 文件库）
+"""
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from database.models import Base
+from database.migrate import (
+    upgrade, current_version, head_version, ensure_schema, discover_migrations, SchemaOutdatedError
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    yield eng
+    eng.dispose()
+
+
+def make_legacy_db(engine):
+    """迁移系统之前的旧库：bindings 只有部分列，数据还在逗号串列里"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE bindings (tg_id BIGINT PRIMARY KEY, emby_account VARCHAR, attack INTEGER, "
+            "guild_id INTEGER, achievements TEXT, owned_frames TEXT, weapon_collection TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE guilds (id INTEGER PRIMARY KEY, name VARCHAR, leader_id BIGINT, "
+            "members TEXT, total_power INTEGER, member_count INTEGER)"
+        ))
+        conn.execute(text(
+            "INSERT INTO bindings VALUES (1, 'alice', 120, NULL, 'first_blood,rich', 'gold', '圣剑,圣剑'), "
+            "(2, 'bob', 30, NULL, '', '', '')"
+        ))
+        conn.execute(text("INSERT INTO guilds VALUES (7, '星之公会', 1, '1,2', 0, 0)"))
+
+
+class TestMigrate:
+
+    def test_fresh_database_is_stamped(self, engine):
+        assert current_version(engine) is None
+        assert upgrade(engine) == []
+        assert current_version(engine) == head_version()
+        assert inspect(engine).has_table("bindings")
+        # 再次执行没有待执行迁移
+        assert upgrade(engine) == []
+
+    def test_legacy_database_runs_all_migrations(self, engine):
+        make_legacy_db(engine)
+        applied = upgrade(engine)
+        assert applied == [m.name for m in discover_migrations()]
+        assert current_version(engine) == head_version()
+
+        columns = {c["name"] for c in inspect(engine).get_columns("bindings")}
+        assert {"last_chest_open", "total_watch_minutes", "equipped_theme"} <= columns
+        assert "idx_attack" in {i["name"] for i in inspect(engine).get_indexes("bindings")}
+
+        with engine.connect() as conn:
+            achievements = conn.execute(text("SELECT achievement_id FROM user_achievements WHERE tg_id = 1")).scalars()
+            assert set(achievements) == {"first_blood", "rich"}
+            assert conn.execute(text("SELECT count FROM user_weapons WHERE tg_id = 1")).scalar() == 2
+            assert conn.execute(text("SELECT guild_id FROM bindings ORDER BY tg_id")).scalars().all() == [7, 7]
+            assert conn.execute(text("SELECT total_power, member_count FROM guilds")).one() == (150, 2)
+            # 新加的列带常量默认值，旧行读到的是默认值而不是 NULL
+            assert conn.execute(text("SELECT total_watch_minutes FROM bindings WHERE tg_id = 2")).scalar() == 0
+
+    def test_migration_version_pins_schema(self, engine):
+        # 迁移到 3 得到的是当时的结构，不会因模型后来新增的列 / 表而改变
+        make_legacy_db(engine)
+        upgrade(engine, target=3)
+        assert current_version(engine) == 3
+        columns = {c["name"] for c in inspect(engine).get_columns("bindings")}
+        assert "equipped_theme" in columns
+        assert not {"watch_ingested_at", "bot_blocked_at"} & columns
+        assert not inspect(engine).has_table("emby_items")
+        assert not inspect(engine).has_table("pending_deletions")
+
+    def test_legacy_upgrade_matches_models(self, engine):
+        make_legacy_db(engine)
+        upgrade(engine)
+        db = inspect(engine)
+        for table in Base.metadata.sorted_tables:
+            assert {c["name"] for c in db.get_columns(table.name)} == {c.name for c in table.columns}, table.name
+            assert {i.name for i in table.indexes} <= {i["name"] for i in db.get_indexes(table.name)}, table.name
+
+    def test_migrations_are_rerunnable(self, engine):
+        make_legacy_db(engine)
+        upgrade(engine)
+        for migration in discover_migrations():
+            with engine.begin() as conn:
+                migration.module.upgrade(conn)
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM user_achievements")).scalar() == 2
+
+    def test_legacy_red_packet_claims_are_imported(self, engine):
+        make_legacy_db(engine)
+        upgrade(engine, target=8)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO red_packets (id, total_amount, total_count, remaining_amount, remaining_count, claimed_by) "
+                "VALUES ('p1', 30, 3, 5, 1, '{\"1\": 10, \"2\": 15}'), ('p2', 10, 1, 10, 1, '')"
+            ))
+        upgrade(engine)
+        [migration] = [m for m in discover_migrations() if m.name.endswith("red_packet_claims")]
+        with engine.begin() as conn:
+            migration.module.upgrade(conn)
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT packet_id, tg_id, amount FROM red_packet_claims ORDER BY tg_id")).all()
+        assert [tuple(r) for r in rows] == [("p1", 1, 10), ("p1", 2, 15)]
+
+    def test_weekly_challenge_week_backfilled_from_task_date(self, engine):
+        make_legacy_db(engine)
+        upgrade(engine, target=9)
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE bindings SET task_date = '2026-10-15 21:30:00.000000' WHERE tg_id = 1"))
+        upgrade(engine)
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT tg_id, weekly_challenge_week FROM bindings ORDER BY tg_id")).all()
+        assert [tuple(r) for r in rows] == [(1, "2026-10-12 00:00:00.000000"), (2, None)]
+
+    def test_legacy_pushed_items_are_imported(self, engine, tmp_path, monkeypatch):
+        legacy = tmp_path / "pushed_emby_items.txt"
+        legacy.write_text("a1\nb2\n\na1\n")
+        [migration] = [m for m in discover_migrations() if m.name.endswith("emby_seen_items")]
+        monkeypatch.setattr(migration.module, "LEGACY_PUSHED_FILE", str(legacy))
+        make_legacy_db(engine)
+        upgrade(engine)
+        with engine.begin() as conn:
+            migration.module.upgrade(conn)
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT kind, item_id FROM emby_seen_items ORDER BY item_id")).all()
+        assert [tuple(r) for r in rows] == [("push", "a1"), ("push", "b2")]
+
+
+class TestEnsureSchema:
+
+    def test_up_to_date_reads_one_row(self, engine):
+        upgrade(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        assert ensure_schema(engine, auto_migrate=False) == head_version()
+        assert len(statements) == 1 and "schema_version" in statements[0]
+
+    def test_outdated_without_auto_migrate(self, engine):
+        make_legacy_db(engine)
+        with pytest.raises(SchemaOutdatedError):
+            ensure_schema(engine, auto_migrate=False)
+
+    def test_outdated_with_auto_migrate(self, engine):
+        make_legacy_db(engine)
+        assert ensure_schema(engine, auto_migrate=True) == head_version()
+        assert current_version(engine) == head_version()
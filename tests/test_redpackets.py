@@ -0,0 +1,67 @@
+"""
+红包领取测试：并发抢同一个红包时名额与金额不会被重复领取
+"""
+import asyncio
+import pytest
+from database.models import RedPacket, UserBinding
+from database.async_repository import get_async_session
+from database.ledger import credit_async
+from database.redpackets import claim_red_packet_async, list_claims_async, get_red_packet_async, pick_amount
+
+
+async def make_packet(amount=100, count=5, users=10):
+    async with get_async_session() as session:
+        session.add(RedPacket(id="p1", sender_id=1, chat_id=-100, total_amount=amount, total_count=count,
+                              remaining_amount=amount, remaining_count=count))
+        session.add_all([UserBinding(tg_id=100 + i, emby_account=f"u{i}", points=0) for i in range(users)])
+
+
+async def grab(tg_id):
+    async with get_async_session() as session:
+        result = await claim_red_packet_async("p1", tg_id, session)
+        if result.status == "ok":
+            await credit_async(tg_id, result.amount, "抢红包", session=session)
+        return result
+
+
+def test_pick_amount_leaves_one_per_packet():
+    for _ in range(200):
+        amount = pick_amount(10, 4)
+        assert 1 <= amount <= 7
+    assert pick_amount(9, 1) == 9
+
+
+@pytest.mark.asyncio
+class TestClaimRedPacket:
+
+    async def test_concurrent_grabs_split_exactly(self, async_db):
+        await make_packet(amount=100, count=5, users=10)
+        results = await asyncio.gather(*(grab(100 + i) for i in range(10)))
+
+        assert sorted(r.status for r in results) == ["empty"] * 5 + ["ok"] * 5
+        assert sum(r.amount for r in results if r.status == "ok") == 100
+        async with get_async_session() as session:
+            packet = await get_red_packet_async("p1", session)
+            assert (packet.remaining_count, packet.remaining_amount) == (0, 0)
+            claims = await list_claims_async("p1", session)
+            assert len(claims) == 5 and sum(amount for _, amount in claims) == 100
+            assert all(amount >= 1 for _, amount in claims)
+            total = 0
+            for i in range(10):
+                total += (await session.get(UserBinding, 100 + i)).points
+            assert total == 100
+
+    async def test_same_user_claims_once(self, async_db):
+        await make_packet()
+        first, second = await asyncio.gather(grab(100), grab(100))
+
+        assert sorted([first.status, second.status]) == ["claimed", "ok"]
+        assert first.amount == second.amount
+        async with get_async_session() as session:
+            assert len(await list_claims_async("p1", session)) == 1
+            assert (await get_red_packet_async("p1", session)).remaining_count == 4
+            assert (await session.get(UserBinding, 100)).points == first.amount
+
+    async def test_missing_packet(self, async_db):
+        async with get_async_session() as session:
+            assert (await claim_red_packet_async("nope", 100, session)).status == "missing"
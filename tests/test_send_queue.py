@@ -0,0 +1,204 @@
+"""
+出站消息发送队列测试（按 Telegram 规则限速的假 Bot，速率按比例放大以缩短测试时间）
+"""
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from collections import defaultdict, deque
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+from messaging import SendQueue, TokenBucket, INTERACTIVE, NORMAL, BROADCAST
+from messaging import outbound
+
+GLOBAL_RATE = 200
+PRIVATE_RATE = 50
+JITTER = 5          # 事件循环调度抖动：发送协程晚醒几毫秒，1 秒滑动窗口里就可能多数到一两条
+
+
+class LimitedBot:
+    """超过全局 / 单聊天速率就抛 RetryAfter，模拟 Telegram 的 flood 控制"""
+
+    def __init__(self, global_rate=GLOBAL_RATE, chat_rate=PRIVATE_RATE, chat_burst=outbound.PRIVATE_BURST):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.window = deque()
+        self.chat_windows = defaultdict(deque)
+        self.delivered = []
+        self.flood_errors = 0
+        self.fail_chats = {}
+
+    @staticmethod
+    def _count(window, now):
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+        return len(window)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(0.001)
+        if chat_id in self.fail_chats:
+            raise self.fail_chats[chat_id]
+        now = time.monotonic()
+        if self._count(self.window, now) >= self.global_rate + JITTER or \
+                self._count(self.chat_windows[chat_id], now) >= self.chat_rate + self.chat_burst:
+            self.flood_errors += 1
+            raise RetryAfter(1)
+        self.window.append(now)
+        self.chat_windows[chat_id].append(now)
+        self.delivered.append((chat_id, text))
+        return (chat_id, text)
+
+
+@pytest_asyncio.fixture
+async def queue():
+    q = SendQueue(rate=GLOBAL_RATE, concurrency=8, private_rate=PRIVATE_RATE, group_rate=10)
+    q.start()
+    yield q
+    await q.stop(timeout=0)
+
+
+def send(bot, chat_id, text):
+    return lambda: bot.send_message(chat_id, text)
+
+
+@pytest.mark.asyncio
+class TestSendQueue:
+
+    async def test_broadcast_stays_within_global_limit(self, queue):
+        bot = LimitedBot()
+        started = time.monotonic()
+        results = await asyncio.gather(*(
+            queue.submit(chat_id, send(bot, chat_id, "hi"), lane=BROADCAST) for chat_id in range(1, 401)
+        ))
+        elapsed = time.monotonic() - started
+        assert len(results) == 400 and bot.flood_errors == 0
+        assert 400 / elapsed <= GLOBAL_RATE * 1.1
+        assert elapsed < 400 / GLOBAL_RATE + 1
+
+    async def test_one_chat_does_not_block_others(self, queue):
+        bot = LimitedBot()
+        busy = [queue.submit(1, send(bot, 1, f"m{i}")) for i in range(30)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await queue.submit(2, send(bot, 2, "other"))
+        assert time.monotonic() - started < 0.1
+
+        await asyncio.gather(*busy)
+        assert [text for chat, text in bot.delivered if chat == 1] == [f"m{i}" for i in range(30)]
+        assert bot.flood_errors == 0
+
+    async def test_interactive_lane_goes_first(self):
+        q = SendQueue(rate=100, concurrency=1, private_rate=100, group_rate=100)
+        q.start()
+        try:
+            bot = LimitedBot(global_rate=1000, chat_rate=1000)
+            broadcast = [q.submit(chat_id, send(bot, chat_id, "b"), lane=BROADCAST) for chat_id in range(1, 51)]
+            await asyncio.sleep(0.05)
+            await q.submit(999, send(bot, 999, "reply"), lane=INTERACTIVE)
+            position = bot.delivered.index((999, "reply"))
+            assert position < 15
+            await asyncio.gather(*broadcast)
+        finally:
+            await q.stop(timeout=0)
+
+    async def test_retry_after_is_honored(self, queue):
+        bot = LimitedBot()
+        calls = {"n": 0}
+
+        async def flaky():
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RetryAfter(1)
+            return await bot.send_message(5, "late")
+
+        started = time.monotonic()
+        assert await queue.submit(5, flaky) == (5, "late")
+        assert time.monotonic() - started >= 0.9
+        assert queue.stats["flood_waits"] == 1 and queue.stats["retried"] == 1
+
+    async def test_errors_are_reported(self, queue):
+        bot = LimitedBot()
+        bot.fail_chats = {1: Forbidden("bot was blocked by the user"), 2: BadRequest("Chat not found")}
+        results = await asyncio.gather(*(queue.submit(c, send(bot, c, "x")) for c in (1, 2, 3)),
+                                       return_exceptions=True)
+        assert isinstance(results[0], Forbidden) and isinstance(results[1], BadRequest)
+        assert results[2] == (3, "x")
+        assert queue.stats["failed"] == 2 and queue.stats["retried"] == 0
+
+    async def test_network_errors_are_retried(self, queue, monkeypatch):
+        monkeypatch.setattr(outbound, "NETWORK_BACKOFF", 0.01)
+        attempts = []
+
+        async def timeout():
+            attempts.append(1)
+            raise TimedOut()
+
+        with pytest.raises(TimedOut):
+            await queue.submit(1, timeout)
+        assert len(attempts) == outbound.MAX_ATTEMPTS
+
+    async def test_not_running_sends_directly(self):
+        q = SendQueue(rate=1, concurrency=1)
+        bot = LimitedBot()
+        assert await q.submit(1, send(bot, 1, "now"), lane=NORMAL) == (1, "now")
+
+    async def test_withdraw_spares_in_flight(self):
+        q = SendQueue(rate=1000, concurrency=1, private_rate=1000, group_rate=1000)
+        q.start()
+        try:
+            started = asyncio.Event()
+
+            async def slow():
+                started.set()
+                await asyncio.sleep(0.05)
+                return "sent"
+
+            first = q.submit(1, slow)
+            rest = [q.submit(chat_id, slow) for chat_id in (2, 3)]
+            await started.wait()
+            assert q.withdraw([first] + rest) == [first]
+            assert all(f.cancelled() for f in rest)
+            assert await first == "sent"
+        finally:
+            await q.stop(timeout=0)
+
+    async def test_stop_cancels_unsent(self):
+        q = SendQueue(rate=1, concurrency=1)
+        q.start()
+        bot = LimitedBot()
+        futures = [q.submit(chat_id, send(bot, chat_id, "x")) for chat_id in range(1, 6)]
+        await asyncio.sleep(0.01)
+        await q.stop(timeout=0)
+        assert all(f.done() for f in futures)
+        assert sum(f.cancelled() for f in futures) >= 3
+
+
+class TestChatBuckets:
+
+    def test_refilled_buckets_are_pruned_periodically(self, monkeypatch):
+        monkeypatch.setattr(outbound, "MAX_CHAT_BUCKETS", 5)
+        q = SendQueue(rate=100, concurrency=1, private_rate=1000)
+        for chat_id in range(10):
+            q._chat_bucket(chat_id).reserve()
+        # 第一次超限时扫描：刚预约过的桶还没回满，保留
+        assert len(q._chats) == 10
+        time.sleep(0.01)
+        q._chat_bucket(10)
+        assert len(q._chats) == 11          # 扫描间隔内不再扫描
+        monkeypatch.setattr(q, "_next_prune", 0.0)
+        q._chat_bucket(11)
+        assert set(q._chats) == {11}
+
+
+class TestTokenBucket:
+
+    def test_reservations_queue_up(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        assert bucket.reserve(now=bucket.updated) == 0
+        assert bucket.reserve(now=bucket.updated) == pytest.approx(0.5)
+        assert bucket.reserve(now=bucket.updated) == pytest.approx(1.0)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.pause(3, now=bucket.updated)
+        assert bucket.reserve(now=bucket.updated) == pytest.approx(3.1)
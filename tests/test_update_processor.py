@@ -0,0 +1,117 @@
+"""
+入站更新调度测试：同一用户串行、不同用户并行
+"""
+import asyncio
+from datetime import datetime
+import pytest
+from telegram import Chat, Message, Update, User
+from messaging import OrderedUpdateProcessor
+from messaging.updates import update_key
+
+GROUP = Chat(id=-100, type=Chat.SUPERGROUP)
+_ids = iter(range(1, 100000))
+
+
+def make_update(user_id=None, chat=GROUP) -> Update:
+    user = User(id=user_id, first_name=f"u{user_id}", is_bot=False) if user_id is not None else None
+    update_id = next(_ids)
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, from_user=user, text="hi")
+    if chat.type == Chat.CHANNEL:
+        return Update(update_id, channel_post=message)
+    return Update(update_id, message=message)
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.peak = 0
+
+    async def handle(self, name, delay):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.events.append(("start", name))
+        await asyncio.sleep(delay)
+        self.events.append(("end", name))
+        self.running -= 1
+
+
+async def dispatch(processor, updates_and_work):
+    """像 Application 一样为每条更新创建任务并交给处理器"""
+    tasks = [asyncio.create_task(processor.process_update(update, work))
+             for update, work in updates_and_work]
+    await asyncio.gather(*tasks)
+
+
+def test_update_key():
+    assert update_key(make_update(7)) == 7
+    assert update_key(make_update(7, chat=Chat(id=7, type=Chat.PRIVATE))) == 7
+    assert update_key(make_update(None, chat=Chat(id=-200, type=Chat.CHANNEL))) == -200
+    assert update_key(Update(1)) is None
+    assert update_key("not an update") is None
+
+
+@pytest.mark.asyncio
+class TestOrderedUpdateProcessor:
+
+    async def test_same_user_is_serialized_in_order(self):
+        processor = OrderedUpdateProcessor(concurrency=8)
+        rec = Recorder()
+        work = [(make_update(1), rec.handle(i, 0.03 if i == 0 else 0.001)) for i in range(5)]
+        await dispatch(processor, work)
+        assert rec.events == [(kind, i) for i in range(5) for kind in ("start", "end")]
+        assert processor._tails == {}
+
+    async def test_slow_user_does_not_block_others(self):
+        processor = OrderedUpdateProcessor(concurrency=8)
+        rec = Recorder()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        finished = {}
+
+        async def timed(name, delay):
+            await rec.handle(name, delay)
+            finished[name] = loop.time() - start
+
+        work = [(make_update(1), timed("slow", 0.3))]
+        work += [(make_update(100 + i), timed(i, 0.01)) for i in range(10)]
+        await dispatch(processor, work)
+        assert all(finished[i] < 0.15 for i in range(10))
+        assert finished["slow"] >= 0.3
+
+    async def test_concurrency_limit(self):
+        processor = OrderedUpdateProcessor(concurrency=3)
+        rec = Recorder()
+        await dispatch(processor, [(make_update(i), rec.handle(i, 0.02)) for i in range(10)])
+        assert rec.peak == 3
+
+    async def test_queued_updates_do_not_take_slots(self):
+        # 同一用户连发的 20 条在排队，不影响其他用户拿到并发名额
+        processor = OrderedUpdateProcessor(concurrency=2)
+        rec = Recorder()
+        work = [(make_update(1), rec.handle(("a", i), 0.02)) for i in range(20)]
+        work.append((make_update(2), rec.handle("b", 0.01)))
+        await dispatch(processor, work)
+        assert rec.events.index(("end", "b")) < rec.events.index(("start", ("a", 2)))
+        assert processor.stats["queued"] == 19
+
+    async def test_errors_and_cancellation_release_the_key(self):
+        processor = OrderedUpdateProcessor(concurrency=4)
+        rec = Recorder()
+
+        async def boom():
+            raise ValueError("handler failed")
+
+        await dispatch(processor, [(make_update(1), boom()), (make_update(1), rec.handle("next", 0))])
+        assert rec.events == [("start", "next"), ("end", "next")]
+        assert processor.stats["errors"] == 1
+
+        blocker = asyncio.create_task(processor.process_update(make_update(1), asyncio.sleep(0.05)))
+        waiter = asyncio.create_task(processor.process_update(make_update(1), rec.handle("cancelled", 0)))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await processor.process_update(make_update(1), rec.handle("after", 0))
+        # 排队中的更新被取消，后面的更新仍等前面的处理完
+        assert blocker.done()
+        assert ("start", "cancelled") not in rec.events and ("end", "after") in rec.events
+        assert processor._tails == {}
@@ -0,0 +1,96 @@
+"""
+用户快照缓存测试
+"""
+import pytest
+from sqlalchemy import event
+from database.models import UserBinding
+from database.repository import engine, get_session
+from database.async_repository import get_async_session, get_user_async
+from database.user_cache import UserSnapshotCache, user_cache, get_user_snapshot, get_user_snapshot_async
+
+
+@pytest.fixture
+def statements():
+    """记录同步引擎执行的 SQL 条数"""
+    executed = []
+    listener = lambda *args: executed.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    yield executed
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+class TestUserSnapshotCache:
+    """快照读取与失效"""
+
+    def test_hit_has_no_round_trip(self, db_session, statements):
+        db_session.add(UserBinding(tg_id=1, emby_account="alice", is_vip=True))
+        db_session.commit()
+
+        snap = get_user_snapshot(1)
+        assert snap.is_bound and snap.is_vip and snap.emby_account == "alice"
+
+        statements.clear()
+        hits = user_cache.stats["hits"]
+        assert get_user_snapshot(1) == snap
+        assert statements == []
+        assert user_cache.stats["hits"] == hits + 1
+
+    def test_missing_user_cached(self, db_session, statements):
+        assert get_user_snapshot(404) is None
+        statements.clear()
+        assert get_user_snapshot(404) is None
+        assert statements == []
+
+    def test_orm_write_invalidates(self, db_session):
+        db_session.add(UserBinding(tg_id=1))
+        db_session.commit()
+        assert not get_user_snapshot(1).is_bound
+
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=1).first().emby_account = "alice"
+        assert get_user_snapshot(1).is_bound
+
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=1).first().is_vip = True
+        assert get_user_snapshot(1).is_vip
+
+    def test_new_user_invalidates_negative_entry(self, db_session):
+        assert get_user_snapshot(2) is None
+        db_session.add(UserBinding(tg_id=2, emby_account="bob"))
+        db_session.commit()
+        assert get_user_snapshot(2).emby_account == "bob"
+
+    def test_unrelated_write_keeps_entry(self, db_session):
+        db_session.add(UserBinding(tg_id=1, emby_account="alice"))
+        db_session.commit()
+        get_user_snapshot(1)
+
+        invalidations = user_cache.stats["invalidations"]
+        with get_session() as session:
+            session.query(UserBinding).filter_by(tg_id=1).first().points = 10
+        assert user_cache.stats["invalidations"] == invalidations
+
+    def test_lru_and_ttl(self):
+        cache = UserSnapshotCache(maxsize=2, ttl=3600)
+        for tg_id in (1, 2, 3):
+            cache.store(tg_id, None)
+        assert len(cache) == 2
+        assert cache.stats["evictions"] == 1
+
+        expired = UserSnapshotCache(maxsize=10, ttl=0)
+        expired.store(1, None)
+        expired.lookup(1)
+        assert expired.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+class TestUserSnapshotCacheAsync:
+
+    async def test_async_write_invalidates(self, async_db):
+        async with get_async_session() as session:
+            session.add(UserBinding(tg_id=1, emby_account="alice"))
+        assert (await get_user_snapshot_async(1)).is_vip is False
+
+        async with get_async_session() as session:
+            (await get_user_async(1, session)).is_vip = True
+        assert (await get_user_snapshot_async(1)).is_vip is True
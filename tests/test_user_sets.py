@@ -0,0 +1,67 @@
+"""
+用户集合表测试
+"""
+from database.models import UserBinding, UserAchievement
+from database.repository import engine
+from database.user_sets import (
+    get_user_set, user_set_contains, user_set_members, add_to_user_set, count_set_holders,
+    add_weapon, get_weapon_counts, migrate_legacy_set_columns,
+)
+
+
+class TestUserSets:
+    """集合读写"""
+
+    def test_add_and_contains(self, db_session):
+        assert add_to_user_set(1, "achievement", ["duel_1", "power_100"], db_session) == {"duel_1", "power_100"}
+        # 已存在的成员跳过，只返回新加入的
+        assert add_to_user_set(1, "achievement", ["duel_1", "checkin_7"], db_session) == {"checkin_7"}
+        db_session.commit()
+
+        assert get_user_set(1, "achievement") == {"duel_1", "power_100", "checkin_7"}
+        assert user_set_contains(1, "achievement", "duel_1")
+        assert not user_set_contains(1, "watch_achievement", "duel_1")
+        assert user_set_members(1, "achievement", ["duel_1", "duel_10"]) == {"duel_1"}
+
+    def test_count_holders(self, db_session):
+        for tg_id in (1, 2, 3):
+            add_to_user_set(tg_id, "title", ["novice"] + (["legend"] if tg_id > 1 else []), db_session)
+        db_session.commit()
+        assert count_set_holders("title", "legend") == 2
+        assert count_set_holders("frame", "legend") == 0
+
+    def test_weapon_counts(self, db_session):
+        assert add_weapon(1, "传说的圣剑", db_session) == 1
+        assert add_weapon(1, "传说的圣剑", db_session) == 2
+        add_weapon(1, "神话·终焉之刃", db_session)
+        db_session.commit()
+        assert get_weapon_counts(1) == {"传说的圣剑": 2, "神话·终焉之刃": 1}
+
+
+class TestLegacyMigration:
+    """逗号串列迁移"""
+
+    def test_migrate_is_idempotent(self, db_session):
+        db_session.add_all([
+            UserBinding(tg_id=1, achievements="duel_1,power_100,", owned_frames="default,gold",
+                        presence_levels_claimed="1,2", weapon_collection="圣剑,圣剑,魔杖"),
+            UserBinding(tg_id=2, watch_achievements="watch_100", claimed_early_bird_items="abc"),
+            UserBinding(tg_id=3),
+        ])
+        db_session.commit()
+
+        with engine.begin() as conn:
+            counts = migrate_legacy_set_columns(conn, batch_size=1)
+        assert counts["achievement"] == 2
+        assert counts["weapon"] == 2
+
+        with engine.begin() as conn:
+            migrate_legacy_set_columns(conn)
+
+        assert get_user_set(1, "achievement") == {"duel_1", "power_100"}
+        assert get_user_set(1, "frame") == {"default", "gold"}
+        assert get_user_set(1, "presence_level") == {"1", "2"}
+        assert get_user_set(2, "watch_achievement") == {"watch_100"}
+        assert user_set_contains(2, "early_bird", "abc")
+        assert get_weapon_counts(1) == {"圣剑": 2, "魔杖": 1}
+        assert db_session.query(UserAchievement).count() == 3
@@ -0,0 +1,162 @@
+"""
+观影奖励增量采集测试（假 Emby 客户端 + 内存库）
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from database import UserBinding, get_session
+from emby import EmbyUserDirectory, EmbyError, parse_emby_date
+from plugins import emby_watch
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+class FakeEmby:
+    """按 MinDatePlayed 过滤播放记录，并记录同时在途的请求数"""
+
+    configured = True
+
+    def __init__(self):
+        self.plays = {}          # emby_user_id -> [(分钟, 播放时间)]
+        self.failing = set()
+        self.active = 0
+        self.max_active = 0
+        self.item_requests = 0
+
+    def add_play(self, emby_user_id, minutes, played):
+        self.plays.setdefault(emby_user_id, []).append((minutes, played))
+
+    async def get_json(self, path, params=None, timeout=None):
+        if path == "/Users":
+            return [{"Name": f"user{i}", "Id": f"id{i}"} for i in range(100)]
+        emby_user_id = path.split("/")[2]
+        self.item_requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if emby_user_id in self.failing:
+                raise EmbyError("boom", 500)
+            since = parse_emby_date(params["MinDatePlayed"])
+            return {"Items": [
+                {"RunTimeTicks": minutes * 60 * 10000000,
+                 "UserData": {"LastPlayedDate": played.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")}}
+                for minutes, played in self.plays.get(emby_user_id, []) if played >= since
+            ]}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def emby(monkeypatch):
+    fake = FakeEmby()
+    monkeypatch.setattr(emby_watch, "emby_client", fake)
+    monkeypatch.setattr(emby_watch, "emby_directory", EmbyUserDirectory(client=fake))
+    monkeypatch.setattr(emby_watch, "_utc_now", lambda: NOW)
+    return fake
+
+
+def bind_users(session, count):
+    for i in range(count):
+        session.add(UserBinding(tg_id=1000 + i, emby_account=f"user{i}", points=0,
+                                daily_watch_minutes=0, total_watch_minutes=0))
+    session.commit()
+
+
+def load(tg_id):
+    with get_session() as session:
+        return session.query(UserBinding).filter_by(tg_id=tg_id).first()
+
+
+@pytest.mark.asyncio
+class TestWatchIngest:
+
+    async def test_only_new_plays_are_rewarded(self, db_session, emby):
+        bind_users(db_session, 1)
+        emby.add_play("id0", 30, NOW - timedelta(hours=2))
+        emby.add_play("id0", 20, NOW - timedelta(hours=1))
+        # 昨天的播放不计入
+        emby.add_play("id0", 90, NOW - timedelta(hours=14))
+
+        stats = await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert (stats["rewarded"], user.points, user.daily_watch_minutes) == (1, 10, 50)
+        assert user.watch_ingested_at == NOW - timedelta(hours=1)
+
+        # 没有新播放：不重复结算
+        await emby_watch.process_watch_rewards_job()
+        assert load(1000).points == 10
+
+        emby.add_play("id0", 15, NOW - timedelta(minutes=10))
+        await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert (user.points, user.daily_watch_minutes, user.total_watch_minutes) == (13, 65, 65)
+
+    async def test_fetches_run_with_bounded_concurrency(self, db_session, emby):
+        bind_users(db_session, 40)
+        for i in range(40):
+            emby.add_play(f"id{i}", 10, NOW - timedelta(minutes=30))
+
+        plays, errors = await emby_watch.collect_watch_plays(
+            [(1000 + i, f"user{i}", None) for i in range(40)], concurrency=4
+        )
+        assert (len(plays), errors) == (40, 0)
+        assert 1 < emby.max_active <= 4
+
+    async def test_small_remainder_waits_for_next_run(self, db_session, emby):
+        bind_users(db_session, 1)
+        emby.add_play("id0", 3, NOW - timedelta(minutes=50))
+        await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert (user.points, user.watch_ingested_at) == (0, None)
+
+        emby.add_play("id0", 4, NOW - timedelta(minutes=20))
+        await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert (user.points, user.daily_watch_minutes) == (1, 7)
+        assert user.watch_ingested_at == NOW - timedelta(minutes=20)
+
+    async def test_daily_cap(self, db_session, emby):
+        bind_users(db_session, 1)
+        emby.add_play("id0", 300, NOW - timedelta(hours=5))
+        await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert (user.points, user.daily_watch_minutes) == (36, emby_watch.DAILY_MAX_MINUTES)
+
+        emby.add_play("id0", 60, NOW - timedelta(minutes=5))
+        await emby_watch.process_watch_rewards_job()
+        user = load(1000)
+        assert user.points == 36
+        # 封顶后水位照样推进，下次不再重复拉取这些播放
+        assert user.watch_ingested_at == NOW - timedelta(minutes=5)
+
+    async def test_failed_fetch_does_not_block_others(self, db_session, emby):
+        bind_users(db_session, 3)
+        for i in range(3):
+            emby.add_play(f"id{i}", 10, NOW - timedelta(minutes=30))
+        emby.failing.add("id1")
+
+        stats = await emby_watch.process_watch_rewards_job()
+        assert (stats["users"], stats["rewarded"], stats["errors"]) == (3, 2, 1)
+        assert load(1001).points == 0 and load(1001).watch_ingested_at is None
+        assert stats["duration"] >= stats["fetch_seconds"] > 0
+        assert emby_watch.watch_ingest_stats["rewarded"] == 2
+
+    async def test_webhook_ingest_during_sweep_credits_once(self, db_session, emby, monkeypatch):
+        monkeypatch.setattr(emby_watch, "_ingest_lock", asyncio.Lock())
+        bind_users(db_session, 2)
+        emby.add_play("id0", 30, NOW - timedelta(minutes=30))
+        emby.add_play("id1", 20, NOW - timedelta(minutes=30))
+
+        # Webhook 结算先拿到锁；等锁的全量结算与同一账号的第二次 playback.stop 必须看到推进后的水位
+        webhook = asyncio.create_task(emby_watch.ingest_user_plays("user0"))
+        await asyncio.sleep(0)
+        sweep = asyncio.create_task(emby_watch.process_watch_rewards_job())
+        again = asyncio.create_task(emby_watch.ingest_user_plays("user0"))
+        assert await webhook == 1
+        stats = await sweep
+        assert await again == 0
+
+        assert stats["rewarded"] == 1
+        assert (load(1000).points, load(1000).daily_watch_minutes) == (6, 30)
+        assert load(1001).points == 4
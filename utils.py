@@ -3,10 +3,10 @@
 提供消息自毁等通用功能
 """
 
-import asyncio
 from typing import Optional
 from telegram import Message, CallbackQuery, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from config import Config
+from messaging import auto_deleter, send_queue, INTERACTIVE
 
 
 # 统一的未绑定提示消息
@@ -74,12 +74,8 @@ async def self_destruct(message: Optional[Message], delay: Optional[int] = None)
     if delay <= 0:
         return
 
-    try:
-        await asyncio.sleep(delay)
-        await message.delete()
-    except Exception:
-        # 删除失败（比如消息已被删除、机器人权限不足等）静默忽略
-        pass
+    # 交给自毁调度器（删除失败，比如消息已被删除、机器人权限不足等，静默忽略）
+    auto_deleter.schedule(message.chat_id, message.message_id, delay)
 
 
 async def reply_with_auto_delete(
@@ -103,13 +99,14 @@ async def reply_with_auto_delete(
     if not message:
         return None
 
-    reply = await message.reply_html(text, **kwargs)
+    # 经发送队列的交互通道：优先于广播，且计入全局 / 每聊天限速
+    reply = await send_queue.submit(message.chat_id, lambda: message.reply_html(text, **kwargs), lane=INTERACTIVE)
 
     # 只在群组中自毁
     if reply and reply.chat.type != "private":
         delay = delay if delay is not None else Config.MESSAGE_DELETE_DELAY
         if delay > 0:
-            asyncio.create_task(_delete_after(reply, delay))
+            auto_deleter.schedule(reply.chat_id, reply.message_id, delay)
 
     return reply
 
@@ -174,15 +171,6 @@ async def deny_button_access(query: CallbackQuery) -> None:
     await query.answer("⚠️ 这不是你的菜单哦！", show_alert=True)
 
 
-async def _delete_after(message: Message, delay: int) -> None:
-    """内部函数：延迟删除消息"""
-    try:
-        await asyncio.sleep(delay)
-        await message.delete()
-    except Exception:
-        pass
-
-
 async def send_with_auto_delete(
     bot,
     chat_id: int,
@@ -209,7 +197,7 @@ async def send_with_auto_delete(
     if msg and msg.chat.type != "private":
         delay = delay if delay is not None else Config.MESSAGE_DELETE_DELAY
         if delay > 0:
-            asyncio.create_task(_delete_after(msg, delay))
+            auto_deleter.schedule(msg.chat_id, msg.message_id, delay)
 
     return msg
 
@@ -241,7 +229,7 @@ async def edit_with_auto_delete(
     if msg and msg.chat.type != "private":
         delay = delay if delay is not None else Config.MESSAGE_DELETE_DELAY
         if delay > 0:
-            asyncio.create_task(_delete_after(msg, delay))
+            auto_deleter.schedule(msg.chat_id, msg.message_id, delay)
 
     return msg
 
@@ -299,6 +287,6 @@ async def smart_reply(
     if reply and reply.chat.type != "private":
         delay = delay if delay is not None else Config.MESSAGE_DELETE_DELAY
         if delay > 0:
-            asyncio.create_task(_delete_after(reply, delay))
+            auto_deleter.schedule(reply.chat_id, reply.message_id, delay)
 
     return reply